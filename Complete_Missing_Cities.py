@@ -4,18 +4,32 @@ Complete Missing Cities Loader
 Targeted approach to complete the 2 failed cities from Extended_Safe_Data_Loader
 """
 
-import requests
 import json
-import time
 import sys
 import os
+import argparse
 import psycopg2
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any
 from dotenv import load_dotenv
+from streaming_import import CopyUpsertSink
+from content_hash import UNCHANGED, ChangeDetector, content_hash, ensure_hash_column
+from overpass_fetcher import overpass
+from entity_resolution import resolve_entities
 
 # Load environment variables
 load_dotenv()
 
+# Tourism, historic, food and worship places of a missing city, in one Overpass query
+MISSING_CITY_SELECTORS = [
+    'node["tourism"~"attraction|museum|monument|artwork"]',
+    'node["historic"]["name"]',
+    'node["amenity"~"restaurant|cafe"]',
+    'node["amenity"="place_of_worship"]',
+    'way["tourism"~"attraction|museum|monument"]',
+    'way["historic"]["name"]',
+    'way["amenity"="place_of_worship"]',
+]
+
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -32,13 +46,6 @@ except ImportError as e:
 class MissingCitiesLoader:
     def __init__(self):
         """Initialize the missing cities loader with optimized settings"""
-        self.overpass_url = "http://overpass-api.de/api/interpreter"
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'ViamigoTravelAI/1.0 (Educational Purpose)',
-            'Accept': 'application/json'
-        })
-
         # Initialize PostgreSQL connection
         database_url = os.getenv('DATABASE_URL')
         if not database_url:
@@ -179,90 +186,59 @@ class MissingCitiesLoader:
 
         return ' '.join(description_parts)
 
-    def query_overpass_with_retry(self, query: str, max_retries: int = 3, base_delay: int = 5) -> Optional[Dict]:
-        """Query Overpass API with exponential backoff retry logic"""
-        for attempt in range(max_retries):
-            try:
-                print(f"  🔄 Attempt {attempt + 1}/{max_retries}")
-
-                response = self.session.post(
-                    self.overpass_url,
-                    data=query,
-                    timeout=60  # Increased timeout for problematic cities
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    print(
-                        f"  ✅ Success: {len(data.get('elements', []))} elements found")
-                    return data
-                elif response.status_code == 429:  # Rate limited
-                    delay = base_delay * (2 ** attempt)
-                    print(f"  ⏳ Rate limited, waiting {delay}s...")
-                    time.sleep(delay)
-                else:
-                    print(
-                        f"  ❌ HTTP {response.status_code}: {response.text[:100]}")
-
-            except requests.exceptions.Timeout:
-                delay = base_delay * (2 ** attempt)
-                print(f"  ⏰ Timeout, waiting {delay}s before retry...")
-                time.sleep(delay)
-            except Exception as e:
-                print(f"  ❌ Error: {e}")
-                time.sleep(base_delay)
-
-        print(f"  💀 Failed after {max_retries} attempts")
-        return None
-
-    def load_city_data(self, city_name: str, overpass_query: str) -> bool:
-        """Load data for a single city with comprehensive error handling"""
+    def load_city_data(self, city_name: str, elements: List[Dict[str, Any]]) -> bool:
+        """Load the Overpass elements of a single city with comprehensive error handling"""
         print(f"\n🏛️  Loading {city_name}...")
-        print(f"Query: {overpass_query[:100]}...")
 
-        # Query Overpass API
-        data = self.query_overpass_with_retry(overpass_query)
-        if not data:
-            return False
-
-        elements = data.get('elements', [])
         if not elements:
             print(f"  ⚠️  No elements found for {city_name}")
             return False
 
-        # Process places and insert into database
-        places_inserted = 0
-        places_in_chromadb = 0
-
+        # Normalize, then keep only the places whose content hash is new or changed
+        places = {}
         for element in elements:
             try:
                 place_data = self.osm_to_place_data(element, city_name)
+            except Exception as e:
+                print(f"    ❌ Error processing element: {e}")
+                continue
 
-                # Skip places without names
-                if not place_data['name'] or place_data['name'].startswith('Unnamed'):
-                    continue
-
-                # Create cache key
-                cache_key = f"{city_name.lower()}_{place_data['name'].lower().replace(' ', '_')}"
+            # Skip places without names
+            if not place_data['name'] or place_data['name'].startswith('Unnamed'):
+                continue
 
-                # Insert into PostgreSQL database
-                insert_query = """
-                    INSERT INTO place_cache (cache_key, place_data, city, place_name, country, priority_level, created_at, last_accessed, access_count)
-                    VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW(), 0)
-                    ON CONFLICT (cache_key) DO NOTHING
-                """
+            # Create cache key (first element wins for a key, as before)
+            cache_key = f"{city_name.lower()}_{place_data['name'].lower().replace(' ', '_')}"
+            places.setdefault(cache_key, (place_data, content_hash(place_data)))
 
-                with self.pg_conn.cursor() as cursor:
-                    cursor.execute(
-                        insert_query,
-                        (cache_key, json.dumps(place_data),
-                         city_name, place_data['name'], 'Italy', 1)
-                    )
-                    if cursor.rowcount > 0:
-                        places_inserted += 1
+        try:
+            with self.pg_conn.cursor() as cursor:
+                ensure_hash_column(cursor, 'place_cache')
+            statuses = ChangeDetector(self.pg_conn, 'place_cache', key=('cache_key',)).classify(
+                [((cache_key,), place_hash) for cache_key, (_, place_hash) in places.items()])
+            self.pg_conn.commit()
+        except Exception as e:
+            print(f"    ⚠️  Change detection failed, writing all places: {e}")
+            self.pg_conn.rollback()
+            statuses = [None] * len(places)
+        print(f"  ⏭️  {statuses.count(UNCHANGED)} unchanged places skipped")
+
+        # Insert new and refresh changed places in batches
+        sink = CopyUpsertSink(
+            self.pg_conn, 'place_cache',
+            ('cache_key', 'place_data', 'city', 'place_name', 'country', 'priority_level', 'content_hash'),
+            key=('cache_key',), update=('place_data', 'content_hash'), compare=('{}.content_hash',),
+            insert_values={'created_at': 'NOW()', 'last_accessed': 'NOW()', 'access_count': '0'},
+            update_values={'last_accessed': 'NOW()'})
+        places_in_chromadb = 0
 
-                # Commit the transaction
-                self.pg_conn.commit()
+        for (cache_key, (place_data, place_hash)), status in zip(places.items(), statuses):
+            if status == UNCHANGED:
+                continue
+            try:
+                # Queue for PostgreSQL (merged every batch)
+                sink.add((cache_key, json.dumps(place_data), city_name, place_data['name'], 'Italy', 1,
+                          place_hash))
 
                 # Add to ChromaDB
                 if self.collection and place_data.get('description'):
@@ -284,52 +260,31 @@ class MissingCitiesLoader:
 
             except Exception as e:
                 print(f"    ❌ Error processing element: {e}")
+                self.pg_conn.rollback()
                 continue
 
+        try:
+            sink.flush()
+        except Exception as e:
+            print(f"    ❌ Error writing {city_name} batch: {e}")
+            self.pg_conn.rollback()
+        places_inserted = sink.stats['inserted']
+
         print(
-            f"  ✅ {city_name}: {places_inserted} new places added to PostgreSQL")
+            f"  ✅ {city_name}: {places_inserted} new places added to PostgreSQL, "
+            f"{sink.stats['updated']} changed places updated")
         print(f"  📚 {city_name}: {places_in_chromadb} places indexed in ChromaDB")
 
-        return places_inserted > 0
+        # An up-to-date city (every place unchanged) is loaded too
+        return places_inserted + sink.stats['updated'] + statuses.count(UNCHANGED) > 0
 
-    def load_missing_cities(self):
-        """Load the two missing cities with optimized queries"""
+    def load_missing_cities(self, refresh: bool = False):
+        """Load the two missing cities with optimized queries (refresh: bypass the Overpass disk cache)"""
 
-        # Define the two missing cities with more focused queries
+        # The two missing cities, by administrative area instead of bbox
         missing_cities = {
-            "Padua": """
-                [out:json][timeout:60];
-                (
-                  area["name"="Padova"][admin_level=8];
-                )->.searchArea;
-                (
-                  node["tourism"~"attraction|museum|monument|artwork"](area.searchArea);
-                  node["historic"]["name"](area.searchArea);
-                  node["amenity"~"restaurant|cafe"](area.searchArea);
-                  node["amenity"="place_of_worship"](area.searchArea);
-                  way["tourism"~"attraction|museum|monument"](area.searchArea);
-                  way["historic"]["name"](area.searchArea);
-                  way["amenity"="place_of_worship"](area.searchArea);
-                );
-                out center meta;
-            """,
-
-            "Volterra": """
-                [out:json][timeout:60];
-                (
-                  area["name"="Volterra"][admin_level=8];
-                )->.searchArea;
-                (
-                  node["tourism"~"attraction|museum|monument|artwork"](area.searchArea);
-                  node["historic"]["name"](area.searchArea);
-                  node["amenity"~"restaurant|cafe"](area.searchArea);
-                  node["amenity"="place_of_worship"](area.searchArea);
-                  way["tourism"~"attraction|museum|monument"](area.searchArea);
-                  way["historic"]["name"](area.searchArea);
-                  way["amenity"="place_of_worship"](area.searchArea);
-                );
-                out center meta;
-            """
+            "Padua": 'area["name"="Padova"][admin_level=8]',
+            "Volterra": 'area["name"="Volterra"][admin_level=8]',
         }
 
         print("🎯 COMPLETING MISSING CITIES")
@@ -339,12 +294,19 @@ class MissingCitiesLoader:
         success_count = 0
         total_cities = len(missing_cities)
 
-        for city_name, query in missing_cities.items():
-            if self.load_city_data(city_name, query):
+        # Both cities are fetched concurrently under the shared Overpass slot limiter
+        for city_name, found, error in overpass.fetch_many(
+                missing_cities, {'places': MISSING_CITY_SELECTORS}, timeout=60, out='center meta',
+                refresh=refresh):
+            if error:
+                print(f"  💀 {city_name}: {error}")
+                continue
+            print(f"  ✅ {city_name}: {len(found['places'])} elements found")
+            if self.load_city_data(city_name, found['places']):
                 success_count += 1
 
-            # Brief pause between cities
-            time.sleep(2)
+        print(f"  🗺️  Overpass: {overpass.summary()}")
+        resolve_entities(self.pg_conn, sources=['place_cache'], cities=list(missing_cities))
 
         print(f"\n🎉 COMPLETION SUMMARY")
         print("=" * 30)
@@ -363,13 +325,17 @@ class MissingCitiesLoader:
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description='Complete the cities Extended_Safe_Data_Loader missed')
+    parser.add_argument('--refresh', action='store_true', help='Refetch every city from Overpass instead of the disk cache')
+    args = parser.parse_args()
+
     print("🚀 ViamigoTravelAI - Complete Missing Cities")
     print("=" * 55)
 
     # Initialize loader and complete missing cities
     try:
         loader = MissingCitiesLoader()
-        success = loader.load_missing_cities()
+        success = loader.load_missing_cities(refresh=args.refresh)
 
         if success:
             print("\n🎊 MISSION ACCOMPLISHED!")
@@ -5,20 +5,33 @@ Loads 40+ Italian cities from North to South, including islands
 """
 
 import os
-import requests
+import argparse
 import psycopg2
 from psycopg2.extras import execute_batch
 import chromadb
 from sentence_transformers import SentenceTransformer
 import json
 from typing import List, Dict, Tuple, Optional
-import time
 from dotenv import load_dotenv
 from datetime import datetime
+from content_hash import UNCHANGED, ChangeDetector, content_hash, ensure_hash_column
+from overpass_fetcher import overpass, unique_elements
+from entity_resolution import resolve_entities
 
 # Load environment variables
 load_dotenv()
 
+# Overpass selectors per POI type, fetched together in one query per bbox
+POI_CLASSES = {
+    'restaurant': ['node["amenity"~"restaurant|cafe|bar|pub|fast_food"]',
+                   'way["amenity"~"restaurant|cafe|bar|pub|fast_food"]'],
+    'tourist_attraction': ['node["tourism"~"attraction|museum|gallery|monument"]',
+                           'way["tourism"~"attraction|museum|gallery|monument"]',
+                           'node["historic"]', 'way["historic"]'],
+    'hotel': ['node["tourism"~"hotel|guest_house|hostel"]',
+              'way["tourism"~"hotel|guest_house|hostel"]'],
+}
+
 
 class ExtendedSafeTourismDataLoader:
     def __init__(self, chroma_path: str = "./chromadb_data"):
@@ -55,72 +68,26 @@ class ExtendedSafeTourismDataLoader:
 
         print("✅ PostgreSQL and ChromaDB connections established")
 
-    def query_overpass(self, bbox: Tuple[float, float, float, float], poi_types: List[str]) -> List[Dict]:
+    def query_overpass(self, bbox: Tuple[float, float, float, float], poi_types: List[str],
+                       found: Optional[Dict[str, List[Dict]]] = None) -> List[Dict]:
         """
-        Query OpenStreetMap using Overpass API for specific POI types within bounding box
+        Query OpenStreetMap for specific POI types within bounding box: one
+        Overpass query for all types, cached on disk and rate limited by the
+        shared fetcher
 
         Args:
             bbox: Bounding box (south, west, north, east)
-            poi_types: List of POI types to search for
+            poi_types: List of POI types to search for (keys of POI_CLASSES)
+            found: Elements per POI type already fetched (overpass.fetch_many)
 
         Returns:
             List of POI dictionaries with OSM data
         """
-        # Construct Overpass QL query
-        south, west, north, east = bbox
-
-        # Build query for multiple POI types
-        query_parts = []
-        for poi_type in poi_types:
-            if poi_type == "restaurant":
-                query_parts.append(
-                    f'node["amenity"~"restaurant|cafe|bar|pub|fast_food"]({south},{west},{north},{east});')
-                query_parts.append(
-                    f'way["amenity"~"restaurant|cafe|bar|pub|fast_food"]({south},{west},{north},{east});')
-            elif poi_type == "tourist_attraction":
-                query_parts.append(
-                    f'node["tourism"~"attraction|museum|gallery|monument"]({south},{west},{north},{east});')
-                query_parts.append(
-                    f'way["tourism"~"attraction|museum|gallery|monument"]({south},{west},{north},{east});')
-                query_parts.append(
-                    f'node["historic"]({south},{west},{north},{east});')
-                query_parts.append(
-                    f'way["historic"]({south},{west},{north},{east});')
-            elif poi_type == "hotel":
-                query_parts.append(
-                    f'node["tourism"~"hotel|guest_house|hostel"]({south},{west},{north},{east});')
-                query_parts.append(
-                    f'way["tourism"~"hotel|guest_house|hostel"]({south},{west},{north},{east});')
-
-        overpass_query = f"""
-        [out:json][timeout:25];
-        (
-          {' '.join(query_parts)}
-        );
-        out geom;
-        """
-
-        overpass_url = "https://overpass-api.de/api/interpreter"
-
         try:
-            # Try with shorter timeout first, then retry
-            for timeout_val in [15, 30]:
-                try:
-                    response = requests.post(
-                        overpass_url, data=overpass_query, timeout=timeout_val)
-                    response.raise_for_status()
-                    break  # Success, exit retry loop
-                except requests.exceptions.Timeout:
-                    if timeout_val == 15:
-                        print(
-                            f"⏱️ First attempt timed out, retrying with longer timeout...")
-                        time.sleep(3)
-                        continue
-                    else:
-                        raise  # Final timeout, let it bubble up
-
-            data = response.json()
-            elements = data.get('elements', [])
+            if found is None:
+                found = overpass.fetch(bbox, {poi_type: POI_CLASSES[poi_type] for poi_type in poi_types},
+                                       timeout=25)
+            elements = unique_elements({poi_type: found.get(poi_type, []) for poi_type in poi_types})
 
             print(f"📊 Found {len(elements)} raw POIs from OpenStreetMap")
 
@@ -235,7 +202,7 @@ class ExtendedSafeTourismDataLoader:
 
     def load_city_data(self, city: str, bbox: Tuple[float, float, float, float],
                        load_attractions: bool = True, load_restaurants: bool = True,
-                       load_hotels: bool = True) -> bool:
+                       load_hotels: bool = True, elements: Optional[Dict[str, List[Dict]]] = None) -> bool:
         """
         Load comprehensive data for a city from OpenStreetMap
 
@@ -245,6 +212,8 @@ class ExtendedSafeTourismDataLoader:
             load_attractions: Whether to load tourist attractions
             load_restaurants: Whether to load restaurants
             load_hotels: Whether to load hotels
+            elements: Elements per POI type already fetched (overpass.fetch_many);
+                fetched here when missing
 
         Returns:
             Success status
@@ -261,26 +230,31 @@ class ExtendedSafeTourismDataLoader:
             poi_types.append('hotel')
 
         # Query OpenStreetMap
-        places = self.query_overpass(bbox, poi_types)
+        places = self.query_overpass(bbox, poi_types, elements)
 
         if not places:
             print(f"⚠️ No places found for {city}")
             return False
 
-        # Store in PostgreSQL
-        success = self._store_in_postgres(city, places)
+        # Store in PostgreSQL (categories whose content hash did not change are skipped)
+        changed_places = self._store_in_postgres(city, places)
 
-        if success:
+        if changed_places is not None:
             # Store in ChromaDB for semantic search
-            self._store_in_chromadb(city, places)
-            print(f"✅ Successfully loaded {len(places)} places for {city}")
+            if changed_places:
+                self._store_in_chromadb(city, changed_places)
+            print(f"✅ Successfully loaded {len(places)} places for {city} "
+                  f"({len(changed_places)} new or changed)")
             return True
         else:
             print(f"❌ Failed to store data for {city}")
             return False
 
-    def _store_in_postgres(self, city: str, places: List[Dict]) -> bool:
-        """Store places in PostgreSQL place_cache table"""
+    def _store_in_postgres(self, city: str, places: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Store places in PostgreSQL place_cache table, one row per category.
+        Returns the places of the new or changed categories (None on failure)
+        """
         try:
             # Group places by category
             categories = {}
@@ -290,31 +264,43 @@ class ExtendedSafeTourismDataLoader:
                     categories[category] = []
                 categories[category].append(place)
 
-            # Store each category
-            for category, category_places in categories.items():
-                cache_key = f"{city.lower()}_{category}"
+            ensure_hash_column(self.pg_cursor, 'place_cache')
+            keys = [f"{city.lower()}_{category}" for category in categories]
+            hashes = [content_hash(category_places) for category_places in categories.values()]
+            statuses = ChangeDetector(self.pg_conn, 'place_cache', key=('cache_key',)).classify(
+                [((key,), category_hash) for key, category_hash in zip(keys, hashes)])
+
+            # Store each new or changed category
+            changed_places = []
+            for (category, category_places), cache_key, category_hash, status in zip(
+                    categories.items(), keys, hashes, statuses):
+                if status == UNCHANGED:
+                    continue
+                changed_places.extend(category_places)
                 place_data = json.dumps(category_places, ensure_ascii=False)
 
                 # Insert or update - proper created_at semantics
                 self.pg_cursor.execute("""
-                    INSERT INTO place_cache (cache_key, place_data, city, place_name, country, priority_level, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    INSERT INTO place_cache (cache_key, place_data, city, place_name, country, priority_level, content_hash, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
                     ON CONFLICT (cache_key) 
                     DO UPDATE SET 
                         place_data = EXCLUDED.place_data,
+                        content_hash = EXCLUDED.content_hash,
                         last_accessed = CURRENT_TIMESTAMP,
                         access_count = COALESCE(place_cache.access_count, 0) + 1
                     -- Note: created_at remains unchanged on updates (correct behavior)
-                """, (cache_key, place_data, city, f"{city} {category}", "Italia", "high"))
+                """, (cache_key, place_data, city, f"{city} {category}", "Italia", "high", category_hash))
 
             self.pg_conn.commit()
-            print(f"💾 Stored {len(categories)} categories in PostgreSQL")
-            return True
+            unchanged = statuses.count(UNCHANGED)
+            print(f"💾 Stored {len(categories) - unchanged} categories in PostgreSQL ({unchanged} unchanged)")
+            return changed_places
 
         except Exception as e:
             print(f"❌ Error storing in PostgreSQL: {e}")
             self.pg_conn.rollback()
-            return False
+            return None
 
     def _store_in_chromadb(self, city: str, places: List[Dict]):
         """Store places in ChromaDB for semantic search"""
@@ -356,9 +342,9 @@ class ExtendedSafeTourismDataLoader:
                 metadatas.append(metadata)
                 ids.append(f"{city.lower()}_{place.get('osm_id', i)}")
 
-            # Add to ChromaDB
+            # Add to ChromaDB (upsert: changed places replace their documents)
             if documents:
-                self.collection.add(
+                self.collection.upsert(
                     documents=documents,
                     metadatas=metadatas,
                     ids=ids
@@ -382,6 +368,10 @@ def main():
     Load comprehensive Italian city data using OpenStreetMap
     Extended to cover 40+ cities across all regions
     """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument('--refresh', action='store_true', help='Refetch every city from Overpass instead of the disk cache')
+    args = parser.parse_args()
+
     print("🇮🇹 EXTENDED ViaMigo Safe Data Loader - Comprehensive Italian Coverage 🇮🇹\n")
     print("✅ Using OpenStreetMap (Overpass API) - 100% Safe")
     print("✅ No suspicious APIs, No scam risks")
@@ -463,15 +453,21 @@ def main():
     successful_loads = 0
     failed_loads = 0
 
-    # Load data for each city
-    for city, bbox in extended_italian_cities.items():
+    # Fetch cities concurrently (shared Overpass slots and cache), load each as it arrives
+    for city, elements, error in overpass.fetch_many(extended_italian_cities, POI_CLASSES, timeout=25,
+                                                      refresh=args.refresh):
+        if error:
+            print(f"❌ Error fetching {city}: {error}")
+            failed_loads += 1
+            continue
         try:
             success = loader.load_city_data(
                 city=city,
-                bbox=bbox,
+                bbox=extended_italian_cities[city],
                 load_attractions=True,
                 load_restaurants=True,
-                load_hotels=True
+                load_hotels=True,
+                elements=elements
             )
 
             if success:
@@ -479,16 +475,18 @@ def main():
             else:
                 failed_loads += 1
 
-            time.sleep(2)  # Be respectful to OSM servers
-
         except Exception as e:
             print(f"❌ Error loading {city}: {e}")
             failed_loads += 1
             continue
 
+    # Link the new places to the same monuments stored by the other importers
+    resolve_entities(loader.pg_conn, sources=['place_cache'], cities=list(extended_italian_cities))
+
     # Close connections
     loader.close()
 
+    print(f"🗺️ Overpass: {overpass.summary()}")
     print(f"\n🎉 Extended Data Loading Complete!")
     print(f"✅ Successfully loaded: {successful_loads} cities")
     print(f"❌ Failed to load: {failed_loads} cities")
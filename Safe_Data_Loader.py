@@ -5,20 +5,53 @@ Integrates with existing place_cache and ChromaDB architecture
 """
 
 import os
-import requests
+import argparse
 import psycopg2
 from psycopg2.extras import execute_batch
 import chromadb
 from sentence_transformers import SentenceTransformer
-import json
 from typing import List, Dict, Tuple, Optional
-import time
 from dotenv import load_dotenv
 from datetime import datetime
+from streaming_import import CopyUpsertSink
+from content_hash import UNCHANGED, ChangeDetector, content_hash, ensure_hash_column
+from overpass_fetcher import overpass
+from entity_resolution import resolve_entities
 
 # Load environment variables
 load_dotenv()
 
+# Overpass selectors per element class, fetched together in one query per bbox
+OSM_CLASSES = {
+    'attraction': [
+        'node["tourism"="attraction"]', 'way["tourism"="attraction"]',
+        'node["tourism"="museum"]', 'way["tourism"="museum"]',
+        'node["historic"]', 'way["historic"]',
+        'node["amenity"="place_of_worship"]', 'way["amenity"="place_of_worship"]',
+        'node["tourism"="viewpoint"]',
+    ],
+    'restaurant': [
+        'node["amenity"="restaurant"]', 'way["amenity"="restaurant"]',
+        'node["amenity"="cafe"]', 'way["amenity"="cafe"]',
+        'node["amenity"="bar"]',
+    ],
+}
+
+
+def place_cache_sink(conn) -> CopyUpsertSink:
+    """
+    Bulk sink for OSM places: new keys are inserted, changed ones refreshed
+    (last_accessed, access_count) and identical ones left alone, compared by
+    content_hash (fetched_at inside place_data is not part of it)
+    """
+    return CopyUpsertSink(
+        conn, 'place_cache',
+        ('cache_key', 'place_name', 'city', 'country', 'place_data', 'priority_level', 'content_hash'),
+        key=('cache_key',), update=('place_data', 'content_hash'),
+        insert_values={'created_at': 'NOW()', 'last_accessed': 'NOW()', 'access_count': '0'},
+        update_values={'last_accessed': 'NOW()', 'access_count': 'place_cache.access_count + 1'},
+        compare=('{}.content_hash',))
+
 
 class SafeTourismDataLoader:
     def __init__(self, chroma_path: str = "./chromadb_data"):
@@ -39,6 +72,8 @@ class SafeTourismDataLoader:
 
         self.pg_conn = psycopg2.connect(database_url)
         self.pg_cursor = self.pg_conn.cursor()
+        self.place_sink = place_cache_sink(self.pg_conn)
+        self.place_changes = ChangeDetector(self.pg_conn, 'place_cache', key=('cache_key',))
         self.chroma_client = chromadb.PersistentClient(path=chroma_path)
 
         # Initialize embedding model for RAG
@@ -83,88 +118,34 @@ class SafeTourismDataLoader:
         else:
             print("✅ place_cache table exists")
 
-    def fetch_osm_attractions(self, city: str, bbox: Tuple[float, float, float, float]) -> List[Dict]:
-        """
-        Fetch tourist attractions from OpenStreetMap Overpass API
-
-        Args:
-            city: City name for logging
-            bbox: (south, west, north, east) bounding box coordinates
-
-        Returns:
-            List of OSM elements (attractions, museums, historic sites, churches)
-        """
-        overpass_url = "https://overpass-api.de/api/interpreter"
-
-        # Comprehensive query for tourist attractions
-        query = f"""
-        [out:json][timeout:30];
-        (
-          node["tourism"="attraction"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          way["tourism"="attraction"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          node["tourism"="museum"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          way["tourism"="museum"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          node["historic"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          way["historic"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          node["amenity"="place_of_worship"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          way["amenity"="place_of_worship"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          node["tourism"="viewpoint"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-        );
-        out center body;
-        """
+        ensure_hash_column(self.pg_cursor, 'place_cache')
+        self.pg_conn.commit()
 
-        print(f"🔍 Fetching attractions for {city} from OpenStreetMap...")
-
-        try:
-            response = requests.post(
-                overpass_url, data={"data": query}, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            elements = data.get('elements', [])
-            print(f"✅ Found {len(elements)} attractions in {city}")
-            return elements
-        except Exception as e:
-            print(f"❌ Error fetching attractions for {city}: {e}")
-            return []
-
-    def fetch_osm_restaurants(self, city: str, bbox: Tuple[float, float, float, float]) -> List[Dict]:
+    def fetch_osm_places(self, city: str, bbox: Tuple[float, float, float, float],
+                         classes: Tuple[str, ...] = ('attraction', 'restaurant')) -> Dict[str, List[Dict]]:
         """
-        Fetch restaurants and cafes from OpenStreetMap
+        Fetch OSM elements of several classes with one Overpass query
+        (cached on disk and rate limited by the shared fetcher)
 
         Args:
             city: City name for logging
             bbox: (south, west, north, east) bounding box coordinates
+            classes: Keys of OSM_CLASSES to fetch
 
         Returns:
-            List of OSM restaurant/cafe elements
+            Dict of class -> OSM elements (empty lists on failure)
         """
-        overpass_url = "https://overpass-api.de/api/interpreter"
-
-        query = f"""
-        [out:json][timeout:30];
-        (
-          node["amenity"="restaurant"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          way["amenity"="restaurant"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          node["amenity"="cafe"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          way["amenity"="cafe"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-          node["amenity"="bar"]({bbox[0]},{bbox[1]},{bbox[2]},{bbox[3]});
-        );
-        out center body;
-        """
-
-        print(f"🍽️  Fetching restaurants for {city} from OpenStreetMap...")
+        print(f"🔍 Fetching {' and '.join(classes)} elements for {city} from OpenStreetMap...")
 
         try:
-            response = requests.post(
-                overpass_url, data={"data": query}, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            elements = data.get('elements', [])
-            print(f"✅ Found {len(elements)} restaurants/cafes in {city}")
-            return elements
+            found = overpass.fetch(bbox, {name: OSM_CLASSES[name] for name in classes}, timeout=30)
         except Exception as e:
-            print(f"❌ Error fetching restaurants for {city}: {e}")
-            return []
+            print(f"❌ Error fetching OSM data for {city}: {e}")
+            return {name: [] for name in classes}
+
+        for name, elements in found.items():
+            print(f"✅ Found {len(elements)} {name} elements in {city}")
+        return found
 
     def transform_osm_to_place_cache(self, osm_element: Dict, city: str, element_type: str) -> Dict:
         """
@@ -275,36 +256,41 @@ class SafeTourismDataLoader:
 
         return place_data
 
-    def insert_into_place_cache(self, city: str, place_name: str, place_data: Dict):
+    def insert_into_place_cache(self, city: str, place_name: str, place_data: Dict,
+                                place_hash: Optional[str] = None):
         """
-        Insert place into place_cache table
+        Queue place for place_cache (merged in batches by place_sink, see
+        flush_place_cache)
         Cache key format: osm:{city}:{osm_id}
 
         Args:
             city: City name
             place_name: Place name
             place_data: Place data dict (will be stored as JSONB)
+            place_hash: content_hash of place_data (computed when missing)
         """
         osm_id = place_data.get('osm_id', 'unknown')
         cache_key = f"osm:{city.lower()}:{osm_id}"
 
         try:
             # Match existing table schema (has country, priority_level, etc.)
-            self.pg_cursor.execute("""
-                INSERT INTO place_cache (cache_key, place_name, city, country, place_data, priority_level, created_at, last_accessed, access_count)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW(), 0)
-                ON CONFLICT (cache_key) 
-                DO UPDATE SET 
-                    place_data = EXCLUDED.place_data,
-                    last_accessed = NOW(),
-                    access_count = place_cache.access_count + 1
-            """, (cache_key, place_name, city, 'Italy', json.dumps(place_data), 'standard'))
-
-            # DEBUG: Confirm insert
-            # print(f"  🔹 Inserted with key: {cache_key}")
+            self.place_sink.add((cache_key, place_name, city, 'Italy', place_data, 'standard',
+                                 place_hash or content_hash(place_data)))
 
         except Exception as e:
-            print(f"⚠️ Failed to insert {place_name} into place_cache: {e}")
+            # add() merges a full batch: the batch is lost, the load goes on
+            print(f"⚠️ Failed to write place_cache batch at {place_name}: {e}")
+            self.pg_conn.rollback()
+            import traceback
+            traceback.print_exc()
+
+    def flush_place_cache(self):
+        """Merge the queued places: one COPY + INSERT ... ON CONFLICT per batch"""
+        try:
+            self.place_sink.flush()
+        except Exception as e:
+            print(f"⚠️ Failed to write place_cache batch: {e}")
+            self.pg_conn.rollback()
             import traceback
             traceback.print_exc()
 
@@ -345,7 +331,7 @@ class SafeTourismDataLoader:
         doc_id = f"osm_{city}_{osm_id}".replace(' ', '_').lower()
 
         try:
-            self.collection.add(
+            self.collection.upsert(
                 ids=[doc_id],
                 documents=[document_text],
                 metadatas=[{
@@ -361,8 +347,40 @@ class SafeTourismDataLoader:
             if "already exists" not in str(e):
                 print(f"⚠️ Failed to add {place_name} to ChromaDB: {e}")
 
+    def save_places(self, city: str, places: List[Tuple[str, Dict]], label: str) -> int:
+        """
+        Write the new and changed places (by content hash) to place_cache and
+        ChromaDB; unchanged ones are skipped. Returns the places written
+        """
+        hashes = [content_hash(place_data) for _, place_data in places]
+        try:
+            statuses = self.place_changes.classify(
+                [((f"osm:{city.lower()}:{place_data.get('osm_id', 'unknown')}",), place_hash)
+                 for (_, place_data), place_hash in zip(places, hashes)])
+        except Exception as e:
+            print(f"⚠️ Change detection failed, writing all {label}s: {e}")
+            self.pg_conn.rollback()
+            statuses = [None] * len(places)
+
+        saved = 0
+        for (name, place_data), place_hash, status in zip(places, hashes, statuses):
+            if status == UNCHANGED:
+                continue
+            try:
+                self.insert_into_place_cache(city, name, place_data, place_hash)
+                self.add_to_chromadb(name, city, place_data)
+                saved += 1
+                print(f"✅ Saved {label}: {name}")
+            except Exception as e:
+                print(f"⚠️ Failed to process {name}: {e}")
+
+        self.flush_place_cache()
+        print(f"⏭️ Skipped {statuses.count(UNCHANGED)} unchanged {label}s")
+        return saved
+
     def load_city_data(self, city: str, bbox: Tuple[float, float, float, float],
-                       load_attractions: bool = True, load_restaurants: bool = True):
+                       load_attractions: bool = True, load_restaurants: bool = True,
+                       elements: Optional[Dict[str, List[Dict]]] = None):
         """
         Load all data for a city from OpenStreetMap
 
@@ -371,6 +389,8 @@ class SafeTourismDataLoader:
             bbox: Bounding box (south, west, north, east)
             load_attractions: Whether to load attractions/museums/historic sites
             load_restaurants: Whether to load restaurants/cafes
+            elements: Elements per class already fetched (overpass.fetch_many);
+                fetched here when missing
         """
         print(f"\n{'='*60}")
         print(f"🚀 Starting SAFE data load for {city} (OpenStreetMap)")
@@ -380,12 +400,15 @@ class SafeTourismDataLoader:
         self.ensure_place_cache_ready()
 
         total_inserted = 0
+        if elements is None:
+            classes = ('attraction',) * load_attractions + ('restaurant',) * load_restaurants
+            elements = self.fetch_osm_places(city, bbox, classes) if classes else {}
 
         # Load attractions
         if load_attractions:
-            attractions = self.fetch_osm_attractions(city, bbox)
-            time.sleep(1)  # Be nice to OSM servers
+            attractions = elements.get('attraction', [])
 
+            places = []
             for element in attractions:
                 tags = element.get('tags', {})
                 name = tags.get('name', tags.get('name:en'))
@@ -394,22 +417,18 @@ class SafeTourismDataLoader:
                     continue
 
                 try:
-                    place_data = self.transform_osm_to_place_cache(
-                        element, city, 'attraction')
-                    self.insert_into_place_cache(city, name, place_data)
-                    self.add_to_chromadb(name, city, place_data)
-                    total_inserted += 1
-                    print(f"✅ Saved attraction: {name}")
+                    places.append((name, self.transform_osm_to_place_cache(
+                        element, city, 'attraction')))
                 except Exception as e:
                     print(f"⚠️ Failed to process {name}: {e}")
 
-            self.pg_conn.commit()
+            total_inserted += self.save_places(city, places, 'attraction')
 
         # Load restaurants
         if load_restaurants:
-            restaurants = self.fetch_osm_restaurants(city, bbox)
-            time.sleep(1)  # Be nice to OSM servers
+            restaurants = elements.get('restaurant', [])
 
+            places = []
             for element in restaurants:
                 tags = element.get('tags', {})
                 name = tags.get('name', tags.get('name:en'))
@@ -418,22 +437,20 @@ class SafeTourismDataLoader:
                     continue
 
                 try:
-                    place_data = self.transform_osm_to_place_cache(
-                        element, city, 'restaurant')
-                    self.insert_into_place_cache(city, name, place_data)
-                    self.add_to_chromadb(name, city, place_data)
-                    total_inserted += 1
-                    print(f"✅ Saved restaurant: {name}")
+                    places.append((name, self.transform_osm_to_place_cache(
+                        element, city, 'restaurant')))
                 except Exception as e:
                     print(f"⚠️ Failed to process {name}: {e}")
 
-            self.pg_conn.commit()
+            total_inserted += self.save_places(city, places, 'restaurant')
 
         # Summary
         print(f"\n{'='*60}")
         print(f"✅ {city} SAFE Data Load Complete (OpenStreetMap)")
         print(f"{'='*60}")
-        print(f"Total places inserted: {total_inserted}")
+        print(f"Total places inserted or changed: {total_inserted}")
+        print(f"place_cache (run total): {self.place_sink.summary()}")
+        print(f"Change detection (run total): {self.place_changes.summary()}")
         print(f"Source: OpenStreetMap (100% Safe)")
         print(f"{'='*60}\n")
 
@@ -449,6 +466,10 @@ def main():
     Main execution: Load safe data for Italian cities
     Uses OpenStreetMap Overpass API - 100% Safe and Free
     """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument('--refresh', action='store_true', help='Refetch every city from Overpass instead of the disk cache')
+    args = parser.parse_args()
+
     print("🇮🇹 ViaMigo SAFE Data Loader - OpenStreetMap Integration 🇮🇹\n")
     print("✅ Using OpenStreetMap (Overpass API) - 100% Safe")
     print("✅ No suspicious APIs, No scam risks")
@@ -478,20 +499,29 @@ def main():
         "Verona": (45.42, 10.96, 45.47, 11.04),
     }
 
-    # Load data for each city
-    for city, bbox in italian_cities.items():
+    # Fetch cities concurrently (shared Overpass slots and cache), load each as it arrives
+    for city, elements, error in overpass.fetch_many(italian_cities, OSM_CLASSES, timeout=30,
+                                                      refresh=args.refresh):
+        if error:
+            print(f"❌ Error fetching {city}: {error}")
+            continue
         try:
             loader.load_city_data(
                 city=city,
-                bbox=bbox,
+                bbox=italian_cities[city],
                 load_attractions=True,
-                load_restaurants=True
+                load_restaurants=True,
+                elements=elements
             )
-            time.sleep(2)  # Be respectful to OSM servers
         except Exception as e:
             print(f"❌ Error loading {city}: {e}")
             continue
 
+    print(f"🗺️ Overpass: {overpass.summary()}")
+
+    # Link the new places to the same monuments stored by the other importers
+    resolve_entities(loader.pg_conn, sources=['place_cache'], cities=list(italian_cities))
+
     # Close connections
     loader.close()
 
@@ -31,13 +31,13 @@ from datetime import datetime
 from dotenv import load_dotenv
 import time
 from typing import List, Dict, Optional
-import json
 from sentence_transformers import SentenceTransformer
 import chromadb
 from psycopg2.extras import execute_batch
 import psycopg2
 import os
 import requests
+from streaming_import import CopyUpsertSink
 
 # Load environment variables
 load_dotenv()
@@ -57,6 +57,12 @@ class ViaMigoDataLoader:
 
         self.pg_conn = psycopg2.connect(database_url)
         self.pg_cursor = self.pg_conn.cursor()
+        self.place_sink = CopyUpsertSink(
+            self.pg_conn, 'place_cache', ('cache_key', 'place_name', 'city', 'place_data'),
+            key=('cache_key',), update=('place_data',),
+            insert_values={'created_at': 'NOW()', 'updated_at': 'NOW()'},
+            update_values={'updated_at': 'NOW()'},
+            compare=("{}.place_data::jsonb - 'fetched_at'",))
         self.chroma_client = chromadb.PersistentClient(path=chroma_path)
 
         # Initialize embedding model for RAG
@@ -259,7 +265,8 @@ class ViaMigoDataLoader:
 
     def insert_into_place_cache(self, city: str, place_name: str, place_data: Dict):
         """
-        Insert place into place_cache table using standard cache_key format
+        Queue place for place_cache using standard cache_key format (merged
+        in batches by place_sink)
         Cache key format: opentripmap:{city}:{place_name}
 
         Args:
@@ -270,17 +277,11 @@ class ViaMigoDataLoader:
         cache_key = f"opentripmap:{city.lower()}:{place_name.lower()}"
 
         try:
-            self.pg_cursor.execute("""
-                INSERT INTO place_cache (cache_key, place_name, city, place_data, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, NOW(), NOW())
-                ON CONFLICT (cache_key) 
-                DO UPDATE SET 
-                    place_data = EXCLUDED.place_data,
-                    updated_at = NOW()
-            """, (cache_key, place_name, city, json.dumps(place_data)))
+            self.place_sink.add((cache_key, place_name, city, place_data))
 
         except Exception as e:
-            print(f"⚠️ Failed to insert {place_name} into place_cache: {e}")
+            print(f"⚠️ Failed to write place_cache batch at {place_name}: {e}")
+            self.pg_conn.rollback()
 
     def add_to_chromadb(self, place_name: str, city: str, place_data: Dict):
         """
@@ -384,8 +385,12 @@ class ViaMigoDataLoader:
                 failed_inserts += 1
                 print(f"❌ Failed to save {place_name}: {e}")
 
-        # Commit all PostgreSQL changes
-        self.pg_conn.commit()
+        # Merge the remaining queued places (one COPY + upsert per batch)
+        try:
+            self.place_sink.flush()
+        except Exception as e:
+            print(f"⚠️ Failed to write place_cache batch: {e}")
+            self.pg_conn.rollback()
 
         # Summary
         print(f"\n{'='*60}")
@@ -394,6 +399,7 @@ class ViaMigoDataLoader:
         print(f"Total POIs processed: {len(pois)}")
         print(f"Successful inserts: {successful_inserts}")
         print(f"Failed inserts: {failed_inserts}")
+        print(f"place_cache (run total): {self.place_sink.summary()}")
         print(f"{'='*60}\n")
 
     def close(self):
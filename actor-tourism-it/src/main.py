@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
-import os, io, re, json, hashlib, asyncio, time
+import os, io, re, json, hashlib, asyncio, time, threading
 from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 import requests
 from bs4 import BeautifulSoup
 from apify import Actor
@@ -16,8 +17,17 @@ OVERPASS_URL="https://overpass-api.de/api/interpreter"
 WIKIDATA_SPARQL="https://query.wikidata.org/sparql"
 COMMONS_API="https://commons.wikimedia.org/w/api.php"
 
+# Elements are enriched on worker threads; every request to a host holds one of its PER_HOST slots
+PER_HOST=4
+HOST_SLOTS={}; HOST_LOCK=threading.Lock()
+def slot(u):
+    h=urlparse(u).netloc
+    with HOST_LOCK: return HOST_SLOTS.setdefault(h, threading.BoundedSemaphore(PER_HOST))
+
 def log(m): Actor.log.info(m)
-def GET(u, **k): k.setdefault("timeout",TIMEOUT); r=S.get(u, **k); r.raise_for_status(); return r
+def GET(u, **k):
+    k.setdefault("timeout",TIMEOUT)
+    with slot(u): r=S.get(u, **k); r.raise_for_status(); return r
 def POST(u, **k): k.setdefault("timeout",TIMEOUT); r=S.post(u, **k); r.raise_for_status(); return r
 
 def overpass_query(city, t=60, lim=500):
@@ -95,15 +105,101 @@ def commons_info(title, width=1280):
     return None
 
 def dl(url):
-    r=GET(url, stream=True); import io
-    b=io.BytesIO()
-    for ch in r.iter_content(65536):
-        if ch: b.write(ch)
-    return b.getvalue(), r.headers.get("Content-Type")
+    with slot(url):  # held until the body is read
+        r=S.get(url, stream=True, timeout=TIMEOUT); r.raise_for_status()
+        b=io.BytesIO()
+        for ch in r.iter_content(65536):
+            if ch: b.write(ch)
+        return b.getvalue(), r.headers.get("Content-Type")
 
 def sha256(b): import hashlib; return hashlib.sha256(b).hexdigest()
 
+def el_key(el): return f"{el.get('type')}/{el.get('id')}"
+
+def resolve(el, city, thumb, do_img):
+    """OSM element -> (dataset item, image bytes, mime); blocking, runs on a worker thread"""
+    tags = el.get("tags",{}) or {}
+    rawname = tags.get("name") or tags.get("name:it") or tags.get("name:en") or ""
+    lat = el.get("lat") or (el.get("center") or {}).get("lat")
+    lon = el.get("lon") or (el.get("center") or {}).get("lon")
+
+    qid = qid_from_tags(tags)
+    label, desc, p18 = rawname, "", None
+    if qid:
+        wd = wd_enrich(qid)
+        label = wd.get("label") or label
+        desc  = wd.get("description") or ""
+        p18   = wd.get("p18")
+
+    meta=None
+    if p18:
+        ft = norm_title(p18)
+        if ft: meta = commons_info(ft, thumb)
+    meta = meta or {}
+    img_url, img_ori = meta.get("thumb_url"), meta.get("original_url")
+
+    b, mime = None, None
+    if do_img:
+        for url in [u for u in (img_url, img_ori) if u]:  # thumb, then original
+            try: b, mime = dl(url); break
+            except Exception as e: log(f"image fail {url}: {e}")
+
+    item = {
+        "city": city,
+        "name": label or rawname,
+        "rawName": rawname,
+        "coords": {"lat": lat, "lon": lon},
+        "tourism": tags.get("tourism"),
+        "osmId": el.get("id"),
+        "osmType": el.get("type"),
+        "wikidata": qid,
+        "wikipedia": tags.get("wikipedia"),
+        "description": desc,
+        "image": {
+            "thumbUrl": img_url,
+            "originalUrl": img_ori,
+            "creator": meta.get("creator"),
+            "license": meta.get("license"),
+            "licenseUrl": meta.get("license_url"),
+            "attribution": meta.get("attribution"),
+            "kvKey": None,
+        },
+        "source": {"osm": True, "wikidata": bool(qid), "commons": bool(meta)}
+    }
+    row = None
+    if qid and b:
+        row = ("wikimedia", p18 if p18 else None, qid, city, label or rawname,
+               meta.get("license"), meta.get("license_url"), meta.get("creator"), meta.get("attribution"),
+               img_ori, img_url, psycopg2.Binary(b) if psycopg2 else None, mime or "application/octet-stream",
+               meta.get("width"), meta.get("height"), sha256(b))
+    return item, b, mime, row
+
+PG_INS = """
+INSERT INTO attraction_images
+(source, source_id, attraction_qid, city, attraction_name, license, license_url, creator,
+ attribution, original_url, thumb_url, img_bytes, mime_type, width, height, sha256)
+VALUES %s
+ON CONFLICT (attraction_qid) DO NOTHING
+"""
+
+def pg_insert(pg, rows):
+    """sha256 of the rows stored; a failing batch is retried row by row so one bad row only loses itself"""
+    try:
+        with pg.cursor() as cur: psycopg2.extras.execute_values(cur, PG_INS, rows)
+        return {row[-1] for row in rows}
+    except Exception as e:
+        log(f"PG batch insert fail ({e}), retrying {len(rows)} rows one by one")
+    stored = set()
+    for row in rows:
+        try:
+            with pg.cursor() as cur: psycopg2.extras.execute_values(cur, PG_INS, [row])
+            stored.add(row[-1])
+        except Exception as e:
+            log(f"PG insert skipped {row[2]}: {e}")
+    return stored
+
 async def run():
+    global PER_HOST
     await Actor.init()
     try:
         inp = await Actor.get_input() or {}
@@ -113,9 +209,15 @@ async def run():
         do_img = bool(inp.get("downloadImages", True))
         thumb = int(inp.get("thumbWidth") or 1280)
         do_pg = bool(inp.get("saveToPostgres", False))
+        conc = int(inp.get("concurrency") or 16)
+        PER_HOST = int(inp.get("perHostConcurrency") or 4)
+        batch = int(inp.get("batchSize") or 50)
 
         ds = await Actor.open_dataset()
         kv = await Actor.open_key_value_store()
+        # Resume after a migration/restart: elements already pushed are skipped
+        state = await kv.get_value("STATE") or {"done": [], "sha": []}
+        done, seen = set(state["done"]), set(state["sha"])
 
         pg = None
         if do_pg and os.getenv("DATABASE_URL") and psycopg2 is not None:
@@ -149,95 +251,51 @@ CREATE UNIQUE INDEX IF NOT EXISTS uq_qid ON attraction_images (attraction_qid);
             except Exception as e:
                 log(f"PG connect fail: {e}"); pg=None
 
-        total=0
+        sem = asyncio.Semaphore(conc)
+        async def one(el, city):
+            async with sem:
+                try: return await asyncio.to_thread(resolve, el, city, thumb, do_img)
+                except Exception as e: log(f"element {el_key(el)} fail: {e}"); return None
+
+        total, images, t0 = 0, 0, time.time()
         for city in cities:
             log(f"Overpass: {city}")
             try:
                 els = run_overpass(city, tmo, limit)
             except Exception as e:
                 log(f"Overpass fail {city}: {e}"); continue
-            log(f"{city}: {len(els)} elements")
-
-            for el in els:
-                tags = el.get("tags",{}) or {}
-                rawname = tags.get("name") or tags.get("name:it") or tags.get("name:en") or ""
-                lat = el.get("lat") or (el.get("center") or {}).get("lat")
-                lon = el.get("lon") or (el.get("center") or {}).get("lon")
-                tour = tags.get("tourism")
-
-                qid = qid_from_tags(tags)
-                label, desc, p18 = rawname, "", None
-                if qid:
-                    wd = wd_enrich(qid)
-                    label = wd.get("label") or label
-                    desc  = wd.get("description") or ""
-                    p18   = wd.get("p18")
-
-                meta=None
-                if p18:
-                    ft = norm_title(p18)
-                    if ft: meta = commons_info(ft, thumb)
-
-                img_url = meta.get("thumb_url") if meta else None
-                img_ori = meta.get("original_url") if meta else None
-
-                kv_key = None
-                if do_img and (img_url or img_ori):
-                    try:
-                        url = img_url or img_ori
-                        b, mime = dl(url)
-                        kv_key = f"img_{sha256(b)[:16]}"
-                        await kv.set_value(kv_key, b, {"contentType": mime or "application/octet-stream"})
-                    except Exception as e:
-                        log(f"KV image fail: {e}")
-
-                item = {
-                    "city": city,
-                    "name": label or rawname,
-                    "rawName": rawname,
-                    "coords": {"lat": lat, "lon": lon},
-                    "tourism": tour,
-                    "osmId": el.get("id"),
-                    "osmType": el.get("type"),
-                    "wikidata": qid,
-                    "wikipedia": tags.get("wikipedia"),
-                    "description": desc,
-                    "image": {
-                        "thumbUrl": img_url,
-                        "originalUrl": img_ori,
-                        "creator": meta.get("creator") if meta else None,
-                        "license": meta.get("license") if meta else None,
-                        "licenseUrl": meta.get("license_url") if meta else None,
-                        "attribution": meta.get("attribution") if meta else None,
-                        "kvKey": kv_key,
-                    },
-                    "source": {"osm": True, "wikidata": bool(qid), "commons": bool(meta)}
-                }
-                await ds.push_data(item)
-
-                if pg and qid and (img_url or img_ori) and kv_key:
-                    try:
-                        val = await kv.get_value(kv_key)
-                        if isinstance(val,(bytes,bytearray)):
-                            b=bytes(val); sh=sha256(b)
-                            with pg.cursor() as cur:
-                                cur.execute("""
-INSERT INTO attraction_images
-(source, source_id, attraction_qid, city, attraction_name, license, license_url, creator,
- attribution, original_url, thumb_url, img_bytes, mime_type, width, height, sha256)
-VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-ON CONFLICT (attraction_qid) DO NOTHING
-""",("wikimedia", p18 if p18 else None, qid, city, label or rawname,
-       meta.get("license") if meta else None, meta.get("license_url") if meta else None,
-       meta.get("creator") if meta else None, meta.get("attribution") if meta else None,
-       img_ori, img_url, psycopg2.Binary(b) if psycopg2 else None, "application/octet-stream",
-       meta.get("width") if meta else None, meta.get("height") if meta else None, sh))
-                    except Exception as e:
-                        log(f"PG insert fail: {e}")
-
-                total+=1
-                if total % 50 == 0: log(f"Processed: {total}")
-        log(f"ALL DONE total={total}")
+            todo = [el for el in els if el_key(el) not in done]
+            log(f"{city}: {len(els)} elements, {len(els)-len(todo)} already done")
+
+            for i in range(0, len(todo), batch):
+                chunk = todo[i:i+batch]
+                results = await asyncio.gather(*(one(el, city) for el in chunk))
+                # Only elements whose image (and row) are stored go to done/seen; the rest are retried on resume
+                items, ok, pending = {}, [], {}  # pending: sha -> (row, keys of the elements sharing it)
+                for el, res in zip(chunk, results):
+                    if res is None: continue
+                    item, b, mime, row = res
+                    key = el_key(el); items[key] = item
+                    if not b: ok.append(key); continue
+                    sh = sha256(b)
+                    item["image"]["kvKey"] = f"img_{sh[:16]}"
+                    if sh in seen: ok.append(key)
+                    elif sh in pending: pending[sh][1].append(key)
+                    else:  # same file for several elements: stored once
+                        images += 1
+                        await kv.set_value(item["image"]["kvKey"], b, {"contentType": mime or "application/octet-stream"})
+                        if pg and row: pending[sh] = (row, [key])
+                        else: seen.add(sh); ok.append(key)
+                if pending:
+                    stored = pg_insert(pg, [row for row, _ in pending.values()])
+                    for sh, (row, keys) in pending.items():
+                        if sh in stored: seen.add(sh); ok.extend(keys)
+                if ok: await ds.push_data([items[k] for k in ok])
+                done.update(ok)
+                await kv.set_value("STATE", {"done": sorted(done), "sha": sorted(seen)})
+                total += len(ok)
+                log(f"Processed: {total} ({images} images, {images / max(time.time()-t0, 1e-6) * 60:.0f} images/min)")
+        log(f"ALL DONE total={total} images={images}")
     finally:
         await Actor.exit()
 
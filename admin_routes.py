@@ -187,99 +187,68 @@ def populate_city():
 @require_admin
 def populate_cities_batch():
     """
-    Populate multiple cities in one request
+    Queue cache population for multiple cities and return immediately
 
     POST /admin/populate-cities-batch
     Headers: X-Admin-Secret: your-secret-key
     Body: {
         "cities": ["Bergamo", "Bologna", "Verona", "Firenze"],
         "categories": ["tourist_attraction", "restaurant"],
-        "delay_seconds": 5
+        "force_refresh": false
     }
 
-    Returns: {
+    Returns (202): {
         "success": true,
+        "job_id": "9f1c...",
         "total_cities": 4,
-        "results": { ... },
-        "total_duration_seconds": 500.2
+        "queued": 8,
+        "progress_url": "/admin/jobs/9f1c..."
     }
+
+    Apify calls run on the durable task queue (task_queue.py) with its rate
+    limits, retries and monthly budget; "delay_seconds" is no longer needed.
     """
     # Import here to avoid circular imports
     from apify_integration import apify_travel
-    from models import db, PlaceCache
+    from task_queue import task_queue
 
     try:
-        import time
-
         data = request.get_json()
         cities = data.get('cities', [])
         categories = data.get(
             'categories', ['tourist_attraction', 'restaurant'])
-        delay_seconds = data.get('delay_seconds', 5)
+        force_refresh = data.get('force_refresh', False)
 
         if not cities:
             return jsonify({'error': 'Cities list is required'}), 400
 
+        invalid_categories = [
+            cat for cat in categories if cat not in SUPPORTED_CATEGORIES]
+        if invalid_categories:
+            return jsonify({
+                'error': 'Invalid categories',
+                'invalid': invalid_categories,
+                'supported': SUPPORTED_CATEGORIES
+            }), 400
+
         if not apify_travel.is_available():
             return jsonify({'error': 'Apify is not configured'}), 503
 
-        start_time = datetime.now()
-        all_results = {}
-
-        print(f"\n{'='*60}")
-        print(f"🔧 ADMIN: Batch populating {len(cities)} cities")
-        print(f"{'='*60}\n")
-
-        for i, city in enumerate(cities, 1):
-            print(f"\n[{i}/{len(cities)}] Processing {city}...")
-
-            city_results = {}
-            for category in categories:
-                cache_key = f"{city.lower()}_{category}"
-                existing = PlaceCache.query.filter_by(
-                    cache_key=cache_key).first()
-
-                if existing:
-                    cached_data = json.loads(existing.place_data)
-                    print(
-                        f"  ✅ {category}: {len(cached_data)} places (cached)")
-                    city_results[category] = {
-                        'count': len(cached_data), 'cached': True}
-                    continue
-
-                print(f"  🚀 {category}: Calling Apify...")
-                places = apify_travel.search_google_maps_places(
-                    city, category, 15)
-
-                if places:
-                    apify_travel.cache_places(city, category, places)
-                    print(f"  ✅ {category}: {len(places)} places cached")
-                    city_results[category] = {
-                        'count': len(places), 'cached': False}
-                else:
-                    print(f"  ⚠️ {category}: No results")
-                    city_results[category] = {'count': 0, 'cached': False}
-
-                # Delay between calls to avoid rate limiting
-                if category != categories[-1] or city != cities[-1]:
-                    print(f"  ⏳ Waiting {delay_seconds}s before next call...")
-                    time.sleep(delay_seconds)
-
-            all_results[city] = city_results
-
-        duration = (datetime.now() - start_time).total_seconds()
+        job = task_queue.enqueue_job('apify_place_category', [
+            {'city': city, 'category': category, 'force_refresh': force_refresh}
+            for city in cities for category in categories
+        ], dedup_fields=('city', 'category'))
 
-        print(f"\n{'='*60}")
-        print(f"✅ ADMIN: Batch completed")
-        print(f"Total duration: {duration:.1f} seconds")
-        print(f"{'='*60}\n")
+        print(f"🔧 ADMIN: Batch of {len(cities)} cities queued as job {job['job_id']}")
 
         return jsonify({
             'success': True,
+            'job_id': job['job_id'],
             'total_cities': len(cities),
-            'results': all_results,
-            'total_duration_seconds': round(duration, 2)
-        })
+            'queued': job['queued'],
+            'already_pending': job['duplicates'],
+            'progress_url': f"/admin/jobs/{job['job_id']}"
+        }), 202
 
     except Exception as e:
         print(f"❌ ADMIN BATCH ERROR: {str(e)}")
@@ -291,6 +260,72 @@ def populate_cities_batch():
         }), 500
 
 
+@admin_bp.route('/jobs/<job_id>', methods=['GET'])
+@require_admin
+def job_progress(job_id):
+    """
+    Progress of a queued batch
+
+    GET /admin/jobs/<job_id>
+    Headers: X-Admin-Secret: your-secret-key
+
+    Returns: {
+        "success": true,
+        "job_id": "9f1c...", "total": 8, "queued": 3, "running": 1,
+        "done": 4, "failed": 0, "cancelled": 0, "percent": 50.0,
+        "finished": false, "cost_usd": 0.06, "tasks": [...]
+    }
+    """
+    from task_queue import task_queue
+
+    progress = task_queue.job_progress(
+        job_id, include_tasks=request.args.get('tasks', 'true') != 'false')
+    if not progress:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, **progress})
+
+
+@admin_bp.route('/jobs/<job_id>', methods=['DELETE'])
+@require_admin
+def cancel_job(job_id):
+    """
+    Cancel the tasks of a batch that have not started yet
+
+    DELETE /admin/jobs/<job_id>
+    Headers: X-Admin-Secret: your-secret-key
+
+    Returns: {"success": true, "cancelled": 5}
+    """
+    from task_queue import task_queue
+
+    return jsonify({'success': True, 'cancelled': task_queue.cancel_job(job_id)})
+
+
+@admin_bp.route('/jobs', methods=['GET'])
+@require_admin
+def task_queue_status():
+    """
+    Task queue totals, spend against the monthly budget and rate limits
+
+    GET /admin/jobs
+    Headers: X-Admin-Secret: your-secret-key
+    """
+    from task_queue import task_queue
+
+    try:
+        return jsonify({
+            'success': True,
+            'stats': task_queue.get_stats(),
+            'budget': task_queue.budget_status()
+        })
+    except Exception as e:
+        print(f"❌ ADMIN ERROR: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @admin_bp.route('/cache-status', methods=['GET'])
 @require_admin
 def cache_status():
@@ -342,6 +377,51 @@ def cache_status():
         }), 500
 
 
+@admin_bp.route('/vector-sync/status', methods=['GET'])
+@require_admin
+def vector_sync_status():
+    """
+    Get incremental ChromaDB sync status
+
+    GET /admin/vector-sync/status
+    Headers: X-Admin-Secret: your-secret-key
+
+    Returns: {
+        "success": true,
+        "status": {"pending_changes": 12, "high_water_mark": 4821, ...}
+    }
+    """
+    from vector_index_sync import vector_index_sync
+
+    return jsonify({
+        'success': True,
+        'status': vector_index_sync.get_status()
+    })
+
+
+@admin_bp.route('/vector-sync/run', methods=['POST'])
+@require_admin
+def vector_sync_run():
+    """
+    Drain pending place changes into ChromaDB now
+
+    POST /admin/vector-sync/run
+    Headers: X-Admin-Secret: your-secret-key
+
+    Returns: {"success": true, "changes": 12, "upserted": 30, "deleted": 2}
+    """
+    from vector_index_sync import vector_index_sync
+
+    try:
+        return jsonify({'success': True, **vector_index_sync.sync_once()})
+    except Exception as e:
+        print(f"❌ ADMIN ERROR: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @admin_bp.route('/clear-cache', methods=['POST'])
 @require_admin
 def clear_cache():
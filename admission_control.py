@@ -0,0 +1,230 @@
+"""
+Admission Control - Per-endpoint concurrency limits and load shedding
+Expensive Apify/LLM-backed routes get a bounded number of slots and a short
+wait queue; beyond that requests are shed to a cached copy of a recent
+answer or a template response, with a Retry-After header, so spikes cannot
+starve cheap endpoints (autocomplete, image serving) of workers
+"""
+
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+import functools
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from request_deadline import current_deadline
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# endpoint=concurrency/queue length
+DEFAULT_LIMITS = 'get_details_apify=2/4,plan_ai_powered=4/8,museum_ask=4/8,translate=4/8'
+QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '2'))
+RESPONSE_CACHE_SIZE = int(os.getenv('ADMISSION_RESPONSE_CACHE', '256'))
+
+
+class AdmissionRejected(Exception):
+    """Request shed: no slot and the queue is full, or the queue wait expired"""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: int):
+        super().__init__(f"{endpoint} shed ({reason}), retry after {retry_after}s")
+        self.endpoint = endpoint
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_limits(spec: str) -> Dict[str, tuple]:
+    """'translate=4/8,...' -> {'translate': (4, 8)}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, value = item.partition('=')
+        concurrency, _, queue = value.partition('/')
+        limits[name.strip()] = (int(concurrency), int(queue or concurrency))
+    return limits
+
+
+class AdmissionController:
+    """Slots and bounded wait queues per endpoint, with shed/degrade counters"""
+
+    def __init__(self, limits: Optional[str] = None, queue_timeout: Optional[float] = None):
+        spec = os.getenv('ADMISSION_LIMITS', DEFAULT_LIMITS) if limits is None else limits
+        self.limits = parse_limits(spec)
+        self.queue_timeout = QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self._cond = threading.Condition()
+        self._in_flight = defaultdict(int)
+        self._waiting = defaultdict(int)
+        self._service_times = defaultdict(lambda: deque(maxlen=100))
+        self.stats = defaultdict(lambda: {'admitted': 0, 'queued': 0, 'rejected': 0,
+                                          'queue_timeouts': 0, 'degraded': 0, 'served_cached': 0})
+        self._responses = OrderedDict()  # (endpoint, key) -> (body, mimetype)
+        self._responses_lock = threading.Lock()
+
+    def configure(self, endpoint: str, concurrency: int, queue: int):
+        with self._cond:
+            self.limits[endpoint] = (concurrency, queue)
+            self._cond.notify_all()
+
+    def retry_after(self, endpoint: str) -> int:
+        """Seconds until a slot is likely free: queued work divided over the slots"""
+        concurrency = self.limits.get(endpoint, (1, 0))[0]
+        times = self._service_times[endpoint]
+        avg_service = sum(times) / len(times) if times else 1.0
+        return max(1, min(60, math.ceil(avg_service * (self._waiting[endpoint] + 1) / concurrency)))
+
+    def _reject(self, endpoint: str, reason: str) -> AdmissionRejected:
+        counter = 'rejected' if reason == 'queue_full' else 'queue_timeouts'
+        self.stats[endpoint][counter] += 1
+        error = AdmissionRejected(endpoint, reason, self.retry_after(endpoint))
+        logger.warning(f"🚦 {error}")
+        return error
+
+    def acquire(self, endpoint: str) -> float:
+        """Take a slot, waiting in the bounded queue if needed; returns the start time for release()"""
+        if endpoint not in self.limits:
+            return time.time()
+        concurrency, max_queue = self.limits[endpoint]
+        with self._cond:
+            if self._in_flight[endpoint] >= concurrency or self._waiting[endpoint]:
+                if self._waiting[endpoint] >= max_queue:
+                    raise self._reject(endpoint, 'queue_full')
+
+                # Never queue past the request deadline
+                wait = self.queue_timeout
+                deadline = current_deadline()
+                if deadline is not None:
+                    wait = min(wait, deadline.remaining())
+                expires = time.time() + wait
+
+                self.stats[endpoint]['queued'] += 1
+                self._waiting[endpoint] += 1
+                try:
+                    while self._in_flight[endpoint] >= self.limits[endpoint][0]:
+                        remaining = expires - time.time()
+                        if remaining <= 0:
+                            raise self._reject(endpoint, 'queue_timeout')
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting[endpoint] -= 1
+
+            self._in_flight[endpoint] += 1
+            self.stats[endpoint]['admitted'] += 1
+            return time.time()
+
+    def release(self, endpoint: str, started: float):
+        if endpoint not in self.limits:
+            return
+        with self._cond:
+            self._in_flight[endpoint] -= 1
+            self._service_times[endpoint].append(time.time() - started)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, endpoint: str):
+        """Hold a slot for the enclosed work; raises AdmissionRejected when shed"""
+        started = self.acquire(endpoint)
+        try:
+            yield
+        finally:
+            self.release(endpoint, started)
+
+    def record_degraded(self, endpoint: str, cached: bool = False):
+        with self._cond:
+            self.stats[endpoint]['served_cached' if cached else 'degraded'] += 1
+
+    # ---------------------------------------------------------------- last good responses
+
+    def remember_response(self, endpoint: str, key: str, body: bytes, mimetype: str):
+        with self._responses_lock:
+            self._responses[(endpoint, key)] = (body, mimetype)
+            self._responses.move_to_end((endpoint, key))
+            while len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+
+    def cached_response(self, endpoint: str, key: str):
+        with self._responses_lock:
+            return self._responses.get((endpoint, key))
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            endpoints = {}
+            for endpoint, (concurrency, max_queue) in self.limits.items():
+                times = [t * 1000 for t in self._service_times[endpoint]]
+                endpoints[endpoint] = {
+                    **self.stats[endpoint],
+                    'concurrency_limit': concurrency,
+                    'queue_limit': max_queue,
+                    'in_flight': self._in_flight[endpoint],
+                    'waiting': self._waiting[endpoint],
+                    'service_ms_avg': round(sum(times) / len(times), 1) if times else 0.0,
+                }
+        return {'queue_timeout_s': self.queue_timeout, 'endpoints': endpoints}
+
+
+admission = AdmissionController()
+
+
+def request_cache_key(*parts) -> str:
+    """Stable key from the JSON body (plus any view arguments) for the last-good-response cache"""
+    from flask import request
+    body = request.get_data(cache=True) or b''
+    return hashlib.sha256(repr(parts).encode('utf-8') + body).hexdigest()
+
+
+def admission_controlled(endpoint: str, degrade: Optional[Callable] = None, cache_key: Optional[Callable] = None):
+    """
+    Flask view decorator: run the view in one of the endpoint's slots
+
+    When shed, serve the last good response for the same cache_key(*args,
+    **kwargs) if there is one, else degrade(*args, **kwargs) (a template
+    answer), else a 503; all with Retry-After. A streamed response keeps
+    its slot until it has been sent.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import jsonify, make_response
+
+            key = cache_key(*args, **kwargs) if cache_key else None
+            try:
+                started = admission.acquire(endpoint)
+            except AdmissionRejected as shed:
+                cached = admission.cached_response(endpoint, key) if key else None
+                if cached:
+                    admission.record_degraded(endpoint, cached=True)
+                    response = make_response(cached[0])
+                    response.mimetype = cached[1]
+                    response.headers['X-Admission'] = 'shed-cached'
+                elif degrade:
+                    admission.record_degraded(endpoint)
+                    response = make_response(degrade(*args, **kwargs))
+                    response.headers['X-Admission'] = 'shed-degraded'
+                else:
+                    response = make_response(jsonify({
+                        'error': 'Servizio momentaneamente sovraccarico, riprova tra poco',
+                        'retry_after': shed.retry_after
+                    }), 503)
+                response.headers['Retry-After'] = str(shed.retry_after)
+                return response
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                admission.release(endpoint, started)
+                raise
+            if response.is_streamed:
+                # The work runs while the body is sent: hold the slot until the response is closed
+                response.call_on_close(lambda: admission.release(endpoint, started))
+                return response
+            admission.release(endpoint, started)
+            if key and response.status_code == 200:
+                admission.remember_response(endpoint, key, response.get_data(), response.mimetype)
+            return response
+        return wrapper
+    return decorator
@@ -1,9 +1,8 @@
 from simple_rag_helper import rag_helper
-from openai import OpenAI
+from llm_gateway import get_llm_client
 from flask import Blueprint, request, jsonify, send_from_directory
 import json
 import time
-import os
 import dotenv
 dotenv.load_dotenv()
 
@@ -151,8 +150,8 @@ def get_fallback_attractions(city: str) -> list:
     ])
 
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Shared OpenAI client, governed by the LLM gateway
+openai_client = get_llm_client()
 
 # RAG integration for dynamic attractions
 
@@ -10,10 +10,11 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 import time
 import json
-from openai import OpenAI
 import os
 from typing import Dict, List
 from api_error_handler import resilient_api_call, with_cache, cache_openai, cache_scrapingdog
+from llm_response_cache import llm_cache
+from llm_gateway import get_llm_client
 from weather_intelligence import weather_intelligence
 from crowd_prediction import crowd_predictor
 from multi_language_support import multi_language
@@ -22,11 +23,13 @@ from simple_rag_helper import get_city_context_prompt, get_hotel_context_prompt,
 import requests  # Import requests for making HTTP calls
 # 🇮🇹 UNIVERSAL ITALIAN ROUTER!
 from intelligent_italian_routing import italian_router
+from itinerary_stream import stream_itinerary, stream_response, skeleton_from_response, wants_sse
+from admission_control import admission_controlled, request_cache_key
 
 ai_companion_bp = Blueprint('ai_companion', __name__)
 
-# Initialize OpenAI with fast timeout
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Shared OpenAI client, governed by the LLM gateway (concurrency, lanes, token budget)
+openai_client = get_llm_client()
 openai_api_key = os.environ.get("OPENAI_API_KEY")  # Ensure this is available
 
 
@@ -39,30 +42,59 @@ class AICompanionEngine:
         """
         🚀 DYNAMIC DATABASE QUERY - Query PostgreSQL for REAL attractions
         Queries both comprehensive_attractions and place_cache tables
+        Both join through place_entities, so a monument stored by several
+        importers is returned once (unresolved rows are deduplicated by name)
         """
         import psycopg2
         import json as json_module
+        from entity_resolution import entities_ready, normalize_name
 
         attractions = []
+        seen_places, seen_names = [], {}  # normalized name -> place_id (None when unresolved)
+
+        def duplicate(name, place_id):
+            # Same name counts as the same place unless both rows were resolved
+            key = normalize_name(name)
+            if key in seen_names and (place_id is None or seen_names[key] is None):
+                return True
+            seen_names.setdefault(key, place_id)
+            return False
 
         try:
             conn = psycopg2.connect(self.db_url)
             cursor = conn.cursor()
+            resolved = entities_ready(cursor)
 
-            # Priority 1: Query place_cache (best curated data)
+            # Priority 1: Query place_cache (best curated data), one row per place_id
             print(f"📊 Querying place_cache for {city_name}...")
-            cursor.execute("""
-                SELECT place_name, city, place_data, cache_key
-                FROM place_cache
-                WHERE LOWER(city) = LOWER(%s)
-                ORDER BY priority_level DESC, access_count DESC
-                LIMIT %s
-            """, (city_name, limit))
+            if resolved:
+                cursor.execute("""
+                    SELECT place_name, city, place_data, cache_key, place_id FROM (
+                        SELECT DISTINCT ON (COALESCE(pe.place_id, pc.cache_key))
+                               pc.place_name, pc.city, pc.place_data, pc.cache_key, pe.place_id,
+                               pc.priority_level, pc.access_count
+                        FROM place_cache pc
+                        LEFT JOIN place_entities pe
+                               ON pe.source = 'place_cache' AND pe.source_key = pc.cache_key
+                        WHERE LOWER(pc.city) = LOWER(%s)
+                        ORDER BY COALESCE(pe.place_id, pc.cache_key), pc.priority_level DESC, pc.access_count DESC
+                    ) best
+                    ORDER BY priority_level DESC, access_count DESC
+                    LIMIT %s
+                """, (city_name, limit))
+            else:
+                cursor.execute("""
+                    SELECT place_name, city, place_data, cache_key, NULL
+                    FROM place_cache
+                    WHERE LOWER(city) = LOWER(%s)
+                    ORDER BY priority_level DESC, access_count DESC
+                    LIMIT %s
+                """, (city_name, limit))
 
             place_cache_results = cursor.fetchall()
 
             for row in place_cache_results:
-                place_name, city, place_data_json, cache_key = row
+                place_name, city, place_data_json, cache_key, place_id = row
                 place_data = json_module.loads(
                     place_data_json) if place_data_json else {}
 
@@ -73,43 +105,77 @@ class AICompanionEngine:
                 print(
                     f"🔍 DEBUG place_cache: {place_name} - lat:{lat}, lng:{lng}, keys:{list(place_data.keys())[:5]}")
 
+                name = place_data.get('name', place_name)
+                if duplicate(name, place_id):
+                    continue
+                if place_id:
+                    seen_places.append(place_id)
+
                 attractions.append({
-                    'name': place_data.get('name', place_name),
+                    'name': name,
                     'latitude': lat,
                     'longitude': lng,
                     'description': place_data.get('description', f'{place_name} a {city_name}'),
                     'image_url': place_data.get('image_url'),
+                    'place_id': place_id,
                     'source': 'PostgreSQL place_cache'
                 })
 
             # Priority 2: If insufficient data, query comprehensive_attractions
+            # (skipping the places already returned from place_cache)
             if len(attractions) < limit:
                 print(
                     f"📊 Querying comprehensive_attractions for {city_name}...")
-                cursor.execute("""
-                    SELECT name, city, category, description, latitude, longitude, image_url
-                    FROM comprehensive_attractions
-                    WHERE LOWER(city) = LOWER(%s)
-                      AND latitude IS NOT NULL
-                      AND longitude IS NOT NULL
-                    ORDER BY CASE 
-                        WHEN image_url IS NOT NULL THEN 1 
-                        ELSE 2 
-                    END,
-                    RANDOM()
-                    LIMIT %s
-                """, (city_name, limit - len(attractions)))
+                if resolved:
+                    cursor.execute("""
+                        SELECT name, city, category, description, latitude, longitude, image_url, place_id FROM (
+                            SELECT DISTINCT ON (COALESCE(pe.place_id, ca.id::text))
+                                   ca.name, ca.city, ca.category, ca.description, ca.latitude, ca.longitude,
+                                   ca.image_url, pe.place_id
+                            FROM comprehensive_attractions ca
+                            LEFT JOIN place_entities pe
+                                   ON pe.source = 'comprehensive_attractions' AND pe.source_key = ca.id::text
+                            WHERE LOWER(ca.city) = LOWER(%s)
+                              AND ca.latitude IS NOT NULL
+                              AND ca.longitude IS NOT NULL
+                              AND (pe.place_id IS NULL OR pe.place_id <> ALL(%s::text[]))
+                            ORDER BY COALESCE(pe.place_id, ca.id::text), ca.image_url IS NULL
+                        ) best
+                        ORDER BY CASE 
+                            WHEN image_url IS NOT NULL THEN 1 
+                            ELSE 2 
+                        END,
+                        RANDOM()
+                        LIMIT %s
+                    """, (city_name, seen_places, limit - len(attractions) + len(seen_names)))
+                else:
+                    cursor.execute("""
+                        SELECT name, city, category, description, latitude, longitude, image_url, NULL
+                        FROM comprehensive_attractions
+                        WHERE LOWER(city) = LOWER(%s)
+                          AND latitude IS NOT NULL
+                          AND longitude IS NOT NULL
+                        ORDER BY CASE 
+                            WHEN image_url IS NOT NULL THEN 1 
+                            ELSE 2 
+                        END,
+                        RANDOM()
+                        LIMIT %s
+                    """, (city_name, limit - len(attractions) + len(seen_names)))
 
                 db_results = cursor.fetchall()
 
                 for row in db_results:
-                    name, city, category, description, lat, lng, image_url = row
+                    name, city, category, description, lat, lng, image_url, place_id = row
+                    if len(attractions) >= limit or duplicate(name, place_id):
+                        continue
                     attractions.append({
                         'name': name,
                         'latitude': lat,
                         'longitude': lng,
                         'description': description or f'{name} a {city_name}',
                         'image_url': image_url,
+                        'place_id': place_id,
                         'source': 'PostgreSQL comprehensive_attractions'
                     })
 
@@ -343,7 +409,8 @@ Crea un JSON con alternative realistiche e intelligenti SOLO per {city_name}:
 Rispondi SOLO con JSON valido. Sii specifico per {city_name} e EVITA {stops_to_exclude}.
 """
 
-            response = openai_client.chat.completions.create(
+            content = llm_cache.chat_completion(
+                openai_client, 'piano_b',
                 model="gpt-4-turbo",
                 messages=[
                     {"role": "system", "content": "Sei un AI travel companion esperto che genera Piani B intelligenti e dinamici."},
@@ -353,7 +420,7 @@ Rispondi SOLO con JSON valido. Sii specifico per {city_name} e EVITA {stops_to_e
                 timeout=30
             )
 
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(content)
             print(
                 f"✅ AI Piano B generato: {result.get('ai_confidence', 'unknown')} confidence")
             return result
@@ -489,7 +556,8 @@ REGOLE CRITICHE per adaptive_suggestions e contextual_discoveries:
 Sii specifico per {city_name}, intelligente e contextualmente rilevante. NO CROSS-CITY HALLUCINATIONS.
 """
 
-            response = openai_client.chat.completions.create(
+            content = llm_cache.chat_completion(
+                openai_client, 'scoperte',
                 model="gpt-4-turbo",
                 messages=[
                     {"role": "system", "content": "Sei un AI travel companion che scopre gemme nascoste con intelligenza contestuale."},
@@ -499,7 +567,7 @@ Sii specifico per {city_name}, intelligente e contextualmente rilevante. NO CROS
                 timeout=30
             )
 
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(content)
             print(
                 f"✅ AI Scoperte generate: {len(result.get('contextual_discoveries', []))} scoperte")
             return result
@@ -555,7 +623,8 @@ Genera insights intelligenti del diario di viaggio in JSON:
 Sii perspicace e intelligente nell'analisi comportamentale.
 """
 
-            response = openai_client.chat.completions.create(
+            content = llm_cache.chat_completion(
+                openai_client, 'diario',
                 model="gpt-4-turbo",
                 messages=[
                     {"role": "system", "content": "Sei un AI travel companion che analizza comportamenti e genera insights personalizzati."},
@@ -565,7 +634,7 @@ Sii perspicace e intelligente nell'analisi comportamentale.
                 timeout=30
             )
 
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(content)
             print(
                 f"✅ AI Diario generato: {result.get('personalization_level', 'unknown')} personalizzazione")
             return result
@@ -694,7 +763,7 @@ def ai_scoperte():
         # 🎯 GET REAL CONTEXT FROM CHROMADB
         real_context = ""
         try:
-            city_context = get_city_context_prompt(city, limit=5)
+            city_context = get_city_context_prompt(city)
             if city_context:
                 real_context = f"\n\n🗺️ CONTESTO REALE {city.upper()} (da ChromaDB):\n{city_context}\n"
                 print(f"✅ ChromaDB context loaded for {city}")
@@ -926,11 +995,9 @@ def get_dynamic_city_coordinates(city_name: str):
 
     # Last resort - use AI to get approximate coordinates
     try:
-        from openai import OpenAI
         import json
-        import os
 
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        client = get_llm_client()
         response = client.chat.completions.create(
             model="gpt-4-turbo",
             messages=[
@@ -966,11 +1033,9 @@ def generate_dynamic_attraction_details(attraction, city_name: str):
 def generate_ai_attractions_for_city(city_name: str, city_key: str):
     """Use AI to generate authentic attractions for any city"""
     try:
-        import os
-        from openai import OpenAI
         import json
 
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        client = get_llm_client()
 
         # Get coordinates first
         coords = get_dynamic_city_coordinates(city_name)
@@ -1103,7 +1168,38 @@ def cache_attractions_to_db(city_name: str, attractions):
         print(f"⚠️ Failed to cache attractions: {e}")
 
 
+def _plan_ai_powered_shed():
+    """Template itinerary from the pre-computed Piano B when /plan_ai_powered is shed"""
+    from smart_ai_cache import get_cached_plan_b
+
+    data = request.get_json(silent=True) or {}
+    start = data.get('start', 'Piazza Duomo, Milano')
+    end = data.get('end', 'Corso Buenos Aires, Milano')
+    city = italian_router.detect_city(start + ' ' + end) or start.split(',')[-1].strip() or 'Milano'
+    plan_b = get_cached_plan_b(city)
+
+    itinerary = [{
+        "time": stop['time'],
+        "title": stop['title'],
+        "description": stop['description'],
+        "type": "activity",
+        "context": f"{stop['title'].lower().replace(' ', '_')}_{city.lower().replace(' ', '_')}",
+        "transport": "visit",
+    } for stop in plan_b['alternative_plan']]
+    itinerary.extend({"type": "tip", "title": "💡 Consiglio", "description": tip}
+                     for tip in plan_b['smart_tips'])
+
+    return jsonify({
+        "itinerary": itinerary,
+        "city": city.title(),
+        "total_duration": f"{len(plan_b['alternative_plan']) * 1.5:.1f} hours",
+        "status": "degraded",
+        "router": "smart_ai_cache"
+    })
+
+
 @ai_companion_bp.route('/plan_ai_powered', methods=['POST'])
+@admission_controlled('plan_ai_powered', degrade=_plan_ai_powered_shed, cache_key=request_cache_key)
 def plan_ai_powered():
     """Complete AI-powered planning with all companion features"""
     try:
@@ -1117,30 +1213,7 @@ def plan_ai_powered():
         print(f"🧠 AI-powered planning: {start} → {end}")
 
         # 🇮🇹 ITALIAN CITIES: Use intelligent database-driven router for ALL Italian cities
-        italian_cities = {
-            'milano': 'Milano', 'milan': 'Milano',
-            'roma': 'Roma', 'rome': 'Roma',
-            'torino': 'Torino', 'turin': 'Torino',
-            'venezia': 'Venezia', 'venice': 'Venezia',
-            'firenze': 'Firenze', 'florence': 'Firenze',
-            'napoli': 'Napoli', 'naples': 'Napoli',
-            'bologna': 'Bologna',
-            'genova': 'Genova', 'genoa': 'Genova',
-            'palermo': 'Palermo',
-            'catania': 'Catania',
-            'bari': 'Bari',
-            'verona': 'Verona',
-            'padova': 'Padova', 'padua': 'Padova',
-            'trieste': 'Trieste',
-        }
-
-        # Detect Italian city
-        combined_text = (start + ' ' + end).lower()
-        detected_city = None
-        for key, city_name in italian_cities.items():
-            if key in combined_text:
-                detected_city = city_name
-                break
+        detected_city = italian_router.detect_city(start + ' ' + end)
 
         if detected_city:
             print(
@@ -1658,6 +1731,52 @@ def plan_ai_powered():
         }), 500
 
 
+def _plan_ai_powered_stream_shed():
+    """The shed Piano B template as a skeleton-only stream, so the client's reader still works"""
+    skeleton = skeleton_from_response(_plan_ai_powered_shed())
+    sse = wants_sse(request)
+    return stream_response(stream_itinerary('plan_ai_powered_shed', lambda: skeleton, enrichers=[], sse=sse), sse)
+
+
+# Shares /plan_ai_powered's slots; no last-good-response cache, streamed bodies are not kept
+@ai_companion_bp.route('/plan_ai_powered/stream', methods=['POST'])
+@admission_controlled('plan_ai_powered', degrade=_plan_ai_powered_stream_shed)
+def plan_ai_powered_stream():
+    """
+    Streaming variant of /plan_ai_powered (NDJSON, or SSE with Accept: text/event-stream)
+    Italian cities get the router skeleton immediately; details, images and
+    AI tips follow per stop as they complete
+    """
+    data = request.get_json() or {}
+    start = data.get('start', 'Piazza Duomo, Milano')
+    end = data.get('end', 'Corso Buenos Aires, Milano')
+    pace = data.get('pace', 'Moderato')
+    detected_city = italian_router.detect_city(start + ' ' + end)
+
+    def build_skeleton():
+        if detected_city:
+            itinerary = italian_router.generate_intelligent_itinerary(
+                start=start,
+                end=end,
+                city_name=detected_city,
+                interests=data.get('interests', []),
+                duration="full_day" if pace == "Lento" else "half_day"
+            )
+            return {
+                "itinerary": itinerary,
+                "city": detected_city,
+                "total_duration": f"{len(itinerary) * 1.5:.1f} hours",
+                "status": "success",
+                "router": "intelligent_italian"
+            }
+        # Other destinations: the full planner result becomes the skeleton
+        # (undecorated: this stream already holds a plan_ai_powered slot)
+        return skeleton_from_response(plan_ai_powered.__wrapped__())
+
+    sse = wants_sse(request)
+    return stream_response(stream_itinerary('plan_ai_powered', build_skeleton, sse=sse), sse)
+
+
 # ============= NEW INTELLIGENT FEATURES =============
 
 @ai_companion_bp.route('/weather_intelligence', methods=['POST'])
@@ -1793,55 +1912,71 @@ def predict_crowds():
         return jsonify({'error': str(e)}), 500
 
 
+def _translate_shed():
+    """Translation memory only (no LLM call) when /translate is shed"""
+    try:
+        return jsonify({**_translate_payload(request.get_json(), cached_only=True), 'degraded': True})
+    except Exception as e:
+        print(f"❌ Translation error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @ai_companion_bp.route('/translate', methods=['POST'])
+@admission_controlled('translate', degrade=_translate_shed, cache_key=request_cache_key)
 def translate_content():
     """Translate content to user's preferred language"""
     try:
-        data = request.get_json()
-        content = data.get('content', '')
-        target_language = data.get('target_language', 'en')
-        source_language = data.get('source_language', None)
-        content_type = data.get('content_type', 'text')  # text, itinerary, ui
-
-        # Auto-detect source language if not provided
-        if not source_language:
-            source_language = multi_language.detect_language(content)
-
-        result = {}
-
-        if content_type == 'text':
-            # Simple text translation
-            result['translated'] = multi_language.translate(
-                content,
-                target_language,
-                source_language
-            )
+        return jsonify(_translate_payload(request.get_json()))
 
-        elif content_type == 'itinerary':
-            # Translate full itinerary
-            result['translated'] = multi_language.translate_itinerary(
-                content,  # Should be a list of itinerary items
-                target_language
-            )
+    except Exception as e:
+        print(f"❌ Translation error: {e}")
+        return jsonify({'error': str(e)}), 500
 
-        elif content_type == 'ui':
-            # Get UI strings in target language
-            result['ui_strings'] = multi_language.localize_ui(target_language)
-            result['tips'] = multi_language.get_language_specific_tips(
-                data.get('city', 'general'),
-                target_language
-            )
 
-        result['source_language'] = source_language
-        result['target_language'] = target_language
-        result['language_info'] = multi_language.supported_languages.get(
-            target_language)
+def _translate_payload(data: Dict, cached_only: bool = False) -> Dict:
+    """Body of /translate; cached_only answers from common phrases, translation memory and local heuristics"""
+    content = data.get('content', '')
+    target_language = data.get('target_language', 'en')
+    source_language = data.get('source_language', None)
+    content_type = data.get('content_type', 'text')  # text, itinerary, ui
 
-        return jsonify(result)
+    # Auto-detect source language if not provided (no LLM detection when shed)
+    if not source_language:
+        source_language = multi_language.detect_language(content, use_llm=not cached_only)
 
-    except Exception as e:
-        print(f"❌ Translation error: {e}")
-        return jsonify({'error': str(e)}), 500
+    result = {}
+
+    if content_type == 'text':
+        # Simple text translation
+        result['translated'] = multi_language.translate(
+            content,
+            target_language,
+            source_language,
+            cached_only=cached_only
+        )
+
+    elif content_type == 'itinerary':
+        # Translate full itinerary
+        result['translated'] = multi_language.translate_itinerary(
+            content,  # Should be a list of itinerary items
+            target_language,
+            cached_only=cached_only
+        )
+
+    elif content_type == 'ui':
+        # Get UI strings in target language
+        result['ui_strings'] = multi_language.localize_ui(target_language, cached_only=cached_only)
+        result['tips'] = multi_language.get_language_specific_tips(
+            data.get('city', 'general'),
+            target_language
+        )
+
+    result['source_language'] = source_language
+    result['target_language'] = target_language
+    result['language_info'] = multi_language.supported_languages.get(
+        target_language)
+
+    return result
 
 
 @ai_companion_bp.route('/intelligent_planning', methods=['POST'])
@@ -4,8 +4,10 @@ Enhanced Error Handling and Circuit Breaker for External APIs
 Provides resilient API calling with automatic fallbacks
 """
 
+import os
 import time
 import functools
+import threading
 import logging
 from typing import Any, Callable, Optional, Dict, List
 from collections import deque
@@ -16,6 +18,19 @@ from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
+# Outbound pool workers one upstream may hold at once, counting calls that
+# already timed out for their caller but are still running on the pool
+OUTBOUND_MAX_IN_FLIGHT = int(os.getenv('OUTBOUND_MAX_IN_FLIGHT', '4'))
+
+
+class CallStillRunning(TimeoutError):
+    """A call timed out for its caller but still holds its pool worker (job)"""
+
+    def __init__(self, message: str, job):
+        super().__init__(message)
+        self.job = job
+
+
 class CircuitBreaker:
     """Circuit breaker pattern implementation for API calls"""
     
@@ -95,6 +110,9 @@ class APIErrorHandler:
             'apify': 45,
             'default': 10
         }
+        self.max_in_flight = OUTBOUND_MAX_IN_FLIGHT
+        self._in_flight = {}  # service -> pool workers held
+        self._in_flight_lock = threading.Lock()
         
     def get_circuit_breaker(self, service_name: str) -> CircuitBreaker:
         """Get or create circuit breaker for a service"""
@@ -121,13 +139,23 @@ class APIErrorHandler:
         Returns:
             Function result or fallback data
         """
+        from request_deadline import stage_timeout, DeadlineExceeded
+        from job_runner import DONE
+        
         circuit_breaker = self.get_circuit_breaker(service_name)
-        timeout = custom_timeout or self.timeout_config.get(service_name, self.timeout_config['default'])
+        default_timeout = custom_timeout or self.timeout_config.get(service_name, self.timeout_config['default'])
         
         last_exception = None
+        pending = None  # timed-out attempt still running on the pool
         delay = self.retry_config['initial_delay']
         
         for attempt in range(self.retry_config['max_retries']):
+            # Size each attempt from the request deadline; too little left -> fallback tier
+            timeout = stage_timeout(service_name, default_timeout)
+            if timeout is None:
+                last_exception = DeadlineExceeded(f"{service_name}: request deadline too close")
+                break
+            
             try:
                 # Execute with timeout and circuit breaker
                 start_time = time.time()
@@ -135,7 +163,7 @@ class APIErrorHandler:
                 def timeout_wrapper():
                     return circuit_breaker.call(func)
                 
-                result = self._execute_with_timeout(timeout_wrapper, timeout)
+                result = self._execute_with_timeout(timeout_wrapper, timeout, service_name)
                 
                 execution_time = time.time() - start_time
                 
@@ -149,6 +177,7 @@ class APIErrorHandler:
                 
             except TimeoutError as e:
                 last_exception = e
+                pending = getattr(e, 'job', None)
                 logger.warning(f"{service_name}: Timeout after {timeout}s on attempt {attempt + 1}")
                 
             except Exception as e:
@@ -163,47 +192,83 @@ class APIErrorHandler:
             # Wait before retry (exponential backoff)
             if attempt < self.retry_config['max_retries'] - 1:
                 sleep_time = min(delay, self.retry_config['max_delay'])
+                if stage_timeout(service_name, default_timeout, minimum=sleep_time) is None:
+                    last_exception = DeadlineExceeded(f"{service_name}: no budget left to retry")
+                    break
                 logger.debug(f"{service_name}: Waiting {sleep_time}s before retry")
-                time.sleep(sleep_time)
+                if pending is None:
+                    time.sleep(sleep_time)
+                else:
+                    # Never resubmit next to an attempt that still holds a slot: wait it out instead
+                    waited = time.time()
+                    if not pending.wait(sleep_time):
+                        logger.warning(f"{service_name}: Attempt {attempt + 1} still running, not resubmitting")
+                        break
+                    if pending.status == DONE:
+                        return pending.result
+                    pending = None
+                    time.sleep(max(0.0, sleep_time - (time.time() - waited)))
                 delay *= self.retry_config['backoff_factor']
         
         # All retries failed, use fallback
         logger.error(f"{service_name}: All retries failed. Last error: {last_exception}")
         return self._get_intelligent_fallback(service_name, fallback_data, last_exception)
     
-    def _execute_with_timeout(self, func: Callable, timeout: int):
-        """Execute function with timeout using threading instead of signal"""
-        import threading
-        import queue
-        
-        result_queue = queue.Queue()
-        exception_queue = queue.Queue()
+    def _acquire_slot(self, service_name: str) -> bool:
+        with self._in_flight_lock:
+            if self._in_flight.get(service_name, 0) >= self.max_in_flight:
+                return False
+            self._in_flight[service_name] = self._in_flight.get(service_name, 0) + 1
+            return True
+
+    def _release_slot(self, service_name: str):
+        with self._in_flight_lock:
+            self._in_flight[service_name] -= 1
+
+    def _execute_with_timeout(self, func: Callable, timeout: float, service_name: str = 'default'):
+        """
+        Execute function with timeout on the shared bounded outbound pool (no thread per call)
+
+        At most max_in_flight calls per upstream hold pool workers; a slot is
+        released when the call actually finishes, not when its caller gives up.
+        The call runs inside a deadline of `timeout` seconds, so the HTTP
+        client and LLM gateway cap their own timeouts and the worker stops too.
+        """
+        from job_runner import outbound_calls, JobQueueFull, FAILED
+        from request_deadline import adopt_deadline, current_deadline, deadline_scope
         
-        def worker():
-            try:
-                result = func()
-                result_queue.put(result)
-            except Exception as e:
-                exception_queue.put(e)
+        # Nested resilient call from a pool worker: the outer call's timeout already applies
+        if outbound_calls.in_worker():
+            return func()
         
-        thread = threading.Thread(target=worker)
-        thread.daemon = True
-        thread.start()
-        thread.join(timeout)
+        if not self._acquire_slot(service_name):
+            raise TimeoutError(f"{service_name}: {self.max_in_flight} calls already in flight")
         
-        if thread.is_alive():
-            # Thread is still running, timeout occurred
-            raise TimeoutError(f"Function execution timed out after {timeout} seconds")
+        # Only the request deadline follows the call onto the pool: never the caller's
+        # Flask app/request context or its scoped DB session
+        request_deadline = current_deadline()
         
-        # Check for exceptions
-        if not exception_queue.empty():
-            raise exception_queue.get()
+        def bounded():
+            with adopt_deadline(request_deadline), deadline_scope(timeout, service_name):
+                return func()
         
-        # Get result
-        if not result_queue.empty():
-            return result_queue.get()
-        else:
-            raise RuntimeError("Function completed but no result returned")
+        try:
+            job = outbound_calls.submit(bounded, timeout=timeout, track=False)
+        except JobQueueFull as e:
+            self._release_slot(service_name)
+            raise TimeoutError(f"Outbound call pool saturated: {e}")
+        job.add_done_callback(lambda _: self._release_slot(service_name))
+        
+        if not job.wait(timeout):
+            # Skipped if still queued; a running call keeps its slot until its own timeout stops it
+            job.cancel()
+            raise CallStillRunning(f"Function execution timed out after {timeout} seconds", job)
+        
+        if job.status == FAILED:
+            raise job.exception
+        if job.status != 'done':
+            raise TimeoutError(f"Function execution {job.status}: {job.error}")
+        return job.result
     
     def _get_intelligent_fallback(self, service_name: str, fallback_data: Optional[Any], 
                                 error: Exception) -> Dict:
@@ -285,6 +350,7 @@ class APIErrorHandler:
         for service_name, circuit_breaker in self.circuit_breakers.items():
             service_health = circuit_breaker.get_health_status()
             service_health['timeout_config'] = self.timeout_config.get(service_name, self.timeout_config['default'])
+            service_health['in_flight'] = self._in_flight.get(service_name, 0)
             
             if service_health['state'] == 'open':
                 service_health['status'] = 'unhealthy'
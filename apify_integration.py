@@ -11,6 +11,7 @@ from cost_effective_scraping import CostEffectiveDataProvider
 from models import db, PlaceCache
 from datetime import datetime, timedelta
 from api_error_handler import resilient_api_call, with_cache, cache_apify
+from request_deadline import statement_timeout
 from typing import Any
 
 
@@ -51,8 +52,9 @@ class ApifyTravelIntegration:
         # Usa cache_key invece di city + category separati
         cache_key = f"{city.lower()}_{category}"
         # Query may return None; keep type safe for static analysis
-        cached = PlaceCache.query.filter_by(
-            cache_key=cache_key).first()  # type: Any
+        with statement_timeout(db.session):
+            cached = PlaceCache.query.filter_by(
+                cache_key=cache_key).first()  # type: Any
 
         # Per Londra, usa cache più lungo (24 ore) per evitare chiamate Apify lente
         cache_duration = timedelta(hours=24) if city.lower(
@@ -25,7 +25,7 @@ class LLMService:
         """Initialize LLM clients"""
         try:
             if settings.OPENAI_API_KEY:
-                self.openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
+                self.openai_client = self._governed(OpenAI(api_key=settings.OPENAI_API_KEY))
                 logger.info("OpenAI client initialized")
             else:
                 logger.warning("OpenAI API key not found")
@@ -33,6 +33,15 @@ class LLMService:
         except Exception as e:
             logger.error(f"Failed to initialize LLM clients: {e}")
     
+    @staticmethod
+    def _governed(client):
+        """Route calls through the shared LLM gateway when running inside the main app"""
+        try:
+            from llm_gateway import llm_gateway
+            return llm_gateway.wrap(client)
+        except ImportError:
+            return client
+    
     async def generate_travel_recommendations(
         self, 
         query: TravelQuery, 
@@ -6,6 +6,19 @@ import json
 import re
 from typing import Dict, List, Tuple, Optional
 
+from keyword_classifier import KeywordClassifier
+
+CITY_ATTRACTIONS = {
+    'Roma': ['Colosseo', 'Fontana di Trevi', 'Pantheon', 'Foro Romano', 'Castel Sant Angelo', 'Basilica San Pietro'],
+    'Milano': ['Duomo Milano', 'La Scala', 'Castello Sforzesco', 'Galleria Vittorio Emanuele'],
+    'Firenze': ['Duomo Firenze', 'Ponte Vecchio', 'Uffizi', 'Palazzo Pitti'],
+    'Venezia': ['Piazza San Marco', 'Basilica San Marco', 'Palazzo Ducale', 'Ponte di Rialto', 'Canal Grande'],
+    'Pisa': ['Torre di Pisa', 'Duomo Pisa'],
+    'Verona': ['Arena di Verona', 'Casa di Giulietta'],
+    'Bergamo': ['Mura Veneziane', 'Citta Alta'],
+    'Napoli': ['Vesuvio', 'Pompei', 'Castel dell Ovo']
+}
+
 
 class AttractionImageClassifier:
     def __init__(self):
@@ -56,6 +69,14 @@ class AttractionImageClassifier:
             'Castel dell Ovo': ['castel dell ovo', 'egg castle'],
         }
 
+        # Longer, more specific keywords weigh more; x1.5 for several matches,
+        # x1.2 in the city, x0.3 elsewhere
+        self.keyword_classifier = KeywordClassifier(
+            self.attraction_keywords, CITY_ATTRACTIONS,
+            weight=lambda keyword, kind: len(keyword.split()) * 0.2 + 0.1,
+            multi_match_bonus=1.5, in_city=1.2, out_of_city=0.3,
+            confidence=self._score_confidence)
+
         # City mappings
         self.city_mappings = {
             'roma': 'Roma',
@@ -101,64 +122,25 @@ class AttractionImageClassifier:
         """Identify specific attraction from title and URL"""
 
         # Combine title and URL for analysis
-        text_to_analyze = f"{title} {content_url}"
-
-        best_match = None
-        highest_score = 0.0
-
-        # Check each attraction's keywords
-        for attraction, keywords in self.attraction_keywords.items():
-            score = 0.0
-            matches = 0
-
-            for keyword in keywords:
-                if keyword in text_to_analyze:
-                    matches += 1
-                    # Weight longer, more specific keywords higher
-                    keyword_weight = len(keyword.split()) * 0.2 + 0.1
-                    score += keyword_weight
-
-            # Bonus for multiple keyword matches
-            if matches > 1:
-                score *= 1.5
-
-            # City relevance check
-            if self._attraction_belongs_to_city(attraction, city):
-                score *= 1.2
-            else:
-                score *= 0.3  # Penalty for wrong city
-
-            if score > highest_score:
-                highest_score = score
-                best_match = attraction
-
-        # Determine confidence level
-        if highest_score > 0.8:
-            confidence = 0.9  # High confidence
-        elif highest_score > 0.4:
-            confidence = 0.7  # Medium confidence
-        elif highest_score > 0.1:
-            confidence = 0.5  # Low confidence
-        else:
-            confidence = 0.2  # Very low confidence - generic city image
-            best_match = f"{city}_generic"
-
-        return best_match or f"{city}_generic", confidence
+        candidates = self.keyword_classifier.candidates(f"{title} {content_url}", city)
+        if not candidates:
+            return f"{city}_generic", 0.2  # Very low confidence - generic city image
+        return candidates[0][1], candidates[0][2]
+
+    @staticmethod
+    def _score_confidence(score: float) -> Optional[float]:
+        """Confidence level of a keyword score (None: too weak, generic city image)"""
+        if score > 0.8:
+            return 0.9  # High confidence
+        elif score > 0.4:
+            return 0.7  # Medium confidence
+        elif score > 0.1:
+            return 0.5  # Low confidence
+        return None
 
     def _attraction_belongs_to_city(self, attraction: str, city: str) -> bool:
         """Check if attraction belongs to the given city"""
-        city_attractions = {
-            'Roma': ['Colosseo', 'Fontana di Trevi', 'Pantheon', 'Foro Romano', 'Castel Sant Angelo', 'Basilica San Pietro'],
-            'Milano': ['Duomo Milano', 'La Scala', 'Castello Sforzesco', 'Galleria Vittorio Emanuele'],
-            'Firenze': ['Duomo Firenze', 'Ponte Vecchio', 'Uffizi', 'Palazzo Pitti'],
-            'Venezia': ['Piazza San Marco', 'Basilica San Marco', 'Palazzo Ducale', 'Ponte di Rialto', 'Canal Grande'],
-            'Pisa': ['Torre di Pisa', 'Duomo Pisa'],
-            'Verona': ['Arena di Verona', 'Casa di Giulietta'],
-            'Bergamo': ['Mura Veneziane', 'Citta Alta'],
-            'Napoli': ['Vesuvio', 'Pompei', 'Castel dell Ovo']
-        }
-
-        return attraction in city_attractions.get(city, [])
+        return self.keyword_classifier.belongs_to_city(attraction, city)
 
     def classify_dataset(self, dataset_path: str) -> Dict:
         """Classify entire dataset and return statistics"""
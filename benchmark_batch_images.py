@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/images/batch, per-item lookups vs one set-based query
+
+Resolves batches of 10, 50 and 200 attraction titles against DATABASE_URL
+in two ways: the previous loop (classify_attraction_from_context, then
+get_best_image_for_attraction, per item: up to 4 classification queries
+and 2 image queries, each on its own connection) and
+EnhancedImageService.resolve_batch (titles normalized up front, one unnest
+query, attraction_images only for misses). Titles are sampled from
+comprehensive_attractions with a share of unknown names, so both hits and
+misses are exercised. The report gives round-trips, connections and
+latency per batch size. Build the batch indexes first with
+create_batch_image_indexes.py, as in production.
+
+Usage:
+    python benchmark_batch_images.py [--sizes 10,50,200] [--repeat 3] [--miss-ratio 0.2]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+
+from enhanced_image_service import EnhancedImageService
+
+
+class CountingCursor:
+    def __init__(self, cursor, counts):
+        self._cursor, self._counts = cursor, counts
+
+    def execute(self, *args, **kwargs):
+        self._counts['round_trips'] += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+        return False
+
+
+class CountingConnection:
+    def __init__(self, conn, counts):
+        self._conn, self._counts = conn, counts
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._counts)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        result = self._conn.__exit__(*exc)
+        self._conn.close()  # the per-item path never closes its connections
+        return result
+
+
+class CountingService(EnhancedImageService):
+    def __init__(self, db_url):
+        super().__init__(db_url)
+        self.counts = {'round_trips': 0, 'connections': 0}
+
+    def get_db_connection(self):
+        self.counts['connections'] += 1
+        return CountingConnection(psycopg2.connect(self.db_url), self.counts)
+
+
+def per_item(service, items):
+    results = []
+    for item in items:
+        city, attraction, confidence = service.classify_attraction_from_context(item['title'], item['context'])
+        image = service.get_best_image_for_attraction(city, attraction)
+        results.append((attraction, (image or {}).get('url')))
+    return results
+
+
+def batched(service, items):
+    return [(r['classified_attraction'], r['image'].get('url') if r['image'].get('source') != 'fallback' else None)
+            for r in service.resolve_batch(items)]
+
+
+def sample_items(database_url, count, miss_ratio):
+    conn = psycopg2.connect(database_url)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT city, name FROM comprehensive_attractions
+            WHERE name IS NOT NULL ORDER BY random() LIMIT %s
+        """, (count,))
+        rows = cur.fetchall()
+    conn.close()
+    items = [{'title': name, 'context': f'Visita a {city}'} for city, name in rows]
+    for i in range(int(len(items) * miss_ratio)):
+        items[i]['title'] = f'Luogo sconosciuto {i}'
+    random.shuffle(items)
+    return items
+
+
+def measure(fn, service, items, repeat):
+    timings, counts = [], None
+    for _ in range(repeat):
+        service.counts.update(round_trips=0, connections=0)
+        start = time.perf_counter()
+        output = fn(service, items)
+        timings.append((time.perf_counter() - start) * 1000)
+        counts = dict(service.counts)
+    return statistics.median(timings), counts, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10,50,200')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--miss-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("❌ DATABASE_URL not set")
+        sys.exit(1)
+
+    service = CountingService(database_url)
+    batched(service, sample_items(database_url, 5, 0))  # creates the expression indexes once
+
+    print(f"{'items':>6}{'path':>10}{'round-trips':>13}{'connections':>13}{'ms':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        items = sample_items(database_url, size, args.miss_ratio)
+        old_ms, old_counts, old_out = measure(per_item, service, items, args.repeat)
+        new_ms, new_counts, new_out = measure(batched, service, items, args.repeat)
+        same = sum(a == b for a, b in zip(old_out, new_out))
+        print(f"{len(items):>6}{'per-item':>10}{old_counts['round_trips']:>13}"
+              f"{old_counts['connections']:>13}{old_ms:>10.1f}")
+        print(f"{'':>6}{'batch':>10}{new_counts['round_trips']:>13}"
+              f"{new_counts['connections']:>13}{new_ms:>10.1f}"
+              f"   {old_ms / max(new_ms, 0.01):.1f}x faster, {same}/{len(items)} identical picks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: place_cache loading, one INSERT ... ON CONFLICT per place vs CopyUpsertSink
+
+Loads a synthetic city of OSM places into the in-memory place_cache of
+test_streaming_import.py, which sleeps a fixed latency on every round trip
+(a remote Neon/Supabase connection), first the way Safe_Data_Loader used to
+(one execute per place, one commit) and then through the COPY upsert sink
+(stage, COPY, merge, commit per batch). The per-place loop is timed on the
+first --sample places and extrapolated, since it is linear in round trips.
+A second sink pass over the same places shows the unchanged path.
+
+Usage:
+    python benchmark_bulk_sink.py [--places 5000] [--latency 0.04] [--batch-size 1000] [--sample 250]
+"""
+
+import argparse
+import json
+import time
+
+from streaming_import import CopyUpsertSink
+from test_streaming_import import UpsertConnection
+
+COLUMNS = ('cache_key', 'place_name', 'city', 'country', 'place_data', 'priority_level')
+
+
+def places(count: int):
+    for i in range(count):
+        name = f"Place {i}"
+        yield (f"osm:bergamo:{1000000 + i}", name, 'Bergamo', 'Italy',
+               {'name': name, 'osm_id': 1000000 + i, 'types': ['tourist_attraction'],
+                'geometry': {'location': {'lat': 45.69 + i * 1e-6, 'lng': 9.66}},
+                'description': f"{name} in Bergamo", 'source': 'openstreetmap'}, 'standard')
+
+
+def per_place(rows, conn):
+    """The old loop: one INSERT ... ON CONFLICT DO UPDATE per place"""
+    cur = conn.cursor()
+    for row in rows:
+        cur.execute("""
+            INSERT INTO place_cache (cache_key, place_name, city, country, place_data, priority_level, created_at, last_accessed, access_count)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW(), NOW(), 0)
+            ON CONFLICT (cache_key) DO UPDATE SET place_data = EXCLUDED.place_data
+        """, row[:4] + (json.dumps(row[4]),) + row[5:])
+    conn.commit()
+
+
+def bulk(rows, conn, batch_size):
+    with CopyUpsertSink(conn, 'place_cache', COLUMNS, key=('cache_key',), update=('place_data',),
+                        batch_size=batch_size) as sink:
+        for row in rows:
+            sink.add(row)
+    return sink
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.04, help='Seconds per round trip')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--sample', type=int, default=250, help='Places timed for the per-place loop')
+    args = parser.parse_args()
+    rows = list(places(args.places))
+    print(f"🏙️ {args.places:,} places, {args.latency * 1000:.0f} ms per round trip\n")
+
+    conn = UpsertConnection(COLUMNS, ('cache_key',), ('place_data',), latency=args.latency)
+    sample = rows[:min(args.sample, len(rows))]
+    started = time.time()
+    per_place(sample, conn)
+    old = (time.time() - started) * len(rows) / len(sample)
+    print(f"{'INSERT per place':<22}{old:>8.1f}s  ({len(rows) + 1:,} round trips, "
+          f"extrapolated from {len(sample)})")
+
+    conn = UpsertConnection(COLUMNS, ('cache_key',), ('place_data',), latency=args.latency)
+    for label in ('CopyUpsertSink', '  again (unchanged)'):
+        conn.round_trips = 0
+        started = time.time()
+        sink = bulk(rows, conn, args.batch_size)
+        elapsed = time.time() - started
+        print(f"{label:<22}{elapsed:>8.1f}s  ({conn.round_trips} round trips, {sink.summary()}"
+              + (f", {old / elapsed:.0f}x)" if label == 'CopyUpsertSink' else ')'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cross-source entity resolution, initial run vs incremental runs after an import
+
+Builds a synthetic city whose places are stored by several importers (an
+OSM place_cache row each, a comprehensive_attractions row with a jittered
+position and a variant name for some, an attraction_images row with the
+wikidata id for others) in the in-memory tables of
+test_entity_resolution.py, which sleeps a fixed latency on every round
+trip. Reports the first full resolution, an unchanged re-run, and a re-run
+after an import touched --changed places, with the number of name/distance
+comparisons made against the all-pairs count that blocking avoids.
+
+Usage:
+    python benchmark_entity_resolution.py [--places 3000] [--latency 0.04] [--changed 50] [--batch-size 1000]
+"""
+
+import argparse
+import json
+import random
+import time
+from unittest import mock
+
+import entity_resolution
+from entity_resolution import EntityResolver
+from test_entity_resolution import EntityConnection
+
+SYLLABLES = ['ber', 'ga', 'mo', 'col', 'le', 'o', 'ni', 'ros', 'sa', 'vi', 'ta', 'len', 'cor', 'te', 'mar', 'ti',
+             'pa', 'lu', 'ce', 'do', 'ri', 'ven', 'tu', 'ra', 'sol', 'fe', 'ghi', 'na', 'bel', 'zo']
+
+
+def word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+
+
+def city_sources(count: int, seed: int = 7):
+    """count places over ~10 x 10 km; 60% also in comprehensive_attractions, 30% in attraction_images"""
+    rng = random.Random(seed)
+    place_cache, attractions, images = [], [], []
+    for i in range(count):
+        name = f"{rng.choice(['Chiesa', 'Palazzo', 'Museo', 'Torre'])} {word(rng)} {word(rng)}"
+        lat, lon = 45.65 + rng.random() * 0.09, 9.60 + rng.random() * 0.13
+        place_cache.append((f"osm:bergamo:{10000 + i}", 'Bergamo', name, json.dumps({
+            'name': name, 'osm_id': 10000 + i, 'osm_type': 'node',
+            'geometry': {'location': {'lat': lat, 'lng': lon}}})))
+        if rng.random() < 0.6:
+            attractions.append((i + 1, 'Bergamo', f"{name} (Bergamo)", lat + rng.uniform(-2e-4, 2e-4),
+                                lon + rng.uniform(-2e-4, 2e-4), None, None, None))
+        if rng.random() < 0.3:
+            images.append((i + 1, 'Bergamo', name, f"Q{500000 + i}"))
+    return {'place_cache': place_cache, 'comprehensive_attractions': attractions, 'attraction_images': images}
+
+
+def run(conn, batch_size, **kwargs):
+    comparisons = [0]
+    same_place = entity_resolution.same_place
+
+    def counted(a, b):
+        comparisons[0] += 1
+        return same_place(a, b)
+
+    conn.round_trips = 0
+    resolver = EntityResolver(conn, batch_size)
+    started = time.time()
+    with mock.patch.object(entity_resolution, 'same_place', counted):
+        resolver.run(**kwargs)
+    return time.time() - started, resolver, comparisons[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, default=3000)
+    parser.add_argument('--latency', type=float, default=0.04, help='Seconds per round trip')
+    parser.add_argument('--changed', type=int, default=50, help='Places renamed by the re-import')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    sources = city_sources(args.places)
+    records = sum(len(rows) for rows in sources.values())
+    conn = EntityConnection(sources, latency=args.latency)
+    print(f"🏙️ {args.places:,} places stored as {records:,} records, "
+          f"{args.latency * 1000:.0f} ms per round trip\n")
+
+    elapsed, resolver, comparisons = run(conn, args.batch_size)
+    places = len({e['place_id'] for e in conn.entities.values()})
+    print(f"{'Initial resolution':<24}{elapsed:>7.2f}s  ({conn.round_trips} round trips, {comparisons:,} comparisons "
+          f"vs {records * (records - 1) // 2:,} all-pairs) -> {places:,} places")
+    print(f"{'':<24}{resolver.summary()}")
+
+    elapsed, resolver, comparisons = run(conn, args.batch_size)
+    print(f"{'Unchanged re-run':<24}{elapsed:>7.2f}s  ({conn.round_trips} round trips, {comparisons:,} comparisons)")
+
+    rows = conn.sources['place_cache']
+    for i in range(min(args.changed, len(rows))):
+        key, city, name, data = rows[i]
+        place = json.loads(data)
+        place['name'] = place['name'] + ' Vecchia'
+        rows[i] = (key, city, place['name'], json.dumps(place))
+    elapsed, resolver, comparisons = run(conn, args.batch_size, sources=['place_cache'], cities=['Bergamo'])
+    print(f"{f'{args.changed} places changed':<24}{elapsed:>7.2f}s  ({conn.round_trips} round trips, "
+          f"{comparisons:,} comparisons)  {resolver.summary()}")
+
+
+if __name__ == "__main__":
+    main()
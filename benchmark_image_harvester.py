@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: image ingestion, sequential download loop vs ImageHarvester
+
+Serves generated JPEGs from the local fixture server of
+test_image_harvester.py with a fixed per-request latency (standing in for
+Commons/Flickr round trips) spread over two host names, then ingests
+them the way openverse_fallback/process_apify_dataset used to (one
+download, decode and insert at a time) and with the parallel harvester
+(per-host limits, process-pool decode, perceptual dedup, batched writes).
+Reports images per minute for both.
+
+Usage:
+    python benchmark_image_harvester.py [--images 200] [--latency 0.15] [--concurrency 16] [--per-host 8]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import requests
+
+from image_blob_store import ImageBlobStore
+from image_harvester import Checkpoint, ImageHarvester, decode_image
+from test_image_harvester import FixtureServer, ListSink, make_image
+
+HOSTS = ['127.0.0.1', 'localhost']
+
+
+def sequential(jobs, store):
+    """The old loop: download, decode, store and insert one image at a time"""
+    session, sink = requests.Session(), ListSink()
+    for job in jobs:
+        response = session.get(job['urls'][0], timeout=30)
+        response.raise_for_status()
+        decoded = decode_image(response.content)
+        sink.write([dict(job['row'], blob_sha256=store.put(decoded['bytes']))])
+    return len(sink.rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.15, help='Seconds per request')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=8)
+    args = parser.parse_args()
+
+    files = {f'/img/{i}.jpg': make_image(i, size=(1024, 768)) for i in range(args.images)}
+    with FixtureServer(files, latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        jobs = [{'key': f'bench:{i}', 'urls': [server.url(f'/img/{i}.jpg', HOSTS[i % len(HOSTS)])],
+                 'row': {'source': 'bench', 'source_id': str(i)}} for i in range(args.images)]
+        print(f"🖼️ {args.images} images of ~{sum(map(len, files.values())) // len(files) // 1024} KB, "
+              f"{args.latency * 1000:.0f} ms per request, {len(HOSTS)} hosts\n")
+
+        started = time.time()
+        stored = sequential(jobs, ImageBlobStore(os.path.join(tmp, 'sequential')))
+        old = stored / (time.time() - started) * 60
+        print(f"{'sequential loop':<24}{old:>10,.0f} images/min")
+
+        harvester = ImageHarvester(ListSink(), Checkpoint(os.path.join(tmp, 'bench.checkpoint')),
+                                   concurrency=args.concurrency, per_host=args.per_host, host_interval=0,
+                                   store=ImageBlobStore(os.path.join(tmp, 'harvested')))
+        stats = harvester.run(jobs)
+        assert stats['stored'] == stored, 'both paths should store every image'
+        print(f"{'ImageHarvester':<24}{stats['images_per_min']:>10,.0f} images/min "
+              f"({stats['images_per_min'] / old:.1f}x, {args.per_host} per host x {len(HOSTS)} hosts, "
+              f"{stats['batches']} batches)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark: attraction image serving, bytea buffering vs blob store sendfile
+
+Serves the same set of images through a threaded local WSGI server that,
+like gunicorn, hands file responses to os.sendfile, in two ways:
+the previous handler shape (whole image materialized as Python bytes per
+request, as psycopg2 returns a bytea, then wrapped in a Response) and the
+blob store route (image_storage_routes.serve_attraction_image, send_file
+from the content-addressed file). Concurrent clients fetch images; the
+report gives requests/s, MB/s and peak Python memory of each run. The
+bytea side has its bytes in memory already, so it leaves out the database
+round trip and is a best case for the old handler.
+
+Usage:
+    python benchmark_image_serving.py [--images 40] [--size-kb 400] [--requests 800] [--concurrency 16]
+"""
+
+import argparse
+import http.client
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer
+
+from flask import Flask, Response
+
+import image_storage_routes
+from image_blob_store import ImageBlobStore, ImageLocator
+
+
+class SendfileHandler(ServerHandler):
+    """wsgi.file_wrapper responses go out with os.sendfile (no copy through Python)"""
+
+    def sendfile(self):
+        filelike = self.result.filelike
+        if not hasattr(filelike, 'fileno'):
+            return False
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        offset, remaining = filelike.tell(), os.fstat(filelike.fileno()).st_size - filelike.tell()
+        while remaining > 0:
+            sent = os.sendfile(self.stdout.fileno(), filelike.fileno(), offset, remaining)
+            if not sent:
+                break
+            offset += sent
+            remaining -= sent
+        return True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        self.raw_requestline = self.rfile.readline(65537)
+        if not self.parse_request():
+            return
+        handler = SendfileHandler(self.rfile, self.wfile, self.get_stderr(), self.get_environ(),
+                                  multithread=True)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def build_app(images, store, locator):
+    app = Flask(__name__)
+    image_storage_routes.image_locator, image_storage_routes.blob_store = locator, store
+    app.register_blueprint(image_storage_routes.image_routes_bp)
+
+    @app.route('/bytea/<int:image_id>')
+    def serve_bytea(image_id):
+        img_bytes = bytes(memoryview(images[image_id]))  # psycopg2 hands back a bytea as a buffer copy
+        return Response(img_bytes, mimetype='image/jpeg',
+                        headers={'Cache-Control': 'public, max-age=86400'})
+
+    return app
+
+
+def run(port, path_template, count, concurrency, image_count):
+    buffers = threading.local()
+
+    def fetch(i):
+        if not hasattr(buffers, 'conn'):
+            buffers.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            buffers.chunk = bytearray(65536)
+        buffers.conn.request('GET', path_template.format(i % image_count))
+        response = buffers.conn.getresponse()
+        received = 0
+        view = memoryview(buffers.chunk)
+        while True:
+            n = response.readinto(view)
+            if not n:
+                break
+            received += n
+        return received
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        total = sum(pool.map(fetch, range(count)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    return count / elapsed, total / elapsed / 1024 / 1024, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--images', type=int, default=40)
+    parser.add_argument('--size-kb', type=int, default=400)
+    parser.add_argument('--requests', type=int, default=800)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ImageBlobStore(root=tmp)
+        locator = ImageLocator(store=store)
+        images = {}
+        for image_id in range(args.images):
+            data = os.urandom(args.size_kb * 1024)
+            images[image_id] = data
+            locator._remember(image_id, {'sha256': store.put(data), 'size': len(data),
+                                         'mime_type': 'image/jpeg', 'name': f'img{image_id}', 'city': 'Roma'})
+
+        server = ThreadingWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(build_app(images, store, locator))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_port
+
+        tracemalloc.start()
+        try:
+            print(f"🖼️ {args.requests} requests, {args.concurrency} concurrent, "
+                  f"{args.images} images x {args.size_kb} KB\n")
+            print(f"{'path':<22}{'req/s':>10}{'MB/s':>10}{'peak MB':>10}")
+            results = {}
+            for label, template in (('bytea (buffered)', '/bytea/{}'),
+                                    ('blob store (sendfile)', '/api/images/attraction/{}')):
+                run(port, template, args.concurrency * 2, args.concurrency, args.images)  # warm up
+                results[label] = run(port, template, args.requests, args.concurrency, args.images)
+                rps, mbps, peak = results[label]
+                print(f"{label:<22}{rps:>10.0f}{mbps:>10.1f}{peak:>10.1f}")
+        finally:
+            tracemalloc.stop()
+            server.shutdown()
+
+        old, new = results['bytea (buffered)'], results['blob store (sendfile)']
+        print(f"\n📉 Peak memory {old[2] / max(new[2], 0.01):.1f}x lower, throughput {new[0] / old[0]:.2f}x")
+        print("   (the bytea path here skips the psycopg2 connect + SELECT the old handler paid per request;"
+              " the blob route resolves ids from the locator LRU)")
+
+
+if __name__ == "__main__":
+    main()
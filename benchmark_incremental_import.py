@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nightly city refresh, full rewrite vs content-hash change detection
+
+Loads a synthetic city of OSM elements through
+Complete_Missing_Cities.MissingCitiesLoader.load_city_data against the
+in-memory place_cache of test_content_hash.py, which sleeps a fixed latency
+on every round trip (a remote Neon/Supabase connection). The first run is
+the initial load, the second an unchanged nightly refresh and the third a
+refresh where --changed places were renamed. Reports rows written to
+Postgres, documents sent to ChromaDB, round trips and wall time per run.
+
+Usage:
+    python benchmark_incremental_import.py [--places 5000] [--latency 0.04] [--changed 50]
+"""
+
+import argparse
+import csv
+import time
+from unittest import mock
+
+from test_content_hash import HashedConnection, elements, missing_cities_loader
+
+COLUMNS = ('cache_key', 'place_data', 'city', 'place_name', 'country', 'priority_level', 'content_hash')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--places', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.04, help='Seconds per round trip')
+    parser.add_argument('--changed', type=int, default=50, help='Places renamed before the last refresh')
+    args = parser.parse_args()
+    print(f"🏙️ {args.places:,} places, {args.latency * 1000:.0f} ms per round trip\n")
+
+    conn = HashedConnection(COLUMNS, ('cache_key',), ('content_hash',), latency=args.latency)
+    renamed = set(range(0, args.places, max(1, args.places // max(1, args.changed))))
+    runs = (('initial load', ()), ('unchanged refresh', ()), (f"{len(renamed)} places changed", renamed))
+    for label, changed in runs:
+        loader = missing_cities_loader(conn)
+        conn.round_trips, copies = 0, len(conn.copies)
+        payload = elements(args.places, renamed=changed)
+        started = time.time()
+        with mock.patch('builtins.print'):
+            loader.load_city_data('Padua', payload)
+        elapsed = time.time() - started
+        written = sum(1 for _, data in conn.copies[copies:] for _ in csv.reader(data.splitlines()))
+        print(f"{label:<22}{elapsed:>7.2f}s  {written:>7,} rows written  "
+              f"{len(loader.collection.ids):>7,} embedded  {conn.round_trips:>3} round trips")
+
+
+if __name__ == "__main__":
+    main()
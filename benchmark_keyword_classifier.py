@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: keyword classification, per-keyword loops vs compiled automaton
+
+Classifies the same titles with the loops the classifiers used to run (kept
+as reference implementations in test_keyword_classifier.py) and with the
+compiled KeywordClassifier/KeywordRules now behind
+EnhancedImageService._classify_by_keywords,
+AttractionImageClassifier._identify_attraction and
+classify_attraction_simple. Titles are itinerary-stop style strings built
+from the keyword tables plus unrelated places; the report gives
+classifications per second for each classifier and checks both sides agree.
+
+Usage:
+    python benchmark_keyword_classifier.py [--titles 2000] [--rounds 5]
+"""
+
+import argparse
+import random
+import time
+
+from attraction_classifier import AttractionImageClassifier
+from enhanced_image_service import EnhancedImageService
+from simple_enhanced_images import classify_attraction_simple
+from test_keyword_classifier import (legacy_classify_attraction_simple, legacy_classify_by_keywords,
+                                     legacy_identify_attraction)
+
+FILLER = ['Trattoria da Mario', 'Hotel Centrale', 'Museo Civico', 'Chiesa di San Lorenzo', 'Mercato Centrale',
+          'Giardino Botanico', 'Piazza Garibaldi', 'Stazione Termini', 'Bar Roma', 'Castello di Miramare']
+
+
+def build_titles(tables, count, seed=11):
+    rng = random.Random(seed)
+    keywords = sorted({k for table in tables for keywords in table.values() for k in keywords})
+    titles = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4:
+            titles.append(rng.choice(keywords))
+        elif roll < 0.7:
+            titles.append(f"{rng.choice(['Visit', 'Tour of', 'Ingresso', ''])} {rng.choice(keywords)}".strip())
+        else:
+            titles.append(rng.choice(FILLER))
+    return titles
+
+
+def rate(fn, items, rounds):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            fn(*item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--titles', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    service = EnhancedImageService(db_url='postgresql://unused')
+    classifier = AttractionImageClassifier()
+    cities = ['Roma', 'Firenze', 'Venezia', 'Milano', 'Napoli', 'Genova']
+    titles = build_titles([service.attraction_keywords, classifier.attraction_keywords], args.titles)
+    rng = random.Random(3)
+
+    enhanced = [(t.lower(), rng.choice(cities)) for t in titles]
+    images = [(t.lower(), f"https://example.org/{t.lower().replace(' ', '_')}.jpg", rng.choice(cities))
+              for t in titles]
+    simple = [(t, rng.choice(cities)) for t in titles]
+
+    cases = [
+        ('EnhancedImageService',
+         lambda name, city: legacy_classify_by_keywords(service.attraction_keywords, name, city),
+         service._classify_by_keywords, enhanced),
+        ('AttractionImageClassifier',
+         lambda title, url, city: legacy_identify_attraction(classifier.attraction_keywords, title, url, city),
+         classifier._identify_attraction, images),
+        ('classify_attraction_simple', legacy_classify_attraction_simple, classify_attraction_simple, simple),
+    ]
+
+    print(f"🔤 {len(titles)} titles, best of {args.rounds} rounds\n")
+    print(f"{'classifier':<28}{'loops/s':>12}{'compiled/s':>12}{'speedup':>10}")
+    for label, legacy, compiled, items in cases:
+        assert all(legacy(*item) == compiled(*item) for item in items), f"{label}: results differ"
+        old, new = rate(legacy, items, args.rounds), rate(compiled, items, args.rounds)
+        print(f"{label:<28}{old:>12,.0f}{new:>12,.0f}{new / old:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: LLM response cache on replayed AI companion traffic
+
+Replays a synthetic day of Piano B / Scoperte / place-details requests
+(same cities, weather and time bands with minute-level variation) against
+the local stub LLM server, once without cache and once through
+LLMResponseCache, and reports upstream calls, latency and estimated cost.
+
+Usage:
+    python benchmark_llm_cache.py [--latency 1.0] [--requests 120]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from openai import OpenAI
+
+from llm_response_cache import LLMResponseCache
+from stub_llm_server import start_stub_server
+
+CITIES = ['Roma', 'Milano', 'Firenze', 'Venezia', 'Torino']
+WEATHER = ['pioggia', 'sole', 'nuvoloso']
+PLACES = ['Colosseo', 'Duomo', 'Uffizi', 'Ponte di Rialto', 'Mole Antonelliana']
+
+
+def synthetic_traffic(count: int, seed: int = 7):
+    """(feature, messages, kwargs) tuples with realistic repetition"""
+    rng = random.Random(seed)
+    traffic = []
+    for _ in range(count):
+        city = rng.choice(CITIES)
+        kind = rng.choices(['piano_b', 'scoperte', 'place_details'], weights=[3, 3, 4])[0]
+        if kind == 'place_details':
+            prompt = f"Crea dettagli autentici per {rng.choice(PLACES)} a {city}"
+        else:
+            clock = f"{rng.choice([9, 10, 15, 16, 19])}:{rng.randint(0, 59):02d}"
+            prompt = (f"Città: {city}\nMeteo: {rng.choice(WEATHER)}\nOra attuale: {clock}\n"
+                      f"Genera {'un Piano B' if kind == 'piano_b' else 'scoperte'} in JSON")
+        traffic.append((kind, [{"role": "user", "content": prompt}],
+                        {'response_format': {"type": "json_object"}, 'timeout': 30}))
+    return traffic
+
+
+def replay(client, traffic, cache=None):
+    latencies = []
+    for feature, messages, kwargs in traffic:
+        start = time.perf_counter()
+        if cache:
+            cache.chat_completion(client, feature, model="gpt-4-turbo", messages=messages, **kwargs)
+        else:
+            client.chat.completions.create(model="gpt-4-turbo", messages=messages, **kwargs)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--latency', type=float, default=1.0, help='stub LLM latency (s)')
+    parser.add_argument('--requests', type=int, default=120)
+    args = parser.parse_args()
+
+    server = start_stub_server(latency=args.latency)
+    client = OpenAI(api_key='stub', base_url=server.base_url)
+    traffic = synthetic_traffic(args.requests)
+
+    print("=" * 70)
+    print(f"🧠 LLM CACHE BENCHMARK ({args.requests} requests, stub latency {args.latency}s)")
+    print("=" * 70)
+
+    baseline = replay(client, traffic)
+    baseline_calls = server.requests['chat']
+
+    cache = LLMResponseCache(database_url='')  # memory tier only for the benchmark
+    cached = replay(client, traffic, cache)
+    cached_calls = server.requests['chat'] - baseline_calls
+    stats = cache.get_stats()
+
+    for label, latencies, calls in (('no cache', baseline, baseline_calls), ('cache', cached, cached_calls)):
+        print(f"{label:>9}: {calls:4d} upstream calls, total {sum(latencies):7.1f}s, "
+              f"p50 {statistics.median(latencies) * 1000:7.1f} ms")
+
+    print(f"\n🎯 Hit rate: {stats['totals']['hit_rate']}%  "
+          f"💰 est. saved ${stats['totals']['cost_saved_usd']:.2f} "
+          f"({stats['totals']['tokens_saved']} tokens)")
+    for feature, feature_stats in stats['features'].items():
+        print(f"   {feature:<14} hit rate {feature_stats['hit_rate']:5.1f}%  "
+              f"TTL {feature_stats['ttl_seconds']}s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
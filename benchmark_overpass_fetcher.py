@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: city loading from Overpass, sequential per-class queries vs the shared fetcher
+
+Runs the local Overpass stub of test_overpass_fetcher.py (2 slots, a fixed
+latency per query) and fetches attractions and restaurants for --cities
+bboxes three ways: the way Safe_Data_Loader used to (one query per class,
+one city at a time, 1s sleep after each query and 2s between cities), with
+overpass_fetcher (one union query per city, cities in parallel under the
+/status slot limiter) and again from the disk cache (reprocessing).
+
+Usage:
+    python benchmark_overpass_fetcher.py [--cities 10] [--latency 0.5] [--concurrency 4]
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+from http_client import HTTPClient
+from overpass_fetcher import build_query
+from test_overpass_fetcher import CLASSES, OverpassStub, city_elements, fetcher_for
+
+
+def sequential(stub, cities):
+    """The old loaders: a query per class per city, fixed sleeps in between"""
+    client = HTTPClient(host_limits='')
+    for bbox in cities.values():
+        for selectors in CLASSES.values():
+            client.post(stub.url, data={'data': build_query(bbox, selectors, 30)}, timeout=60, retries=2)
+            time.sleep(1)  # Be nice to OSM servers
+        time.sleep(2)  # Be respectful to OSM servers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cities', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds per Overpass query')
+    parser.add_argument('--concurrency', type=int, default=4, help='Cities fetched in parallel')
+    args = parser.parse_args()
+    cities = {f"City {i}": (40.0 + i, 9.0, 40.1 + i, 9.1) for i in range(args.cities)}
+    areas = {'{},{},{},{}'.format(*bbox): city_elements(i) for i, bbox in enumerate(cities.values())}
+    print(f"🗺️ {args.cities} cities x {len(CLASSES)} classes, {args.latency:.2f}s per query, 2 server slots\n")
+
+    cache_dir = tempfile.mkdtemp(prefix='overpass_cache_')
+    try:
+        with OverpassStub(areas, slots=2, latency=args.latency) as stub:
+            started = time.time()
+            sequential(stub, cities)
+            old = time.time() - started
+            print(f"{'sequential + sleeps':<22}{old:>7.1f}s  ({len(stub.queries)} queries)")
+
+            for label in ('overpass_fetcher', '  again (cached)'):
+                fetcher = fetcher_for(stub, cache_dir, args.concurrency)
+                queries, rejected = len(stub.queries), stub.rejected
+                started = time.time()
+                for city, found, error in fetcher.fetch_many(cities, CLASSES):
+                    assert error is None, error
+                elapsed = time.time() - started
+                print(f"{label:<22}{elapsed:>7.1f}s  ({len(stub.queries) - queries} queries, "
+                      f"{stub.rejected - rejected} x 429, {old / elapsed:.0f}x)")
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: trimmed vs untrimmed RAG context in LLM prompts
+
+Builds the city + hotel context for a city both ways (legacy
+format_*_for_prompt vs PromptContextBuilder under a token budget), reports
+prompt tokens and build time, and - when an OpenAI-compatible endpoint is
+configured - times end-to-end chat completions for each variant.
+
+Usage:
+    python benchmark_prompt_context.py Milano
+    OPENAI_BASE_URL=http://localhost:8089/v1 python benchmark_prompt_context.py Roma --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+from simple_rag_helper import (
+    CITY_CONTEXT_MAX_TOKENS, HOTEL_CONTEXT_MAX_TOKENS, context_builder, rag_helper)
+
+CATEGORIES = ["restaurant", "tourist_attraction", "cafe", "museum"]
+
+
+def untrimmed_context(city):
+    city_context = rag_helper.get_city_context(city, CATEGORIES)
+    hotel_context = rag_helper.get_hotel_context(city, 8.0, 3)
+    return (rag_helper.format_context_for_prompt(city_context) + "\n\n" +
+            rag_helper.format_hotel_context_for_prompt(hotel_context))
+
+
+def trimmed_context(city):
+    return (context_builder.build_city_prompt(city, CATEGORIES, max_tokens=CITY_CONTEXT_MAX_TOKENS) + "\n\n" +
+            context_builder.build_hotel_prompt(city, 8.0, 3, max_tokens=HOTEL_CONTEXT_MAX_TOKENS))
+
+
+def time_llm(client, model, context, runs):
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": f"{context}\n\nSuggerisci un Piano B per la pioggia."}],
+            max_tokens=200,
+            timeout=60
+        )
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('city')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--model', default='gpt-3.5-turbo')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"🧾 PROMPT CONTEXT BENCHMARK - {args.city}")
+    print("=" * 70)
+
+    variants = {}
+    for label, build in (('untrimmed', untrimmed_context), ('trimmed', trimmed_context)):
+        rag_helper.clear_cache()
+        start = time.perf_counter()
+        context = build(args.city)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        build(args.city)
+        warm = time.perf_counter() - start
+        variants[label] = context
+        print(f"{label:>10}: {context_builder.estimate_tokens(context):5d} tokens, "
+              f"build cold {cold * 1000:.1f} ms / warm {warm * 1000:.2f} ms")
+
+    if not (os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_BASE_URL')):
+        print("\n⏭️  No OPENAI_API_KEY / OPENAI_BASE_URL set - skipping LLM latency runs")
+        return
+
+    from openai import OpenAI
+    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY', 'benchmark'))
+    print(f"\n⏱️  LLM latency over {args.runs} runs ({args.model})")
+    for label, context in variants.items():
+        latencies = time_llm(client, args.model, context, args.runs)
+        print(f"{label:>10}: median {statistics.median(latencies):.2f}s, max {max(latencies):.2f}s")
+
+    print(f"\n📊 Builder metrics: {context_builder.get_metrics()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark: city+category semantic search round-trips and result completeness
+
+Compares the legacy strategy (fetch n_results * 2 filtered by city, then
+post-filter by category) with the compound $and pushdown in
+OptimizedRAGHelper.semantic_search_places, on an in-memory ChromaDB
+collection where some categories are sparse for a city.
+
+Usage:
+    python benchmark_semantic_search.py
+"""
+
+import hashlib
+import time
+
+import chromadb
+
+from simple_rag_helper import OptimizedRAGHelper
+
+CITIES = ['milano', 'roma', 'firenze', 'bergamo']
+# (category, places per city) - museums and hotels are sparse on purpose
+CATEGORY_SIZES = [('restaurant', 300), ('tourist_attraction', 150), ('museum', 6), ('hotel', 3)]
+N_RESULTS = 5
+QUERIES = ['romantic dinner', 'renaissance art', 'quiet place to stay', 'historic church']
+
+
+class HashEmbedding:
+    """Deterministic offline embedding so the benchmark needs no model download"""
+
+    def __call__(self, input):
+        vectors = []
+        for text in input:
+            digest = hashlib.sha256(text.encode()).digest()
+            vectors.append([b / 255.0 for b in digest[:32]])
+        return vectors
+
+    def embed_query(self, input):
+        return self(input)
+
+    def name(self):
+        return 'hash-embedding'
+
+
+def build_collection():
+    client = chromadb.EphemeralClient()
+    collection = client.get_or_create_collection(
+        'benchmark_places', embedding_function=HashEmbedding())
+
+    ids, documents, metadatas = [], [], []
+    for city in CITIES:
+        for category, size in CATEGORY_SIZES:
+            for i in range(size):
+                ids.append(f'{city}:{category}:{i}')
+                documents.append(f'{category} {i} in {city}')
+                metadatas.append({'city': city, 'category': category, 'name': f'{category.title()} {i}'})
+    collection.add(ids=ids, documents=documents, metadatas=metadatas)
+    return collection
+
+
+def legacy_search(collection, query, city, categories, n_results):
+    """Pre-change behaviour: one over-fetch, post-filter, may underfill"""
+    results = collection.query(
+        query_texts=[query], n_results=n_results * 2,
+        where={"city": {"$eq": city}}, include=["metadatas"])
+    hits = [m for m in results['metadatas'][0] if m.get('category') in categories]
+    return hits[:n_results], 1
+
+
+def legacy_widening_search(collection, query, city, categories, n_results):
+    """Legacy post-filter retried with doubling fetch until complete"""
+    fetch, trips = n_results * 2, 0
+    total = len(collection.get(where={"city": {"$eq": city}}, include=[])['ids'])
+    while True:
+        trips += 1
+        results = collection.query(
+            query_texts=[query], n_results=min(fetch, total),
+            where={"city": {"$eq": city}}, include=["metadatas"])
+        hits = [m for m in results['metadatas'][0] if m.get('category') in categories]
+        if len(hits) >= n_results or fetch >= total:
+            return hits[:n_results], trips
+        fetch *= 2
+
+
+def main():
+    collection = build_collection()
+    helper = OptimizedRAGHelper.__new__(OptimizedRAGHelper)
+    OptimizedRAGHelper.__init__(helper)
+    helper._chroma_collection = collection
+
+    print("=" * 70)
+    print(f"🔍 SEMANTIC SEARCH BENCHMARK ({collection.count()} documents, n_results={N_RESULTS})")
+    print("=" * 70)
+
+    for category, size in CATEGORY_SIZES:
+        expected = min(N_RESULTS, size)
+        legacy_found = new_found = legacy_trips = widened_trips = 0
+        legacy_time = new_time = 0.0
+        runs = 0
+
+        for city in CITIES:
+            for query in QUERIES:
+                runs += 1
+                start = time.perf_counter()
+                hits, trips = legacy_search(collection, query, city, [category], N_RESULTS)
+                legacy_time += time.perf_counter() - start
+                legacy_found += len(hits)
+                legacy_trips += trips
+
+                _, trips = legacy_widening_search(collection, query, city, [category], N_RESULTS)
+                widened_trips += trips
+
+                start = time.perf_counter()
+                places = helper.semantic_search_places(query, city, [category], N_RESULTS)
+                new_time += time.perf_counter() - start
+                new_found += len(places)
+
+        new_trips = helper.get_performance_metrics()['semantic_round_trips']
+        helper._performance_metrics['semantic_round_trips'] = 0
+
+        print(f"\n📂 {category} ({size}/city, expected {expected} per query)")
+        print(f"   legacy : {legacy_found / runs:.1f} results/query, "
+              f"{legacy_trips / runs:.1f} round-trips, {legacy_time / runs * 1000:.1f} ms")
+        print(f"   widened: {expected:.1f} results/query, "
+              f"{widened_trips / runs:.1f} round-trips (legacy post-filter retried until full)")
+        print(f"   $and   : {new_found / runs:.1f} results/query, "
+              f"{new_trips / runs:.1f} round-trips, {new_time / runs * 1000:.1f} ms")
+        print(f"   complete: legacy {'✅' if legacy_found == expected * runs else '❌'}  "
+              f"new {'✅' if new_found == expected * runs else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
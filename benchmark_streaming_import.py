@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: dataset import, json.load of the whole export vs streaming chunks
+
+Writes a synthetic Apify touristic-attractions export of the requested
+size (records cloned from the North Italy dataset with unique names and
+OSM ids), then runs import_north_italy_dataset.import_to_comprehensive_attractions
+on it in a fresh process per mode against a connection that discards the
+COPY payloads: once with the json.load-ed list (the old loader) and once
+with the streaming JsonRecords reader. Reports records/s, time to the first
+written chunk and peak RSS. The json.load run is skipped above
+--full-load-max-mb, where it would need several times the file size in RAM.
+What the streaming run still grows is the (city, name)/OSM dedup key sets,
+one entry per unique attraction (every synthetic record is unique).
+
+Usage:
+    python benchmark_streaming_import.py [--size-mb 2048] [--chunk-size 1000] [--full-load-max-mb 600] [--keep]
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from streaming_import import peak_memory_mb
+from test_streaming_import import NORTH_ITALY, RecordingConnection, RecordingCursor
+
+
+class DiscardCursor(RecordingCursor):
+    def copy_expert(self, sql, data):
+        self.conn.copied += sum(1 for _ in csv.reader(data))
+        if self.conn.first_chunk_s is None:
+            self.conn.first_chunk_s = time.time() - self.conn.started
+
+
+class DiscardConnection(RecordingConnection):
+    def __init__(self, started):
+        super().__init__()
+        self.started = started
+        self.first_chunk_s = None
+        self.copied = 0
+
+    def cursor(self):
+        return DiscardCursor(self)
+
+
+def generate(path: str, size_mb: int):
+    """Clone the real records until the file reaches size_mb"""
+    with open(NORTH_ITALY, encoding='utf-8') as f:
+        templates = [item for item in json.load(f) if item.get('coords', {}).get('lat')]
+    target, written, count = size_mb << 20, 0, 0
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write('[\n')
+        while written < target:
+            item = dict(templates[count % len(templates)], name=f"{templates[count % len(templates)]['name']} #{count}",
+                        osmId=10 ** 10 + count)
+            text = ('' if count == 0 else ',\n') + json.dumps(item, ensure_ascii=False, indent=2)
+            out.write(text)
+            written += len(text.encode('utf-8'))
+            count += 1
+        out.write('\n]\n')
+    return count
+
+
+def run(mode: str, path: str, chunk_size: int):
+    """One import in this process; prints a JSON line with the measurements"""
+    import import_north_italy_dataset
+
+    started = time.time()
+    conn = DiscardConnection(started)
+    with mock.patch.object(import_north_italy_dataset.psycopg2, 'connect', return_value=conn), \
+            mock.patch('builtins.print'):
+        if mode == 'load':
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            data = import_north_italy_dataset.load_dataset(path)
+        import_north_italy_dataset.import_to_comprehensive_attractions(data, chunk_size=chunk_size)
+    elapsed = time.time() - started
+    sys.stdout.write(json.dumps({'rows': conn.copied, 'elapsed_s': elapsed, 'first_chunk_s': conn.first_chunk_s,
+                                 'peak_mb': peak_memory_mb()}) + '\n')
+
+
+def measure(mode: str, path: str, chunk_size: int) -> dict:
+    output = subprocess.run([sys.executable, __file__, '--run', mode, path, '--chunk-size', str(chunk_size)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--full-load-max-mb', type=int, default=600,
+                        help='Skip the json.load run above this file size')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated dataset')
+    parser.add_argument('--run', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run[0], args.run[1], args.chunk_size)
+        return
+
+    fd, path = tempfile.mkstemp(suffix='.json', prefix='dataset_synthetic_')
+    os.close(fd)
+    try:
+        started = time.time()
+        records = generate(path, args.size_mb)
+        print(f"📂 {os.path.getsize(path) / (1 << 20):,.0f} MB synthetic export, {records:,} records "
+              f"(generated in {time.time() - started:.0f}s), chunks of {args.chunk_size:,}\n")
+
+        modes = [('streaming chunks', 'stream')]
+        if args.size_mb <= args.full_load_max_mb:
+            modes.insert(0, ('json.load', 'load'))
+        else:
+            print(f"{'json.load':<20}skipped (> {args.full_load_max_mb} MB, use --full-load-max-mb)")
+        for label, mode in modes:
+            result = measure(mode, path, args.chunk_size)
+            print(f"{label:<20}{result['rows'] / result['elapsed_s']:>10,.0f} records/s  "
+                  f"first chunk after {result['first_chunk_s']:>6.2f}s  peak RSS {result['peak_mb']:>7,.0f} MB  "
+                  f"({result['rows']:,} rows in {result['elapsed_s']:.0f}s)")
+    finally:
+        if args.keep:
+            print(f"\nDataset kept at {path}")
+        else:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+City Bundles - Versioned offline packs for the PWA service worker
+Packs a city's attractions, restaurants, hotels, thumbnail metadata and
+precomputed itineraries into one gzip JSON file per version; every record
+carries a content hash so clients holding an older version download only
+the records that changed (plus the ids that went away)
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+from itinerary_precompiler import normalize_place, precomputed_itineraries
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BUNDLE_DIR = os.getenv('CITY_BUNDLE_DIR', 'city_bundles')
+KEEP_VERSIONS = int(os.getenv('CITY_BUNDLE_KEEP_VERSIONS', '5'))
+RECORD_KINDS = ('attraction', 'restaurant', 'hotel', 'thumbnail', 'itinerary')
+PLACE_KINDS = ('attraction', 'restaurant', 'hotel')
+
+
+def record_hash(data: Dict) -> str:
+    """Content hash of a record body (key order and whitespace independent)"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+
+
+class CityBundleStore:
+    """
+    One directory per city: v<N>.json.gz bundles plus manifest.json with the
+    latest version and the record hashes of the last KEEP_VERSIONS versions
+    (enough to answer deltas without opening old bundles)
+    """
+
+    def __init__(self, bundle_dir: Optional[str] = None, keep_versions: int = KEEP_VERSIONS):
+        self.bundle_dir = os.path.abspath(bundle_dir or BUNDLE_DIR)
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._manifests = {}  # city key -> (mtime, manifest)
+        self.stats = {'bundles_built': 0, 'bundles_unchanged': 0, 'bundles_served': 0,
+                      'deltas_served': 0, 'full_resyncs': 0, 'bytes_served': 0}
+
+    @staticmethod
+    def city_key(city: str) -> str:
+        return normalize_place(city).replace(' ', '_')
+
+    def _city_dir(self, city: str) -> str:
+        return os.path.join(self.bundle_dir, self.city_key(city))
+
+    def bundle_path(self, city: str, version: int) -> str:
+        return os.path.join(self._city_dir(city), f'v{version}.json.gz')
+
+    def manifest(self, city: str) -> Optional[Dict]:
+        """Manifest from disk, re-read only when the file changed"""
+        path = os.path.join(self._city_dir(city), 'manifest.json')
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        key = self.city_key(city)
+        with self._lock:
+            cached = self._manifests.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        with self._lock:
+            self._manifests[key] = (mtime, manifest)
+        return manifest
+
+    def cities(self) -> List[str]:
+        if not os.path.isdir(self.bundle_dir):
+            return []
+        return sorted(name for name in os.listdir(self.bundle_dir)
+                      if os.path.exists(os.path.join(self.bundle_dir, name, 'manifest.json')))
+
+    def save(self, city: str, records: List[Dict]) -> Dict:
+        """
+        Write a new version when any record changed; returns the manifest
+        (records are {'id', 'kind', 'data'}; the hash is added here)
+        """
+        unique = {r['id']: r for r in records}  # e.g. two hotels with the same normalized name
+        records = sorted(({**r, 'hash': record_hash(r['data'])} for r in unique.values()), key=lambda r: r['id'])
+        hashes = {r['id']: r['hash'] for r in records}
+        previous = self.manifest(city)
+        if previous and previous['versions'][str(previous['version'])]['hashes'] == hashes:
+            self.stats['bundles_unchanged'] += 1
+            return previous
+
+        version = previous['version'] + 1 if previous else 1
+        built_at = _utc_now()
+        counts = {kind: 0 for kind in RECORD_KINDS}
+        for r in records:
+            counts[r['kind']] = counts.get(r['kind'], 0) + 1
+
+        city_dir = self._city_dir(city)
+        os.makedirs(city_dir, exist_ok=True)
+        payload = json.dumps({'city': city, 'version': version, 'built_at': built_at, 'records': records},
+                             separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+        path = self.bundle_path(city, version)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(gzip.compress(payload, compresslevel=9))
+        os.replace(path + '.tmp', path)
+
+        versions = dict(previous['versions']) if previous else {}
+        versions[str(version)] = {'built_at': built_at, 'hashes': hashes}
+        for old in sorted(versions, key=int)[:-self.keep_versions]:
+            del versions[old]
+            try:
+                os.remove(self.bundle_path(city, int(old)))
+            except OSError:
+                pass
+
+        manifest = {'city': city, 'version': version, 'built_at': built_at, 'counts': counts,
+                    'size_bytes': os.path.getsize(path), 'raw_bytes': len(payload), 'versions': versions}
+        manifest_path = os.path.join(city_dir, 'manifest.json')
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(manifest_path + '.tmp', manifest_path)
+        self.stats['bundles_built'] += 1
+        return manifest
+
+    def load(self, city: str, version: Optional[int] = None) -> Optional[Dict]:
+        manifest = self.manifest(city)
+        if not manifest:
+            return None
+        with gzip.open(self.bundle_path(city, version or manifest['version']), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def delta(self, city: str, since: Optional[int]) -> Optional[Dict]:
+        """
+        Records added or changed since the client's version and the ids removed;
+        a full record set (full=True) when that version is no longer known
+        """
+        manifest = self.manifest(city)
+        if not manifest:
+            return None
+        version = manifest['version']
+        result = {'city': manifest['city'], 'version': version, 'since': since,
+                  'built_at': manifest['built_at'], 'full': False, 'changed': [], 'removed': []}
+        if since == version:
+            self.stats['deltas_served'] += 1
+            return result
+
+        bundle = self.load(city)
+        old = manifest['versions'].get(str(since)) if since is not None else None
+        if old is None:
+            self.stats['full_resyncs'] += 1
+            result.update(full=True, changed=bundle['records'])
+            return result
+
+        old_hashes = old['hashes']
+        current_ids = {r['id'] for r in bundle['records']}
+        result['changed'] = [r for r in bundle['records'] if old_hashes.get(r['id']) != r['hash']]
+        result['removed'] = sorted(set(old_hashes) - current_ids)
+        self.stats['deltas_served'] += 1
+        return result
+
+    def record_served(self, size: int):
+        self.stats['bundles_served'] += 1
+        self.stats['bytes_served'] += size
+
+    def status(self) -> Dict:
+        """Bundle totals for /api/offline/status"""
+        cities, places, size, last_built = [], 0, 0, None
+        for key in self.cities():
+            manifest = self.manifest(key)
+            if not manifest:
+                continue
+            counts = manifest['counts']
+            cities.append({'city': manifest['city'], 'version': manifest['version'],
+                           'built_at': manifest['built_at'], 'size_bytes': manifest['size_bytes'],
+                           'counts': counts})
+            places += sum(counts.get(kind, 0) for kind in PLACE_KINDS)
+            size += manifest['size_bytes']
+            last_built = max(last_built or manifest['built_at'], manifest['built_at'])
+        return {'cities': cities, 'cached_places': places, 'size_bytes': size, 'last_built': last_built}
+
+    def get_stats(self) -> Dict:
+        status = self.status()
+        return {**self.stats, 'cities': len(status['cities']), 'places': status['cached_places'],
+                'size_bytes': status['size_bytes'], 'last_built': status['last_built']}
+
+
+city_bundles = CityBundleStore()
+
+
+# ---------------------------------------------------------------- builder
+
+class CityBundleBuilder:
+    """Collects a city's records from PostgreSQL and the precomputed itinerary store"""
+
+    def __init__(self, store: CityBundleStore = None, database_url: Optional[str] = None,
+                 itineraries=None, min_attractions: int = 5):
+        self.store = store or city_bundles
+        self.database_url = database_url if database_url is not None else os.getenv('DATABASE_URL')
+        self.itineraries = itineraries or precomputed_itineraries
+        self.min_attractions = min_attractions
+
+    def list_cities(self) -> List[str]:
+        conn = psycopg2.connect(self.database_url)
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT city FROM comprehensive_attractions
+                WHERE city IS NOT NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+                GROUP BY city HAVING COUNT(*) >= %s
+                ORDER BY COUNT(*) DESC
+            """, (self.min_attractions,))
+            cities = [row[0] for row in cur.fetchall()]
+        conn.close()
+        return cities
+
+    @staticmethod
+    def _query(conn, label: str, sql: str, params) -> List[tuple]:
+        """Optional sources (restaurants, hotels, images) may be missing on some deployments"""
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                return cur.fetchall()
+        except psycopg2.Error as e:
+            conn.rollback()
+            logger.warning(f"⚠️ Bundle source {label} skipped: {e}")
+            return []
+
+    @staticmethod
+    def _coord(value) -> Optional[float]:
+        return round(float(value), 6) if value is not None else None
+
+    def collect(self, city: str) -> List[Dict]:
+        conn = psycopg2.connect(self.database_url)
+        records = []
+        try:
+            for row in self._query(conn, 'attractions', """
+                SELECT id, name, category, description, latitude, longitude, image_url, wikidata_id
+                FROM comprehensive_attractions
+                WHERE LOWER(city) = LOWER(%s) AND name IS NOT NULL
+                  AND latitude IS NOT NULL AND longitude IS NOT NULL
+            """, (city,)):
+                id_, name, category, description, lat, lon, image_url, wikidata_id = row
+                records.append({'id': f'attraction:{id_}', 'kind': 'attraction', 'data': {
+                    'name': name, 'category': category, 'description': description,
+                    'latitude': self._coord(lat), 'longitude': self._coord(lon),
+                    'image_url': image_url, 'wikidata_id': wikidata_id}})
+
+            for row in self._query(conn, 'restaurants', """
+                SELECT id, name, cuisine_type, address, latitude, longitude, rating, price_range, image_url
+                FROM restaurants WHERE LOWER(city) = LOWER(%s) AND name IS NOT NULL
+            """, (city,)):
+                id_, name, cuisine, address, lat, lon, rating, price_range, image_url = row
+                records.append({'id': f'restaurant:{id_}', 'kind': 'restaurant', 'data': {
+                    'name': name, 'cuisine_type': cuisine, 'address': address,
+                    'latitude': self._coord(lat), 'longitude': self._coord(lon),
+                    'rating': float(rating) if rating is not None else None,
+                    'price_range': price_range, 'image_url': image_url}})
+
+            for row in self._query(conn, 'hotels', """
+                SELECT hotel_name, MAX(hotel_address), AVG(latitude), AVG(longitude),
+                       MAX(average_score), COUNT(*)
+                FROM hotel_reviews
+                WHERE LOWER(city) = LOWER(%s) AND hotel_name IS NOT NULL
+                GROUP BY hotel_name
+            """, (city,)):
+                name, address, lat, lon, score, reviews = row
+                records.append({'id': f'hotel:{normalize_place(name)}', 'kind': 'hotel', 'data': {
+                    'name': name, 'address': address,
+                    'latitude': self._coord(lat), 'longitude': self._coord(lon),
+                    'average_score': float(score) if score is not None else None, 'review_count': reviews}})
+
+            # Thumbnail metadata only: the images themselves stay behind the image endpoints
+            for row in self._query(conn, 'thumbnails', """
+                SELECT id, attraction_name, thumb_url, width, height, license, creator, attribution
+                FROM attraction_images
+                WHERE LOWER(city) = LOWER(%s) AND thumb_url IS NOT NULL
+            """, (city,)):
+                id_, name, thumb_url, width, height, license_, creator, attribution = row
+                records.append({'id': f'thumbnail:{id_}', 'kind': 'thumbnail', 'data': {
+                    'attraction_name': name, 'thumb_url': thumb_url, 'width': width, 'height': height,
+                    'license': license_, 'creator': creator, 'attribution': attribution}})
+        finally:
+            conn.close()
+
+        return records + self.itinerary_records(city)
+
+    def itinerary_records(self, city: str) -> List[Dict]:
+        index = self.itineraries.city_index(city) or {}
+        return [{'id': f'itinerary:{start}|{end}|{duration}|{profile}', 'kind': 'itinerary', 'data': {
+                    'start_hub': start, 'end_hub': end, 'duration': duration, 'profile': profile,
+                    'itinerary': itinerary}}
+                for (start, end, duration, profile), itinerary in index.get('entries', {}).items()]
+
+    def run(self, cities: Optional[List[str]] = None) -> Dict[str, int]:
+        """Build (or keep) the bundle of every given city; returns the version per city"""
+        built = {}
+        for city in cities or self.list_cities():
+            started = time.time()
+            manifest = self.store.save(city, self.collect(city))
+            built[city] = manifest['version']
+            print(f"📦 {city}: v{manifest['version']} {sum(manifest['counts'].values())} records, "
+                  f"{manifest['size_bytes'] / 1024:.1f} KB in {time.time() - started:.1f}s")
+        return built
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build offline city bundles for the PWA')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build')
+    build.add_argument('--city', action='append', help='City to build (repeatable; default all)')
+    delta = sub.add_parser('delta')
+    delta.add_argument('city')
+    delta.add_argument('since', type=int)
+    sub.add_parser('status')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        result = CityBundleBuilder().run(args.city)
+        print(f"✅ {len(result)} city bundles up to date in {city_bundles.bundle_dir}")
+    elif args.command == 'delta':
+        result = city_bundles.delta(args.city, args.since)
+        if result is None:
+            print(f"❌ No bundle for {args.city}")
+            sys.exit(1)
+        print(f"v{args.since} -> v{result['version']}: {len(result['changed'])} changed, "
+              f"{len(result['removed'])} removed{' (full resync)' if result['full'] else ''}")
+    else:
+        print(json.dumps(city_bundles.status(), indent=2, ensure_ascii=False))
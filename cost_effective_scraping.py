@@ -3,7 +3,8 @@ Sistema di scraping economico per Viamigo
 Combina API gratuite + Scrapingdog come fallback costoso
 """
 import os
-import requests
+from http_client import http
+from overpass_fetcher import OVERPASS_LIVE_CACHE_TTL, overpass
 import json
 from typing import List, Dict, Optional
 
@@ -11,7 +12,6 @@ from typing import List, Dict, Optional
 class CostEffectiveDataProvider:
     def __init__(self):
         # API gratuite prima
-        self.openstreetmap_base = "https://overpass-api.de/api/interpreter"
         self.geoapify_key = os.environ.get(
             "GEOAPIFY_KEY")  # 3000 free credits/day
         self.opentripmap_key = None  # Free tourist attractions
@@ -92,85 +92,67 @@ class CostEffectiveDataProvider:
 
             tag = osm_tags.get(category, 'amenity="restaurant"')
 
-            # Query Overpass CORRETTA per città mondiali
+            # Area Overpass CORRETTA per città mondiali
             if "new york" in city.lower():
                 # Per New York specifico
-                query = f"""
-                [out:json][timeout:15];
-                (
-                  node[{tag}](bbox:40.6,-74.1,40.8,-73.9);
-                  way[{tag}](bbox:40.6,-74.1,40.8,-73.9);
-                );
-                out center;
-                """
+                area = (40.6, -74.1, 40.8, -73.9)
             else:
-                # Query generica con bounding box
-                query = f"""
-                [out:json][timeout:15];
-                area[name="{city}"][admin_level~"^(4|5|6|7|8)$"];
-                (
-                  node[{tag}](area);
-                  way[{tag}](area);
-                );
-                out center;
-                """
-
-            response = requests.post(
-                self.openstreetmap_base,
-                data={'data': query},
-                timeout=15
-            )
-
-            if response.ok:
-                data = response.json()
-                places = []
-
-                for element in data.get('elements', [])[:10]:  # Max 10
-                    lat = element.get('lat') or element.get(
-                        'center', {}).get('lat')
-                    lon = element.get('lon') or element.get(
-                        'center', {}).get('lon')
-
-                    # ✅ FILTRO GEOGRAFICO: Validate coordinates are reasonable
-                    if lat is None or lon is None:
-                        continue
-                    # Basic sanity check for global coordinates
-                    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
-                        continue
-
-                    tags = element.get('tags', {})
-                    name = tags.get('name', 'Unknown')
-
-                    # Filter out garbage data
-                    if 'F-84' in name or 'aircraft' in name.lower() or 'thunderstreak' in name.lower():
-                        continue
-                    if name == 'Unknown' or len(name) < 3:
-                        continue
-
-                    # Descrizione più ricca
-                    description = f"Luogo di interesse a {city}"
-                    if tags.get('cuisine'):
-                        description = f"Cucina {tags['cuisine']} a {city}"
-                    elif tags.get('tourism'):
-                        description = f"Attrazione turistica a {city}"
-                    elif tags.get('amenity'):
-                        description = f"{tags['amenity'].title()} a {city}"
-
-                    place = {
-                        'name': name,
-                        'latitude': lat,
-                        'longitude': lon,
-                        'description': description,
-                        'source': 'openstreetmap_free',
-                        'category': category,
-                        'address': tags.get('addr:street', ''),
-                        'rating': tags.get('stars', 'N/A')
-                    }
-
-                    if place['latitude'] and place['longitude']:
-                        places.append(place)
-
-                return places
+                # Area amministrativa generica
+                area = f'area[name="{city}"][admin_level~"^(4|5|6|7|8)$"]'
+
+            # Fetcher condiviso: cache su disco (al massimo OVERPASS_LIVE_CACHE_TTL) + slot Overpass
+            # (max 5s di attesa nel percorso live)
+            data = overpass.fetch(area, {category: [f'node[{tag}]', f'way[{tag}]']},
+                                  timeout=15, max_wait=5, max_age=OVERPASS_LIVE_CACHE_TTL)
+
+            places = []
+
+            for element in data[category][:10]:  # Max 10
+                lat = element.get('lat') or element.get(
+                    'center', {}).get('lat')
+                lon = element.get('lon') or element.get(
+                    'center', {}).get('lon')
+
+                # ✅ FILTRO GEOGRAFICO: Validate coordinates are reasonable
+                if lat is None or lon is None:
+                    continue
+                # Basic sanity check for global coordinates
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    continue
+
+                tags = element.get('tags', {})
+                name = tags.get('name', 'Unknown')
+
+                # Filter out garbage data
+                if 'F-84' in name or 'aircraft' in name.lower() or 'thunderstreak' in name.lower():
+                    continue
+                if name == 'Unknown' or len(name) < 3:
+                    continue
+
+                # Descrizione più ricca
+                description = f"Luogo di interesse a {city}"
+                if tags.get('cuisine'):
+                    description = f"Cucina {tags['cuisine']} a {city}"
+                elif tags.get('tourism'):
+                    description = f"Attrazione turistica a {city}"
+                elif tags.get('amenity'):
+                    description = f"{tags['amenity'].title()} a {city}"
+
+                place = {
+                    'name': name,
+                    'latitude': lat,
+                    'longitude': lon,
+                    'description': description,
+                    'source': 'openstreetmap_free',
+                    'category': category,
+                    'address': tags.get('addr:street', ''),
+                    'rating': tags.get('stars', 'N/A')
+                }
+
+                if place['latitude'] and place['longitude']:
+                    places.append(place)
+
+            return places
 
         except Exception as e:
             print(f"❌ Errore OSM: {e}")
@@ -208,9 +190,9 @@ class CostEffectiveDataProvider:
                 'apiKey': self.geoapify_key
             }
 
-            response = requests.get(url, params=params, timeout=10)
+            response = http.get(url, params=params, timeout=10)
 
-            if response.ok:
+            if response.is_success:
                 data = response.json()
                 places = []
 
@@ -266,9 +248,9 @@ class CostEffectiveDataProvider:
                 'dynamic': 'false'
             }
 
-            response = requests.get(url, params=params, timeout=15)
+            response = http.get(url, params=params, timeout=15)
 
-            if response.ok:
+            if response.is_success:
                 data = response.json()
                 places = []
 
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Create Batch Image Indexes - Expression indexes used by /api/images/batch
+Builds the (LOWER(city), LOWER(name)) indexes that EnhancedImageService.BATCH_QUERY
+joins on with CREATE INDEX CONCURRENTLY, outside any transaction, so imports
+and the running app keep writing to both tables while they build. An invalid
+index left behind by an interrupted build is dropped and rebuilt.
+
+Usage:
+    python create_batch_image_indexes.py            # uses DATABASE_URL
+"""
+
+import os
+import sys
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BATCH_INDEXES = {
+    'idx_comprehensive_attractions_city_name': 'comprehensive_attractions (LOWER(city), LOWER(name))',
+    'idx_attraction_images_city_name': 'attraction_images (LOWER(city), LOWER(attraction_name))',
+}
+
+
+def create_batch_indexes(conn) -> list:
+    """Build missing (or invalid) batch indexes concurrently; returns the names built"""
+    conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    built = []
+    with conn.cursor() as cur:
+        for name, definition in BATCH_INDEXES.items():
+            cur.execute("""
+                SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s
+            """, (name,))
+            row = cur.fetchone()
+            if row and row[0]:
+                print(f"✓ {name} already exists")
+                continue
+            if row:
+                print(f"⚠️ {name} is invalid (interrupted build), rebuilding")
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            print(f"🔨 Building {name} on {definition}...")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+            built.append(name)
+    return built
+
+
+def main():
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("❌ DATABASE_URL not set")
+        sys.exit(1)
+    conn = psycopg2.connect(database_url)
+    try:
+        built = create_batch_indexes(conn)
+    finally:
+        conn.close()
+    print(f"✅ {len(built)} batch image index(es) built")
+
+
+if __name__ == "__main__":
+    main()
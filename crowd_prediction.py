@@ -6,12 +6,12 @@ Uses AI and patterns to predict busy times at attractions
 
 
 from api_error_handler import resilient_api_call, with_cache, APICache
-from openai import OpenAI
+from llm_response_cache import llm_cache
+from llm_gateway import get_llm_client
 import logging
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import json
-import os
 import dotenv
 dotenv.load_dotenv()
 
@@ -25,7 +25,7 @@ class CrowdPredictor:
     """Predicts crowd levels at tourist attractions"""
 
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        self.openai_client = get_llm_client()
 
         # Historical crowd patterns (general patterns for Italian attractions)
         self.patterns = {
@@ -310,7 +310,9 @@ class CrowdPredictor:
             Be specific and accurate based on real data.
             """
 
-            response = self.openai_client.chat.completions.create(
+            content = llm_cache.chat_completion(
+                self.openai_client, 'crowd_insights',
+                scope={'city': city},
                 model="gpt-4-turbo",
                 messages=[
                     {"role": "system", "content": "You are an expert on tourist crowds and local patterns."},
@@ -320,7 +322,7 @@ class CrowdPredictor:
                 timeout=10
             )
 
-            return json.loads(response.choices[0].message.content)
+            return json.loads(content)
 
         except Exception as e:
             logger.error(f"AI crowd insights error: {e}")
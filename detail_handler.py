@@ -5,6 +5,8 @@ import os
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any
 
+from admission_control import admission, AdmissionRejected
+
 detail_bp = Blueprint('details', __name__)
 
 load_dotenv()
@@ -503,7 +505,9 @@ def get_details():
             user_data = data.get('user_data', {})
 
             print(f"⏱️ Calling Apify handler (this may take 30+ seconds)...")
-            result = handler.get_details(context, user_data)
+            # Bounded Apify slots: when shed, answer with the enhanced fallback below
+            with admission.admit('get_details_apify'):
+                result = handler.get_details(context, user_data)
             print(f"⏱️ Apify took {time.time() - apify_start:.2f}s")
 
             if result and result.get('success'):
@@ -515,6 +519,13 @@ def get_details():
             else:
                 print(f"⚠️ Apify returned empty result, using fallback")
 
+        except AdmissionRejected as e:
+            print(f"🚦 {e}, using enhanced fallback")
+            admission.record_degraded('get_details_apify')
+            response = jsonify({**_enhance_generic_result(context, None), 'degraded': True})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+
         except Exception as e:
             print(f"❌ Apify error: {e}, using enhanced fallback")
 
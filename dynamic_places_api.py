@@ -4,7 +4,7 @@ Utilizza API esterne per ottenere dati autentici in tempo reale
 """
 
 import os
-import requests
+from http_client import http
 import json
 from typing import Dict, List, Optional
 
@@ -58,8 +58,8 @@ class DynamicPlacesAPI:
         }
         
         try:
-            response = requests.get(f"{self.nominatim_base}/search", params=params, timeout=5)
-            if response.ok and response.json():
+            response = http.get(f"{self.nominatim_base}/search", params=params, timeout=5)
+            if response.is_success and response.json():
                 return response.json()[0]
         except:
             pass
@@ -85,8 +85,8 @@ class DynamicPlacesAPI:
             out tags;
             """
             
-            response = requests.post(self.overpass_base, data=overpass_query, timeout=10)
-            if response.ok:
+            response = http.post(self.overpass_base, data=overpass_query, timeout=10)
+            if response.is_success:
                 return response.json()
         except:
             pass
@@ -99,7 +99,8 @@ class DynamicPlacesAPI:
         
         try:
             from openai import OpenAI
-            client = OpenAI(api_key=self.openai_api_key)
+            from llm_gateway import llm_gateway
+            client = llm_gateway.wrap(OpenAI(api_key=self.openai_api_key))
             
             # Prepara il contesto per l'AI
             context = {
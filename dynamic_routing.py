@@ -5,7 +5,8 @@ Genera percorsi reali basati su start/end dell'utente
 
 import os
 import sys
-import requests
+from http_client import http
+from request_deadline import require_stage
 import json
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
@@ -277,14 +278,17 @@ class DynamicRouter:
                 'viewbox': '-180,-90,180,90'  # Worldwide bounding box
             }
 
-            response = requests.get(
+            # Budget della richiesta quasi esaurito: salta l'API e usa i fallback locali
+            geocode_timeout = require_stage('geocoder', 10)
+
+            response = http.get(
                 f"{self.nominatim_base}/search",
                 params=params,
-                timeout=10,
+                timeout=geocode_timeout,
                 headers={'User-Agent': 'Viamigo-Travel-App/1.0'}
             )
 
-            if response.ok and response.json():
+            if response.is_success and response.json():
                 results = response.json()
                 for result in results:
                     lat, lon = float(result['lat']), float(result['lon'])
@@ -480,15 +484,14 @@ class DynamicRouter:
     def _fallback_geocoding(self, city: str) -> List[float]:
         """Fallback geocoding using Nominatim"""
         try:
-            import requests
             url = "https://nominatim.openstreetmap.org/search"
             params = {
                 'q': city,
                 'format': 'json',
                 'limit': 1
             }
-            response = requests.get(url, params=params, timeout=5)
-            if response.ok and response.json():
+            response = http.get(url, params=params, timeout=5)
+            if response.is_success and response.json():
                 result = response.json()[0]
                 return [float(result['lat']), float(result['lon'])]
         except:
@@ -521,14 +524,14 @@ class DynamicRouter:
                 'addressdetails': 1
             }
 
-            response = requests.get(
+            response = http.get(
                 "https://nominatim.openstreetmap.org/search",
                 params=params,
                 timeout=10,
                 headers={'User-Agent': 'Viamigo-Travel-App/1.0'}
             )
 
-            if response.ok and response.json():
+            if response.is_success and response.json():
                 result = response.json()[0]
                 lat = float(result['lat'])
                 lon = float(result['lon'])
@@ -638,7 +641,8 @@ class DynamicRouter:
 
         try:
             from openai import OpenAI
-            client = OpenAI(api_key=self.openai_api_key)
+            from llm_gateway import llm_gateway
+            client = llm_gateway.wrap(OpenAI(api_key=self.openai_api_key))
 
             # Calcola punto medio per riferimento
             mid_lat = (start_coords[0] + end_coords[0]) / 2
@@ -1080,10 +1084,9 @@ class DynamicRouter:
     def _generate_smart_destination_waypoints(self, coords: Tuple[float, float], destination: str, city: str) -> List[Dict]:
         """Genera waypoints intelligenti per una destinazione specifica usando AI + geocoding"""
         try:
-            from openai import OpenAI
-            import os
+            from llm_gateway import get_llm_client
 
-            client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+            client = get_llm_client()
 
             prompt = f"""
             Genera 3-4 waypoints per visitare "{destination}" vicino a {city}, Italia.
@@ -11,8 +11,25 @@ from urllib.parse import urlparse
 from typing import Dict, List, Optional, Tuple
 import logging
 
+from image_variants import WIDTHS, variant_url
+from keyword_classifier import KeywordClassifier
+
 logger = logging.getLogger(__name__)
 
+CITY_ATTRACTIONS = {
+    'Roma': ['Colosseo', 'Fontana di Trevi', 'Pantheon', 'Foro Romano',
+             'Castel Sant Angelo', 'Basilica di San Pietro', 'Musei Vaticani',
+             'Piazza Navona', 'Villa Borghese', 'Trastevere'],
+    'Firenze': ['Duomo di Firenze', 'Ponte Vecchio', 'Galleria degli Uffizi',
+                'Palazzo Pitti', 'Piazza della Signoria', 'Basilica di Santa Croce'],
+    'Venezia': ['Piazza San Marco', 'Basilica di San Marco', 'Ponte di Rialto',
+                'Palazzo Ducale', 'Canal Grande', 'Ponte dei Sospiri'],
+    'Milano': ['Duomo di Milano', 'Teatro alla Scala', 'Castello Sforzesco',
+               'Galleria Vittorio Emanuele II', 'Navigli'],
+    'Napoli': ['Spaccanapoli', 'Castel dell Ovo', 'Quartieri Spagnoli',
+               'Museo Archeologico']
+}
+
 
 class EnhancedImageService:
     """Enhanced image service using comprehensive attractions database"""
@@ -141,6 +158,16 @@ class EnhancedImageService:
             ]
         }
 
+        # Exact match 1.0, keyword in name 0.7, name in keyword 0.5 (names
+        # longer than 3 chars); x1.3 for several matches, x1.2 in the city,
+        # x0.4 elsewhere; confidence = score * 0.6 capped at 0.9 above 0.3
+        self.keyword_classifier = KeywordClassifier(
+            self.attraction_keywords, CITY_ATTRACTIONS,
+            weight=lambda keyword, kind: {'exact': 1.0, 'contains': 0.7, 'within': 0.5}[kind],
+            multi_match_bonus=1.3, in_city=1.2, out_of_city=0.4,
+            confidence=lambda score: min(score * 0.6, 0.9) if score > 0.3 else None,
+            match_within=3)
+
         # City mappings for better recognition
         self.city_mappings = {
             'roma': 'Roma',
@@ -169,8 +196,20 @@ class EnhancedImageService:
             logger.error(f"Database connection error: {e}")
             return None
 
-    def get_best_image_for_attraction(self, city: str, attraction_name: str) -> Optional[Dict]:
-        """Get the best image for an attraction from comprehensive database"""
+    @staticmethod
+    def _sized(image: Dict, width: Optional[int]) -> Dict:
+        """Point url/thumb_url at variants for the caller's display width (originals kept)"""
+        if not width:
+            return image
+        original = image['url']
+        return {**image,
+                'url': variant_url(original, width),
+                'thumb_url': variant_url(image.get('thumb_url') or original, WIDTHS[1]),
+                'original_url': original}
+
+    def get_best_image_for_attraction(self, city: str, attraction_name: str,
+                                      width: Optional[int] = None) -> Optional[Dict]:
+        """Get the best image for an attraction from comprehensive database (sized for width if given)"""
         try:
             with self.get_db_connection() as conn:
                 with conn.cursor() as cur:
@@ -194,7 +233,7 @@ class EnhancedImageService:
 
                     result = cur.fetchone()
                     if result:
-                        return {
+                        return self._sized({
                             # prefer full image, fallback to thumb
                             'url': result[0] or result[1],
                             'thumb_url': result[1],
@@ -204,7 +243,7 @@ class EnhancedImageService:
                             'license': result[5],
                             'source': 'comprehensive_db',
                             'from_commons': result[6]
-                        }
+                        }, width)
 
                     # Fallback to attraction_images with better confidence filtering
                     cur.execute("""
@@ -219,14 +258,14 @@ class EnhancedImageService:
 
                     result = cur.fetchone()
                     if result:
-                        return {
+                        return self._sized({
                             'url': result[0],
                             'confidence': result[1],
                             'attribution': result[2],
                             'license': result[3],
                             'source': 'attraction_images',
                             'from_commons': False
-                        }
+                        }, width)
 
         except Exception as e:
             logger.error(
@@ -234,6 +273,182 @@ class EnhancedImageService:
 
         return None
 
+    def _image_result(self, image_data: Optional[Dict], city: str, attraction_name: str,
+                      fallback_url: str = None, width: Optional[int] = None) -> Dict:
+        """Public image payload: the database image if it has a URL, else a fallback"""
+        if image_data and image_data.get('url'):
+            return {
+                'url': image_data['url'],
+                'thumb_url': image_data.get('thumb_url'),
+                'original_url': image_data.get('original_url', image_data['url']),
+                'confidence': image_data.get('confidence', 0.8),
+                'attribution': image_data.get('attribution'),
+                'license': image_data.get('license'),
+                'source': image_data.get('source'),
+                'from_commons': image_data.get('from_commons', False)
+            }
+
+        # Use provided fallback or generate one
+        fallback = fallback_url or self.get_fallback_image_url(attraction_name, city)
+
+        return {
+            'url': variant_url(fallback, width),
+            'original_url': fallback,
+            'confidence': 0.4,  # Lower confidence for fallbacks
+            'source': 'fallback',
+            'from_commons': False
+        }
+
+    # One statement for a whole batch: request rows come in as parallel arrays,
+    # are classified against comprehensive_attractions with the same priority
+    # as _find_in_database (exact, name, raw_name, description), then get the
+    # image get_best_image_for_attraction would pick; attraction_images is only
+    # searched for rows without a comprehensive_attractions image. Its
+    # (LOWER(city), LOWER(name)) indexes are built by create_batch_image_indexes.py
+    BATCH_QUERY = """
+        WITH req AS (
+            SELECT * FROM unnest(%s::int[], %s::text[], %s::text[], %s::text[])
+                AS r(ord, city, title, fallback)
+        ),
+        matched AS (
+            SELECT DISTINCT ON (r.ord) r.ord, ca.name, ca.confidence_score
+            FROM req r
+            JOIN comprehensive_attractions ca ON LOWER(ca.city) = r.city
+            WHERE LOWER(ca.name) = r.title
+               OR LOWER(ca.name) LIKE '%%' || r.title || '%%'
+               OR LOWER(ca.raw_name) LIKE '%%' || r.title || '%%'
+               OR LOWER(ca.description) LIKE '%%' || r.title || '%%'
+            ORDER BY r.ord,
+                CASE
+                    WHEN LOWER(ca.name) = r.title THEN 0
+                    WHEN LOWER(ca.name) LIKE '%%' || r.title || '%%' THEN 1
+                    WHEN LOWER(ca.raw_name) LIKE '%%' || r.title || '%%' THEN 2
+                    ELSE 3
+                END,
+                ca.confidence_score DESC
+        ),
+        resolved AS (
+            SELECT r.ord, r.city, m.name AS matched_name, m.confidence_score AS matched_confidence,
+                   LOWER(COALESCE(m.name, r.fallback)) AS name
+            FROM req r LEFT JOIN matched m ON m.ord = r.ord
+        )
+        SELECT s.ord, s.matched_name, s.matched_confidence,
+               ci.found, ci.image_url, ci.thumb_url, ci.confidence_score,
+               ci.image_attribution, ci.image_license, ci.source_commons,
+               ai.original_url, ai.confidence_score, ai.attribution, ai.license
+        FROM resolved s
+        LEFT JOIN LATERAL (
+            SELECT true AS found, image_url, thumb_url, confidence_score,
+                   image_attribution, image_license, source_commons
+            FROM comprehensive_attractions ca
+            WHERE LOWER(ca.city) = s.city
+            AND (LOWER(ca.name) LIKE '%%' || s.name || '%%' OR LOWER(ca.raw_name) LIKE '%%' || s.name || '%%')
+            AND ca.has_image = true
+            ORDER BY
+                CASE
+                    WHEN ca.source_commons = true THEN 3
+                    WHEN ca.source_wikidata = true THEN 2
+                    ELSE 1
+                END DESC,
+                ca.confidence_score DESC
+            LIMIT 1
+        ) ci ON true
+        LEFT JOIN LATERAL (
+            SELECT original_url, confidence_score, attribution, license
+            FROM attraction_images ai
+            WHERE ci.found IS NULL
+            AND LOWER(ai.city) = s.city
+            AND LOWER(ai.attraction_name) LIKE '%%' || s.name || '%%'
+            AND ai.confidence_score > 0.6
+            ORDER BY ai.confidence_score DESC, ai.created_at DESC
+            LIMIT 1
+        ) ai ON true
+    """
+
+    def _plan_batch(self, items: List[Dict]) -> Tuple[List[Tuple], Dict[Tuple, Dict]]:
+        """
+        Normalize every item up front (no database): per item its lookup key,
+        and per distinct (city, title) the keyword/generic classification used
+        when the database has no match
+        """
+        keys, lookups = [], {}
+        for item in items:
+            city = self._extract_city_from_context(item.get('context', ''))
+            title_clean = self._normalize_attraction_name(item.get('title', ''))
+            key = (city, title_clean)
+            keys.append(key)
+            if key not in lookups:
+                lookups[key] = {
+                    'ord': len(lookups),
+                    'fallback': (self._classify_by_keywords(title_clean, city)
+                                 or (city, f"{city}_generic", 0.3))
+                }
+        return keys, lookups
+
+    def resolve_batch(self, items: List[Dict], width: Optional[int] = None) -> List[Dict]:
+        """
+        Classify and find images for many {title, context} items with a single
+        query; results come back in request order, in the shape of the
+        per-item classify_attraction_enhanced + get_enhanced_attraction_image
+        """
+        keys, lookups = self._plan_batch(items)
+        rows = {}
+        conn = self.get_db_connection() if lookups else None
+        if conn is not None:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(self.BATCH_QUERY, (
+                        [entry['ord'] for entry in lookups.values()],
+                        [city.lower() for city, _ in lookups],
+                        [title for _, title in lookups],
+                        [entry['fallback'][1] for entry in lookups.values()]
+                    ))
+                    rows = {row[0]: row for row in cur.fetchall()}
+            except Exception as e:
+                logger.error(f"Batch image lookup error: {e}")
+            finally:
+                conn.close()
+
+        results = []
+        for item, key in zip(items, keys):
+            entry = lookups[key]
+            row = rows.get(entry['ord'])
+            city, attraction, confidence = entry['fallback']
+            image_data = None
+
+            if row and row[1]:
+                # Boost DB matches, as _find_in_database does
+                attraction, confidence = row[1], min((row[2] if row[2] else 0.7) + 0.1, 0.95)
+            if row and row[3]:
+                image_data = self._sized({
+                    'url': row[4] or row[5],
+                    'thumb_url': row[5],
+                    'has_image': True,
+                    'confidence': row[6] if row[6] else 0.8,
+                    'attribution': row[7],
+                    'license': row[8],
+                    'source': 'comprehensive_db',
+                    'from_commons': row[9]
+                }, width)
+            elif row and row[10]:
+                image_data = self._sized({
+                    'url': row[10],
+                    'confidence': row[11],
+                    'attribution': row[12],
+                    'license': row[13],
+                    'source': 'attraction_images',
+                    'from_commons': False
+                }, width)
+
+            results.append({
+                'original_title': item.get('title', ''),
+                'classified_attraction': attraction,
+                'city': city,
+                'confidence': confidence,
+                'image': self._image_result(image_data, city, attraction, width=width)
+            })
+        return results
+
     def classify_attraction_from_context(self, title: str, context: str) -> Tuple[str, str, float]:
         """Enhanced attraction classification using context and comprehensive data"""
         # Extract city from context
@@ -348,69 +563,16 @@ class EnhancedImageService:
 
     def _classify_by_keywords(self, attraction_name: str, city: str) -> Optional[Tuple[str, str, float]]:
         """Classify using keyword matching with improved scoring"""
-        best_match = None
-        highest_score = 0.0
-
-        attraction_lower = attraction_name.lower()
-
-        for attraction, keywords in self.attraction_keywords.items():
-            score = 0.0
-            matches = 0
-
-            for keyword in keywords:
-                keyword_lower = keyword.lower()
-
-                # Exact match gets highest score
-                if attraction_lower == keyword_lower:
-                    score += 1.0
-                    matches += 1
-                # Attraction name contains keyword
-                elif keyword_lower in attraction_lower:
-                    score += 0.7
-                    matches += 1
-                # Keyword contains attraction name (for short names)
-                elif attraction_lower in keyword_lower and len(attraction_lower) > 3:
-                    score += 0.5
-                    matches += 1
-
-            # Bonus for multiple matches
-            if matches > 1:
-                score *= 1.3
-
-            # City relevance check
-            if self._attraction_belongs_to_city(attraction, city):
-                score *= 1.2
-            else:
-                score *= 0.4  # Penalty for wrong city
-
-            if score > highest_score:
-                highest_score = score
-                best_match = attraction
-
-        if best_match and highest_score > 0.3:
-            # Convert score to confidence
-            confidence = min(highest_score * 0.6, 0.9)  # Cap at 0.9
-            return city, best_match, confidence
+        candidates = self.keyword_candidates(attraction_name, city)
+        return candidates[0] if candidates else None
 
-        return None
+    def keyword_candidates(self, attraction_name: str, city: str) -> List[Tuple[str, str, float]]:
+        """Every keyword classification above the threshold, best first"""
+        return self.keyword_classifier.candidates(attraction_name.lower(), city)
 
     def _attraction_belongs_to_city(self, attraction: str, city: str) -> bool:
         """Check if attraction belongs to the specified city"""
-        city_attractions = {
-            'Roma': ['Colosseo', 'Fontana di Trevi', 'Pantheon', 'Foro Romano',
-                     'Castel Sant Angelo', 'Basilica di San Pietro', 'Musei Vaticani',
-                     'Piazza Navona', 'Villa Borghese', 'Trastevere'],
-            'Firenze': ['Duomo di Firenze', 'Ponte Vecchio', 'Galleria degli Uffizi',
-                        'Palazzo Pitti', 'Piazza della Signoria', 'Basilica di Santa Croce'],
-            'Venezia': ['Piazza San Marco', 'Basilica di San Marco', 'Ponte di Rialto',
-                        'Palazzo Ducale', 'Canal Grande', 'Ponte dei Sospiri'],
-            'Milano': ['Duomo di Milano', 'Teatro alla Scala', 'Castello Sforzesco',
-                       'Galleria Vittorio Emanuele II', 'Navigli'],
-            'Napoli': ['Spaccanapoli', 'Castel dell Ovo', 'Quartieri Spagnoli',
-                       'Museo Archeologico']
-        }
-
-        return attraction in city_attractions.get(city, [])
+        return self.keyword_classifier.belongs_to_city(attraction, city)
 
     def get_fallback_image_url(self, attraction_name: str, city: str) -> str:
         """Get a high-quality fallback image URL"""
@@ -449,37 +611,20 @@ class EnhancedImageService:
 enhanced_image_service = EnhancedImageService()
 
 
-def get_enhanced_attraction_image(city: str, attraction_name: str, fallback_url: str = None) -> Dict:
+def get_enhanced_attraction_image(city: str, attraction_name: str, fallback_url: str = None,
+                                  width: Optional[int] = None) -> Dict:
     """
     Main function to get enhanced attraction images
-    Returns dict with url, confidence, attribution, etc.
+    Returns dict with url, confidence, attribution, etc.; with width the URLs
+    point at resized variants (original_url keeps the full image)
     """
     try:
         # Get best image from database
         image_data = enhanced_image_service.get_best_image_for_attraction(
-            city, attraction_name)
-
-        if image_data and image_data.get('url'):
-            return {
-                'url': image_data['url'],
-                'thumb_url': image_data.get('thumb_url'),
-                'confidence': image_data.get('confidence', 0.8),
-                'attribution': image_data.get('attribution'),
-                'license': image_data.get('license'),
-                'source': image_data.get('source'),
-                'from_commons': image_data.get('from_commons', False)
-            }
+            city, attraction_name, width)
 
-        # Use provided fallback or generate one
-        fallback = fallback_url or enhanced_image_service.get_fallback_image_url(
-            attraction_name, city)
-
-        return {
-            'url': fallback,
-            'confidence': 0.4,  # Lower confidence for fallbacks
-            'source': 'fallback',
-            'from_commons': False
-        }
+        return enhanced_image_service._image_result(
+            image_data, city, attraction_name, fallback_url, width)
 
     except Exception as e:
         logger.error(f"Error in get_enhanced_attraction_image: {e}")
@@ -496,3 +641,8 @@ def get_enhanced_attraction_image(city: str, attraction_name: str, fallback_url:
 def classify_attraction_enhanced(title: str, context: str) -> Tuple[str, str, float]:
     """Enhanced attraction classification function"""
     return enhanced_image_service.classify_attraction_from_context(title, context)
+
+
+def resolve_batch_images(items: List[Dict], width: Optional[int] = None) -> List[Dict]:
+    """Batch classification + images in one database round-trip"""
+    return enhanced_image_service.resolve_batch(items, width)
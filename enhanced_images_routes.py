@@ -12,30 +12,39 @@ enhanced_images_bp = Blueprint('enhanced_images', __name__)
 
 # Try to import the real service, fallback to mock for testing
 try:
-    from enhanced_image_service import get_enhanced_attraction_image, classify_attraction_enhanced
+    from enhanced_image_service import (get_enhanced_attraction_image, classify_attraction_enhanced,
+                                        resolve_batch_images)
     logger.info("Using real enhanced image service")
 except ImportError:
     try:
-        from mock_enhanced_image_service import get_enhanced_attraction_image, classify_attraction_enhanced
+        from mock_enhanced_image_service import (get_enhanced_attraction_image, classify_attraction_enhanced,
+                                                 resolve_batch_images)
         logger.info("Using mock enhanced image service for testing")
     except ImportError:
         logger.error("No enhanced image service available")
 
-        def get_enhanced_attraction_image(city, attraction, fallback=None):
+        def get_enhanced_attraction_image(city, attraction, fallback=None, width=None):
             return {'url': 'https://images.unsplash.com/photo-1523906921802-b5d2d899e93b?w=400', 'confidence': 0.3}
 
         def classify_attraction_enhanced(title, context):
             return 'Italia', 'Generic', 0.3
 
+        def resolve_batch_images(items, width=None):
+            return [{'original_title': item.get('title', ''), 'classified_attraction': 'Generic',
+                     'city': 'Italia', 'confidence': 0.3,
+                     'image': get_enhanced_attraction_image('Italia', 'Generic', width=width)}
+                    for item in items]
+
 
 @enhanced_images_bp.route('/api/images/enhanced/<city>/<attraction>', methods=['GET'])
 def get_enhanced_image(city, attraction):
     """Get enhanced image for a specific attraction"""
     try:
         fallback_url = request.args.get('fallback')
+        width = request.args.get('w', type=int)  # display width, e.g. 80 for map markers
 
         image_data = get_enhanced_attraction_image(
-            city, attraction, fallback_url)
+            city, attraction, fallback_url, width=width)
 
         return jsonify({
             'success': True,
@@ -90,26 +99,10 @@ def get_batch_images():
     try:
         data = request.get_json()
         attractions = data.get('attractions', [])
+        width = data.get('width')
 
-        results = []
-        for item in attractions:
-            title = item.get('title', '')
-            context = item.get('context', '')
-
-            # Classify attraction
-            city, attraction, confidence = classify_attraction_enhanced(
-                title, context)
-
-            # Get image
-            image_data = get_enhanced_attraction_image(city, attraction)
-
-            results.append({
-                'original_title': title,
-                'classified_attraction': attraction,
-                'city': city,
-                'confidence': confidence,
-                'image': image_data
-            })
+        # Classification and image lookup for the whole batch in one query
+        results = resolve_batch_images(attractions, width)
 
         return jsonify({
             'success': True,
@@ -0,0 +1,613 @@
+"""
+Entity Resolution - Canonical place ids across place sources
+The same monument is stored by several importers: OSM rows and legacy
+city_category blobs (Apify results) in place_cache, comprehensive_attractions
+and attraction_images. Every record is mapped to one place_id in the
+place_entities table (source, source_key) -> place_id, and read paths join
+through it to return each place once. Candidates are blocked by geohash
+cell (and by city + name token for records without coordinates), then
+matched on shared wikidata/OSM ids or on normalized-name similarity within
+a distance. Runs are incremental: a hash of the fields used for matching is
+stored per record, so only new or changed records are resolved
+
+Usage:
+    python entity_resolution.py [--city Bergamo] [--sources place_cache,comprehensive_attractions]
+"""
+
+import os
+import re
+import json
+import math
+import logging
+import argparse
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from content_hash import UNCHANGED, ChangeDetector, content_hash
+from streaming_import import CopyUpsertSink
+
+ENTITY_TABLE = 'place_entities'
+MATCH_DISTANCE_M = float(os.getenv('ENTITY_MATCH_DISTANCE_M', '150'))
+NEAR_DISTANCE_M = float(os.getenv('ENTITY_NEAR_DISTANCE_M', '40'))
+NAME_THRESHOLD = float(os.getenv('ENTITY_NAME_THRESHOLD', '0.85'))
+NEAR_NAME_THRESHOLD = 0.75
+UNLOCATED_NAME_THRESHOLD = float(os.getenv('ENTITY_UNLOCATED_THRESHOLD', '0.92'))
+BATCH_SIZE = int(os.getenv('ENTITY_BATCH_SIZE', '1000'))
+GEOHASH_PRECISION = 8
+BLOCK_PRECISION = 7  # ~150 x 110 m cells; a record is compared with the cells within MATCH_DISTANCE_M
+
+logger = logging.getLogger(__name__)
+
+# Articles and prepositions dropped from names ("Basilica di Santa Maria" ~ "Basilica Santa Maria")
+STOPWORDS = frozenset({
+    'il', 'lo', 'la', 'i', 'gli', 'le', 'l', 'un', 'una', 'di', 'del', 'dello', 'della', 'dei', 'degli',
+    'delle', 'dell', 'd', 'da', 'dal', 'dall', 'dalla', 'in', 'a', 'al', 'alla', 'ai', 'alle', 'e', 'ed', 'con', 'per',
+    'su', 'sul', 'sull', 'sulla', 'nel', 'nell', 'all', 'the', 'of', 'and', 'de',
+})
+# Words too common to block on: every city has dozens of churches and museums
+GENERIC_TOKENS = frozenset({
+    'chiesa', 'basilica', 'cattedrale', 'duomo', 'museo', 'piazza', 'palazzo', 'via', 'villa', 'torre',
+    'ponte', 'porta', 'parco', 'giardino', 'fontana', 'teatro', 'castello', 'galleria', 'monumento',
+    'san', 'santa', 'santo', 'santi', 'ss', 'st', 'ristorante', 'trattoria', 'osteria', 'pizzeria', 'bar',
+    'caffe', 'hotel', 'church', 'museum', 'square', 'palace',
+})
+
+COLUMNS = ('source', 'source_key', 'place_id', 'city', 'name', 'norm_name', 'name_tokens',
+           'latitude', 'longitude', 'geohash', 'block', 'wikidata', 'osm_key', 'record_hash')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {ENTITY_TABLE} (
+    source VARCHAR(40) NOT NULL,
+    source_key TEXT NOT NULL,
+    place_id VARCHAR(64) NOT NULL,
+    city VARCHAR(100),
+    name TEXT,
+    norm_name TEXT,
+    name_tokens TEXT,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    geohash VARCHAR(12),
+    block VARCHAR(12),
+    wikidata VARCHAR(50),
+    osm_key VARCHAR(40),
+    record_hash VARCHAR(32),
+    resolved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, source_key)
+);
+CREATE INDEX IF NOT EXISTS idx_place_entities_place_id ON {ENTITY_TABLE} (place_id);
+CREATE INDEX IF NOT EXISTS idx_place_entities_block ON {ENTITY_TABLE} (block);
+CREATE INDEX IF NOT EXISTS idx_place_entities_wikidata ON {ENTITY_TABLE} (wikidata) WHERE wikidata IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_place_entities_osm_key ON {ENTITY_TABLE} (osm_key) WHERE osm_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_place_entities_tokens ON {ENTITY_TABLE} USING GIN (string_to_array(name_tokens, ' '));
+"""
+
+WIKIDATA = re.compile(r'^Q\d+$')
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def strip_accents(text: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def normalize_city(city: Optional[str]) -> str:
+    return ' '.join(strip_accents(city or '').lower().split())
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Lowercase ASCII words without punctuation and stopwords ('Caffè dell'Arte' -> 'caffe arte')"""
+    words = re.sub(r'[^a-z0-9]+', ' ', strip_accents(name or '').lower()).split()
+    return ' '.join(w for w in words if w not in STOPWORDS) or ' '.join(words)
+
+
+def name_tokens(norm_name: str) -> List[str]:
+    """Distinctive words of a normalized name, used as blocking keys"""
+    return sorted({w for w in norm_name.split() if len(w) > 2 and w not in GENERIC_TOKENS})
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Best of character similarity and word overlap of two normalized names"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    words_a, words_b = set(a.split()), set(b.split())
+    overlap = len(words_a & words_b) / len(words_a | words_b)
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    if matcher.real_quick_ratio() <= overlap or matcher.quick_ratio() <= overlap:
+        return overlap  # upper bounds of ratio() that cannot beat the word overlap
+    return max(overlap, matcher.ratio())
+
+
+def name_contained(a: str, b: str) -> bool:
+    words_a, words_b = set(a.split()), set(b.split())
+    return bool(words_a and words_b) and (words_a <= words_b or words_b <= words_a)
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    cell, bits, bit, even = [], 0, 0, True
+    while len(cell) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            rng[0] = mid
+        else:
+            bits *= 2
+            rng[1] = mid
+        even, bit = not even, bit + 1
+        if bit == 5:
+            cell.append(_BASE32[bits])
+            bits, bit = 0, 0
+    return ''.join(cell)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(lat, lon) degrees spanned by a cell"""
+    lon_bits = (5 * precision + 1) // 2
+    return 180.0 / 2 ** (5 * precision - lon_bits), 360.0 / 2 ** lon_bits
+
+
+def geohash_neighbors(lat: float, lon: float, precision: int = BLOCK_PRECISION,
+                      radius_m: float = MATCH_DISTANCE_M) -> List[str]:
+    """The cell of (lat, lon) and the cells around it, enough of them to cover radius_m in every direction"""
+    dlat, dlon = geohash_cell_size(precision)
+    rows = math.ceil(radius_m / (dlat * 111320))
+    columns = math.ceil(radius_m / (dlon * 111320 * max(0.01, math.cos(math.radians(lat)))))
+    return sorted({geohash_encode(max(-90.0, min(90.0, lat + i * dlat)), (lon + j * dlon + 180) % 360 - 180,
+                                  precision)
+                   for i in range(-rows, rows + 1) for j in range(-columns, columns + 1)})
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Haversine distance in meters"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * 6371000 * math.asin(min(1.0, math.sqrt(h)))
+
+
+def _number(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def place_coordinates(place: Dict) -> Tuple[Optional[float], Optional[float]]:
+    """(lat, lon) from any of the place_data layouts in use, or (None, None)"""
+    candidates = [place, place.get('location'), place.get('center'), place.get('coords'),
+                  (place.get('geometry') or {}).get('location') if isinstance(place.get('geometry'), dict) else None]
+    for where in candidates:
+        if isinstance(where, dict):
+            lat = _number(where.get('lat', where.get('latitude')))
+            lon = _number(where.get('lng', where.get('lon', where.get('longitude'))))
+            if lat is not None and lon is not None:
+                break
+    else:
+        coordinates = place.get('coordinates')
+        if isinstance(coordinates, (list, tuple)) and len(coordinates) == 2:
+            lat, lon = _number(coordinates[0]), _number(coordinates[1])
+        else:
+            lat = lon = None
+    if lat is None or lon is None or (lat == 0 and lon == 0) or abs(lat) > 90 or abs(lon) > 180:
+        return None, None
+    return lat, lon
+
+
+def osm_key(osm_type, osm_id) -> Optional[str]:
+    if not osm_id or not osm_type:
+        return None
+    return f"{str(osm_type).lower()}/{osm_id}"
+
+
+def wikidata_id(value) -> Optional[str]:
+    value = str(value or '').strip().rsplit('/', 1)[-1]
+    return value if WIKIDATA.match(value) else None
+
+
+def make_record(source: str, source_key: str, city: Optional[str], name: Optional[str],
+                lat=None, lon=None, wikidata=None, osm=None) -> Optional[Dict]:
+    """Entity record of one source row, or None when it has no name"""
+    norm = normalize_name(name)
+    if not norm:
+        return None
+    city_words = set(normalize_name(city).split())
+    norm = ' '.join(w for w in norm.split() if w not in city_words) or norm  # 'Rocca di Bergamo' ~ 'Rocca'
+    lat, lon = _number(lat), _number(lon)
+    located = lat is not None and lon is not None and not (lat == 0 and lon == 0)
+    cell = geohash_encode(lat, lon) if located else None
+    record = {
+        'source': source, 'source_key': source_key, 'place_id': None, 'city': normalize_city(city),
+        'name': name.strip(), 'norm_name': norm, 'name_tokens': ' '.join(name_tokens(norm)),
+        'latitude': lat if located else None, 'longitude': lon if located else None,
+        'geohash': cell, 'block': cell[:BLOCK_PRECISION] if cell else None,
+        'wikidata': wikidata_id(wikidata), 'osm_key': osm,
+    }
+    record['record_hash'] = content_hash([record[c] for c in COLUMNS[3:13]])
+    return record
+
+
+def place_record(source: str, source_key: str, city: Optional[str], place: Dict,
+                 fallback_name: Optional[str] = None) -> Optional[Dict]:
+    lat, lon = place_coordinates(place)
+    tags = place.get('tags') if isinstance(place.get('tags'), dict) else {}
+    return make_record(source, source_key, city, place.get('name') or place.get('title') or fallback_name,
+                       lat, lon, place.get('wikidata') or tags.get('wikidata'),
+                       osm_key(place.get('osm_type'), place.get('osm_id')))
+
+
+def _place_cache_records(row) -> List[Dict]:
+    """An OSM row is one place; a legacy city_category blob holds a list (keyed cache_key#name)"""
+    cache_key, city, place_name, place_data = row
+    try:
+        data = json.loads(place_data) if isinstance(place_data, str) else place_data
+    except ValueError:
+        return []
+    if isinstance(data, dict):
+        record = place_record('place_cache', cache_key, city, data, place_name)
+        return [record] if record else []
+    records = []
+    for place in data if isinstance(data, list) else []:
+        if isinstance(place, dict):
+            norm = normalize_name(place.get('name') or place.get('title'))
+            record = place_record('place_cache', f"{cache_key}#{norm}", city, place) if norm else None
+            if record:
+                records.append(record)
+    return records
+
+
+def _attraction_records(row) -> List[Dict]:
+    key, city, name, lat, lon, osm_type, osm_id, wikidata = row
+    record = make_record('comprehensive_attractions', str(key), city, name, lat, lon, wikidata,
+                         osm_key(osm_type or 'node', osm_id))
+    return [record] if record else []
+
+
+def _image_records(row) -> List[Dict]:
+    key, city, name, qid = row
+    record = make_record('attraction_images', str(key), city, name, wikidata=qid)
+    return [record] if record else []
+
+
+# source -> (key column, first key, SELECT with {where}, rows -> records); key and city come first
+SOURCES = {
+    'place_cache': ('cache_key', '',
+                    "SELECT cache_key, city, place_name, place_data::text FROM place_cache {where}",
+                    _place_cache_records),
+    'comprehensive_attractions': ('id', 0,
+                                  "SELECT id, city, name, latitude, longitude, osm_type, osm_id, wikidata_id "
+                                  "FROM comprehensive_attractions {where}",
+                                  _attraction_records),
+    'attraction_images': ('id', 0,
+                          "SELECT id, city, attraction_name, attraction_qid FROM attraction_images {where}",
+                          _image_records),
+}
+
+
+def same_place(a: Dict, b: Dict) -> bool:
+    """Shared wikidata/OSM id, or similar names close enough (same city when a side has no coordinates)"""
+    if a['wikidata'] and b['wikidata']:
+        return a['wikidata'] == b['wikidata']  # two different items are never one place
+    if a['osm_key'] and a['osm_key'] == b['osm_key']:
+        return True
+    if a['latitude'] is not None and b['latitude'] is not None:
+        distance = distance_m(a['latitude'], a['longitude'], b['latitude'], b['longitude'])
+        if distance > MATCH_DISTANCE_M:  # most pairs of a block: ruled out before comparing names
+            return False
+        if distance <= NEAR_DISTANCE_M and name_contained(a['norm_name'], b['norm_name']):
+            return True
+        threshold = NEAR_NAME_THRESHOLD if distance <= NEAR_DISTANCE_M else NAME_THRESHOLD
+    elif a['city'] != b['city']:
+        return False
+    else:
+        threshold = UNLOCATED_NAME_THRESHOLD
+    return name_similarity(a['norm_name'], b['norm_name']) >= threshold
+
+
+def _id_rank(place_id: str) -> Tuple[int, str]:
+    """wd: ids beat osm: ids, which beat pl: hashes"""
+    prefix = place_id.split(':', 1)[0]
+    return ('wd', 'osm', 'pl').index(prefix) if prefix in ('wd', 'osm', 'pl') else 3, place_id
+
+
+def canonical_id(records: Sequence[Dict]) -> str:
+    """wd:Q... when a record carries a wikidata id, else osm:type/id, else a hash of the first record key"""
+    wikidata = sorted(r['wikidata'] for r in records if r['wikidata'])
+    if wikidata:
+        return f"wd:{wikidata[0]}"
+    osm = sorted(r['osm_key'] for r in records if r['osm_key'])
+    if osm:
+        return f"osm:{osm[0]}"
+    first = min((r['source'], r['source_key']) for r in records)
+    return f"pl:{content_hash(first)[:16]}"
+
+
+def _wikidata_ids(node: Dict) -> set:
+    """Wikidata ids of a record or stored entity: its own and the one its place_id is named after"""
+    ids = {node['wikidata']} if node['wikidata'] else set()
+    if (node['place_id'] or '').startswith('wd:'):
+        ids.add(node['place_id'][3:])
+    return ids
+
+
+class _UnionFind:
+    """Clusters carry the wikidata ids of their members; two clusters with different ids are never merged"""
+
+    def __init__(self, wikidata: Sequence[set]):
+        self.parent = list(range(len(wikidata)))
+        self.wikidata = [set(ids) for ids in wikidata]
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int, force: bool = False) -> bool:
+        a, b = self.find(i), self.find(j)
+        if a == b:
+            return True
+        if not force and self.wikidata[a] and self.wikidata[b] and self.wikidata[a].isdisjoint(self.wikidata[b]):
+            return False  # the record would bridge two wikidata items
+        self.parent[a] = b
+        self.wikidata[b] |= self.wikidata[a]
+        return True
+
+
+class EntityResolver:
+    """
+    Resolves source records into place_entities batch by batch: the new or
+    changed records of a batch (ChangeDetector on their match hash) are
+    compared with each other and with the stored entities of their blocks,
+    fetched in one query; matching clusters keep an existing place_id
+    (merging two clusters renames the weaker id everywhere in one UPDATE;
+    clusters of two different wikidata items are never merged),
+    new clusters get a canonical one, and the batch is upserted through the
+    COPY sink
+    """
+
+    def __init__(self, conn, batch_size: int = BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.stats = {'read': 0, 'unchanged': 0, 'resolved': 0, 'linked': 0, 'new_places': 0, 'merged': 0}
+
+    def ensure_table(self):
+        with self.conn.cursor() as cur:
+            cur.execute(SCHEMA)
+        self.conn.commit()
+
+    def records(self, source: str, cities: Optional[Sequence[str]] = None) -> Iterator[List[Dict]]:
+        """Pages of a source's records, by keyset pagination (commits between pages are safe)"""
+        key_column, last, select, to_records = SOURCES[source]
+        where = f"WHERE {key_column} > %s" + (" AND LOWER(city) = ANY(%s)" if cities else '')
+        sql = select.format(where=where) + f" ORDER BY {key_column} LIMIT %s"
+        while True:
+            params = (last,) + ((list(c.lower() for c in cities),) if cities else ()) + (self.batch_size,)
+            with self.conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            if not rows:
+                return
+            page = [record for row in rows for record in to_records(row)]
+            self.stats['read'] += len(page)
+            yield page
+            if len(rows) < self.batch_size:
+                return
+            last = rows[-1][0]
+
+    def run(self, sources: Optional[Sequence[str]] = None, cities: Optional[Sequence[str]] = None) -> Dict:
+        self.ensure_table()
+        changes = ChangeDetector(self.conn, ENTITY_TABLE, key=('source', 'source_key'),
+                                 hash_column='record_hash', batch_size=self.batch_size)
+        with CopyUpsertSink(self.conn, ENTITY_TABLE, COLUMNS, key=('source', 'source_key'),
+                            update_values={'resolved_at': 'NOW()'}, batch_size=self.batch_size) as sink:
+            for source in sources or SOURCES:
+                for page in self.records(source, cities):
+                    unique = list({(r['source'], r['source_key']): r for r in page}.values())
+                    statuses = changes.classify([((r['source'], r['source_key']), r['record_hash'])
+                                                 for r in unique])
+                    pending = [r for r, status in zip(unique, statuses) if status != UNCHANGED]
+                    self.stats['unchanged'] += len(unique) - len(pending)
+                    if pending:
+                        sink.write([tuple(r[c] for c in COLUMNS) for r in self.resolve(pending)])
+        return self.stats
+
+    def candidates(self, records: Sequence[Dict], cells: Sequence[List[str]]) -> List[Dict]:
+        """Stored entities sharing a block, id or (city, name token) with the records, and their own rows"""
+        blocks = sorted({cell for near in cells for cell in near})
+        tokens = sorted({t for r in records for t in r['name_tokens'].split()})
+        with self.conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT {', '.join(COLUMNS)} FROM {ENTITY_TABLE}
+                WHERE block = ANY(%s) OR wikidata = ANY(%s) OR osm_key = ANY(%s)
+                   OR (string_to_array(name_tokens, ' ') && %s::text[] AND city = ANY(%s))
+                   OR (source, source_key) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+            """, (blocks, sorted({r['wikidata'] for r in records if r['wikidata']}),
+                  sorted({r['osm_key'] for r in records if r['osm_key']}), tokens,
+                  sorted({r['city'] for r in records}),
+                  [r['source'] for r in records], [r['source_key'] for r in records]))
+            return [dict(zip(COLUMNS, row)) for row in cur.fetchall()]
+
+    def resolve(self, records: List[Dict]) -> List[Dict]:
+        """Assign place_ids to the records (in place), merging stored clusters they bridge"""
+        pending = {(r['source'], r['source_key']) for r in records}
+        cells = [geohash_neighbors(r['latitude'], r['longitude']) if r['latitude'] is not None else []
+                 for r in records]
+        stored = [e for e in self.candidates(records, cells) if (e['source'], e['source_key']) not in pending]
+        nodes = records + stored
+        clusters = _UnionFind([_wikidata_ids(node) for node in nodes])
+
+        by_block, by_token, by_id, by_place = {}, {}, {}, {}
+        for i, node in enumerate(nodes):
+            if node['block']:
+                by_block.setdefault(node['block'], []).append(i)
+            for token in node['name_tokens'].split():
+                by_token.setdefault((node['city'], token), []).append(i)
+            for identifier in (node['wikidata'], node['osm_key']):
+                if identifier:
+                    by_id.setdefault(identifier, []).append(i)
+            if i >= len(records):
+                by_place.setdefault(node['place_id'], []).append(i)
+        for members in by_place.values():  # stored clusters stay whole
+            for i in members[1:]:
+                clusters.union(i, members[0], force=True)
+
+        for i, record in enumerate(records):
+            near = set()
+            for cell in cells[i]:
+                near.update(by_block.get(cell, ()))
+            for token in record['name_tokens'].split():
+                near.update(by_token.get((record['city'], token), ()))
+            for identifier in (record['wikidata'], record['osm_key']):
+                near.update(by_id.get(identifier, ()) if identifier else ())
+            for j in near:
+                if j != i and clusters.find(i) != clusters.find(j) and same_place(record, nodes[j]):
+                    clusters.union(i, j)
+
+        groups = {}
+        for i in range(len(nodes)):
+            groups.setdefault(clusters.find(i), []).append(i)
+        renames = {}
+        for members in groups.values():
+            new = [nodes[i] for i in members if i < len(records)]
+            if not new:
+                continue
+            existing = sorted({nodes[i]['place_id'] for i in members if i >= len(records)}, key=_id_rank)
+            place_id = canonical_id([nodes[i] for i in members])
+            if existing and _id_rank(place_id)[0] >= _id_rank(existing[0])[0]:
+                place_id = existing[0]  # keep the stored id unless the cluster gained a stronger one
+            for loser in existing:
+                if loser != place_id:
+                    renames[loser] = place_id
+            self.stats['merged'] += max(0, len(existing) - 1)
+            if existing:
+                self.stats['linked'] += len(new)
+            else:
+                self.stats['new_places'] += 1
+                self.stats['linked'] += len(new) if len(new) > 1 else 0
+            for record in new:
+                record['place_id'] = place_id
+
+        if renames:
+            with self.conn.cursor() as cur:
+                cur.execute(f"""
+                    UPDATE {ENTITY_TABLE} e SET place_id = m.winner, resolved_at = NOW()
+                    FROM unnest(%s::text[], %s::text[]) AS m(loser, winner)
+                    WHERE e.place_id = m.loser
+                """, (list(renames), list(renames.values())))
+        self.stats['resolved'] += len(records)
+        return records
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['read']:,} records: {s['unchanged']:,} unchanged, {s['resolved']:,} resolved "
+                f"({s['linked']:,} linked to other records, {s['new_places']:,} new places, "
+                f"{s['merged']:,} places merged)")
+
+
+def resolve_entities(conn, sources: Optional[Sequence[str]] = None,
+                     cities: Optional[Sequence[str]] = None) -> Optional[Dict]:
+    """Incremental resolution to run after an import; failures are reported, never raised"""
+    resolver = EntityResolver(conn)
+    try:
+        resolver.run(sources, cities)
+    except Exception as e:
+        conn.rollback()
+        print(f"⚠️ Entity resolution skipped: {e}")
+        return None
+    print(f"🧩 Entity resolution: {resolver.summary()}")
+    return resolver.stats
+
+
+# Read-path helpers -------------------------------------------------------
+
+_entities_ready = False
+
+
+def entities_ready(cur) -> bool:
+    """Whether place_entities exists (a positive answer is remembered)"""
+    global _entities_ready
+    if not _entities_ready:
+        cur.execute(f"SELECT to_regclass('{ENTITY_TABLE}') IS NOT NULL")
+        row = cur.fetchone()
+        _entities_ready = bool(row and row[0])
+    return _entities_ready
+
+
+def place_identifiers(place: Dict, city: Optional[str] = None) -> List[Tuple[str, str]]:
+    """(kind, value) pairs a read-path place dict can be resolved by, strongest first"""
+    identifiers = []
+    if place.get('cache_key'):
+        identifiers.append(('key', f"place_cache {place['cache_key']}"))
+    city_key = (city or place.get('city') or '').lower()
+    if place.get('osm_id') and city_key:
+        identifiers.append(('key', f"place_cache osm:{city_key}:{place['osm_id']}"))
+    if place.get('category_match') and city_key:
+        norm = normalize_name(place.get('name'))
+        identifiers.append(('key', f"place_cache {city_key}_{place['category_match']}#{norm}"))
+    if osm_key(place.get('osm_type'), place.get('osm_id')):
+        identifiers.append(('osm', osm_key(place['osm_type'], place['osm_id'])))
+    wikidata = wikidata_id(place.get('wikidata') or place.get('wikidata_id'))
+    if wikidata:
+        identifiers.append(('wd', wikidata))
+    return identifiers
+
+
+def _columns(rows: Sequence[Tuple], width: int) -> List[list]:
+    return [list(column) for column in zip(*rows)] if rows else [[] for _ in range(width)]
+
+
+def lookup_place_ids(cur, places: Sequence[Dict], city: Optional[str] = None) -> List[Optional[str]]:
+    """place_id of every place (None when unresolved), in one query"""
+    found: List[Optional[str]] = [place.get('place_id') for place in places]
+    wanted = [(i, rank, kind, value) for i, place in enumerate(places) if not found[i]
+              for rank, (kind, value) in enumerate(place_identifiers(place, city))]
+    if not wanted or not entities_ready(cur):
+        return found
+    keys = [(i, rank, *value.split(' ', 1)) for i, rank, kind, value in wanted if kind == 'key']
+    osm = [(i, rank, value) for i, rank, kind, value in wanted if kind == 'osm']
+    wikidata = [(i, rank, value) for i, rank, kind, value in wanted if kind == 'wd']
+    cur.execute(f"""
+        SELECT x.i, x.rank, e.place_id FROM unnest(%s::int[], %s::int[], %s::text[], %s::text[])
+            AS x(i, rank, source, source_key)
+        JOIN {ENTITY_TABLE} e ON e.source = x.source AND e.source_key = x.source_key
+        UNION ALL
+        SELECT x.i, x.rank, e.place_id FROM unnest(%s::int[], %s::int[], %s::text[]) AS x(i, rank, v)
+        JOIN {ENTITY_TABLE} e ON e.osm_key = x.v
+        UNION ALL
+        SELECT x.i, x.rank, e.place_id FROM unnest(%s::int[], %s::int[], %s::text[]) AS x(i, rank, v)
+        JOIN {ENTITY_TABLE} e ON e.wikidata = x.v
+    """, _columns(keys, 4) + _columns(osm, 3) + _columns(wikidata, 3))
+    best = {}
+    for i, rank, place_id in cur.fetchall():
+        if i not in best or rank < best[i][0]:
+            best[i] = (rank, place_id)
+    for i, (_, place_id) in best.items():
+        found[i] = place_id
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--city', action='append', help='Only resolve records of this city (repeatable)')
+    parser.add_argument('--sources', default=','.join(SOURCES), help='Comma-separated sources')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    import psycopg2
+    from dotenv import load_dotenv
+    load_dotenv()
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+    try:
+        resolver = EntityResolver(conn, args.batch_size)
+        resolver.run([s.strip() for s in args.sources.split(',') if s.strip()], args.city)
+        print(f"🧩 {resolver.summary()}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -336,6 +336,18 @@ except ImportError as e:
 
         logging.info("✅ Enhanced images fallback route registered")
 
+# Incremental place_cache/comprehensive_attractions -> ChromaDB sync
+if os.getenv('VECTOR_SYNC_ENABLED', 'false').lower() == 'true':
+    try:
+        from vector_index_sync import vector_index_sync
+        vector_index_sync.start_background_sync(
+            interval=int(os.getenv('VECTOR_SYNC_INTERVAL', '30')))
+    except Exception as e:
+        logging.warning(f"❌ Vector index sync not started: {e}")
+
+# Durable task queue workers (admin batch population, proactive scraping) run in
+# their own process, `python task_queue.py work`, never inside web workers
+
 # Root route is defined in routes.py (with authentication logic)
 # Don't define it here to avoid endpoint collision
 
@@ -0,0 +1,383 @@
+"""
+HTTP Client - Shared pooled outbound HTTP layer for Viamigo
+One httpx connection pool (keep-alive, HTTP/2 when the h2 package is
+installed) behind sync and async façades, with per-host concurrency limits,
+a uniform timeout/retry policy and latency histograms per upstream host
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import weakref
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from dotenv import load_dotenv
+
+from request_deadline import current_deadline
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401 - enables httpx HTTP/2 support
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Re-exported so callers do not need to import httpx for error handling
+Timeout = httpx.TimeoutException
+HTTPError = httpx.HTTPError
+
+DEFAULT_TIMEOUT = float(os.getenv('HTTP_DEFAULT_TIMEOUT', '10'))
+DEFAULT_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+DEFAULT_HOST_LIMIT = int(os.getenv('HTTP_PER_HOST_LIMIT', '10'))
+
+# Public services with strict usage policies get fewer parallel connections
+DEFAULT_HOST_LIMITS = 'nominatim.openstreetmap.org=1,overpass-api.de=2,commons.wikimedia.org=4'
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+USER_AGENT = 'Viamigo-Travel-App/1.0 (+https://viamigo.app)'
+
+
+def parse_host_limits(spec: str) -> Dict[str, int]:
+    """'overpass-api.de=2,nominatim.openstreetmap.org=1' -> {host: limit}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        host, limit = item.split('=')
+        limits[host.strip()] = int(limit)
+    return limits
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class LatencyHistogram:
+    """Per-upstream latency buckets, recent samples for percentiles, status and error counts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+        self._samples = defaultdict(lambda: deque(maxlen=500))
+        self._counters = defaultdict(lambda: {'requests': 0, 'errors': 0, 'retries': 0, 'statuses': defaultdict(int)})
+
+    def record(self, host: str, elapsed_ms: float, status: Optional[int] = None):
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if elapsed_ms <= bound),
+                     len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            self._buckets[host][index] += 1
+            self._samples[host].append(elapsed_ms)
+            counters = self._counters[host]
+            counters['requests'] += 1
+            if status is None:
+                counters['errors'] += 1
+            else:
+                counters['statuses'][status] += 1
+
+    def record_retry(self, host: str):
+        with self._lock:
+            self._counters[host]['retries'] += 1
+
+    def get_stats(self) -> Dict:
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            stats = {}
+            for host, counters in self._counters.items():
+                samples = list(self._samples[host])
+                stats[host] = {
+                    'requests': counters['requests'],
+                    'errors': counters['errors'],
+                    'retries': counters['retries'],
+                    'statuses': dict(counters['statuses']),
+                    'latency_ms_p50': round(_percentile(samples, 0.5), 1),
+                    'latency_ms_p95': round(_percentile(samples, 0.95), 1),
+                    'latency_ms_p99': round(_percentile(samples, 0.99), 1),
+                    'histogram': dict(zip(labels, self._buckets[host])),
+                }
+            return stats
+
+
+class HTTPClient:
+    """
+    Process-wide outbound HTTP client
+
+    The sync façade shares one thread-safe httpx.Client; the async façade
+    keeps one httpx.AsyncClient per event loop. Both go through the same
+    per-host concurrency limits, retry policy and latency histograms.
+    Idempotent requests (GET/HEAD) are retried on transport errors and
+    429/502/503/504 with exponential backoff, honoring Retry-After; other
+    methods are only retried when the caller passes retries explicitly.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, retries: Optional[int] = None,
+                 max_connections: Optional[int] = None, max_keepalive: Optional[int] = None,
+                 host_limits: Optional[str] = None, default_host_limit: Optional[int] = None,
+                 http2: Optional[bool] = None):
+        self.timeout = timeout or DEFAULT_TIMEOUT
+        self.retries = DEFAULT_RETRIES if retries is None else retries
+        self.http2 = HTTP2_AVAILABLE if http2 is None else http2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv('HTTP_MAX_CONNECTIONS', '100')),
+            max_keepalive_connections=max_keepalive or int(os.getenv('HTTP_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30')))
+        self.host_limits = parse_host_limits(
+            host_limits if host_limits is not None else os.getenv('HTTP_HOST_LIMITS', DEFAULT_HOST_LIMITS))
+        self.default_host_limit = default_host_limit or DEFAULT_HOST_LIMIT
+        self.metrics = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._sync_client: Optional[httpx.Client] = None
+        self._host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._async_state = weakref.WeakKeyDictionary()  # event loop -> (AsyncClient, {host: Semaphore})
+
+    # ---------------------------------------------------------------- plumbing
+
+    def _client_kwargs(self) -> Dict:
+        return {'http2': self.http2, 'limits': self.limits, 'follow_redirects': True,
+                'timeout': httpx.Timeout(self.timeout), 'headers': {'User-Agent': USER_AGENT}}
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(**self._client_kwargs())
+            return self._sync_client
+
+    def _host_limit(self, host: str) -> int:
+        return self.host_limits.get(host, self.default_host_limit)
+
+    def _sync_semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self._host_limit(host))
+            return self._host_semaphores[host]
+
+    def _async_client_and_semaphore(self, host: str):
+        loop = asyncio.get_running_loop()
+        state = self._async_state.get(loop)
+        if state is None:
+            state = (httpx.AsyncClient(**self._client_kwargs()), {})
+            self._async_state[loop] = state
+        client, semaphores = state
+        if host not in semaphores:
+            semaphores[host] = asyncio.Semaphore(self._host_limit(host))
+        return client, semaphores[host]
+
+    @staticmethod
+    def _prepare(kwargs: Dict) -> Dict:
+        """Accept requests-style arguments (raw string bodies as data=)"""
+        data = kwargs.get('data')
+        if isinstance(data, (str, bytes)):
+            kwargs['content'] = kwargs.pop('data')
+        return kwargs
+
+    def _attempts(self, method: str, retries: Optional[int]) -> int:
+        if retries is not None:
+            return retries + 1
+        return self.retries + 1 if method.upper() in IDEMPOTENT_METHODS else 1
+
+    @staticmethod
+    def _backoff(attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return min(0.5 * 2 ** attempt, 8.0) * random.uniform(0.8, 1.2)
+
+    def _fit_deadline(self, host: str, kwargs: Dict):
+        """Cap the attempt timeout by the request deadline (if any); raises Timeout when it has passed"""
+        deadline = current_deadline()
+        if deadline is None:
+            return
+        remaining = deadline.remaining()
+        if remaining <= 0.05:
+            raise Timeout(f"Request deadline exceeded before calling {host}")
+        timeout = kwargs.get('timeout')
+        if timeout is None or isinstance(timeout, (int, float)):
+            kwargs['timeout'] = min(timeout or self.timeout, remaining)
+
+    @staticmethod
+    def _retry_fits(delay: float) -> bool:
+        deadline = current_deadline()
+        return deadline is None or deadline.remaining() > delay + 0.05
+
+    # ---------------------------------------------------------------- sync façade
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Sync request through the shared pool; kwargs as httpx (params, json, data, headers, timeout)"""
+        host = urlsplit(url).hostname or ''
+        kwargs = self._prepare(kwargs)
+        attempts = self._attempts(method, retries)
+        for attempt in range(attempts):
+            response = None
+            self._fit_deadline(host, kwargs)
+            started = time.perf_counter()
+            try:
+                with self._sync_semaphore(host):
+                    response = self.sync_client.request(method, url, **kwargs)
+                self.metrics.record(host, (time.perf_counter() - started) * 1000, response.status_code)
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+            except httpx.TransportError:
+                self.metrics.record(host, (time.perf_counter() - started) * 1000)
+                if attempt == attempts - 1:
+                    raise
+            self.metrics.record_retry(host)
+            delay = self._backoff(attempt, response)
+            if not self._retry_fits(delay):
+                if response is not None:
+                    return response
+                raise Timeout(f"No request budget left to retry {host}")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('POST', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('HEAD', url, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs):
+        """
+        Streaming request through the shared pool (no retries): yields the
+        httpx.Response before its body is read, so callers can cap or abort it
+        """
+        host = urlsplit(url).hostname or ''
+        kwargs = self._prepare(kwargs)
+        self._fit_deadline(host, kwargs)
+        started = time.perf_counter()
+        with self._sync_semaphore(host):
+            try:
+                with self.sync_client.stream(method, url, **kwargs) as response:
+                    self.metrics.record(host, (time.perf_counter() - started) * 1000, response.status_code)
+                    yield response
+            except httpx.TransportError:
+                self.metrics.record(host, (time.perf_counter() - started) * 1000)
+                raise
+
+    # ---------------------------------------------------------------- async façade
+
+    async def arequest(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Async request through the current event loop's pool; same policy as request()"""
+        host = urlsplit(url).hostname or ''
+        kwargs = self._prepare(kwargs)
+        attempts = self._attempts(method, retries)
+        for attempt in range(attempts):
+            response = None
+            self._fit_deadline(host, kwargs)
+            started = time.perf_counter()
+            try:
+                client, semaphore = self._async_client_and_semaphore(host)
+                async with semaphore:
+                    response = await client.request(method, url, **kwargs)
+                self.metrics.record(host, (time.perf_counter() - started) * 1000, response.status_code)
+                if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+            except httpx.TransportError:
+                self.metrics.record(host, (time.perf_counter() - started) * 1000)
+                if attempt == attempts - 1:
+                    raise
+            self.metrics.record_retry(host)
+            delay = self._backoff(attempt, response)
+            if not self._retry_fits(delay):
+                if response is not None:
+                    return response
+                raise Timeout(f"No request budget left to retry {host}")
+            await asyncio.sleep(delay)
+
+    async def aget(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest('GET', url, **kwargs)
+
+    async def apost(self, url: str, **kwargs) -> httpx.Response:
+        return await self.arequest('POST', url, **kwargs)
+
+    @asynccontextmanager
+    async def async_session(self, timeout: Optional[float] = None):
+        """
+        Drop-in for `async with httpx.AsyncClient(timeout=...) as client`:
+        yields a façade with get/post bound to the shared pool, closes nothing
+        """
+        yield AsyncSession(self, timeout)
+
+    async def aclose(self):
+        """Close the current loop's pool (FastAPI shutdown)"""
+        state = self._async_state.pop(asyncio.get_running_loop(), None)
+        if state:
+            await state[0].aclose()
+
+    def session(self, headers: Optional[Dict] = None, timeout: Optional[float] = None) -> 'Session':
+        """Sync façade with default headers/timeout, in place of a per-object requests.Session"""
+        return Session(self, headers, timeout)
+
+    def close(self):
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+    def get_stats(self) -> Dict:
+        return {
+            'http2': self.http2,
+            'max_connections': self.limits.max_connections,
+            'max_keepalive_connections': self.limits.max_keepalive_connections,
+            'default_host_limit': self.default_host_limit,
+            'host_limits': dict(self.host_limits),
+            'upstreams': self.metrics.get_stats(),
+        }
+
+
+class Session:
+    """Sync request defaults (headers, timeout) over the shared pool"""
+
+    def __init__(self, client: HTTPClient, headers: Optional[Dict] = None, timeout: Optional[float] = None):
+        self._client = client
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        kwargs['headers'] = {**self.headers, **(kwargs.get('headers') or {})}
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        return self._client.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request('POST', url, **kwargs)
+
+
+class AsyncSession:
+    """Async counterpart of Session, yielded by HTTPClient.async_session()"""
+
+    def __init__(self, client: HTTPClient, timeout: Optional[float] = None):
+        self._client = client
+        self.timeout = timeout
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        return await self._client.arequest(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+
+# Global client instance
+http = HTTPClient()
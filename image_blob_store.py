@@ -0,0 +1,348 @@
+"""
+Image Blob Store - Content-addressed attraction images on the filesystem
+Image bytes live under IMAGE_BLOB_DIR/<ab>/<cd>/<sha256> (written once,
+identical downloads share one file); attraction_images keeps the metadata
+plus blob_sha256/blob_size, so serving is a small indexed lookup followed
+by send_file instead of pulling a bytea through psycopg2 per request
+"""
+
+import os
+import sys
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = os.getenv('IMAGE_BLOB_DIR', 'image_blobs')
+LOCATOR_CACHE_SIZE = int(os.getenv('IMAGE_LOCATOR_CACHE', '4096'))
+BLOB_COLUMNS_RECHECK = float(os.getenv('IMAGE_BLOB_COLUMNS_RECHECK', '60'))
+BLOB_INDEX = 'idx_attraction_images_blob'
+
+
+def ensure_blob_columns(cur):
+    """Metadata columns pointing at the blob (idempotent; offline jobs only, requests never run DDL)"""
+    cur.execute("""
+        ALTER TABLE attraction_images ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64);
+        ALTER TABLE attraction_images ADD COLUMN IF NOT EXISTS blob_size INTEGER;
+    """)
+
+
+def create_blob_index(conn) -> bool:
+    """
+    Index on blob_sha256 built with CREATE INDEX CONCURRENTLY (writers keep
+    going); an invalid index left by an interrupted build is rebuilt.
+    Returns True when it was built
+    """
+    autocommit = conn.autocommit
+    conn.autocommit = True  # CONCURRENTLY cannot run inside a transaction block
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s
+            """, (BLOB_INDEX,))
+            row = cur.fetchone()
+            if row and row[0]:
+                return False
+            if row:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {BLOB_INDEX}")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {BLOB_INDEX} "
+                        f"ON attraction_images(blob_sha256)")
+        return True
+    finally:
+        conn.autocommit = autocommit
+
+
+class ImageBlobStore:
+    """Write-once files named by the SHA-256 of their content"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or BLOB_DIR)
+        self.stats = {'writes': 0, 'dedup_hits': 0, 'bytes_written': 0}
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def put(self, data: bytes) -> str:
+        """Store bytes, returns their SHA-256 (no write when the content is already there)"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if os.path.exists(path):
+            self.stats['dedup_hits'] += 1
+            return sha256
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)  # atomic: readers never see a partial blob
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.stats['writes'] += 1
+        self.stats['bytes_written'] += len(data)
+        return sha256
+
+    def get(self, sha256: str) -> Optional[bytes]:
+        try:
+            with open(self.path(sha256), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, root=self.root)
+
+
+blob_store = ImageBlobStore()
+
+
+class ImageLocator:
+    """
+    image id -> (sha256, size, mime, name, city) from attraction_images,
+    remembered in a small LRU; rows still holding only bytea are moved to the
+    blob store on first read
+    """
+
+    def __init__(self, store: ImageBlobStore = None, max_entries: int = LOCATOR_CACHE_SIZE):
+        self.store = store or blob_store
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns_ready = False
+        self._columns_checked_at = 0.0
+        self.stats = {'hits': 0, 'misses': 0, 'migrated_on_read': 0}
+
+    def _remember(self, image_id: int, entry: Dict):
+        with self._lock:
+            self._entries[image_id] = entry
+            self._entries.move_to_end(image_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def has_blob_columns(self, conn) -> bool:
+        """
+        Whether attraction_images has the blob columns (added by the migrate
+        command); a missing answer is looked up again after BLOB_COLUMNS_RECHECK s
+        """
+        if self._columns_ready:
+            return True
+        if time.time() - self._columns_checked_at < BLOB_COLUMNS_RECHECK:
+            return False
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*) FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'attraction_images'
+                  AND column_name IN ('blob_sha256', 'blob_size')
+            """)
+            self._columns_ready = cur.fetchone()[0] == 2
+        self._columns_checked_at = time.time()
+        return self._columns_ready
+
+    def locate(self, image_id: int, connect) -> Optional[Dict]:
+        """Blob entry of an image, or None if it has no bytes; connect() is only called on a miss"""
+        with self._lock:
+            entry = self._entries.get(image_id)
+            if entry is not None:
+                self._entries.move_to_end(image_id)
+        if entry is not None and self.store.exists(entry['sha256']):
+            self.stats['hits'] += 1
+            return entry
+        self.stats['misses'] += 1
+
+        conn = connect()
+        if conn is None:
+            raise ConnectionError('Database connection failed')
+        try:
+            entry = self._load(image_id, conn)
+        finally:
+            conn.close()
+        if entry is not None:
+            self._remember(image_id, entry)
+        return entry
+
+    def _load(self, image_id: int, conn) -> Optional[Dict]:
+        if not self.has_blob_columns(conn):
+            # Not migrated yet: the bytea goes to the blob store, the row stays as it is
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT img_bytes, mime_type, attraction_name, city
+                    FROM attraction_images WHERE id = %s
+                """, (image_id,))
+                row = cur.fetchone()
+            if not row or row[0] is None:
+                return None
+            data, mime_type, name, city = bytes(row[0]), row[1], row[2], row[3]
+            return {'sha256': self.store.put(data), 'size': len(data), 'mime_type': mime_type or 'image/jpeg',
+                    'name': name, 'city': city}
+
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT blob_sha256, blob_size, mime_type, attraction_name, city
+                FROM attraction_images WHERE id = %s
+            """, (image_id,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            sha256, size, mime_type, name, city = row
+
+            if not sha256 or not self.store.exists(sha256):
+                cur.execute("SELECT img_bytes FROM attraction_images WHERE id = %s", (image_id,))
+                data = cur.fetchone()[0]
+                if data is None:
+                    return None
+                data = bytes(data)
+                sha256, size = self.store.put(data), len(data)
+                cur.execute("UPDATE attraction_images SET blob_sha256 = %s, blob_size = %s WHERE id = %s",
+                            (sha256, size, image_id))
+                conn.commit()
+                self.stats['migrated_on_read'] += 1
+
+        return {'sha256': sha256, 'size': size, 'mime_type': mime_type or 'image/jpeg',
+                'name': name, 'city': city}
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            cached = len(self._entries)
+        return {**self.stats, 'cached': cached, 'store': self.store.get_stats()}
+
+
+image_locator = ImageLocator()
+
+
+def drop_migrated_bytes(conn, store: ImageBlobStore = None, batch_size: int = 200) -> Tuple[int, int]:
+    """
+    Clear img_bytes of rows migrated earlier without drop_bytes, batch by
+    batch and only once their blob is in this host's store: a missing file
+    is written again from the bytea first. Returns (cleared, restored)
+    """
+    store = store or blob_store
+    cleared = restored = last_id = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, blob_sha256 FROM attraction_images
+                WHERE blob_sha256 IS NOT NULL AND img_bytes IS NOT NULL AND id > %s
+                ORDER BY id LIMIT %s
+            """, (last_id, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            missing = {image_id for image_id, sha256 in rows if not store.exists(sha256)}
+            present = [image_id for image_id, _ in rows if image_id not in missing]
+            updates = []
+            if missing:
+                cur.execute("""
+                    SELECT id, img_bytes FROM attraction_images
+                    WHERE id = ANY(%s) AND img_bytes IS NOT NULL
+                """, (sorted(missing),))
+                for image_id, data in cur.fetchall():
+                    data = bytes(data)
+                    updates.append((image_id, store.put(data), len(data)))
+            if updates:
+                execute_values(cur, """
+                    UPDATE attraction_images AS a
+                    SET blob_sha256 = v.sha, blob_size = v.size, img_bytes = NULL
+                    FROM (VALUES %s) AS v(id, sha, size)
+                    WHERE a.id = v.id
+                """, updates)
+            if present:
+                cur.execute("UPDATE attraction_images SET img_bytes = NULL WHERE id = ANY(%s)", (present,))
+        conn.commit()
+        cleared += len(present) + len(updates)
+        restored += len(updates)
+    return cleared, restored
+
+
+def migrate(database_url: Optional[str] = None, batch_size: int = 200, drop_bytes: bool = False,
+            store: ImageBlobStore = None) -> Dict[str, int]:
+    """
+    Add the blob columns and index, then copy every attraction_images bytea
+    into the blob store (resumable: rows that already have blob_sha256 are
+    skipped); with drop_bytes the bytea is cleared once its file is on disk,
+    also for rows migrated earlier
+    """
+    store = store or blob_store
+    conn = psycopg2.connect(database_url or os.getenv('DATABASE_URL'))
+    with conn.cursor() as cur:
+        ensure_blob_columns(cur)
+    conn.commit()
+    if create_blob_index(conn):
+        print(f"🔨 {BLOB_INDEX} built")
+
+    result = {'rows': 0, 'bytes': 0, 'dedup_hits': 0}
+    started = time.time()
+    while True:
+        with conn.cursor() as cur:
+            # One batch of bytea in memory at a time
+            cur.execute("""
+                SELECT id, img_bytes FROM attraction_images
+                WHERE blob_sha256 IS NULL AND img_bytes IS NOT NULL
+                ORDER BY id LIMIT %s
+            """, (batch_size,))
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for image_id, data in rows:
+                data = bytes(data)
+                before = store.stats['dedup_hits']
+                updates.append((image_id, store.put(data), len(data)))
+                result['dedup_hits'] += store.stats['dedup_hits'] - before
+                result['bytes'] += len(data)
+
+            execute_values(cur, f"""
+                UPDATE attraction_images AS a
+                SET blob_sha256 = v.sha, blob_size = v.size
+                    {', img_bytes = NULL' if drop_bytes else ''}
+                FROM (VALUES %s) AS v(id, sha, size)
+                WHERE a.id = v.id
+            """, updates)
+        conn.commit()
+        result['rows'] += len(rows)
+        print(f"🖼️ {result['rows']} images moved ({result['bytes'] / 1024 / 1024:.1f} MB, "
+              f"{result['rows'] / (time.time() - started):.0f}/s)")
+
+    if drop_bytes:
+        result['bytes_dropped'], result['restored'] = drop_migrated_bytes(conn, store, batch_size)
+    conn.close()
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Content-addressed attraction image store')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('migrate', help='Move attraction_images bytea into the blob store')
+    run.add_argument('--batch', type=int, default=200)
+    run.add_argument('--drop-bytes', action='store_true', help='Clear img_bytes once the blob is written')
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        print("❌ DATABASE_URL not set")
+        sys.exit(1)
+    totals = migrate(batch_size=args.batch, drop_bytes=args.drop_bytes)
+    print(f"✅ {totals['rows']} images in {blob_store.root} "
+          f"({totals['dedup_hits']} duplicates shared a blob)")
+    if args.drop_bytes:
+        print(f"🧹 img_bytes cleared on {totals['bytes_dropped']} earlier rows "
+              f"({totals['restored']} blobs missing on this host were written again)")
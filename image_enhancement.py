@@ -11,7 +11,7 @@ Strategy:
 
 import psycopg2
 import os
-import requests
+from http_client import http
 import json
 from dotenv import load_dotenv
 from typing import List, Dict, Optional
@@ -75,7 +75,7 @@ class ImageEnhancementSystem:
                 'iiurlwidth': 800
             }
 
-            response = requests.get(search_url, params=params, timeout=5)
+            response = http.get(search_url, params=params, timeout=5)
             data = response.json()
 
             if 'query' in data and 'pages' in data['query']:
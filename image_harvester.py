@@ -0,0 +1,532 @@
+"""
+Image Harvester - Parallel, resumable ingestion into attraction_images
+Downloads run on a bounded thread pool with per-host concurrency and
+spacing limits (Retry-After is honoured), decoding/resizing and the
+perceptual hash run in a process pool, near-duplicates are dropped across
+sources by 64-bit dHash, bytes go to the blob store and rows are inserted
+in batches. Finished jobs are appended to a checkpoint file once their
+batch is written, so an interrupted run resumes where it stopped
+"""
+
+import os
+import sys
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from io import BytesIO
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from psycopg2.extras import execute_values
+
+from image_blob_store import ImageBlobStore, blob_store, ensure_blob_columns
+
+logger = logging.getLogger(__name__)
+
+HARVEST_CONCURRENCY = int(os.getenv('IMAGE_HARVEST_CONCURRENCY', '16'))
+HARVEST_PER_HOST = int(os.getenv('IMAGE_HARVEST_PER_HOST', '4'))
+HARVEST_HOST_INTERVAL = float(os.getenv('IMAGE_HARVEST_HOST_INTERVAL', '0.1'))
+HARVEST_DECODE_WORKERS = int(os.getenv('IMAGE_HARVEST_DECODE_WORKERS', str(min(4, os.cpu_count() or 1))))
+PHASH_DISTANCE = int(os.getenv('IMAGE_HARVEST_PHASH_DISTANCE', '6'))
+MAX_DOWNLOAD_BYTES = 15 * 1024 * 1024
+MAX_RETRY_AFTER = 120
+UA = "ViamigoImageHarvester/1.0 (+https://example.com/contact)"
+
+
+def ensure_harvest_columns(cur):
+    """Blob columns plus the perceptual hash used for cross-source dedup (idempotent)"""
+    ensure_blob_columns(cur)
+    cur.execute("""
+        ALTER TABLE attraction_images ADD COLUMN IF NOT EXISTS phash BIGINT;
+        CREATE INDEX IF NOT EXISTS idx_attraction_images_phash ON attraction_images(phash);
+    """)
+
+
+# ---------------------------------------------------------------------------
+# Decoding (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+def dhash(img) -> int:
+    """64-bit difference hash: brightness gradient of a 9x8 grayscale thumbnail"""
+    from PIL import Image
+
+    px = img.convert('L').resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return value
+
+
+def to_signed64(value: int) -> int:
+    """Unsigned 64-bit hash -> PostgreSQL BIGINT"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_signed64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def decode_image(data: bytes, max_size: Optional[Tuple[int, int]] = None, min_size: int = 0,
+                 reencode: bool = False) -> Dict:
+    """
+    Validate downloaded bytes and hash them perceptually. With reencode the
+    image is flattened to RGB, fitted in max_size and saved as JPEG q85
+    (what process_apify_dataset stored); otherwise the original bytes are
+    kept. Raises ValueError for anything that is not a usable image
+    """
+    from PIL import Image
+
+    try:
+        img = Image.open(BytesIO(data))
+        width, height = img.size
+        mime_type = Image.MIME.get(img.format, 'application/octet-stream')
+        if width < min_size or height < min_size:
+            raise ValueError(f"too small: {width}x{height}")
+
+        if not reencode:
+            img.draft('RGB', (64, 64))  # JPEG: decode at 1/8 scale, enough for the hash
+            return {'bytes': data, 'width': width, 'height': height, 'mime_type': mime_type,
+                    'phash': dhash(img)}
+
+        if img.mode in ('RGBA', 'LA', 'P'):
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            flat = Image.new('RGB', img.size, (255, 255, 255))
+            flat.paste(img, mask=img.split()[-1])
+            img = flat
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        if max_size and (width > max_size[0] or height > max_size[1]):
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+        output = BytesIO()
+        img.save(output, format='JPEG', quality=85, optimize=True)
+        return {'bytes': output.getvalue(), 'width': img.size[0], 'height': img.size[1],
+                'mime_type': 'image/jpeg', 'phash': dhash(img)}
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"invalid image: {e}") from e
+
+
+# ---------------------------------------------------------------------------
+# Politeness, checkpoint, dedup index, sink
+# ---------------------------------------------------------------------------
+
+class HostLimiter:
+    """At most per_host requests in flight per host, starts spaced min_interval apart"""
+
+    def __init__(self, per_host: int = HARVEST_PER_HOST, min_interval: float = HARVEST_HOST_INTERVAL):
+        self.per_host = per_host
+        self.min_interval = min_interval
+        self._slots = {}  # host -> Semaphore
+        self._next_start = {}  # host -> monotonic time of the next allowed request
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str):
+        with self._lock:
+            slots = self._slots.get(host)
+            if slots is None:
+                slots = self._slots[host] = threading.Semaphore(self.per_host)
+        slots.acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, 0.0))
+            self._next_start[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host: str):
+        self._slots[host].release()
+
+    def back_off(self, host: str, seconds: float):
+        """Hold every new request to host for seconds (429/503 with Retry-After)"""
+        with self._lock:
+            self._next_start[host] = max(self._next_start.get(host, 0.0), time.monotonic() + seconds)
+
+
+class Checkpoint:
+    """
+    Append-only file of finished job keys, one 'status<TAB>key' line each.
+    Lines are written after the rows of their batch are committed; failed
+    jobs are skipped on resume too unless retry_failed is set
+    """
+
+    def __init__(self, path: Optional[str], retry_failed: bool = False):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # torn last line of an interrupted run
+                    status, _, key = line.rstrip('\n').partition('\t')
+                    if key and not (retry_failed and status == 'failed'):
+                        self.done.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def mark(self, entries: List[Tuple[str, str]]):
+        """Record (key, status) pairs durably"""
+        if not entries:
+            return
+        self.done.update(key for key, _ in entries)
+        if not self.path:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(f"{status}\t{key}\n" for key, status in entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class PerceptualIndex:
+    """
+    Seen images by SHA-256 and by dHash. Near lookups split the 64 bits into
+    8 bytes: two hashes within 7 bits of each other share at least one byte
+    exactly, so only the hashes in those 8 buckets are compared
+    """
+
+    BANDS = 8
+
+    def __init__(self, distance: int = PHASH_DISTANCE):
+        if not 0 <= distance < self.BANDS:
+            raise ValueError(f"phash distance must be below {self.BANDS}")
+        self.distance = distance
+        self.sha256 = set()
+        self._buckets = {}  # (band, byte) -> [hash]
+        self.size = 0
+
+    def add(self, phash: Optional[int] = None, sha256: Optional[str] = None):
+        if sha256:
+            self.sha256.add(sha256)
+        if phash is not None:
+            for band in range(self.BANDS):
+                self._buckets.setdefault((band, (phash >> (band * 8)) & 0xFF), []).append(phash)
+            self.size += 1
+
+    def near(self, phash: int) -> Optional[int]:
+        """A known hash within distance bits, or None"""
+        for band in range(self.BANDS):
+            for known in self._buckets.get((band, (phash >> (band * 8)) & 0xFF), ()):
+                if bin(phash ^ known).count('1') <= self.distance:
+                    return known
+        return None
+
+
+def load_known_images(conn, index: PerceptualIndex) -> PerceptualIndex:
+    """Seed the index with what attraction_images already holds, from every source"""
+    with conn.cursor() as cur:
+        ensure_harvest_columns(cur)
+        cur.execute("""
+            SELECT blob_sha256, phash FROM attraction_images
+            WHERE blob_sha256 IS NOT NULL OR phash IS NOT NULL
+        """)
+        for sha256, phash in cur.fetchall():
+            index.add(from_signed64(phash) if phash is not None else None, sha256)
+    if not conn.autocommit:
+        conn.commit()
+    return index
+
+
+class PostgresImageSink:
+    """
+    Batched INSERT ... ON CONFLICT DO NOTHING into attraction_images (one
+    statement per batch); a failing batch is retried row by row so one bad
+    row only loses itself
+    """
+
+    def __init__(self, conn, table: str = 'attraction_images', page_size: int = 200):
+        self.conn = conn
+        self.table = table
+        self.page_size = page_size
+
+    def _insert(self, cur, columns: List[str], rows: List[Dict]) -> int:
+        template = '(' + ', '.join(f'%({column})s' for column in columns) + ')'
+        inserted = execute_values(cur, f"""
+            INSERT INTO {self.table} ({', '.join(columns)}) VALUES %s
+            ON CONFLICT DO NOTHING RETURNING 1
+        """, rows, template=template, page_size=self.page_size, fetch=True)
+        return len(inserted)
+
+    def _commit(self):
+        if not self.conn.autocommit:
+            self.conn.commit()
+
+    def write(self, rows: List[Dict]) -> int:
+        columns = list(rows[0])
+        try:
+            with self.conn.cursor() as cur:
+                inserted = self._insert(cur, columns, rows)
+            self._commit()
+            return inserted
+        except Exception as e:
+            if not self.conn.autocommit:
+                self.conn.rollback()
+            logger.warning(f"Batch insert failed ({e}), retrying {len(rows)} rows one by one")
+
+        inserted = 0
+        for row in rows:
+            try:
+                with self.conn.cursor() as cur:
+                    inserted += self._insert(cur, columns, [row])
+                self._commit()
+            except Exception as e:
+                if not self.conn.autocommit:
+                    self.conn.rollback()
+                logger.warning(f"Insert skipped ({row.get('source')}:{row.get('source_id')}): {e}")
+        return inserted
+
+
+# ---------------------------------------------------------------------------
+# Harvester
+# ---------------------------------------------------------------------------
+
+class ImageHarvester:
+    """
+    Runs image jobs, each a dict {'key': unique id for the checkpoint,
+    'urls': [candidates, tried in order], 'row': attraction_images metadata}.
+    Stored rows get blob_sha256, blob_size, width, height, mime_type, phash
+    and the content hash under every name in hash_columns
+    """
+
+    def __init__(self, sink, checkpoint: Optional[Checkpoint] = None, session: requests.Session = None,
+                 concurrency: int = HARVEST_CONCURRENCY, per_host: int = HARVEST_PER_HOST,
+                 host_interval: float = HARVEST_HOST_INTERVAL, decode_workers: int = HARVEST_DECODE_WORKERS,
+                 batch_size: int = 100, max_size: Optional[Tuple[int, int]] = None, min_size: int = 0,
+                 reencode: bool = False, max_bytes: int = MAX_DOWNLOAD_BYTES,
+                 index: Optional[PerceptualIndex] = None, store: ImageBlobStore = None,
+                 hash_columns: Tuple[str, ...] = ('sha256',), headers: Optional[Dict] = None,
+                 timeout: float = 30, retries: int = 3, progress: Optional[Callable[[str], None]] = None):
+        self.sink = sink
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.concurrency = concurrency
+        self.limiter = HostLimiter(per_host, host_interval)
+        self.decode_workers = decode_workers
+        self.batch_size = batch_size
+        self.decode_options = {'max_size': max_size, 'min_size': min_size, 'reencode': reencode}
+        self.max_bytes = max_bytes
+        self.index = index or PerceptualIndex()
+        self.store = store or blob_store
+        self.hash_columns = hash_columns
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.retries = retries
+        self.progress = progress
+
+        if session is None:
+            session = requests.Session()
+            session.headers.update({'User-Agent': UA})
+            adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+        self._decoder = None
+        self._stats_lock = threading.Lock()
+        self._rows = []
+        self._finished = []  # (key, status) waiting for the next batch write
+        self.elapsed = 0.0
+        self.stats = {'jobs': 0, 'skipped': 0, 'downloaded': 0, 'failed': 0, 'duplicates': 0,
+                      'near_duplicates': 0, 'stored': 0, 'inserted': 0, 'bytes': 0, 'batches': 0,
+                      'throttled': 0}
+
+    # -- worker threads -------------------------------------------------------
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _download(self, url: str) -> bytes:
+        host = urlparse(url).netloc
+        for attempt in range(self.retries):
+            self.limiter.acquire(host)
+            try:
+                with self.session.get(url, headers=self.headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code in (429, 503) and attempt + 1 < self.retries:
+                        retry_after = response.headers.get('Retry-After', '')
+                        delay = float(retry_after) if retry_after.isdigit() else 2.0 ** attempt
+                        self.limiter.back_off(host, min(delay, MAX_RETRY_AFTER))
+                        self._count('throttled')
+                        continue
+                    response.raise_for_status()
+                    buffer = BytesIO()
+                    for chunk in response.iter_content(65536):
+                        buffer.write(chunk)
+                        if buffer.tell() > self.max_bytes:
+                            raise ValueError(f"larger than {self.max_bytes} bytes")
+                    return buffer.getvalue()
+            finally:
+                self.limiter.release(host)
+        raise RuntimeError(f"gave up after {self.retries} attempts")
+
+    def _fetch(self, job: Dict) -> Tuple[Dict, Optional[Dict], Optional[str]]:
+        """Download and decode the first working URL of a job: (job, decoded, error)"""
+        error = 'no url'
+        for url in job['urls']:
+            if not url:
+                continue
+            try:
+                data = self._download(url)
+                self._count('downloaded')
+                if self._decoder is not None:
+                    return job, self._decoder.submit(decode_image, data, **self.decode_options).result(), None
+                return job, decode_image(data, **self.decode_options), None
+            except Exception as e:
+                error = f"{url}: {e}"
+        return job, None, error
+
+    # -- main thread ----------------------------------------------------------
+
+    def _accept(self, job: Dict, decoded: Optional[Dict], error: Optional[str]):
+        if decoded is None:
+            self.stats['failed'] += 1
+            logger.info(f"Image job {job['key']} failed: {error}")
+            self._finished.append((job['key'], 'failed'))
+            return
+
+        sha256 = hashlib.sha256(decoded['bytes']).hexdigest()
+        if sha256 in self.index.sha256:
+            self.stats['duplicates'] += 1
+            self._finished.append((job['key'], 'duplicate'))
+            return
+        if self.index.near(decoded['phash']) is not None:
+            self.stats['near_duplicates'] += 1
+            self.index.add(sha256=sha256)
+            self._finished.append((job['key'], 'near_duplicate'))
+            return
+        self.index.add(decoded['phash'], sha256)
+
+        self.store.put(decoded['bytes'])
+        row = dict(job['row'], blob_sha256=sha256, blob_size=len(decoded['bytes']),
+                   width=decoded['width'], height=decoded['height'], mime_type=decoded['mime_type'],
+                   phash=to_signed64(decoded['phash']))
+        for column in self.hash_columns:
+            row[column] = sha256
+        self._rows.append(row)
+        self._finished.append((job['key'], 'stored'))
+        self.stats['bytes'] += len(decoded['bytes'])
+
+    def _flush(self):
+        rows, self._rows = self._rows, []
+        finished, self._finished = self._finished, []
+        if rows:
+            self.stats['inserted'] += self.sink.write(rows)
+            self.stats['stored'] += len(rows)
+            self.stats['batches'] += 1
+        self.checkpoint.mark(finished)  # only once the rows are committed
+        if self.progress and rows:
+            self.progress(self.report())
+
+    def run(self, jobs: Iterable[Dict]) -> Dict:
+        """Harvest jobs (a lazy iterable is fine: at most 2 x concurrency are in flight)"""
+        started = time.time()
+        fetchers = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='harvest')
+        if self.decode_workers > 0:
+            self._decoder = ProcessPoolExecutor(max_workers=self.decode_workers)
+        in_flight = set()
+
+        def drain(return_when):
+            nonlocal in_flight
+            done, in_flight = wait(in_flight, return_when=return_when)
+            for future in done:
+                self._accept(*future.result())
+                if len(self._rows) >= self.batch_size or len(self._finished) >= self.batch_size * 4:
+                    self._flush()
+
+        try:
+            for job in jobs:
+                self.stats['jobs'] += 1
+                if job['key'] in self.checkpoint:
+                    self.stats['skipped'] += 1
+                    continue
+                in_flight.add(fetchers.submit(self._fetch, job))
+                if len(in_flight) >= self.concurrency * 2:
+                    drain(FIRST_COMPLETED)
+            while in_flight:
+                drain(FIRST_COMPLETED)
+            self._flush()
+        finally:
+            fetchers.shutdown(wait=True, cancel_futures=True)
+            if self._decoder is not None:
+                self._decoder.shutdown(cancel_futures=True)
+                self._decoder = None
+            self.elapsed += time.time() - started
+        return self.get_stats()
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['elapsed_s'] = round(self.elapsed, 2)
+        stats['images_per_min'] = round(stats['stored'] / self.elapsed * 60, 1) if self.elapsed else 0.0
+        return stats
+
+    def report(self) -> str:
+        stats = self.get_stats()
+        return (f"{stats['stored']} stored, {stats['duplicates']} duplicates, "
+                f"{stats['near_duplicates']} near-duplicates, {stats['failed']} failed, "
+                f"{stats['skipped']} already done — {stats['images_per_min']:.0f} images/min")
+
+
+def backfill_phash(conn, batch_size: int = 500, store: ImageBlobStore = None) -> int:
+    """Perceptual hashes for rows stored before the phash column existed (resumable)"""
+    store = store or blob_store
+    with conn.cursor() as cur:
+        ensure_harvest_columns(cur)
+    conn.commit()
+
+    done, last_id = 0, 0
+    with ProcessPoolExecutor(max_workers=max(HARVEST_DECODE_WORKERS, 1)) as pool:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, blob_sha256 FROM attraction_images
+                    WHERE phash IS NULL AND blob_sha256 IS NOT NULL AND id > %s
+                    ORDER BY id LIMIT %s
+                """, (last_id, batch_size))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                blobs = [(image_id, store.get(sha256)) for image_id, sha256 in rows]
+                futures = [(image_id, pool.submit(decode_image, data)) for image_id, data in blobs if data]
+                updates = []
+                for image_id, future in futures:
+                    try:
+                        updates.append((image_id, to_signed64(future.result()['phash'])))
+                    except ValueError as e:
+                        logger.warning(f"Image {image_id} not hashed: {e}")
+                if updates:
+                    execute_values(cur, """
+                        UPDATE attraction_images AS a SET phash = v.phash
+                        FROM (VALUES %s) AS v(id, phash) WHERE a.id = v.id
+                    """, updates)
+            conn.commit()
+            done += len(updates)
+            print(f"🔎 {done} images hashed")
+    return done
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Parallel, resumable attraction image harvesting')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('backfill-phash', help='Perceptual hashes for images stored before dedup existed')
+    run.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        print("❌ DATABASE_URL not set")
+        sys.exit(1)
+    connection = psycopg2.connect(os.getenv('DATABASE_URL'))
+    try:
+        print(f"✅ {backfill_phash(connection, batch_size=args.batch)} images hashed")
+    finally:
+        connection.close()
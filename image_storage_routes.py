@@ -1,17 +1,23 @@
 """
 Image Storage Routes for ViamigoTravelAI
-Serves stored attraction images from PostgreSQL with online fallback
+Serves stored attraction images from the content-addressed blob store
+(metadata in PostgreSQL) with online fallback
 """
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, Response, request, jsonify, send_file
 import psycopg2
 import os
 import logging
-import requests
-from io import BytesIO
+
+from image_blob_store import blob_store, image_locator
+from image_variants import (IMMUTABLE, fetch_remote_source, image_variants, negotiate_format,
+                            remote_source_allowed)
+from placeholder_images import placeholder_images, render_svg
 
 # Create blueprint for image routes
 image_routes_bp = Blueprint('image_routes', __name__)
 
+FALLBACK_CACHE = 'public, max-age=60'  # SVG served for a failed placeholder render: retry soon
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,43 +47,109 @@ def get_db_connection():
         return None
 
 
+def _size_sql(conn):
+    """Stored size of an image: blob_size once migrated, else the bytea length"""
+    if image_locator.has_blob_columns(conn):
+        return "COALESCE(blob_size, LENGTH(img_bytes))"
+    return "LENGTH(img_bytes)"
+
+
 @image_routes_bp.route('/api/images/attraction/<int:image_id>')
 def serve_attraction_image(image_id):
-    """Serve stored attraction image by ID"""
+    """Serve stored attraction image by ID (sendfile, strong ETag, 304 and Range)"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        entry = image_locator.locate(image_id, get_db_connection)
+        if not entry:
+            return jsonify({'error': 'Image not found'}), 404
+
+        if request.args.get('w'):
+            sha256 = entry['sha256']
+            return _serve_variant(f'sha256:{sha256}', lambda: blob_store.get(sha256),
+                                  'public, max-age=86400')
+
+        # The blob name is its SHA-256: a strong validator for free
+        response = send_file(
+            blob_store.path(entry['sha256']),
+            mimetype=entry['mime_type'],
+            download_name=f"{entry['name']}_{entry['city']}.jpg",
+            etag=entry['sha256'],
+            conditional=True,
+            max_age=86400  # Cache for 24 hours
+        )
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
 
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT img_bytes, mime_type, attraction_name, city
-                FROM attraction_images 
-                WHERE id = %s
-            """, (image_id,))
+    except ConnectionError:
+        return jsonify({'error': 'Database connection failed'}), 500
+    except Exception as e:
+        logger.error(f"Error serving image {image_id}: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
 
-            result = cur.fetchone()
-            if not result:
-                return jsonify({'error': 'Image not found'}), 404
 
-            img_bytes, mime_type, name, city = result
+def _serve_variant(source_key, load_source, cache_control):
+    """Resized/re-encoded variant for ?w=<width>&fmt=<webp|avif|jpeg|auto>"""
+    requested_format = request.args.get('fmt', 'auto')
+    fmt = negotiate_format(requested_format, request.headers.get('Accept', ''))
+    result = image_variants.get_variant(source_key, load_source, request.args.get('w', type=int), fmt)
+    if not result:
+        return jsonify({'error': 'Image not found'}), 404
 
-        conn.close()
+    path, mimetype, etag = result
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    response.headers['Cache-Control'] = cache_control
+    if requested_format == 'auto':
+        response.headers['Vary'] = 'Accept'
+    return response
 
-        return Response(
-            img_bytes,
-            mimetype=mime_type or 'image/jpeg',
-            headers={
-                'Content-Disposition': f'inline; filename="{name}_{city}.jpg"',
-                'Cache-Control': 'public, max-age=86400'  # Cache for 24 hours
-            }
-        )
 
+@image_routes_bp.route('/api/images/variant/<sha256>')
+def serve_image_variant(sha256):
+    """Variant of a blob store image; the URL names the source content, so it never changes"""
+    if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+        return jsonify({'error': 'Invalid image hash'}), 400
+    try:
+        return _serve_variant(f'sha256:{sha256}', lambda: blob_store.get(sha256), IMMUTABLE)
     except Exception as e:
-        logger.error(f"Error serving image {image_id}: {e}")
+        logger.error(f"Error serving variant {sha256[:12]}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 
+@image_routes_bp.route('/api/images/variant')
+def serve_remote_image_variant():
+    """Variant of an image on an allowed remote host (Commons, Unsplash, Flickr)"""
+    url = request.args.get('url', '')
+    if not remote_source_allowed(url):
+        return jsonify({'error': 'Image host not allowed'}), 400
+    try:
+        return _serve_variant(f'url:{url}', lambda: fetch_remote_source(url), 'public, max-age=604800')
+    except Exception as e:
+        logger.error(f"Error serving variant of {url}: {e}")
+        return jsonify({'error': 'Image not available'}), 502
+
+
+@image_routes_bp.route('/api/images/placeholder')
+@image_routes_bp.route('/api/images/placeholder.svg')
+def serve_placeholder_image():
+    """Placeholder for places without a photo: the cached JPEG, else the SVG template"""
+    city, name = request.args.get('city', '')[:100], request.args.get('name', '')[:200]
+    etag = placeholder_images.key(city, name)
+    path = None if request.path.endswith('.svg') else placeholder_images.get(city, name)
+
+    if path:
+        response = send_file(path, mimetype='image/jpeg', etag=etag, conditional=True)
+        kind, cache_control = 'jpeg', IMMUTABLE
+    else:
+        response = Response(render_svg(city, name), mimetype='image/svg+xml')
+        response.set_etag(f'{etag}-svg')
+        response.make_conditional(request)
+        kind = 'svg'
+        # the .svg URL is always the template; on the JPEG URL it stands in for a failed render
+        cache_control = IMMUTABLE if request.path.endswith('.svg') else FALLBACK_CACHE
+    response.headers['Cache-Control'] = cache_control
+    placeholder_images.record_served(kind, response.content_length or 0)
+    return response
+
+
 @image_routes_bp.route('/api/images/search')
 def search_attraction_images():
     """Search for stored attraction images by city or attraction name"""
@@ -107,11 +179,12 @@ def search_attraction_images():
 
         where_clause = " AND ".join(where_conditions)
         params.append(limit)
+        size = _size_sql(conn)
 
         query = f"""
             SELECT id, city, attraction_name, attraction_qid,
                    original_url, thumb_url, mime_type,
-                   width, height, LENGTH(img_bytes) as size_bytes
+                   width, height, {size} as size_bytes
             FROM attraction_images 
             WHERE {where_clause}
             ORDER BY city, attraction_name
@@ -160,12 +233,13 @@ def get_image_stats():
         if not conn:
             return jsonify({'error': 'Database connection failed'}), 500
 
+        size = _size_sql(conn)
         with conn.cursor() as cur:
             # Get city statistics
-            cur.execute("""
+            cur.execute(f"""
                 SELECT city, COUNT(*) as count, 
-                       SUM(LENGTH(img_bytes)) as total_bytes,
-                       AVG(LENGTH(img_bytes)) as avg_bytes
+                       SUM({size}) as total_bytes,
+                       AVG({size}) as avg_bytes
                 FROM attraction_images 
                 GROUP BY city 
                 ORDER BY count DESC
@@ -173,11 +247,11 @@ def get_image_stats():
             city_stats = cur.fetchall()
 
             # Get overall statistics
-            cur.execute("""
+            cur.execute(f"""
                 SELECT COUNT(*) as total_images,
                        COUNT(DISTINCT city) as cities_count,
-                       SUM(LENGTH(img_bytes)) as total_size,
-                       AVG(LENGTH(img_bytes)) as avg_size
+                       SUM({size}) as total_size,
+                       AVG({size}) as avg_size
                 FROM attraction_images
             """)
             overall = cur.fetchone()
@@ -3,10 +3,14 @@ Image utility functions for ViamigoTravelAI
 """
 import os
 import base64
-from io import BytesIO
+from functools import lru_cache
 import psycopg2
 from dotenv import load_dotenv
 
+from image_blob_store import image_locator
+from image_variants import variant_url
+from placeholder_images import placeholder_images, render_placeholder, render_svg
+
 load_dotenv()
 
 
@@ -20,16 +24,17 @@ def get_db_connection():
         return None
 
 
-def get_local_image_url(city, attraction_name):
-    """Get local database image URL for an attraction"""
+def get_local_image_url(city, attraction_name, width=None):
+    """Get local database image URL for an attraction (a resized variant when width is given)"""
     try:
         conn = get_db_connection()
         if not conn:
             return None
 
+        blob_column = 'blob_sha256' if image_locator.has_blob_columns(conn) else 'NULL'
         with conn.cursor() as cur:
-            cur.execute("""
-                SELECT id FROM attraction_images 
+            cur.execute(f"""
+                SELECT id, {blob_column} FROM attraction_images 
                 WHERE LOWER(city) = LOWER(%s) 
                 AND LOWER(attraction_name) ILIKE LOWER(%s)
                 LIMIT 1
@@ -37,7 +42,8 @@ def get_local_image_url(city, attraction_name):
 
             result = cur.fetchone()
             if result:
-                return f"/api/images/attraction/{result[0]}"
+                conn.close()
+                return variant_url(f"/api/images/attraction/{result[0]}", width, blob_sha256=result[1])
 
         conn.close()
         return None
@@ -46,68 +52,28 @@ def get_local_image_url(city, attraction_name):
         return None
 
 
+@lru_cache(maxsize=256)
 def create_placeholder_image_data_url(city, attraction):
-    """Create a placeholder image data URL"""
+    """Create a placeholder image data URL (inline; prefer placeholder_images.url)"""
     try:
-        from PIL import Image, ImageDraw, ImageFont
-
-        # Create a simple placeholder image
-        width, height = 400, 300
-        img = Image.new('RGB', (width, height), color='#f0f0f0')
-        draw = ImageDraw.Draw(img)
-
-        # Try to use a font, fallback to default
-        try:
-            font = ImageFont.truetype(
-                "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf", 20)
-        except:
-            font = ImageFont.load_default()
-
-        # Draw city and attraction name
-        city_text = f"📍 {city}"
-        attraction_text = f"🏛️ {attraction}"
-
-        # Calculate text position
-        city_bbox = draw.textbbox((0, 0), city_text, font=font)
-        attraction_bbox = draw.textbbox((0, 0), attraction_text, font=font)
-
-        city_x = (width - (city_bbox[2] - city_bbox[0])) // 2
-        city_y = height // 2 - 30
-
-        attraction_x = (width - (attraction_bbox[2] - attraction_bbox[0])) // 2
-        attraction_y = height // 2 + 10
-
-        # Draw text
-        draw.text((city_x, city_y), city_text, fill='#666666', font=font)
-        draw.text((attraction_x, attraction_y),
-                  attraction_text, fill='#333333', font=font)
-
-        # Convert to base64 data URL
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG', quality=85)
-        img_str = base64.b64encode(buffer.getvalue()).decode()
-
+        img_str = base64.b64encode(render_placeholder(city, attraction)).decode()
         return f"data:image/jpeg;base64,{img_str}"
 
     except Exception as e:
         print(f"Error creating placeholder: {e}")
         # Return a minimal SVG placeholder
-        svg = f'''<svg width="400" height="300" xmlns="http://www.w3.org/2000/svg">
-            <rect width="400" height="300" fill="#f0f0f0"/>
-            <text x="200" y="140" text-anchor="middle" font-family="Arial" font-size="16" fill="#666">📍 {city}</text>
-            <text x="200" y="170" text-anchor="middle" font-family="Arial" font-size="18" fill="#333">🏛️ {attraction}</text>
-        </svg>'''
-        svg_base64 = base64.b64encode(svg.encode()).decode()
+        svg_base64 = base64.b64encode(render_svg(city, attraction).encode()).decode()
         return f"data:image/svg+xml;base64,{svg_base64}"
 
 
-def get_image_for_attraction(city, attraction_name, fallback_url=None):
+def get_image_for_attraction(city, attraction_name, fallback_url=None, width=None):
     """
     Get the best available image for an attraction
     Priority: 1) Local database, 2) Provided fallback URL, 3) Placeholder
+    With width (CSS px the caller displays), URLs point at a resized variant
     """
     # Try local database first
-    local_url = get_local_image_url(city, attraction_name)
+    local_url = get_local_image_url(city, attraction_name, width)
     if local_url:
         return {
             'type': 'local',
@@ -119,12 +85,13 @@ def get_image_for_attraction(city, attraction_name, fallback_url=None):
     if fallback_url:
         return {
             'type': 'external',
-            'url': fallback_url,
+            'url': variant_url(fallback_url, width),
+            'original_url': fallback_url,
             'source': 'external'
         }
 
-    # Create placeholder
-    placeholder_url = create_placeholder_image_data_url(city, attraction_name)
+    # Placeholder, rendered once and served by URL
+    placeholder_url = placeholder_images.url(city, attraction_name)
     return {
         'type': 'placeholder',
         'url': placeholder_url,
@@ -0,0 +1,304 @@
+"""
+Image Variants - Resized WebP/AVIF/JPEG renditions generated on demand
+Widths snap to a fixed ladder, Pillow renders in a process pool, results are
+cached on disk under the hash of (source, width, format) with LRU eviction
+by total bytes; the URLs carry the source's content hash, so responses can
+be cached as immutable by browsers and CDNs
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import quote, urljoin, urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = os.getenv('IMAGE_VARIANT_DIR', 'image_variants')
+VARIANT_CACHE_MB = float(os.getenv('IMAGE_VARIANT_CACHE_MB', '512'))
+VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', str(min(4, os.cpu_count() or 1))))
+REMOTE_HOSTS = os.getenv('IMAGE_VARIANT_HOSTS',
+                         'upload.wikimedia.org,commons.wikimedia.org,images.unsplash.com,live.staticflickr.com')
+MAX_SOURCE_BYTES = 15 * 1024 * 1024
+MAX_REDIRECTS = 5
+RENDER_TIMEOUT = 30
+
+WIDTHS = (80, 160, 320, 640, 1024, 1600)
+FORMATS = {  # name -> (Pillow format, mime type, quality)
+    'avif': ('AVIF', 'image/avif', 55),
+    'webp': ('WEBP', 'image/webp', 80),
+    'jpeg': ('JPEG', 'image/jpeg', 82),
+}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def snap_width(width: Optional[int]) -> int:
+    """Smallest ladder width >= the requested one (bounded set of cached variants)"""
+    if not width or width <= 0:
+        return WIDTHS[2]
+    return next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+
+
+def _format_supported(name: str) -> bool:
+    from PIL import features
+    return name == 'jpeg' or bool(features.check(name))
+
+
+def negotiate_format(requested: Optional[str], accept: str = '') -> str:
+    """Explicit format if supported, else the best one the client accepts (fmt=auto)"""
+    requested = (requested or 'auto').lower().replace('jpg', 'jpeg')
+    if requested in FORMATS and _format_supported(requested):
+        return requested
+    for name in ('avif', 'webp'):
+        if f'image/{name}' in accept and _format_supported(name):
+            return name
+    return 'jpeg'
+
+
+def render_variant(data: bytes, width: int, fmt: str) -> bytes:
+    """Decode, downscale (never upscale) and encode; runs in the worker processes"""
+    from PIL import Image, ImageOps
+
+    pil_format, _, quality = FORMATS[fmt]
+    img = Image.open(BytesIO(data))
+    img.draft('RGB', (width, 1))  # JPEG: decode at the smallest DCT scale still >= width
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+    if fmt == 'jpeg' and img.mode == 'RGBA':
+        img = img.convert('RGB')
+    if img.width > width:
+        img.thumbnail((width, img.height), Image.Resampling.LANCZOS)
+
+    out = BytesIO()
+    options = {'quality': quality}
+    if fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    elif fmt == 'webp':
+        options['method'] = 4
+    img.save(out, format=pil_format, **options)
+    return out.getvalue()
+
+
+class VariantCache:
+    """Variant files on disk, least recently served evicted first once over max_bytes"""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = os.path.abspath(root or VARIANT_DIR)
+        self.max_bytes = int(VARIANT_CACHE_MB * 1024 * 1024) if max_bytes is None else max_bytes
+        self._entries = OrderedDict()  # file name -> size
+        self._total = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._scan()
+
+    def _scan(self):
+        """Pick up variants from previous runs, oldest first"""
+        if not os.path.isdir(self.root):
+            return
+        files = []
+        for name in os.listdir(self.root):
+            if name.startswith('.tmp-'):
+                continue
+            stat = os.stat(os.path.join(self.root, name))
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+        self._evict()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            if name not in self._entries:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(name)
+            self.stats['hits'] += 1
+        return self.path(name)
+
+    def put(self, name: str, data: bytes) -> str:
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self.path(name))
+        with self._lock:
+            self._total += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._evict()
+        return self.path(name)
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self.stats, 'files': len(self._entries), 'bytes': self._total,
+                    'max_bytes': self.max_bytes}
+
+
+class SingleFlight:
+    """One caller per key does the work; concurrent callers wait for it, then look again"""
+
+    def __init__(self):
+        self._inflight = {}  # key -> Event
+        self._lock = threading.Lock()
+
+    def run(self, key: str, lookup: Callable, work: Callable, wait: float):
+        """lookup() if it finds something, else work() once across threads"""
+        while True:
+            found = lookup()
+            if found:
+                return found
+            with self._lock:
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            event.wait(wait)  # another request is doing the work for this key
+
+        try:
+            return work()
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+
+class ImageVariantService:
+    """Cache lookup, then one render per (source, width, format) even under concurrent requests"""
+
+    def __init__(self, cache: VariantCache = None, workers: int = VARIANT_WORKERS):
+        self.cache = cache or VariantCache()
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.stats = {'renders': 0, 'render_errors': 0, 'source_bytes': 0, 'variant_bytes': 0}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _render(self, data: bytes, width: int, fmt: str) -> bytes:
+        try:
+            return self._executor().submit(render_variant, data, width, fmt).result(timeout=RENDER_TIMEOUT)
+        except BrokenProcessPool:
+            with self._pool_lock:
+                self._pool = None  # a worker died: start a fresh pool next time
+            raise
+
+    @staticmethod
+    def variant_name(source_key: str, width: int, fmt: str) -> str:
+        digest = hashlib.sha256(f'{source_key}|{width}|{fmt}'.encode('utf-8')).hexdigest()
+        return f'{digest}.{fmt}'
+
+    def get_variant(self, source_key: str, load_source: Callable[[], Optional[bytes]],
+                    width: int, fmt: str) -> Optional[Tuple[str, str, str]]:
+        """(path, mime type, etag) of the variant, rendering it on a miss; None if the source is missing"""
+        width = snap_width(width)
+        name = self.variant_name(source_key, width, fmt)
+        etag = name.split('.')[0][:32]
+
+        def render() -> Optional[str]:
+            try:
+                data = load_source()
+                if not data:
+                    return None
+                variant = self._render(data, width, fmt)
+                self.stats['renders'] += 1
+                self.stats['source_bytes'] += len(data)
+                self.stats['variant_bytes'] += len(variant)
+                return self.cache.put(name, variant)
+            except Exception:
+                self.stats['render_errors'] += 1
+                raise
+
+        path = self._flights.run(name, lambda: self.cache.get(name), render, RENDER_TIMEOUT)
+        return (path, FORMATS[fmt][1], etag) if path else None
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, 'workers': self.workers, 'cache': self.cache.get_stats()}
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+
+image_variants = ImageVariantService()
+
+
+def remote_source_allowed(url: str) -> bool:
+    parsed = urlparse(url or '')
+    hosts = {h.strip() for h in REMOTE_HOSTS.split(',') if h.strip()}
+    return parsed.scheme in ('http', 'https') and parsed.hostname in hosts
+
+
+def fetch_remote_source(url: str) -> Optional[bytes]:
+    """
+    Body of an allowed remote image, or None
+
+    Redirects are followed by hand so every hop is checked against the host
+    allowlist; the body is streamed and abandoned past MAX_SOURCE_BYTES (or
+    before reading it, when Content-Length already says it is too large)
+    """
+    from http_client import http
+    for _ in range(MAX_REDIRECTS + 1):
+        if not remote_source_allowed(url):
+            logger.warning(f"⚠️ Image source host not allowed: {url}")
+            return None
+        with http.stream('GET', url, follow_redirects=False) as response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers.get('Location', ''))
+                continue
+            length = response.headers.get('Content-Length', '')
+            if response.status_code != 200 or (length.isdigit() and int(length) > MAX_SOURCE_BYTES):
+                return None
+            body = bytearray()
+            for chunk in response.iter_bytes():
+                body.extend(chunk)
+                if len(body) > MAX_SOURCE_BYTES:
+                    return None
+            return bytes(body)
+    return None
+
+
+def variant_url(url: Optional[str], width: Optional[int], fmt: str = 'auto', blob_sha256: str = None) -> Optional[str]:
+    """
+    URL of a width-sized variant of an image URL: blob-backed images by content
+    hash, local attraction images by id, allowed remote hosts through the proxy;
+    anything else (data: placeholders, unknown hosts) is returned unchanged
+    """
+    if not url or not width:
+        return url
+    width = snap_width(width)
+    if blob_sha256:
+        return f'/api/images/variant/{blob_sha256}?w={width}&fmt={fmt}'
+    if url.startswith('/api/images/attraction/'):
+        return f"{url.split('?')[0]}?w={width}&fmt={fmt}"
+    if remote_source_allowed(url):
+        return f'/api/images/variant?url={quote(url, safe="")}&w={width}&fmt={fmt}'
+    return url
@@ -17,6 +17,8 @@ from collections import defaultdict
 import json
 from datetime import datetime
 
+from content_hash import CHANGED, NEW, UNCHANGED, UNTRACKED, ChangeDetector, content_hash, ensure_hash_column
+
 
 class HuggingFaceHotelsImporter:
     """Import hotels from HuggingFace dataset to PostgreSQL"""
@@ -43,23 +45,19 @@ class HuggingFaceHotelsImporter:
         """Create database connection"""
         return psycopg2.connect(self.db_url)
 
-    def load_existing_hotels(self):
-        """Load existing hotels from database to avoid duplicates"""
+    def ensure_change_detection(self):
+        """content_hash column + (LOWER(hotel_name), city) index used to find changed hotels"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-
-        query = "SELECT LOWER(hotel_name), city FROM hotel_reviews GROUP BY LOWER(hotel_name), city;"
-        cursor.execute(query)
-
-        existing = set()
-        for row in cursor.fetchall():
-            existing.add((row[0], row[1]))  # (hotel_name_lower, city)
-
-        cursor.close()
-        conn.close()
-
-        print(f"✅ Loaded {len(existing)} existing hotels from database")
-        return existing
+        try:
+            with conn.cursor() as cursor:
+                ensure_hash_column(cursor, 'hotel_reviews')
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_hotel_reviews_name_city
+                    ON hotel_reviews (LOWER(hotel_name), city)
+                """)
+            conn.commit()
+        finally:
+            conn.close()
 
     def extract_hotels_from_dataset(self, max_records=None):
         """
@@ -152,26 +150,19 @@ class HuggingFaceHotelsImporter:
 
         return hotels_data
 
-    def prepare_hotel_records(self, hotels_data, existing_hotels):
+    def prepare_hotel_records(self, hotels_data):
         """
         Prepare hotel records for database insertion
 
         Args:
             hotels_data: Dict of hotels with aggregated review data
-            existing_hotels: Set of (hotel_name_lower, city) tuples already in DB
 
         Returns:
-            List of tuples ready for insertion
+            List of tuples ready for insertion, content_hash last
         """
         records = []
-        skipped = 0
 
         for (hotel_name, city), data in hotels_data.items():
-            # Skip if already exists
-            if (hotel_name.lower(), city) in existing_hotels:
-                skipped += 1
-                continue
-
             # Calculate aggregated stats
             total_reviews = data['total_reviews']
             average_score = data['ratings_sum'] / \
@@ -192,12 +183,33 @@ class HuggingFaceHotelsImporter:
                 total_reviews                  # total_reviews
             )
 
-            records.append(record)
+            records.append(record + (content_hash(record),))
 
-        print(
-            f"\n📊 Prepared {len(records)} hotels for insertion ({skipped} skipped as duplicates)")
+        print(f"\n📊 Prepared {len(records)} hotel records")
         return records
 
+    def split_changed_records(self, records):
+        """
+        Compare the records' content hashes with hotel_reviews, one query per
+        1,000 hotels (nothing is loaded up front)
+
+        Returns:
+            (new records, changed records, detector stats). Hotels already
+            present without a hash (other imports) are skipped, as before
+        """
+        conn = self.get_connection()
+        try:
+            detector = ChangeDetector(conn, 'hotel_reviews', key=('LOWER(hotel_name)', 'city'))
+            statuses = detector.classify(
+                [((record[0].lower(), record[2]), record[-1]) for record in records])
+        finally:
+            conn.close()
+
+        new = [record for record, status in zip(records, statuses) if status == NEW]
+        changed = [record for record, status in zip(records, statuses) if status == CHANGED]
+        print(f"🔍 Change detection: {detector.summary()}")
+        return new, changed, detector.stats
+
     def insert_hotels(self, records):
         """Insert hotel records into database"""
         if not records:
@@ -211,7 +223,7 @@ class HuggingFaceHotelsImporter:
         INSERT INTO hotel_reviews (
             hotel_name, hotel_address, city, country,
             latitude, longitude,
-            average_score, total_reviews
+            average_score, total_reviews, content_hash
         ) VALUES %s
         ON CONFLICT DO NOTHING;
         """
@@ -228,6 +240,38 @@ class HuggingFaceHotelsImporter:
             cursor.close()
             conn.close()
 
+    def update_hotels(self, records):
+        """Refresh the aggregates of hotels this importer wrote before and whose hash changed"""
+        if not records:
+            return
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        update_query = """
+        UPDATE hotel_reviews h SET
+            average_score = v.average_score,
+            total_reviews = v.total_reviews,
+            content_hash = v.content_hash
+        FROM (VALUES %s) AS v (hotel_name, city, average_score, total_reviews, content_hash)
+        WHERE LOWER(h.hotel_name) = LOWER(v.hotel_name)
+          AND h.city = v.city
+          AND h.content_hash IS NOT NULL
+        """
+
+        try:
+            execute_values(cursor, update_query,
+                           [(r[0], r[2], r[6], r[7], r[-1]) for r in records], page_size=500)
+            conn.commit()
+            print(f"✅ Successfully updated {len(records)} changed hotel records")
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error updating hotels: {e}")
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
     def import_hotels(self, max_records=None):
         """
         Main import function
@@ -239,24 +283,29 @@ class HuggingFaceHotelsImporter:
         print("🏨 HuggingFace Hotels Dataset Importer")
         print("🏨 " + "="*70)
 
-        # Step 1: Load existing hotels
-        existing_hotels = self.load_existing_hotels()
+        # Step 1: Make sure hashes can be stored and looked up
+        self.ensure_change_detection()
 
         # Step 2: Extract hotels from HuggingFace
         hotels_data = self.extract_hotels_from_dataset(max_records=max_records)
 
-        # Step 3: Prepare records
-        records = self.prepare_hotel_records(hotels_data, existing_hotels)
+        # Step 3: Prepare records and keep the new or changed ones
+        records = self.prepare_hotel_records(hotels_data)
+        new, changed, stats = self.split_changed_records(records)
 
-        # Step 4: Insert into database
-        if records:
-            self.insert_hotels(records)
+        # Step 4: Write only those
+        if new:
+            self.insert_hotels(new)
+        self.update_hotels(changed)
 
         # Step 5: Summary
         print(f"\n" + "="*70)
         print(f"📊 Import Summary:")
         print(f"   - Total hotels processed: {len(hotels_data)}")
-        print(f"   - New hotels inserted: {len(records)}")
+        print(f"   - New hotels inserted: {len(new)}")
+        print(f"   - Changed hotels updated: {len(changed)}")
+        print(f"   - Unchanged hotels skipped: {stats[UNCHANGED]}")
+        print(f"   - Skipped (already imported without hash): {stats[UNTRACKED]}")
         print(f"   - Cities covered: {', '.join(self.target_cities.keys())}")
         print(f"="*70)
 
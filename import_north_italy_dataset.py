@@ -8,10 +8,11 @@ Total: 2,321 attractions with 553 images from Wikimedia Commons
 
 import json
 import psycopg2
-from psycopg2.extras import execute_values
 import os
 import sys
 
+from streaming_import import DEFAULT_CHUNK_SIZE, JsonRecords, copy_writer, import_in_chunks
+
 # Database connection
 DATABASE_URL = os.environ.get(
     'DATABASE_URL',
@@ -19,16 +20,26 @@ DATABASE_URL = os.environ.get(
 )
 
 
+ATTRACTION_COLUMNS = (
+    'city', 'name', 'raw_name', 'description', 'category',
+    'latitude', 'longitude', 'osm_id', 'osm_type', 'osm_tags',
+    'wikidata_id', 'wikipedia_url', 'has_image', 'image_url',
+    'thumb_url', 'original_url', 'image_creator', 'image_license',
+    'image_attribution', 'source_osm', 'source_wikidata', 'source_commons')
+
+IMAGE_COLUMNS = (
+    'source', 'attraction_qid', 'city', 'attraction_name', 'license',
+    'license_url', 'creator', 'attribution', 'original_url', 'thumb_url',
+    'confidence_score', 'wikidata_id')
+
+
 def load_dataset(filename):
-    """Load JSON dataset"""
-    print(f"📂 Loading dataset: {filename}")
-    with open(filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    print(f"✅ Loaded {len(data)} attractions")
-    return data
+    """Dataset records, streamed from the file on every pass (never loaded whole)"""
+    print(f"📂 Streaming dataset: {filename} ({os.path.getsize(filename) / 1024 / 1024:.1f} MB)")
+    return JsonRecords(filename)
 
 
-def import_to_comprehensive_attractions(data):
+def import_to_comprehensive_attractions(data, chunk_size=DEFAULT_CHUNK_SIZE):
     """Import attractions to comprehensive_attractions table with deduplication"""
     conn = psycopg2.connect(DATABASE_URL)
     cursor = conn.cursor()
@@ -54,13 +65,11 @@ def import_to_comprehensive_attractions(data):
     existing_osm = set(cursor.fetchall())
     print(f"   Loaded {len(existing_osm)} existing OSM (id, type) pairs")
 
-    # Prepare data for insertion with DISTINCT logic
-    print("\n   Processing JSON data...")
-    records_dict = {}  # Use dict to auto-deduplicate by (city, name)
-    skipped = 0
-    source_duplicates = 0
+    # Only the keys seen so far stay in memory, rows are written chunk by chunk
+    seen = set()
+    counts = {'skipped': 0, 'source_duplicates': 0, 'in_database': 0}
 
-    for item in data:
+    def to_row(item):
         city = item.get('city')
         name = item.get('name')
         raw_name = item.get('rawName', name)
@@ -95,29 +104,27 @@ def import_to_comprehensive_attractions(data):
 
         # Validate required fields
         if not all([city, name, lat, lon]):
-            skipped += 1
-            continue
+            counts['skipped'] += 1
+            return None
 
         # Create unique key (case-insensitive)
         unique_key = (city.lower(), name.lower())
 
-        # Check if already in database by name
-        if unique_key in existing_pairs:
-            continue
-
-        # Check if OSM ID already exists (unique constraint)
-        if osm_id and osm_type:
-            osm_key = (osm_id, osm_type)
-            if osm_key in existing_osm:
-                continue
+        # Check if already in database by name, or by OSM ID (unique constraint)
+        osm_key = (osm_id, osm_type) if osm_id and osm_type else None
+        if unique_key in existing_pairs or osm_key in existing_osm:
+            counts['in_database'] += 1
+            return None
 
         # Check if duplicate in source data (keep first occurrence)
-        if unique_key in records_dict:
-            source_duplicates += 1
-            continue
-
-        # Store with unique key
-        records_dict[unique_key] = (
+        if unique_key in seen:
+            counts['source_duplicates'] += 1
+            return None
+        seen.add(unique_key)
+        if osm_key:
+            existing_osm.add(osm_key)
+
+        return (
             city,
             name,
             raw_name,
@@ -142,37 +149,23 @@ def import_to_comprehensive_attractions(data):
             source_commons
         )
 
-    values = list(records_dict.values())
+    # COPY per chunk: rows are already deduplicated against the table
+    print("\n🚀 Streaming records into comprehensive_attractions...")
+    stats = import_in_chunks(
+        data, to_row, copy_writer(conn, 'comprehensive_attractions', ATTRACTION_COLUMNS),
+        chunk_size, label='attractions')
 
-    print(f"   Valid unique records to insert: {len(values)}")
-    print(f"   Skipped (missing data): {skipped}")
-    print(f"   Duplicates in source data: {source_duplicates}")
-    print(
-        f"   Already in database: {len(data) - skipped - source_duplicates - len(values)}")
+    print(f"   Valid unique records inserted: {stats['written']}")
+    print(f"   Skipped (missing data): {counts['skipped']}")
+    print(f"   Duplicates in source data: {counts['source_duplicates']}")
+    print(f"   Already in database: {counts['in_database']}")
 
-    if not values:
+    if not stats['written']:
         print("\n⚠️  No new records to insert!")
         cursor.close()
         conn.close()
         return
 
-    # Bulk insert using execute_values for efficiency
-    print(
-        f"\n🚀 Bulk inserting {len(values)} records into comprehensive_attractions...")
-
-    insert_query = """
-        INSERT INTO comprehensive_attractions 
-            (city, name, raw_name, description, category, 
-             latitude, longitude, osm_id, osm_type, osm_tags,
-             wikidata_id, wikipedia_url, has_image, image_url, 
-             thumb_url, original_url, image_creator, image_license, 
-             image_attribution, source_osm, source_wikidata, source_commons)
-        VALUES %s
-    """
-
-    execute_values(cursor, insert_query, values, page_size=500)
-    conn.commit()
-
     # Count after import
     cursor.execute("SELECT COUNT(*) FROM comprehensive_attractions")
     result = cursor.fetchone()
@@ -214,7 +207,7 @@ def import_to_comprehensive_attractions(data):
     conn.close()
 
 
-def import_to_attraction_images(data):
+def import_to_attraction_images(data, chunk_size=DEFAULT_CHUNK_SIZE):
     """Import high-quality images to attraction_images table with deduplication"""
     conn = psycopg2.connect(DATABASE_URL)
     cursor = conn.cursor()
@@ -244,17 +237,14 @@ def import_to_attraction_images(data):
     existing_qids = set(row[0] for row in cursor.fetchall())
     print(f"   Loaded {len(existing_qids)} existing Wikidata QIDs")
 
-    # Prepare image records with DISTINCT logic
-    print("\n   Processing image data...")
-    records_dict = {}  # Use dict to auto-deduplicate
-    skipped = 0
-    source_duplicates = 0
+    seen = set()
+    counts = {'skipped': 0, 'source_duplicates': 0, 'in_database': 0}
 
-    for item in data:
+    def to_row(item):
         image_data = item.get('image', {})
         if not image_data.get('originalUrl'):
-            skipped += 1
-            continue  # Skip items without images
+            counts['skipped'] += 1
+            return None  # Skip items without images
 
         city = item.get('city')
         name = item.get('name') or item.get('rawName')
@@ -267,26 +257,26 @@ def import_to_attraction_images(data):
         wikidata_id = item.get('wikidata')
 
         if not all([city, name, lat, lon]):
-            skipped += 1
-            continue
+            counts['skipped'] += 1
+            return None
 
         # Create unique key (case-insensitive)
         unique_key = (city.lower(), name.lower(), 'wikimedia_commons')
 
-        # Check if already in database by (city, name, source)
-        if unique_key in existing_tuples:
-            continue
-
-        # Check if Wikidata QID already exists (unique constraint)
-        if wikidata_id and wikidata_id in existing_qids:
-            continue
+        # Check if already in database by (city, name, source) or Wikidata QID (unique constraint)
+        if unique_key in existing_tuples or (wikidata_id and wikidata_id in existing_qids):
+            counts['in_database'] += 1
+            return None
 
         # Check if duplicate in source data
-        if unique_key in records_dict:
-            source_duplicates += 1
-            continue
-
-        records_dict[unique_key] = (
+        if unique_key in seen:
+            counts['source_duplicates'] += 1
+            return None
+        seen.add(unique_key)
+        if wikidata_id:
+            existing_qids.add(wikidata_id)
+
+        return (
             'wikimedia_commons',  # source
             wikidata_id,  # attraction_qid
             city,  # city
@@ -301,34 +291,22 @@ def import_to_attraction_images(data):
             wikidata_id,  # wikidata_id
         )
 
-    values = list(records_dict.values())
+    print("\n🚀 Streaming image records into attraction_images...")
+    stats = import_in_chunks(
+        data, to_row, copy_writer(conn, 'attraction_images', IMAGE_COLUMNS),
+        chunk_size, label='attractions')
 
-    print(f"   Valid unique image records to insert: {len(values)}")
-    print(f"   Skipped (no image or missing data): {skipped}")
-    print(f"   Duplicates in source data: {source_duplicates}")
-    print(
-        f"   Already in database: {len([i for i in data if i.get('image', {}).get('originalUrl')]) - skipped - source_duplicates - len(values)}")
+    print(f"   Valid unique image records inserted: {stats['written']}")
+    print(f"   Skipped (no image or missing data): {counts['skipped']}")
+    print(f"   Duplicates in source data: {counts['source_duplicates']}")
+    print(f"   Already in database: {counts['in_database']}")
 
-    if not values:
+    if not stats['written']:
         print("\n⚠️  No new image records to insert!")
         cursor.close()
         conn.close()
         return
 
-    # Bulk insert using execute_values
-    print(f"\n🚀 Bulk inserting {len(values)} image records...")
-
-    insert_query = """
-        INSERT INTO attraction_images 
-            (source, attraction_qid, city, attraction_name, license, 
-             license_url, creator, attribution, original_url, thumb_url,
-             confidence_score, wikidata_id)
-        VALUES %s
-    """
-
-    execute_values(cursor, insert_query, values, page_size=500)
-    conn.commit()
-
     # Count after
     cursor.execute(
         "SELECT COUNT(*) FROM attraction_images WHERE source = 'wikimedia_commons'")
@@ -367,7 +345,7 @@ def main():
     print("🇮🇹 Northern Italy Tourist Attractions Import")
     print("=" * 60)
 
-    # Load dataset
+    # Stream the dataset (each import reads the file once)
     data = load_dataset(filename)
 
     # Import to comprehensive_attractions
@@ -7,10 +7,11 @@ Records: 10 highly-rated Milano restaurants
 
 import json
 import psycopg2
-from psycopg2.extras import execute_values
 import os
 import sys
 
+from streaming_import import DEFAULT_CHUNK_SIZE, JsonRecords, import_in_chunks, values_writer
+
 # Database connection
 DATABASE_URL = os.environ.get(
     'DATABASE_URL',
@@ -19,15 +20,12 @@ DATABASE_URL = os.environ.get(
 
 
 def load_dataset(filename):
-    """Load JSON dataset"""
-    print(f"📂 Loading TripAdvisor dataset: {filename}")
-    with open(filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    print(f"✅ Loaded {len(data)} restaurants")
-    return data
+    """TripAdvisor records, streamed from the file (never loaded whole)"""
+    print(f"📂 Streaming TripAdvisor dataset: {filename} ({os.path.getsize(filename) / 1024 / 1024:.1f} MB)")
+    return JsonRecords(filename)
 
 
-def import_restaurants(data):
+def import_restaurants(data, chunk_size=DEFAULT_CHUNK_SIZE):
     """Import restaurants to comprehensive_attractions table"""
     conn = psycopg2.connect(DATABASE_URL)
     cursor = conn.cursor()
@@ -48,29 +46,31 @@ def import_restaurants(data):
     existing_names = set(row[0] for row in cursor.fetchall())
     print(f"   Loaded {len(existing_names)} existing names")
 
-    # Process TripAdvisor data
-    print("\n   Processing TripAdvisor restaurants...")
-    records_dict = {}
-    skipped = 0
-    duplicates = 0
+    # Process TripAdvisor data chunk by chunk, keeping only the names seen
+    seen = set()
+    imported = []  # first names, for the summary
+    counts = {'skipped': 0, 'duplicates': 0}
 
-    for item in data:
+    def to_row(item):
         name = item.get('name')
         lat = item.get('latitude')
         lon = item.get('longitude')
 
         if not all([name, lat, lon]):
-            skipped += 1
-            continue
+            counts['skipped'] += 1
+            return None
 
         # Check for duplicates (case-insensitive)
         name_lower = name.lower()
         if name_lower in existing_names:
-            duplicates += 1
-            continue
+            counts['duplicates'] += 1
+            return None
 
-        if name_lower in records_dict:
-            continue
+        if name_lower in seen:
+            return None
+        seen.add(name_lower)
+        if len(imported) < 20:
+            imported.append(name)
 
         # Build description from review tags
         review_tags = item.get('reviewTags', [])
@@ -119,7 +119,7 @@ def import_restaurants(data):
         street = address_obj.get('street1', '') or item.get('address', '')
         postal = address_obj.get('postalcode', '')
 
-        records_dict[name_lower] = (
+        return (
             'Milano',  # city
             name,  # name
             name,  # raw_name
@@ -155,21 +155,8 @@ def import_restaurants(data):
             False,  # source_commons
         )
 
-    values = list(records_dict.values())
-
-    print(f"   Valid unique restaurants to insert: {len(values)}")
-    print(f"   Skipped (missing data): {skipped}")
-    print(f"   Already in database: {duplicates}")
-
-    if not values:
-        print("\n⚠️  No new restaurants to insert!")
-        cursor.close()
-        conn.close()
-        return
-
-    # Bulk insert
-    print(
-        f"\n🚀 Inserting {len(values)} restaurants into comprehensive_attractions...")
+    # Bulk insert, one execute_values per chunk
+    print("\n🚀 Streaming restaurants into comprehensive_attractions...")
 
     insert_query = """
         INSERT INTO comprehensive_attractions 
@@ -181,8 +168,18 @@ def import_restaurants(data):
         VALUES %s
     """
 
-    execute_values(cursor, insert_query, values, page_size=100)
-    conn.commit()
+    stats = import_in_chunks(data, to_row, values_writer(conn, insert_query, page_size=100),
+                             chunk_size, label='restaurants')
+
+    print(f"   Valid unique restaurants inserted: {stats['written']}")
+    print(f"   Skipped (missing data): {counts['skipped']}")
+    print(f"   Already in database: {counts['duplicates']}")
+
+    if not stats['written']:
+        print("\n⚠️  No new restaurants to insert!")
+        cursor.close()
+        conn.close()
+        return
 
     # Count after
     cursor.execute(
@@ -197,8 +194,10 @@ def import_restaurants(data):
 
     # Show imported restaurants
     print(f"\n🍽️  Imported restaurants:")
-    for i, (_, name, *_) in enumerate(values, 1):
+    for i, name in enumerate(imported, 1):
         print(f"   {i}. {name}")
+    if stats['written'] > len(imported):
+        print(f"   ... and {stats['written'] - len(imported)} more")
 
     cursor.close()
     conn.close()
@@ -215,7 +214,7 @@ def main():
     print("🍽️  TripAdvisor Milano Restaurants Import")
     print("=" * 60)
 
-    # Load dataset
+    # Stream the dataset
     data = load_dataset(filename)
 
     # Import restaurants
@@ -71,7 +71,7 @@ def warm_cache_on_startup():
             max_scrapes=3, prioritize_users=True)
 
         logger.info(
-            f"✅ Startup cache warming: {result['successful']}/{result['total_attempted']}")
+            f"✅ Startup cache warming: {result.get('queued', 0)} tasks queued (job {result.get('job_id')})")
     except Exception as e:
         logger.error(f"❌ Startup cache warming failed: {e}")
 
@@ -227,10 +227,11 @@ def scrape(cities):
     from proactive_scraping import ProactiveScrapingManager
 
     manager = ProactiveScrapingManager()
-    result = manager.run_proactive_scraping(max_scrapes=cities)
+    result = manager.run_proactive_scraping(max_scrapes=cities, wait=True)
 
     click.echo(
-        f"✅ Scraped {result['successful']}/{result['total_attempted']} cities")
+        f"✅ Scraped {result.get('successful', 0)}/{result.get('total_attempted', 0)} cities "
+        f"({result.get('status')})")
 
 
 @scraping_cli.command()
@@ -2,14 +2,14 @@
 Sistema AI per contenuti ricchi e gestione imprevisti Viamigo
 Usa GPT-5 per generare dettagli autentici e Piano B intelligente
 """
-import os
 import json
-from openai import OpenAI
 from typing import List, Dict, Optional
+from llm_response_cache import llm_cache
+from llm_gateway import get_llm_client
 
 class IntelligentContentGenerator:
     def __init__(self):
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        self.client = get_llm_client()
         # Use GPT-4-turbo as the current best available model
         self.model = "gpt-4-turbo"
     
@@ -39,7 +39,9 @@ class IntelligentContentGenerator:
             Rispondi SOLO con JSON valido, basato su conoscenza reale del luogo.
             """
             
-            response = self.client.chat.completions.create(
+            content = llm_cache.chat_completion(
+                self.client, 'place_details',
+                scope={'city': city},
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "Sei un esperto di viaggi che conosce i dettagli autentici di luoghi in tutto il mondo. Rispondi sempre con JSON valido."},
@@ -49,7 +51,6 @@ class IntelligentContentGenerator:
                 timeout=8  # Fast 8-second timeout
             )
             
-            content = response.choices[0].message.content
             return json.loads(content)
             
         except Exception as e:
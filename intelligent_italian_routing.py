@@ -18,6 +18,25 @@ from typing import List, Dict, Optional, Tuple
 import json
 
 
+# Name/alias -> canonical city handled by the router (checked in order)
+CITY_ALIASES = {
+    'milano': 'Milano', 'milan': 'Milano',
+    'roma': 'Roma', 'rome': 'Roma',
+    'torino': 'Torino', 'turin': 'Torino',
+    'venezia': 'Venezia', 'venice': 'Venezia',
+    'firenze': 'Firenze', 'florence': 'Firenze',
+    'napoli': 'Napoli', 'naples': 'Napoli',
+    'bologna': 'Bologna',
+    'genova': 'Genova', 'genoa': 'Genova',
+    'palermo': 'Palermo',
+    'catania': 'Catania',
+    'bari': 'Bari',
+    'verona': 'Verona',
+    'padova': 'Padova', 'padua': 'Padova',
+    'trieste': 'Trieste',
+}
+
+
 class IntelligentItalianRouter:
     def __init__(self):
         self.db_url = os.getenv('DATABASE_URL')
@@ -40,6 +59,14 @@ class IntelligentItalianRouter:
             'trieste': [45.6495, 13.7768],
         }
 
+    def detect_city(self, text: str) -> Optional[str]:
+        """Canonical router city mentioned in free text (e.g. start + end), or None"""
+        text = text.lower()
+        for alias, city_name in CITY_ALIASES.items():
+            if alias in text:
+                return city_name
+        return None
+
     def generate_intelligent_itinerary(
         self,
         start: str,
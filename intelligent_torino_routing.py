@@ -12,6 +12,8 @@ import os
 from typing import List, Dict, Optional
 import random
 
+from request_deadline import apply_statement_timeout
+
 
 class IntelligentTorinoRouter:
     def __init__(self):
@@ -52,6 +54,7 @@ class IntelligentTorinoRouter:
         try:
             conn = psycopg2.connect(self.db_url)
             cursor = conn.cursor()
+            apply_statement_timeout(cursor)
 
             # Priority 1: Try place_cache (has best data for Torino - 12 attractions)
             cursor.execute("""
@@ -131,6 +134,7 @@ class IntelligentTorinoRouter:
         try:
             conn = psycopg2.connect(self.db_url)
             cursor = conn.cursor()
+            apply_statement_timeout(cursor)
 
             # Try exact match first
             cursor.execute("""
@@ -6,7 +6,10 @@ Italy Attractions Image Ingestor (v3_fixed - NO WDQS + robust downloads)
 - Evita WDQS (usa solo le API MediaWiki di Wikidata).
 - Pescaggio item con `haswbstatement` per P131 (città) + P31 (classe).
 - Prelievo P18 via wbgetentities.
-- Download thumbs 1280px da Commons con retry/backoff e fallback all'originale.
+- imageinfo Commons a blocchi di 50 titoli.
+- Download thumbs 1280px da Commons in parallelo (image_harvester.py: limiti per host,
+  Retry-After, fallback all'originale, checkpoint riprendibile, dedup percettiva),
+  byte nel blob store e insert a blocchi.
 - Flag --debug per loggare URL e status in chiaro.
 - Supporto proxy via env (HTTP_PROXY/HTTPS_PROXY) e timeout configurabili.
 
@@ -15,16 +18,16 @@ Esempio:
   python italy_attractions_to_postgres_v3_fixed.py --cities "Roma" --per-class-limit 300 --debug
 """
 import os
-import io
 import time
 import argparse
 import sys
-import hashlib
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional
 import requests
 from requests.adapters import HTTPAdapter, Retry
 import psycopg2
-import psycopg2.extras
+
+from image_harvester import (HARVEST_CONCURRENCY, HARVEST_PER_HOST, Checkpoint, ImageHarvester,
+                             PerceptualIndex, PostgresImageSink, ensure_harvest_columns, load_known_images)
 
 WIKIDATA_API = "https://www.wikidata.org/w/api.php"
 COMMONS_API = "https://commons.wikimedia.org/w/api.php"
@@ -102,18 +105,6 @@ CREATE UNIQUE INDEX IF NOT EXISTS uq_source_sid ON attraction_images (source, so
 CREATE UNIQUE INDEX IF NOT EXISTS uq_qid ON attraction_images (attraction_qid);
 """
 
-INS = """
-INSERT INTO attraction_images (
-  source, source_id, attraction_qid, city, attraction_name, license, license_url, creator,
-  attribution, original_url, thumb_url, img_bytes, mime_type, width, height, sha256
-) VALUES (
-  %(source)s, %(source_id)s, %(attraction_qid)s, %(city)s, %(attraction_name)s, %(license)s, %(license_url)s, %(creator)s,
-  %(attribution)s, %(original_url)s, %(thumb_url)s, %(img_bytes)s, %(mime_type)s, %(width)s, %(height)s, %(sha256)s
-)
-ON CONFLICT DO NOTHING
-"""
-
-
 def city_qid(sess: requests.Session, name: str, debug=False) -> Optional[str]:
     r = sess.get(WIKIDATA_API, params={
         "action": "wbsearchentities", "search": name, "language": "it", "format": "json", "type": "item", "limit": 10
@@ -192,69 +183,77 @@ def p18_titles(entity: Dict) -> List[str]:
     return titles
 
 
-def commons_info(sess: requests.Session, title: str, width: int = 1280, debug=False) -> Optional[Dict]:
-    r = sess.get(COMMONS_API, params={
-        "action": "query", "format": "json", "prop": "imageinfo", "titles": title,
-        "iiprop": "url|mime|size|extmetadata", "iiurlwidth": width, "redirects": 1, "origin": "*"
-    }, allow_redirects=True)
-    r.raise_for_status()
-    j = r.json()
-    pages = j.get("query", {}).get("pages", {}) or {}
-    for _, page in pages.items():
-        ii = page.get("imageinfo", []) or []
-        if not ii:
-            continue
-        info = ii[0]
-        ext = info.get("extmetadata", {}) or {}
-        creator = (ext.get("Artist", {}) or {}).get("value") or ""
-        lic = (ext.get("LicenseShortName", {}) or {}).get("value") or ""
-        licu = (ext.get("LicenseUrl", {}) or {}).get("value") or ""
-        credit = (ext.get("Credit", {}) or {}).get("value") or ""
-        attr = f"{creator} – {lic}".strip(" –") if (
-            creator or lic) else (credit or "")
-        out = {
-            "original_url": info.get("url"),
-            "thumb_url": info.get("thumburl") or info.get("url"),
-            "mime_type": info.get("mime"),
-            "width": info.get("thumbwidth") or info.get("width"),
-            "height": info.get("thumbheight") or info.get("height"),
-            "creator": creator, "license": lic, "license_url": licu, "attribution": attr
-        }
-        if debug:
-            log(
-                f"    commons {title} -> thumb={out['thumb_url']} orig={out['original_url']}")
-        return out
-    return None
-
-
-def download_with_retry(sess: requests.Session, url: str, debug=False) -> Tuple[bytes, Optional[str]]:
-    # Try GET (thumb); on 404 or other errors, bubble up to caller
-    if debug:
-        log(f"    download: GET {url}")
-    r = sess.get(url, stream=True, allow_redirects=True)
+def _commons_page_info(info: Dict) -> Dict:
+    ext = info.get("extmetadata", {}) or {}
+    creator = (ext.get("Artist", {}) or {}).get("value") or ""
+    lic = (ext.get("LicenseShortName", {}) or {}).get("value") or ""
+    licu = (ext.get("LicenseUrl", {}) or {}).get("value") or ""
+    credit = (ext.get("Credit", {}) or {}).get("value") or ""
+    attr = f"{creator} – {lic}".strip(" –") if (
+        creator or lic) else (credit or "")
+    return {
+        "original_url": info.get("url"),
+        "thumb_url": info.get("thumburl") or info.get("url"),
+        "mime_type": info.get("mime"),
+        "width": info.get("thumbwidth") or info.get("width"),
+        "height": info.get("thumbheight") or info.get("height"),
+        "creator": creator, "license": lic, "license_url": licu, "attribution": attr
+    }
+
+
+def commons_infos(sess: requests.Session, titles: List[str], width: int = 1280, debug=False) -> Dict[str, Dict]:
+    """imageinfo di più file, 50 titoli per richiesta (invece di una chiamata per entità)"""
+    result: Dict[str, Dict] = {}
+    for chunk in chunked(titles, 50):
+        r = sess.get(COMMONS_API, params={
+            "action": "query", "format": "json", "prop": "imageinfo", "titles": "|".join(chunk),
+            "iiprop": "url|mime|size|extmetadata", "iiurlwidth": width, "redirects": 1, "origin": "*"
+        }, allow_redirects=True)
+        r.raise_for_status()
+        q = r.json().get("query", {}) or {}
+        # titolo richiesto -> titolo della pagina (normalizzazione "_" -> " ", redirect)
+        renamed = {n["to"]: n["from"] for n in (q.get("normalized") or [])}
+        for rd in q.get("redirects") or []:
+            renamed[rd["to"]] = renamed.get(rd["from"], rd["from"])
+        for _, page in (q.get("pages", {}) or {}).items():
+            ii = page.get("imageinfo", []) or []
+            if not ii:
+                continue
+            title = page.get("title", "")
+            result[renamed.get(title, title)] = _commons_page_info(ii[0])
+        time.sleep(0.2)
     if debug:
-        log(f"    status: {r.status_code}")
-    r.raise_for_status()
-    buf = io.BytesIO()
-    for ch in r.iter_content(65536):
-        if ch:
-            buf.write(ch)
-    return buf.getvalue(), r.headers.get("Content-Type")
+        log(f"    commons imageinfo: {len(result)}/{len(titles)}")
+    return result
 
 
 def ensure_schema(conn):
     with conn.cursor() as cur:
         cur.execute(SCHEMA)
+        ensure_harvest_columns(cur)
 
 
-def insert_row(conn, row: Dict) -> bool:
-    try:
-        with conn.cursor() as cur:
-            cur.execute(INS, row)
-        return True
-    except Exception as e:
-        log(f"Insert skipped/failed {row.get('attraction_qid')} ({row.get('source_id')}): {e}")
-        return False
+def entity_jobs(ents: Dict[str, Dict], infos: Dict[str, Dict], city: str) -> List[Dict]:
+    """Un job per entità con P18: thumb Commons, fallback all'originale"""
+    jobs = []
+    for qid, ent in ents.items():
+        titles = p18_titles(ent)
+        if not titles or titles[0] not in infos:
+            continue
+        ft = titles[0]  # primo P18
+        info = infos[ft]
+        jobs.append({
+            "key": f"wikimedia:{qid}:{ft}",
+            "urls": [u for u in (info.get("thumb_url"), info.get("original_url")) if u],
+            "row": {
+                "source": "wikimedia", "source_id": ft, "attraction_qid": qid, "city": city,
+                "attraction_name": label_it_or_en(ent),
+                "license": info.get("license"), "license_url": info.get("license_url"), "creator": info.get("creator"),
+                "attribution": info.get("attribution"), "original_url": info.get("original_url"),
+                "thumb_url": info.get("thumb_url"),
+            },
+        })
+    return jobs
 
 
 def main():
@@ -266,6 +265,9 @@ def main():
     ap.add_argument("--thumb-width", type=int, default=1280)
     ap.add_argument("--connect-timeout", type=int, default=15)
     ap.add_argument("--read-timeout", type=int, default=60)
+    ap.add_argument("--concurrency", type=int, default=HARVEST_CONCURRENCY)
+    ap.add_argument("--per-host", type=int, default=HARVEST_PER_HOST)
+    ap.add_argument("--checkpoint", type=str, default="italy_attractions_images.checkpoint")
     ap.add_argument("--debug", action="store_true")
     a = ap.parse_args()
 
@@ -284,7 +286,9 @@ def main():
 
     conn = db_connect()
     ensure_schema(conn)
-    total = 0
+    harvester = ImageHarvester(PostgresImageSink(conn), Checkpoint(a.checkpoint), session=sess,
+                               concurrency=a.concurrency, per_host=a.per_host,
+                               index=load_known_images(conn, PerceptualIndex()), hash_columns=("sha256",))
 
     for city in cities:
         log(f"Resolve QID: {city}")
@@ -315,57 +319,18 @@ def main():
             continue
 
         ents = get_entities(sess, sorted(all_qids), debug=a.debug)
+        titles = sorted({p18_titles(ent)[0] for ent in ents.values() if p18_titles(ent)})
+        try:
+            infos = commons_infos(sess, titles, a.thumb_width, debug=a.debug)
+        except Exception as e:
+            log(f"  commons error {city}: {e}")
+            continue
 
-        for qid, ent in ents.items():
-            label = label_it_or_en(ent)
-            titles = p18_titles(ent)
-            if not titles:
-                continue
-
-            ft = titles[0]  # primo P18
-            info = commons_info(sess, ft, a.thumb_width, debug=a.debug)
-            if not info:
-                continue
-            url = info.get("thumb_url") or info.get("original_url")
-            if not url:
-                continue
-
-            # prova thumb → fallback originale
-            try:
-                data, mime = download_with_retry(sess, url, debug=a.debug)
-            except requests.HTTPError as e:
-                if a.debug:
-                    log(f"    thumb failed: {e}")
-                if info.get("original_url"):
-                    try:
-                        data, mime = download_with_retry(
-                            sess, info["original_url"], debug=a.debug)
-                    except Exception as e2:
-                        log(f"  download fail {ft}: {e2}")
-                        continue
-                else:
-                    continue
-            except Exception as e:
-                log(f"  download fail {ft}: {e}")
-                continue
+        before = harvester.stats["stored"]
+        harvester.run(entity_jobs(ents, infos, city))
+        log(f"Done {city} — {harvester.stats['stored'] - before} new, {harvester.report()}")
 
-            row = {
-                "source": "wikimedia", "source_id": ft, "attraction_qid": qid, "city": city, "attraction_name": label,
-                "license": info.get("license"), "license_url": info.get("license_url"), "creator": info.get("creator"),
-                "attribution": info.get("attribution"), "original_url": info.get("original_url"), "thumb_url": info.get("thumb_url"),
-                "img_bytes": psycopg2.Binary(data), "mime_type": info.get("mime_type") or mime,
-                "width": info.get("width"), "height": info.get("height"),
-                "sha256": hashlib.sha256(data).hexdigest()
-            }
-            ok = insert_row(conn, row)
-            if ok:
-                total += 1
-                if total % 25 == 0:
-                    log(f"Inserted so far: {total}")
-
-        log(f"Done {city} — total: {total}")
-
-    log(f"ALL DONE — inserted: {total}")
+    log(f"ALL DONE — {harvester.report()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,540 @@
+"""
+Itinerary Precompiler - Offline top itineraries per city for instant /plan serving
+For every city in comprehensive_attractions, pick the common start hubs
+(railway stations, main piazzas, the centre), then build an optimized route
+for each hub pair, duration and interest profile and store it in the
+precomputed_itineraries table. /plan serves an exact or nearest match from
+an in-memory per-city index and only falls back to live planning for novel
+inputs.
+
+Usage:
+    python itinerary_precompiler.py build [--city Torino] [--hubs 6]
+    python itinerary_precompiler.py lookup Torino "Porta Nuova" "Piazza Castello"
+    python itinerary_precompiler.py stats
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DURATIONS = ('half_day', 'full_day')
+MAX_STOPS = {'half_day': 4, 'full_day': 6}
+MAX_DETOUR_KM = {'half_day': 2.5, 'full_day': 5.0}
+
+# Interest profile -> category keywords of comprehensive_attractions (same families as the live router)
+PROFILE_CATEGORIES = {
+    'default': ('attraction', 'museum', 'artwork', 'gallery', 'viewpoint', 'monument', 'memorial',
+                'church', 'palace', 'castle', 'tower', 'square', 'park', 'garden'),
+    'culture': ('attraction', 'museum', 'artwork', 'gallery', 'viewpoint', 'monument', 'memorial',
+                'church', 'palace', 'castle', 'tower', 'square'),
+    'parks': ('park', 'garden', 'viewpoint'),
+    'food': ('restaurant', 'cafe', 'dining'),
+}
+# User interest words -> profile (checked in this order on ties)
+PROFILE_INTERESTS = {
+    'culture': {'culture', 'cultura', 'storia', 'history', 'arte', 'art', 'musei', 'museums'},
+    'parks': {'parks', 'parchi', 'nature', 'natura', 'verde'},
+    'food': {'food', 'cibo', 'gastronomia', 'ristoranti'},
+}
+
+HUB_PATTERNS = re.compile(r'\b(stazione|station|piazza|piazzale|largo|porta)\b', re.I)
+STOPWORDS = {'di', 'del', 'della', 'dei', 'delle', 'il', 'la', 'lo', 'le', 'da', 'in', 'a', 'e', 'the', 'of'}
+NAME_MATCH_RATIO = 0.8
+CITY_INDEX_TTL = float(os.getenv('PRECOMPUTED_INDEX_TTL', '3600'))
+# A hub matched by name (not exactly) must be this close to the caller's coordinates, when given
+NEAREST_HUB_MAX_KM = float(os.getenv('PRECOMPUTED_NEAREST_MAX_KM', '0.5'))
+
+
+def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(h))
+
+
+def normalize_place(text: str, city: str = '') -> str:
+    """'Piazza Castello, Torino' -> 'piazza castello' (accents, punctuation, city and stopwords removed)"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    city_norm = unicodedata.normalize('NFKD', city or '').encode('ascii', 'ignore').decode().lower()
+    tokens = [t for t in re.findall(r'[a-z0-9]+', text) if t not in STOPWORDS and t != city_norm]
+    return ' '.join(tokens)
+
+
+def profile_for(interests: Optional[List[str]]) -> str:
+    """Interest profile closest to the user's interests ('default' when none overlap)"""
+    words = {w.lower() for w in (interests or [])}
+    best, best_overlap = 'default', 0
+    for profile, keywords in PROFILE_INTERESTS.items():
+        overlap = len(words & keywords)
+        if overlap > best_overlap:
+            best, best_overlap = profile, overlap
+    return best
+
+
+# ---------------------------------------------------------------- route building
+
+def select_hubs(city: str, attractions: List[Dict], center: Optional[Tuple[float, float]],
+                limit: int = 6) -> List[Dict]:
+    """Railway stations first, then the piazzas with most attractions within 500 m, plus the centre"""
+    candidates = []
+    seen = set()
+    for attraction in attractions:
+        key = normalize_place(attraction['name'], city)
+        if not key or key in seen or not HUB_PATTERNS.search(attraction['name']):
+            continue
+        seen.add(key)
+        point = (attraction['latitude'], attraction['longitude'])
+        is_station = 'stazione' in key or 'station' in (attraction.get('category') or '')
+        nearby = sum(1 for other in attractions
+                     if haversine_km(point, (other['latitude'], other['longitude'])) <= 0.5)
+        candidates.append((not is_station, -nearby, attraction['name'], point))
+
+    hubs = [{'name': name, 'latitude': point[0], 'longitude': point[1]}
+            for _, _, name, point in sorted(candidates)[:max(0, limit - 1)]]
+    if center:
+        hubs.append({'name': f"Centro {city}", 'latitude': center[0], 'longitude': center[1]})
+    return hubs
+
+
+def profile_attractions(attractions: List[Dict], profile: str) -> List[Dict]:
+    keywords = PROFILE_CATEGORIES[profile]
+    return [a for a in attractions if any(k in (a.get('category') or '').lower() for k in keywords)]
+
+
+def _route_length(points: List[Tuple[float, float]]) -> float:
+    return sum(haversine_km(points[i], points[i + 1]) for i in range(len(points) - 1))
+
+
+def order_stops(start: Tuple[float, float], end: Tuple[float, float], stops: List[Dict]) -> List[Dict]:
+    """Nearest-neighbour walk from start, improved by 2-opt with both endpoints fixed"""
+    remaining = list(stops)
+    ordered = []
+    current = start
+    while remaining:
+        nearest = min(remaining, key=lambda s: haversine_km(current, (s['latitude'], s['longitude'])))
+        remaining.remove(nearest)
+        ordered.append(nearest)
+        current = (nearest['latitude'], nearest['longitude'])
+
+    def length(route):
+        return _route_length([start] + [(s['latitude'], s['longitude']) for s in route] + [end])
+
+    improved = True
+    while improved:
+        improved = False
+        best = length(ordered)
+        for i in range(len(ordered) - 1):
+            for j in range(i + 1, len(ordered)):
+                candidate = ordered[:i] + ordered[i:j + 1][::-1] + ordered[j + 1:]
+                candidate_length = length(candidate)
+                if candidate_length < best - 1e-9:
+                    ordered, best, improved = candidate, candidate_length, True
+    return ordered
+
+
+def choose_stops(start: Tuple[float, float], end: Tuple[float, float], attractions: List[Dict],
+                 duration: str, exclude: Tuple[str, ...] = ()) -> List[Dict]:
+    """Best stops by detour from the start->end corridor, with a bonus for richer records"""
+    direct = haversine_km(start, end)
+    scored = []
+    seen = set(normalize_place(name) for name in exclude)
+    for attraction in attractions:
+        key = normalize_place(attraction['name'])
+        if key in seen:
+            continue
+        seen.add(key)
+        point = (attraction['latitude'], attraction['longitude'])
+        detour = haversine_km(start, point) + haversine_km(point, end) - direct
+        if detour > MAX_DETOUR_KM[duration]:
+            continue
+        richness = 0.3 * bool(attraction.get('image_url')) + 0.3 * bool(attraction.get('description'))
+        scored.append((detour - richness, attraction['name'], attraction))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return order_stops(start, end, [a for _, _, a in scored[:MAX_STOPS[duration]]])
+
+
+# ---------------------------------------------------------------- store
+
+class PrecomputedItineraryStore:
+    """
+    precomputed_itineraries in PostgreSQL behind an in-memory per-city index;
+    lookups touch the database at most once per city per PRECOMPUTED_INDEX_TTL
+    """
+
+    def __init__(self, database_url: Optional[str] = None, max_cities: int = 64):
+        self.database_url = database_url if database_url is not None else os.getenv('DATABASE_URL')
+        self.max_cities = max_cities
+        self._cities = OrderedDict()  # city key -> {'hubs', 'entries', 'loaded_at'}
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._db_retry_at = 0.0
+        self.stats = {'exact': 0, 'nearest': 0, 'misses': 0, 'lookup_ms_total': 0.0}
+
+    @property
+    def _db_disabled(self) -> bool:
+        return not self.database_url or time.time() < self._db_retry_at
+
+    def _db_failed(self, action: str, error: Exception):
+        logger.warning(f"⚠️ Precomputed itineraries DB {action} failed, memory only for 60s: {error}")
+        self._db_retry_at = time.time() + 60
+
+    def _connect(self):
+        return psycopg2.connect(self.database_url, connect_timeout=3)
+
+    def _ensure_table(self, cur):
+        if self._table_ready:
+            return
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS precomputed_itineraries (
+                city VARCHAR(100) NOT NULL,
+                start_hub VARCHAR(200) NOT NULL,
+                end_hub VARCHAR(200) NOT NULL,
+                duration VARCHAR(20) NOT NULL,
+                profile VARCHAR(20) NOT NULL,
+                start_lat DOUBLE PRECISION,
+                start_lon DOUBLE PRECISION,
+                end_lat DOUBLE PRECISION,
+                end_lon DOUBLE PRECISION,
+                itinerary JSONB NOT NULL,
+                built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (city, start_hub, end_hub, duration, profile)
+            )
+        """)
+        self._table_ready = True
+
+    @staticmethod
+    def _city_key(city: str) -> str:
+        return normalize_place(city)
+
+    def _index(self, city_key: str, rows) -> Dict:
+        hubs, entries = {}, {}
+        for start_hub, end_hub, duration, profile, start_lat, start_lon, end_lat, end_lon, itinerary in rows:
+            hubs[start_hub] = (start_lat, start_lon)
+            hubs[end_hub] = (end_lat, end_lon)
+            entries[(start_hub, end_hub, duration, profile)] = itinerary
+        return {'hubs': hubs, 'normalized': {normalize_place(h, city_key): h for h in hubs},
+                'entries': entries, 'loaded_at': time.time()}
+
+    def _remember(self, city_key: str, index: Dict):
+        with self._lock:
+            self._cities[city_key] = index
+            self._cities.move_to_end(city_key)
+            while len(self._cities) > self.max_cities:
+                self._cities.popitem(last=False)
+
+    def city_index(self, city: str) -> Optional[Dict]:
+        """Per-city index from memory, loaded from the table when missing or stale"""
+        city_key = self._city_key(city)
+        with self._lock:
+            index = self._cities.get(city_key)
+        if index is not None and time.time() - index['loaded_at'] < CITY_INDEX_TTL:
+            return index
+        if self._db_disabled:
+            return index
+
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                self._ensure_table(cur)
+                cur.execute("""
+                    SELECT start_hub, end_hub, duration, profile,
+                           start_lat, start_lon, end_lat, end_lon, itinerary
+                    FROM precomputed_itineraries WHERE city = %s
+                """, (city_key,))
+                rows = cur.fetchall()
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            self._db_failed('read', e)
+            return index
+
+        # Cities without precomputed routes are remembered too (no DB hit per request)
+        index = self._index(city_key, [(*row[:8], row[8] if isinstance(row[8], list) else json.loads(row[8]))
+                                       for row in rows])
+        self._remember(city_key, index)
+        return index
+
+    def save_city(self, city: str, entries: List[Dict]):
+        """Replace a city's precomputed itineraries (memory, then one transaction in the table)"""
+        city_key = self._city_key(city)
+        rows = [(e['start_hub']['name'], e['end_hub']['name'], e['duration'], e['profile'],
+                 e['start_hub']['latitude'], e['start_hub']['longitude'],
+                 e['end_hub']['latitude'], e['end_hub']['longitude'], e['itinerary'])
+                for e in entries]
+        self._remember(city_key, self._index(city_key, rows))
+
+        if self._db_disabled:
+            return
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                self._ensure_table(cur)
+                cur.execute("DELETE FROM precomputed_itineraries WHERE city = %s", (city_key,))
+                execute_values(cur, """
+                    INSERT INTO precomputed_itineraries
+                        (city, start_hub, end_hub, duration, profile,
+                         start_lat, start_lon, end_lat, end_lon, itinerary)
+                    VALUES %s
+                """, [(city_key, *row[:8], json.dumps(row[8], separators=(',', ':'))) for row in rows],
+                    page_size=500)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            self._db_failed('write', e)
+
+    @staticmethod
+    def _match_hub(index: Dict, text: str, city: str,
+                   coords: Optional[Tuple[float, float]] = None) -> Tuple[Optional[str], bool]:
+        """
+        (hub, exact) for a free-text location: same normalized name, else containment or close spelling
+
+        A non-exact hub is only accepted within NEAREST_HUB_MAX_KM of the
+        caller's coordinates or, without coordinates, when the names differ
+        only by hub words or typos ('Porta Nuova', 'Piaza Castello'), never
+        by a distinguishing word ('Stazione Porta Susa' is not Porta Nuova).
+        """
+        query = normalize_place(text, city)
+        if not query: return None, False
+        if query in index['normalized']: return index['normalized'][query], True
+        if query in ('centro', 'centro storico', 'center', 'centre'):
+            centre = next((h for n, h in index['normalized'].items() if n.startswith('centro')), None)
+            return PrecomputedItineraryStore._near(index, centre, coords, query, None), False
+        query_tokens = set(query.split())
+        best, best_score = None, 0.0
+        for normalized, hub in index['normalized'].items():
+            hub_tokens = set(normalized.split())
+            if hub_tokens <= query_tokens or query_tokens <= hub_tokens:
+                score = len(hub_tokens & query_tokens) / len(hub_tokens | query_tokens) + 1.0
+            else:
+                score = SequenceMatcher(None, query, normalized).ratio()
+                if score < NAME_MATCH_RATIO: continue
+            if score > best_score and PrecomputedItineraryStore._near(index, hub, coords, query, normalized):
+                best, best_score = hub, score
+        return best, False
+
+    @staticmethod
+    def _near(index: Dict, hub: Optional[str], coords: Optional[Tuple[float, float]],
+              query: str, normalized: Optional[str]) -> Optional[str]:
+        """hub if it can stand in for the query: within the distance cutoff, else same place by name"""
+        if hub is None:
+            return None
+        if coords and all(c is not None for c in index['hubs'].get(hub, (None, None))):
+            return hub if haversine_km(coords, index['hubs'][hub]) <= NEAREST_HUB_MAX_KM else None
+        if normalized is None:  # centre alias
+            return hub
+        query_tokens, hub_tokens = query.split(), normalized.split()
+        if set(hub_tokens) <= set(query_tokens) or set(query_tokens) <= set(hub_tokens):
+            return hub if all(HUB_PATTERNS.fullmatch(t) for t in set(query_tokens) ^ set(hub_tokens)) else None
+        same_words = len(query_tokens) == len(hub_tokens) and all(
+            q == h or SequenceMatcher(None, q, h).ratio() >= NAME_MATCH_RATIO
+            for q, h in zip(query_tokens, hub_tokens))
+        return hub if same_words else None
+
+    def lookup(self, city: str, start: str, end: str, duration: str = 'half_day',
+               interests: Optional[List[str]] = None,
+               start_coords: Optional[Tuple[float, float]] = None,
+               end_coords: Optional[Tuple[float, float]] = None) -> Optional[Dict]:
+        """
+        Precomputed itinerary for the request, or None for novel inputs
+
+        'exact' when both hubs, duration and interest profile match; 'nearest'
+        when a hub was matched by name similarity or the duration/profile was
+        substituted. Start and end stops carry the user's own labels.
+        start_coords/end_coords (lat, lon), when the caller has them, bound a
+        similarity match to hubs within NEAREST_HUB_MAX_KM.
+        """
+        started = time.perf_counter()
+        result = None
+        index = self.city_index(city) if city else None
+        if index and index['entries']:
+            start_hub, start_exact = self._match_hub(index, start, city, start_coords)
+            end_hub, end_exact = self._match_hub(index, end, city, end_coords)
+            wanted_duration = duration if duration in DURATIONS else 'half_day'
+            wanted_profile = profile_for(interests)
+            if start_hub and end_hub:
+                for profile in (wanted_profile, 'default'):
+                    itinerary = index['entries'].get((start_hub, end_hub, wanted_duration, profile))
+                    if itinerary:
+                        exact = (start_exact and end_exact and duration == wanted_duration
+                                 and profile == wanted_profile)
+                        result = {
+                            'itinerary': self._relabel(itinerary, start, end),
+                            'match': 'exact' if exact else 'nearest',
+                            'start_hub': start_hub, 'end_hub': end_hub,
+                            'duration': wanted_duration, 'profile': profile,
+                        }
+                        break
+
+        self.stats['lookup_ms_total'] += (time.perf_counter() - started) * 1000
+        self.stats[result['match'] if result else 'misses'] += 1
+        return result
+
+    @staticmethod
+    def _relabel(itinerary: List[Dict], start: str, end: str) -> List[Dict]:
+        stops = [dict(stop) for stop in itinerary]
+        if stops and stops[0].get('type') == 'start':
+            stops[0]['title'] = stops[0]['name'] = start
+        if stops and stops[-1].get('type') == 'destination':
+            stops[-1]['title'] = stops[-1]['name'] = end
+        return stops
+
+    def table_stats(self) -> Dict[str, Dict]:
+        """Itineraries and last build time per city in the table"""
+        conn = self._connect()
+        with conn.cursor() as cur:
+            self._ensure_table(cur)
+            cur.execute("""
+                SELECT city, COUNT(*), MAX(built_at) FROM precomputed_itineraries
+                GROUP BY city ORDER BY city
+            """)
+            rows = cur.fetchall()
+        conn.commit()
+        conn.close()
+        return {city: {'itineraries': count, 'built_at': built_at.isoformat() if built_at else None}
+                for city, count, built_at in rows}
+
+    def get_stats(self) -> Dict:
+        served = self.stats['exact'] + self.stats['nearest']
+        total = served + self.stats['misses']
+        with self._lock:
+            cities = {key: len(index['entries']) for key, index in self._cities.items()}
+        return {
+            **{k: v for k, v in self.stats.items() if k != 'lookup_ms_total'},
+            'hit_rate': round(served / total, 3) if total else 0.0,
+            'lookup_ms_avg': round(self.stats['lookup_ms_total'] / total, 3) if total else 0.0,
+            'cities_loaded': cities,
+        }
+
+
+precomputed_itineraries = PrecomputedItineraryStore()
+
+
+# ---------------------------------------------------------------- offline compiler
+
+class ItineraryPrecompiler:
+    """Builds every hub pair x duration x profile itinerary of a city with the live router's stop format"""
+
+    def __init__(self, store: PrecomputedItineraryStore = None, database_url: Optional[str] = None,
+                 hubs_per_city: int = 6, min_attractions: int = 5):
+        self.store = store or precomputed_itineraries
+        self.database_url = database_url if database_url is not None else os.getenv('DATABASE_URL')
+        self.hubs_per_city = hubs_per_city
+        self.min_attractions = min_attractions
+
+    def list_cities(self) -> List[str]:
+        conn = psycopg2.connect(self.database_url)
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT city FROM comprehensive_attractions
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND city IS NOT NULL
+                GROUP BY city HAVING COUNT(*) >= %s
+                ORDER BY COUNT(*) DESC
+            """, (self.min_attractions,))
+            cities = [row[0] for row in cur.fetchall()]
+        conn.close()
+        return cities
+
+    def load_attractions(self, city: str) -> List[Dict]:
+        conn = psycopg2.connect(self.database_url)
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT name, category, description, latitude, longitude, image_url
+                FROM comprehensive_attractions
+                WHERE LOWER(city) = LOWER(%s) AND name IS NOT NULL
+                  AND latitude IS NOT NULL AND longitude IS NOT NULL
+            """, (city,))
+            rows = cur.fetchall()
+        conn.close()
+        return [{'name': name, 'category': category or 'attraction', 'description': description or f'{name} a {city}',
+                 'latitude': float(lat), 'longitude': float(lon), 'image_url': image_url,
+                 'source': 'comprehensive_attractions'}
+                for name, category, description, lat, lon, image_url in rows]
+
+    def compile_city(self, city: str, attractions: Optional[List[Dict]] = None) -> List[Dict]:
+        """All itineraries of one city (not stored)"""
+        from intelligent_italian_routing import italian_router
+
+        attractions = self.load_attractions(city) if attractions is None else attractions
+        center = italian_router.city_centers.get(normalize_place(city).replace(' ', ''))
+        if center is None and attractions:
+            center = (sum(a['latitude'] for a in attractions) / len(attractions),
+                      sum(a['longitude'] for a in attractions) / len(attractions))
+        hubs = select_hubs(city, attractions, center, self.hubs_per_city)
+
+        entries = []
+        for profile in PROFILE_CATEGORIES:
+            pool = profile_attractions(attractions, profile)
+            if len(pool) < 2:
+                continue
+            for start_hub in hubs:
+                start = (start_hub['latitude'], start_hub['longitude'])
+                for end_hub in hubs:
+                    end = (end_hub['latitude'], end_hub['longitude'])
+                    for duration in DURATIONS:
+                        stops = choose_stops(start, end, pool, duration,
+                                             exclude=(start_hub['name'], end_hub['name']))
+                        if len(stops) < 2:
+                            continue
+                        itinerary = italian_router._build_intelligent_route(
+                            start_hub['name'], end_hub['name'], list(start), list(end),
+                            stops, None, city, duration)
+                        entries.append({'start_hub': start_hub, 'end_hub': end_hub, 'duration': duration,
+                                        'profile': profile, 'itinerary': itinerary})
+        return entries
+
+    def run(self, cities: Optional[List[str]] = None) -> Dict[str, int]:
+        """Compile and store the given cities (default: every city with enough attractions)"""
+        built = {}
+        for city in cities or self.list_cities():
+            started = time.time()
+            entries = self.compile_city(city)
+            self.store.save_city(city, entries)
+            built[city] = len(entries)
+            print(f"🧭 {city}: {len(entries)} itineraries in {time.time() - started:.1f}s")
+        return built
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Precompute itineraries per city')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build')
+    build.add_argument('--city', action='append', help='City to build (repeatable; default all)')
+    build.add_argument('--hubs', type=int, default=6, help='Start/end hubs per city')
+    lookup = sub.add_parser('lookup')
+    lookup.add_argument('city')
+    lookup.add_argument('start')
+    lookup.add_argument('end')
+    lookup.add_argument('--duration', default='half_day')
+    sub.add_parser('stats')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        result = ItineraryPrecompiler(hubs_per_city=args.hubs).run(args.city)
+        print(f"✅ {sum(result.values())} itineraries for {len(result)} cities")
+    elif args.command == 'lookup':
+        match = precomputed_itineraries.lookup(args.city, args.start, args.end, args.duration)
+        if not match:
+            print("❌ No precomputed match (live planning)")
+            sys.exit(1)
+        print(json.dumps({k: v for k, v in match.items() if k != 'itinerary'}, ensure_ascii=False))
+        for stop in match['itinerary']:
+            print(f"  {stop['time']:>13}  {stop['title']}")
+    else:
+        print(json.dumps(precomputed_itineraries.table_stats(), indent=2))
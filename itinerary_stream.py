@@ -0,0 +1,224 @@
+"""
+Itinerary Streaming - Progressive delivery for the planning endpoints
+Emits the route skeleton first, then per-stop details, images and AI tips
+as NDJSON lines (or Server-Sent Events) while each enrichment completes
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Response, stream_with_context
+
+logger = logging.getLogger(__name__)
+
+# Total time allowed for enrichments after the skeleton has been sent (seconds)
+STREAM_DEADLINE = float(os.getenv('PLAN_STREAM_DEADLINE', '25'))
+
+# Stop types that are real places (transit legs only carry coordinates)
+ENRICHABLE_TYPES = {'activity', 'destination', 'attraction', 'restaurant', None}
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('PLAN_STREAM_WORKERS', '8')),
+                               thread_name_prefix='plan-stream')
+
+
+# ---------------------------------------------------------------- enrichers
+
+def enrich_details(stop: Dict, city: str) -> Optional[Dict]:
+    """Database details for the stop (same source as /get_details)"""
+    from detail_handler import _get_details_from_comprehensive_db
+    return _get_details_from_comprehensive_db(stop.get('context', ''))
+
+
+def enrich_image(stop: Dict, city: str) -> Optional[Dict]:
+    """Image for stops the router could not illustrate"""
+    if stop.get('image_url'):
+        return None
+    from image_utils import get_image_for_attraction
+    return get_image_for_attraction(city, stop.get('title', ''), width=640)
+
+
+_content_generator = None
+
+
+def enrich_ai_tip(stop: Dict, city: str) -> Optional[Dict]:
+    """AI insider tip and highlights (served from the LLM response cache when warm)"""
+    global _content_generator
+    if _content_generator is None:
+        from intelligent_content_generator import IntelligentContentGenerator
+        _content_generator = IntelligentContentGenerator()
+    place_type = 'restaurant' if stop.get('category') == 'restaurant' else 'attraction'
+    details = _content_generator.enrich_place_details(stop.get('title', ''), city, place_type)
+    tip = {key: details.get(key) for key in
+           ('insider_tip', 'best_time', 'highlights', 'opening_hours', 'price_range') if details.get(key)}
+    return tip or None
+
+
+DEFAULT_ENRICHERS: List[Tuple[str, Callable[[Dict, str], Optional[Dict]]]] = [
+    ('details', enrich_details),
+    ('image', enrich_image),
+    ('ai_tip', enrich_ai_tip),
+]
+
+
+# ---------------------------------------------------------------- metrics
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class StreamMetrics:
+    """Time-to-first-stop and completion statistics per streaming endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._first_stop_ms = defaultdict(lambda: deque(maxlen=500))
+        self._complete_ms = defaultdict(lambda: deque(maxlen=500))
+        self.counters = defaultdict(lambda: {'streams': 0, 'errors': 0, 'enrichments': 0,
+                                             'failed': 0, 'timed_out': 0})
+
+    def record_first_stop(self, endpoint: str, elapsed_ms: float):
+        with self._lock:
+            self._first_stop_ms[endpoint].append(elapsed_ms)
+            self.counters[endpoint]['streams'] += 1
+
+    def record_completion(self, endpoint: str, elapsed_ms: float, sent: int, failed: int, timed_out: int):
+        with self._lock:
+            self._complete_ms[endpoint].append(elapsed_ms)
+            counters = self.counters[endpoint]
+            counters['enrichments'] += sent
+            counters['failed'] += failed
+            counters['timed_out'] += timed_out
+
+    def record_error(self, endpoint: str):
+        with self._lock:
+            self.counters[endpoint]['errors'] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {}
+            for endpoint, counters in self.counters.items():
+                first = list(self._first_stop_ms[endpoint])
+                complete = list(self._complete_ms[endpoint])
+                stats[endpoint] = {
+                    **counters,
+                    'time_to_first_stop_ms_p50': round(_percentile(first, 0.5), 1),
+                    'time_to_first_stop_ms_p95': round(_percentile(first, 0.95), 1),
+                    'complete_ms_p50': round(_percentile(complete, 0.5), 1),
+                    'complete_ms_p95': round(_percentile(complete, 0.95), 1),
+                }
+            return stats
+
+
+stream_metrics = StreamMetrics()
+
+
+# ---------------------------------------------------------------- streaming
+
+def wants_sse(req) -> bool:
+    """SSE when asked for explicitly (Accept header or ?format=sse), NDJSON otherwise"""
+    return 'text/event-stream' in req.headers.get('Accept', '') or req.args.get('format') == 'sse'
+
+
+def format_event(event: Dict, sse: bool = False) -> str:
+    payload = json.dumps(event, ensure_ascii=False, default=str)
+    if sse:
+        return f"event: {event['event']}\ndata: {payload}\n\n"
+    return payload + '\n'
+
+
+def skeleton_from_response(rv) -> Dict:
+    """Turn a non-streaming planning view's return value into a skeleton dict"""
+    response = rv[0] if isinstance(rv, tuple) else rv
+    data = response.get_json() or {}
+    if data.get('error') or data.get('success') is False:
+        raise RuntimeError(data.get('error', 'planning failed'))
+    return data
+
+
+def _is_enrichable(stop: Dict) -> bool:
+    return isinstance(stop, dict) and bool(stop.get('title')) and stop.get('type') in ENRICHABLE_TYPES
+
+
+def stream_itinerary(endpoint: str, build_skeleton: Callable[[], Dict],
+                     enrichers: Optional[List[Tuple[str, Callable]]] = None,
+                     deadline: Optional[float] = None, sse: bool = False):
+    """
+    Generator of planning events
+
+    Args:
+        endpoint: Metrics namespace (e.g. 'plan_ai_powered')
+        build_skeleton: Returns {'itinerary': [...], 'city': ..., ...}; runs first
+        enrichers: (kind, fn(stop, city)) pairs run concurrently per place stop
+        deadline: Seconds allowed for enrichments once the skeleton is out
+        sse: Format as Server-Sent Events instead of NDJSON
+
+    Events: start, skeleton, enrichment (index, kind, data), done; error on failure
+    """
+    enrichers = DEFAULT_ENRICHERS if enrichers is None else enrichers
+    deadline = STREAM_DEADLINE if deadline is None else deadline
+    started = time.time()
+
+    yield format_event({'event': 'start', 'endpoint': endpoint}, sse)
+
+    try:
+        skeleton = build_skeleton()
+    except Exception as e:
+        logger.error(f"Streaming skeleton failed for {endpoint}: {e}")
+        stream_metrics.record_error(endpoint)
+        yield format_event({'event': 'error', 'error': str(e)}, sse)
+        return
+
+    itinerary = skeleton.get('itinerary') or []
+    city = skeleton.get('city') or ''
+    first_stop_ms = (time.time() - started) * 1000
+    stream_metrics.record_first_stop(endpoint, first_stop_ms)
+    yield format_event({**skeleton, 'event': 'skeleton', 'time_to_first_stop_ms': round(first_stop_ms, 1)}, sse)
+
+    futures = {}
+    for index, stop in enumerate(itinerary):
+        if not _is_enrichable(stop):
+            continue
+        for kind, enricher in enrichers:
+            futures[_executor.submit(enricher, stop, city)] = (index, kind)
+
+    sent = failed = timed_out = 0
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            index, kind = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                failed += 1
+                logger.warning(f"Enrichment {kind} failed for stop {index}: {e}")
+                continue
+            if data:
+                sent += 1
+                yield format_event({'event': 'enrichment', 'index': index, 'kind': kind, 'data': data}, sse)
+    except FuturesTimeout:
+        for future in futures:
+            if not future.done():
+                future.cancel()
+                timed_out += 1
+
+    elapsed_ms = (time.time() - started) * 1000
+    stream_metrics.record_completion(endpoint, elapsed_ms, sent, failed, timed_out)
+    yield format_event({'event': 'done', 'enrichments': sent, 'failed': failed,
+                        'timed_out': timed_out, 'elapsed_ms': round(elapsed_ms, 1)}, sse)
+
+
+def stream_response(events, sse: bool = False) -> Response:
+    """Flask response for an event generator; disables proxy buffering"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream' if sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
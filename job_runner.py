@@ -0,0 +1,288 @@
+"""
+Job Runner - Bounded background execution for Viamigo
+Fixed worker pool, bounded queue with backpressure, job ids with result TTL,
+cooperative cancellation and deadlines
+"""
+
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+FINISHED_STATES = {DONE, FAILED, CANCELLED, EXPIRED}
+
+
+class JobQueueFull(Exception):
+    """Raised by submit() when the queue is at capacity; callers degrade instead of waiting"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job by check() once it was cancelled or ran past its deadline"""
+
+
+class Job:
+    """A unit of work plus its status, partial results and deadline"""
+
+    def __init__(self, job_id: str, func: Callable, args: tuple, kwargs: dict,
+                 deadline: Optional[float] = None):
+        self.id = job_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline  # absolute time.time(), None = no deadline
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.partial = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    # -------------------------------------------------- inside the job
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set() or (self.deadline is not None and time.time() > self.deadline)
+
+    def remaining(self, default: Optional[float] = None) -> Optional[float]:
+        """Seconds left before the deadline (default when the job has none)"""
+        if self.deadline is None:
+            return default
+        return max(0.0, self.deadline - time.time())
+
+    def check(self):
+        """Cooperative cancellation point for long jobs"""
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    def publish(self, key: str, value: Any):
+        """Expose a partial result to pollers before the job finishes"""
+        self.partial[key] = value
+
+    # -------------------------------------------------- outside the job
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def add_done_callback(self, callback: Callable[['Job'], Any]):
+        """Call callback(job) once the job finishes, whether it ran or not (now if already finished)"""
+        with self._callbacks_lock:
+            if self._callbacks is not None:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, status: str, result: Any = None, error: Optional[str] = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        with self._callbacks_lock:
+            callbacks, self._callbacks = self._callbacks, None
+        # Before waking waiters, so they observe the callbacks' effects
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.warning(f"⚠️ Job {self.id} callback failed: {e}")
+        self._finished.set()
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'partial': dict(self.partial),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+_local = threading.local()
+
+
+def current_job() -> Optional[Job]:
+    """The job the calling thread is executing, if any"""
+    return getattr(_local, 'job', None)
+
+
+class JobRunner:
+    """
+    Fixed-size worker pool fed by a bounded queue
+
+    Workers are started once and never replaced, so the thread count stays
+    constant regardless of load. A full queue rejects new work immediately
+    (JobQueueFull). Finished jobs are kept for result_ttl seconds so they
+    can be polled by id.
+    """
+
+    def __init__(self, name: str, max_workers: int = 4, max_queue: int = 100,
+                 result_ttl: int = 600, max_results: int = 1000):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = OrderedDict()  # job id -> Job, oldest first
+        self._lock = threading.Lock()
+        self._workers = []
+        self._started = False
+        self.stats = {'submitted': 0, 'rejected': 0, DONE: 0, FAILED: 0, CANCELLED: 0, EXPIRED: 0}
+
+    # -------------------------------------------------- workers
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._work, name=f"{self.name}-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._started = True
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job):
+        if job._cancel.is_set():
+            return self._record(job, CANCELLED)
+        if job.cancelled:
+            return self._record(job, EXPIRED, error='deadline passed before start')
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        _local.job = job
+        try:
+            result = job.func(*job.args, **job.kwargs)
+            self._record(job, DONE, result=result)
+        except JobCancelled as e:
+            self._record(job, CANCELLED if job._cancel.is_set() else EXPIRED, error=str(e))
+        except Exception as e:
+            logger.warning(f"⚠️ Job {job.id} in {self.name} failed: {e}")
+            job.exception = e
+            self._record(job, FAILED, error=str(e))
+        finally:
+            _local.job = None
+
+    def _record(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job._finish(status, result, error)
+        with self._lock:
+            self.stats[status] += 1
+
+    def in_worker(self) -> bool:
+        """True when called from one of this runner's worker threads"""
+        return threading.current_thread() in self._workers
+
+    # -------------------------------------------------- API
+
+    def submit(self, func: Callable, *args, job_id: Optional[str] = None,
+               timeout: Optional[float] = None, track: bool = True, **kwargs) -> Job:
+        """
+        Queue func(*args, **kwargs)
+
+        Args:
+            job_id: Stable id for polling (generated when omitted)
+            timeout: Deadline in seconds from now; the job is expired if it
+                cannot start in time and check()/remaining() observe it
+            track: Keep the job pollable by id (off for fire-and-wait callers)
+
+        Raises:
+            JobQueueFull: when max_queue jobs are already waiting
+        """
+        self._start()
+        self._purge()
+        job = Job(job_id or uuid.uuid4().hex, func, args, kwargs,
+                  deadline=time.time() + timeout if timeout else None)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.stats['rejected'] += 1
+                raise JobQueueFull(f"{self.name} queue full ({self.max_queue} jobs waiting)")
+            if track:
+                self._jobs[job.id] = job
+                self._jobs.move_to_end(job.id)
+            self.stats['submitted'] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if not job or job.status in FINISHED_STATES:
+            return False
+        job.cancel()
+        return True
+
+    def _purge(self):
+        """Drop finished jobs past their TTL, and the oldest ones beyond max_results"""
+        now = time.time()
+        with self._lock:
+            for job_id in list(self._jobs):
+                job = self._jobs[job_id]
+                expired = job.finished_at and now - job.finished_at > self.result_ttl
+                if expired or (len(self._jobs) > self.max_results and job.status in FINISHED_STATES):
+                    del self._jobs[job_id]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            finished = sum(self.stats[state] for state in FINISHED_STATES)
+            return {
+                'workers': len(self._workers),
+                'max_workers': self.max_workers,
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'in_progress': self.stats['submitted'] - finished,
+                'stored_jobs': len(self._jobs),
+                'result_ttl': self.result_ttl,
+                **self.stats,
+            }
+
+
+# Long-running enrichment work (lightning itineraries, AI enhancement)
+background_jobs = JobRunner(
+    'background',
+    max_workers=int(os.getenv('BACKGROUND_JOB_WORKERS', '4')),
+    max_queue=int(os.getenv('BACKGROUND_JOB_QUEUE', '100')),
+    result_ttl=int(os.getenv('BACKGROUND_JOB_RESULT_TTL', '600'))
+)
+
+# Short outbound API calls executed with a timeout by api_error_handler
+outbound_calls = JobRunner(
+    'outbound',
+    max_workers=int(os.getenv('OUTBOUND_CALL_WORKERS', '16')),
+    max_queue=int(os.getenv('OUTBOUND_CALL_QUEUE', '64')),
+    result_ttl=60
+)
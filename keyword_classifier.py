@@ -0,0 +1,191 @@
+"""
+Keyword Classifier - Compiled keyword tables for attraction classification
+All keywords of a city/attraction table go into one multi-pattern matcher
+(a trie compiled to a single regular expression) at startup, with an
+inverted index from keyword to the attractions listing it; a title is
+scanned once and only the attractions it hits are scored, instead of a
+substring test per keyword per attraction
+"""
+
+import re
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class KeywordAutomaton:
+    """
+    All patterns in one trie, compiled into a single regular expression so
+    the scan runs inside the re engine: each search yields the longest
+    pattern at the next position where any pattern starts, the shorter
+    patterns that are its prefixes come from a table built with the trie
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(dict.fromkeys(patterns))
+        trie = {}
+        for pattern in self.patterns:
+            node = trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        ids = {pattern: i for i, pattern in enumerate(self.patterns)}
+        self._prefixes = {
+            pattern: frozenset(ids[pattern[:end]] for end in range(1, len(pattern) + 1) if pattern[:end] in ids)
+            for pattern in self.patterns
+        }
+        self._regex = re.compile(self._trie_pattern(trie), re.DOTALL) if self.patterns else None
+
+    @classmethod
+    def _trie_pattern(cls, node: Dict) -> str:
+        branches = [re.escape(char) + cls._trie_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 and len(branches[0]) == 1 else f"(?:{'|'.join(branches)})"
+        return f'{body}?' if '' in node else body  # greedy: the longer pattern wins
+
+    def find(self, text: str) -> Set[int]:
+        """Ids of the patterns occurring anywhere in text (overlaps included)"""
+        found = set()
+        if self._regex is None:
+            return found
+        search, prefixes = self._regex.search, self._prefixes
+        match = search(text)
+        while match:
+            found |= prefixes[match.group()]
+            match = search(text, match.start() + 1)  # patterns starting inside this one
+        return found
+
+
+class KeywordClassifier:
+    """
+    Ranked (city, attraction, confidence) candidates for a text from a
+    {attraction: [keywords]} table, scored the way the hand-written loops did:
+    weight(keyword, kind) per matching keyword, a bonus for several matches,
+    then a factor for whether the attraction belongs to the city. Keywords
+    are lowercased, texts are matched as given. kind is
+    'exact' (text == keyword), 'contains' (keyword in text) or, with
+    match_within set, 'within' (text in keyword, for texts longer than
+    match_within characters)
+    """
+
+    def __init__(self, keyword_tables: Dict[str, List[str]], city_attractions: Dict[str, List[str]],
+                 weight: Callable[[str, str], float], multi_match_bonus: float,
+                 in_city: float, out_of_city: float,
+                 confidence: Callable[[float], Optional[float]], match_within: Optional[int] = None):
+        self.attractions = list(keyword_tables)
+        self.city_pairs = {(city, attraction) for city, names in city_attractions.items() for attraction in names}
+        self.multi_match_bonus = multi_match_bonus
+        self.in_city = in_city
+        self.out_of_city = out_of_city
+        self.confidence = confidence
+        self.match_within = match_within
+
+        # Inverted index: keyword -> [(attraction index, position in its list, weights by kind)]
+        postings = {}
+        for index, (attraction, keywords) in enumerate(keyword_tables.items()):
+            for position, keyword in enumerate(keywords):
+                keyword = keyword.lower()
+                weights = {kind: weight(keyword, kind) for kind in ('exact', 'contains', 'within')}
+                postings.setdefault(keyword, []).append((index, position, weights))
+        self.automaton = KeywordAutomaton(postings)
+        self.postings = [postings[keyword] for keyword in self.automaton.patterns]
+
+        # Every substring of every keyword -> keywords containing it ('within' matches)
+        self.containing = {}
+        if match_within is not None:
+            for pattern_id, keyword in enumerate(self.automaton.patterns):
+                for start in range(len(keyword)):
+                    for end in range(start + match_within + 1, len(keyword) + 1):
+                        self.containing.setdefault(keyword[start:end], set()).add(pattern_id)
+
+    def belongs_to_city(self, attraction: str, city: str) -> bool:
+        return (city, attraction) in self.city_pairs
+
+    def scores(self, text: str, city: str) -> List[Tuple[str, float]]:
+        """(attraction, score) for every attraction with at least one matching keyword, best first"""
+        hits = {}  # attraction index -> [(position, weight)]
+        found = self.automaton.find(text)
+        for pattern_id in found:
+            kind = 'exact' if self.automaton.patterns[pattern_id] == text else 'contains'
+            for index, position, weights in self.postings[pattern_id]:
+                hits.setdefault(index, []).append((position, weights[kind]))
+        if self.match_within is not None and len(text) > self.match_within:
+            for pattern_id in self.containing.get(text, ()):
+                if pattern_id not in found:
+                    for index, position, weights in self.postings[pattern_id]:
+                        hits.setdefault(index, []).append((position, weights['within']))
+
+        ranked = []
+        for index, matches in hits.items():
+            matches.sort()  # sum in table order, like the loops did
+            score = 0.0
+            for _, keyword_weight in matches:
+                score += keyword_weight
+            if len(matches) > 1:
+                score *= self.multi_match_bonus
+            attraction = self.attractions[index]
+            score *= self.in_city if self.belongs_to_city(attraction, city) else self.out_of_city
+            if score > 0:
+                ranked.append((-score, index, attraction))
+        ranked.sort()
+        return [(attraction, -score) for score, _, attraction in ranked]
+
+    def candidates(self, text: str, city: str) -> List[Tuple[str, str, float]]:
+        """Ranked (city, attraction, confidence); scores the confidence function rejects are dropped"""
+        result = []
+        for attraction, score in self.scores(text, city):
+            confidence = self.confidence(score)
+            if confidence is not None:
+                result.append((city, attraction, confidence))
+        return result
+
+
+class KeywordRules:
+    """
+    if/elif chains of substring tests as data, several chains sharing one
+    scan: each table is a list of (value, alternatives) rules where each
+    alternative is a tuple of terms that must all occur; a text gives the
+    first satisfied rule of every table, or all of them in rule order
+    """
+
+    def __init__(self, *tables: List[Tuple[Hashable, Tuple[Tuple[str, ...], ...]]]):
+        self.tables = tables
+        self.automaton = KeywordAutomaton(term for rules in tables for _, alternatives in rules
+                                          for terms in alternatives for term in terms)
+        term_ids = {term: i for i, term in enumerate(self.automaton.patterns)}
+        self.by_term = {}  # term id -> (table, rule index) it satisfies on its own, in order
+        self.compound = []  # (table, rule index, term ids) for alternatives needing several terms
+        for table, rules in enumerate(tables):
+            for index, (_, alternatives) in enumerate(rules):
+                for terms in alternatives:
+                    if len(terms) == 1:
+                        self.by_term.setdefault(term_ids[terms[0]], []).append((table, index))
+                    else:
+                        self.compound.append((table, index, frozenset(term_ids[term] for term in terms)))
+
+    def first(self, text: str, *defaults: Hashable) -> Tuple:
+        """First satisfied value of each table (its default, or None, when nothing matches)"""
+        found = self.automaton.find(text)
+        best = [len(rules) for rules in self.tables]
+        for term_id in found:
+            for table, index in self.by_term.get(term_id, ()):
+                if index < best[table]:
+                    best[table] = index
+        for table, index, terms in self.compound:
+            if index < best[table] and terms <= found:
+                best[table] = index
+        result = []
+        for table, rules in enumerate(self.tables):
+            if best[table] < len(rules):
+                result.append(rules[best[table]][0])
+            else:
+                result.append(defaults[table] if table < len(defaults) else None)
+        return tuple(result)
+
+    def matches(self, text: str) -> List[List[Hashable]]:
+        """Every satisfied value of each table, in rule order"""
+        found = self.automaton.find(text)
+        satisfied = {hit for term_id in found for hit in self.by_term.get(term_id, ())}
+        satisfied.update((table, index) for table, index, terms in self.compound if terms <= found)
+        return [[rules[index][0] for index in sorted(i for t, i in satisfied if t == table)]
+                for table, rules in enumerate(self.tables)]
@@ -5,30 +5,41 @@ Returns cached data immediately, then enriches with real AI in background
 """
 
 from flask import Blueprint, request, jsonify
-import threading
+import os
 import time
 from smart_ai_cache import get_cached_ai_details, get_cached_plan_b, get_cached_discoveries
+from llm_gateway import llm_gateway, BACKGROUND
+from job_runner import background_jobs, current_job, JobQueueFull, JobCancelled, FINISHED_STATES
 
 lightning_bp = Blueprint('lightning', __name__)
 
-# In-memory store for enhanced content
-enhanced_store = {}
+# Time budget for one itinerary's background enhancement (seconds)
+ENHANCEMENT_DEADLINE = int(os.getenv('LIGHTNING_ENHANCEMENT_DEADLINE', '180'))
 
 def background_ai_enhancement(itinerary_id, places, city):
-    """Background thread to enhance content with real AI"""
+    """Background job to enhance content with real AI; results are published on the job"""
+    job = current_job()
+    # Background lane: capped share of LLM slots, yields to interactive requests
+    with llm_gateway.lane(BACKGROUND, deadline=job.remaining() if job else None):
+        _enhance_places(itinerary_id, places, city, job)
+
+def _enhance_places(itinerary_id, places, city, job):
+    store = job.publish if job else (lambda key, value: None)
     try:
         from intelligent_content_generator import IntelligentContentGenerator
         ai_generator = IntelligentContentGenerator()
         
         # Process each place with AI
         for i, place in enumerate(places):
+            if job:
+                job.check()
             if 'title' in place and place.get('type') != 'tip':
                 try:
                     place_type = 'restaurant' if 'restaurant' in place.get('context', '') else 'attraction'
                     ai_details = ai_generator.enrich_place_details(place['title'], city, place_type)
                     
                     # Store enhanced details
-                    enhanced_store[f"{itinerary_id}_{i}"] = ai_details
+                    store(f"{itinerary_id}_{i}", ai_details)
                     print(f"✅ AI enhanced: {place['title']}")
                 except Exception as e:
                     print(f"⚠️ AI enhancement failed for {place['title']}: {e}")
@@ -38,12 +49,15 @@ def background_ai_enhancement(itinerary_id, places, city):
             discoveries = ai_generator.generate_smart_discoveries("Fifth Avenue", city, "morning")
             plan_b = ai_generator.generate_emergency_plan_b(places, city, "rain")
             
-            enhanced_store[f"{itinerary_id}_discoveries"] = discoveries
-            enhanced_store[f"{itinerary_id}_plan_b"] = plan_b
+            store(f"{itinerary_id}_discoveries", discoveries)
+            store(f"{itinerary_id}_plan_b", plan_b)
             print("✅ AI features generated in background")
         except Exception as e:
             print(f"⚠️ Background AI features failed: {e}")
             
+    except JobCancelled:
+        print(f"⏹️ Background AI processing stopped for {itinerary_id}")
+        raise
     except Exception as e:
         print(f"⚠️ Background AI processing failed: {e}")
 
@@ -78,7 +92,7 @@ def plan_lightning():
                 'time': '09:00',
                 'title': f'{start.title()}',
                 'description': f'Starting point: {start}',
-                'coordinates': nyc_coords,
+                'coordinates': base_coords,
                 'context': f'{start.lower().replace(" ", "_")}_new_york',
                 'transport': 'start'
             }
@@ -158,26 +172,27 @@ def plan_lightning():
                 'type': 'emergency_plan',
                 'title': '🌧️ Piano B',
                 'description': 'Alternative al coperto se piove',
-                'coordinates': nyc_coords,
+                'coordinates': base_coords,
                 'plan_b_data': plan_b
             },
             {
                 'type': 'smart_discovery',
                 'title': '🔍 Scoperte Local',
                 'description': 'Gemme nascoste nelle vicinanze',
-                'coordinates': nyc_coords,
+                'coordinates': base_coords,
                 'discoveries': discoveries
             }
         ])
         
-        # Start background AI enhancement
-        threading.Thread(
-            target=background_ai_enhancement,
-            args=(itinerary_id, itinerary, 'new york'),
-            daemon=True
-        ).start()
-        
-        print(f"⚡ Lightning response sent, background AI processing started for {itinerary_id}")
+        # Queue background AI enhancement (bounded pool; when saturated the cached details stand)
+        try:
+            background_jobs.submit(background_ai_enhancement, itinerary_id, itinerary, 'new york',
+                                   job_id=itinerary_id, timeout=ENHANCEMENT_DEADLINE)
+            enhancement_status = 'processing'
+            print(f"⚡ Lightning response sent, background AI processing queued for {itinerary_id}")
+        except JobQueueFull as e:
+            enhancement_status = 'skipped'
+            print(f"⚠️ Background AI enhancement skipped for {itinerary_id}: {e}")
         
         return jsonify({
             'itinerary': itinerary,
@@ -186,7 +201,7 @@ def plan_lightning():
             'transport_cost': '$0 (walking only)',
             'status': 'lightning_success',
             'itinerary_id': itinerary_id,
-            'enhancement_status': 'processing'
+            'enhancement_status': enhancement_status
         })
         
     except Exception as e:
@@ -195,16 +210,28 @@ def plan_lightning():
 
 @lightning_bp.route('/get_enhancements/<itinerary_id>', methods=['GET'])
 def get_enhancements(itinerary_id):
-    """Get AI enhancements for an itinerary"""
+    """Get AI enhancements for an itinerary (partial results while the job runs)"""
     try:
-        enhancements = {}
-        for key, value in enhanced_store.items():
-            if key.startswith(itinerary_id):
-                enhancements[key] = value
+        job = background_jobs.get(itinerary_id)
+        if not job:
+            return jsonify({'enhancements': {}, 'status': 'not_found'}), 404
+        
+        if job.status in FINISHED_STATES:
+            status = 'ready' if job.status == 'done' else job.status
+        else:
+            status = 'processing'
         
         return jsonify({
-            'enhancements': enhancements,
-            'status': 'ready' if enhancements else 'processing'
+            'enhancements': dict(job.partial),
+            'status': status,
+            'job_status': job.status
         })
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@lightning_bp.route('/get_enhancements/<itinerary_id>', methods=['DELETE'])
+def cancel_enhancements(itinerary_id):
+    """Cancel a queued or running enhancement job"""
+    if background_jobs.cancel(itinerary_id):
+        return jsonify({'status': 'cancelling', 'itinerary_id': itinerary_id})
+    return jsonify({'status': 'not_cancellable', 'itinerary_id': itinerary_id}), 404
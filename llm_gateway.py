@@ -0,0 +1,240 @@
+"""
+LLM Gateway - Process-wide governor for OpenAI chat calls
+Bounds concurrency, keeps background enrichment from starving interactive
+requests, and enforces a tokens-per-minute budget
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from request_deadline import current_deadline, stage_timeout
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Maximum time a call may wait for a slot before failing fast (seconds)
+DEFAULT_DEADLINES = {
+    INTERACTIVE: float(os.getenv('LLM_INTERACTIVE_DEADLINE', '8')),
+    BACKGROUND: float(os.getenv('LLM_BACKGROUND_DEADLINE', '120')),
+}
+
+_current_lane = contextvars.ContextVar('llm_lane', default=INTERACTIVE)
+_current_deadline = contextvars.ContextVar('llm_deadline', default=None)
+
+
+class LLMQueueTimeout(Exception):
+    """Raised when a call cannot start before its deadline; callers use their fallback"""
+
+
+def _estimate_tokens(kwargs: Dict) -> int:
+    chars = sum(len(str(m.get('content', ''))) for m in kwargs.get('messages', []))
+    return chars // 4 + int(kwargs.get('max_tokens') or 500)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class LLMGateway:
+    """
+    Semaphore with two priority lanes and a sliding one-minute token budget
+
+    Interactive calls may use every slot; background calls are capped at
+    background_slots and only start when no interactive call is waiting.
+    A call whose predicted (or actual) queue time exceeds its deadline
+    raises LLMQueueTimeout immediately instead of piling up.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, background_slots: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None):
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+        self.background_slots = background_slots or int(
+            os.getenv('LLM_BACKGROUND_SLOTS', str(max(1, self.max_concurrency // 2))))
+        self.tokens_per_minute = tokens_per_minute or int(os.getenv('LLM_TOKENS_PER_MINUTE', '90000'))
+        self._cond = threading.Condition()
+        self._in_flight = defaultdict(int)
+        self._waiting = defaultdict(int)
+        self._token_window = deque()  # [started_at, tokens] entries from the last minute
+        self._service_times = deque(maxlen=50)
+        self._queue_times = defaultdict(lambda: deque(maxlen=500))
+        self.stats = defaultdict(lambda: {'calls': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0})
+
+    # ---------------------------------------------------------------- lanes
+
+    @contextmanager
+    def lane(self, name: str, deadline: Optional[float] = None):
+        """Run the enclosed LLM calls in the given lane, optionally with a custom queue deadline"""
+        lane_token = _current_lane.set(name)
+        deadline_token = _current_deadline.set(deadline)
+        try:
+            yield
+        finally:
+            _current_lane.reset(lane_token)
+            _current_deadline.reset(deadline_token)
+
+    # ---------------------------------------------------------------- admission
+
+    def _tokens_used(self, now: float) -> int:
+        while self._token_window and self._token_window[0][0] <= now - 60:
+            self._token_window.popleft()
+        return sum(entry[1] for entry in self._token_window)
+
+    def _can_start(self, lane: str, tokens: int, now: float) -> bool:
+        total = sum(self._in_flight.values())
+        if total >= self.max_concurrency:
+            return False
+        if lane == BACKGROUND and (self._in_flight[BACKGROUND] >= self.background_slots
+                                   or self._waiting[INTERACTIVE]):
+            return False
+        used = self._tokens_used(now)
+        return not self._token_window or used + tokens <= self.tokens_per_minute
+
+    def _predicted_wait(self, lane: str) -> float:
+        if sum(self._in_flight.values()) < self.max_concurrency or not self._service_times:
+            return 0.0
+        ahead = self._waiting[INTERACTIVE] + (self._waiting[BACKGROUND] if lane == BACKGROUND else 0)
+        slots = self.background_slots if lane == BACKGROUND else self.max_concurrency
+        avg_service = sum(self._service_times) / len(self._service_times)
+        return (ahead + 1) * avg_service / slots
+
+    def acquire(self, lane: str, tokens: int, deadline: float) -> list:
+        """Block until the call may start; returns the token-window entry to settle on release"""
+        start = time.time()
+        with self._cond:
+            if self._predicted_wait(lane) > deadline:
+                self.stats[lane]['rejected'] += 1
+                raise LLMQueueTimeout(f"{lane} LLM queue wait would exceed {deadline:.1f}s")
+
+            self._waiting[lane] += 1
+            try:
+                while not self._can_start(lane, tokens, time.time()):
+                    remaining = start + deadline - time.time()
+                    if remaining <= 0:
+                        self.stats[lane]['timeouts'] += 1
+                        raise LLMQueueTimeout(f"{lane} LLM call waited {deadline:.1f}s without a slot")
+                    wait = remaining
+                    if self._token_window:
+                        wait = min(wait, max(0.05, self._token_window[0][0] + 60 - time.time()))
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[lane] -= 1
+
+            entry = [time.time(), tokens]
+            self._token_window.append(entry)
+            self._in_flight[lane] += 1
+            self.stats[lane]['calls'] += 1
+            self._queue_times[lane].append(entry[0] - start)
+            return entry
+
+    def release(self, lane: str, entry: list, started: float, actual_tokens: Optional[int] = None):
+        with self._cond:
+            self._in_flight[lane] -= 1
+            if actual_tokens:
+                entry[1] = actual_tokens
+            self._service_times.append(time.time() - started)
+            self._cond.notify_all()
+
+    # ---------------------------------------------------------------- calls
+
+    def chat_completion(self, client, lane: Optional[str] = None, deadline: Optional[float] = None, **kwargs):
+        """client.chat.completions.create(**kwargs) inside the governor"""
+        lane = lane or _current_lane.get()
+        deadline = deadline or _current_deadline.get() or DEFAULT_DEADLINES.get(lane, DEFAULT_DEADLINES[INTERACTIVE])
+
+        # Inside a request deadline: queue wait and call timeout come out of what is left
+        budget = stage_timeout('openai', kwargs.get('timeout') or 60)
+        if budget is None:
+            self.stats[lane]['rejected'] += 1
+            raise LLMQueueTimeout(f"{lane} LLM call skipped: request deadline too close")
+        if current_deadline() is not None:
+            deadline = min(deadline, budget)
+            kwargs['timeout'] = budget
+
+        entry = self.acquire(lane, _estimate_tokens(kwargs), deadline)
+        started = time.time()
+        actual_tokens = None
+        try:
+            response = client.chat.completions.create(**kwargs)
+            usage = getattr(response, 'usage', None)
+            actual_tokens = getattr(usage, 'total_tokens', None)
+            return response
+        except Exception:
+            self.stats[lane]['errors'] += 1
+            raise
+        finally:
+            self.release(lane, entry, started, actual_tokens)
+
+    def wrap(self, client) -> 'GovernedClient':
+        return client if isinstance(client, GovernedClient) else GovernedClient(client, self)
+
+    def get_stats(self) -> Dict:
+        with self._cond:
+            tokens_used = self._tokens_used(time.time())
+            lanes = {}
+            for lane in (INTERACTIVE, BACKGROUND):
+                queue_ms = [t * 1000 for t in self._queue_times[lane]]
+                lanes[lane] = {
+                    **self.stats[lane],
+                    'in_flight': self._in_flight[lane],
+                    'waiting': self._waiting[lane],
+                    'queue_ms_p50': round(_percentile(queue_ms, 0.5), 1),
+                    'queue_ms_p95': round(_percentile(queue_ms, 0.95), 1),
+                    'queue_ms_max': round(max(queue_ms, default=0.0), 1),
+                }
+        return {
+            'max_concurrency': self.max_concurrency,
+            'background_slots': self.background_slots,
+            'tokens_per_minute': self.tokens_per_minute,
+            'tokens_last_minute': tokens_used,
+            'lanes': lanes,
+        }
+
+
+class GovernedClient:
+    """
+    OpenAI client façade: chat.completions.create goes through the gateway,
+    everything else (embeddings, models, ...) is delegated unchanged
+    """
+
+    def __init__(self, client, gateway: LLMGateway):
+        self._client = client
+        self._gateway = gateway
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        return self._gateway.chat_completion(self._client, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# Global gateway instance
+llm_gateway = LLMGateway()
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_llm_client() -> GovernedClient:
+    """Process-wide governed OpenAI client (one connection pool for every feature)"""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            from openai import OpenAI
+            _shared_client = llm_gateway.wrap(OpenAI(api_key=os.environ.get("OPENAI_API_KEY")))
+        return _shared_client
@@ -0,0 +1,403 @@
+"""
+LLM Response Cache - Canonical-prompt and semantic caching for OpenAI calls
+Shared by the AI companion, content generator and crowd predictor
+"""
+
+import os
+import re
+import json
+import time
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Per-feature TTLs (seconds). Place details change rarely; contextual
+# suggestions depend on weather and time of day so they expire sooner.
+FEATURE_TTLS = {
+    'piano_b': 1800,
+    'scoperte': 1800,
+    'diario': 3600,
+    'place_details': 7 * 86400,
+    'crowd_insights': 86400,
+    'default': 3600,
+}
+
+# Features whose prompts embed clock times that only matter at band granularity
+TIME_BANDED_FEATURES = {'piano_b', 'scoperte'}
+
+# Features whose prompts carry no user data: the only ones eligible for
+# embedding-similarity matches. Itinerary and diary prompts embed a user's
+# stops and behaviour, so they are served from exact matches only.
+SEMANTIC_FEATURES = {'place_details', 'crowd_insights'}
+
+# USD per 1K tokens (input, output), used for the "cost saved" estimate
+MODEL_PRICES = {
+    'gpt-4-turbo': (0.01, 0.03),
+    'gpt-4o': (0.005, 0.015),
+    'gpt-4o-mini': (0.00015, 0.0006),
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+}
+
+# Clock times: 15:30, 15h30, or a dot only after "ore"/"alle"/"at" (4.50 €, 1.20 km are not times)
+_TIME_RE = re.compile(
+    r'(?<!\d)(?<!\d[.,:])(?:([01]?\d|2[0-3]):([0-5]\d)'
+    r'|(?:(?<=ore )|(?<=alle )|(?<=at ))([01]?\d|2[0-3])\.([0-5]\d)'
+    r'|([01]?\d|2[0-3])h([0-5]\d))'
+    r'(?!\d|[.,]\d|\s*(?:€|eur\b|\$|%|km\b|m\b))', re.I)
+_ISO_RE = re.compile(r'(\d{4}-\d{2}-\d{2})T(\d{2}):\d{2}(:\d{2}(\.\d+)?)?([+-]\d{2}:?\d{2}|Z)?')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def _time_band(hour: int) -> str:
+    if 5 <= hour < 12:
+        return '<morning>'
+    if 12 <= hour < 17:
+        return '<afternoon>'
+    if 17 <= hour < 22:
+        return '<evening>'
+    return '<night>'
+
+
+def canonicalize_prompt(messages: List[Dict], model: str, time_bands: bool = False, **params) -> str:
+    """
+    Canonical text for a chat request, used as the cache key source
+
+    Whitespace and case are normalized; with time_bands, clock times and ISO
+    timestamps are collapsed to morning/afternoon/evening/night so requests
+    that differ only by a few minutes share an entry.
+    """
+    parts = [model, json.dumps(params, sort_keys=True, default=str)]
+    for message in messages:
+        content = str(message.get('content', ''))
+        if time_bands:
+            content = _ISO_RE.sub(lambda m: f"{m.group(1)} {_time_band(int(m.group(2)))}", content)
+            content = _TIME_RE.sub(lambda m: _time_band(int(next(g for g in m.groups() if g))), content)
+        content = _SPACE_RE.sub(' ', content).strip().lower()
+        parts.append(f"{message.get('role', 'user')}: {content}")
+    return '\n'.join(parts)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4) if text else 0
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class LLMResponseCache:
+    """
+    Two-level cache for chat completions: in-process LRU in front of a
+    PostgreSQL table shared by all workers. Optionally falls back to an
+    embedding-similarity match within the same feature and scope (city,
+    user, ...) when no exact canonical match exists.
+    """
+
+    def __init__(self, database_url: Optional[str] = None, max_memory_entries: int = 1000,
+                 similarity_threshold: Optional[float] = None,
+                 embed_fn: Optional[Callable[[str], List[float]]] = None):
+        self.database_url = database_url if database_url is not None else os.getenv('DATABASE_URL')
+        self.max_memory_entries = max_memory_entries
+        self.similarity_threshold = similarity_threshold
+        self.embed_fn = embed_fn
+        self._memory = OrderedDict()  # key -> (content, expires_at)
+        self._vectors = defaultdict(lambda: deque(maxlen=500))  # (feature, scope) -> (key, vector)
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._db_retry_at = 0.0  # back off after DB errors instead of failing every call
+        self.stats = defaultdict(lambda: {
+            'hits': 0, 'semantic_hits': 0, 'misses': 0,
+            'tokens_saved': 0, 'cost_saved_usd': 0.0, 'latency_saved_s': 0.0
+        })
+        self._miss_latency = defaultdict(lambda: deque(maxlen=50))
+
+    # ---------------------------------------------------------------- storage
+
+    @property
+    def _db_disabled(self) -> bool:
+        return not self.database_url or time.time() < self._db_retry_at
+
+    def _db_failed(self, action: str, error: Exception):
+        logger.warning(f"⚠️ LLM cache DB {action} failed, memory only for 60s: {error}")
+        self._db_retry_at = time.time() + 60
+
+    def _connect(self):
+        return psycopg2.connect(self.database_url, connect_timeout=3)
+
+    def _ensure_table(self, cur):
+        if self._table_ready:
+            return
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                cache_key VARCHAR(64) PRIMARY KEY,
+                feature VARCHAR(50) NOT NULL,
+                model VARCHAR(50),
+                response TEXT NOT NULL,
+                embedding REAL[],
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                hit_count INTEGER DEFAULT 0
+            );
+            ALTER TABLE llm_response_cache ADD COLUMN IF NOT EXISTS scope VARCHAR(64) NOT NULL DEFAULT '';
+            CREATE INDEX IF NOT EXISTS idx_llm_cache_feature_expiry
+                ON llm_response_cache(feature, expires_at);
+        """)
+        self._table_ready = True
+
+    def _db_get(self, key: str) -> Optional[str]:
+        if self._db_disabled:
+            return None
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                self._ensure_table(cur)
+                cur.execute("""
+                    UPDATE llm_response_cache SET hit_count = hit_count + 1
+                    WHERE cache_key = %s AND expires_at > NOW()
+                    RETURNING response, EXTRACT(EPOCH FROM expires_at - NOW())
+                """, (key,))
+                row = cur.fetchone()
+            conn.commit()
+            conn.close()
+            if row:
+                self._remember(key, row[0], time.time() + float(row[1]))
+                return row[0]
+        except Exception as e:
+            self._db_failed('read', e)
+        return None
+
+    def _db_set(self, key: str, feature: str, scope: str, model: str, content: str, ttl: int,
+                embedding: Optional[List[float]]):
+        if self._db_disabled:
+            return
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                self._ensure_table(cur)
+                cur.execute("""
+                    INSERT INTO llm_response_cache (cache_key, feature, scope, model, response, embedding, expires_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, NOW() + %s * INTERVAL '1 second')
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        response = EXCLUDED.response,
+                        embedding = EXCLUDED.embedding,
+                        expires_at = EXCLUDED.expires_at
+                """, (key, feature, scope, model, content, embedding, ttl))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            self._db_failed('write', e)
+
+    def _load_vectors(self, feature: str, scope: str):
+        """Warm the per-feature, per-scope similarity index from the shared table"""
+        if self._db_disabled or self._vectors[(feature, scope)]:
+            return
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                self._ensure_table(cur)
+                cur.execute("""
+                    SELECT cache_key, embedding FROM llm_response_cache
+                    WHERE feature = %s AND scope = %s AND embedding IS NOT NULL AND expires_at > NOW()
+                    ORDER BY created_at DESC LIMIT 500
+                """, (feature, scope))
+                for key, vector in reversed(cur.fetchall()):
+                    self._vectors[(feature, scope)].append((key, list(vector)))
+            conn.close()
+        except Exception as e:
+            logger.debug(f"LLM cache vector warmup skipped: {e}")
+
+    def _remember(self, key: str, content: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (content, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if not entry:
+                return None
+            if entry[1] < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry[0]
+
+    # ---------------------------------------------------------------- lookup
+
+    @staticmethod
+    def make_scope(scope: Optional[Dict]) -> str:
+        """Hash of the discriminators (city, user, ...) a cached answer is only valid for"""
+        if not scope:
+            return ''
+        normalized = {k: str(v).strip().lower() for k, v in scope.items() if v is not None}
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()[:32]
+
+    @staticmethod
+    def make_key(feature: str, canonical: str, scope: str = '') -> str:
+        return hashlib.sha256(f"{feature}\n{scope}\n{canonical}".encode()).hexdigest()
+
+    def get(self, feature: str, canonical: str, scope: str = '') -> Optional[str]:
+        """Exact canonical match from memory, then from the shared table"""
+        key = self.make_key(feature, canonical, scope)
+        return self._memory_get(key) or self._db_get(key)
+
+    def get_similar(self, feature: str, vector: List[float], scope: str = '') -> Optional[str]:
+        """Best cached response above the similarity threshold within the same scope, if any"""
+        if not self.similarity_threshold or not vector or feature not in SEMANTIC_FEATURES:
+            return None
+        self._load_vectors(feature, scope)
+        best_key, best_score = None, self.similarity_threshold
+        for key, candidate in list(self._vectors[(feature, scope)]):
+            score = _cosine(vector, candidate)
+            if score >= best_score:
+                best_key, best_score = key, score
+        if best_key:
+            return self._memory_get(best_key) or self._db_get(best_key)
+        return None
+
+    def set(self, feature: str, canonical: str, content: str, model: str = '',
+            vector: Optional[List[float]] = None, scope: str = ''):
+        ttl = FEATURE_TTLS.get(feature, FEATURE_TTLS['default'])
+        key = self.make_key(feature, canonical, scope)
+        self._remember(key, content, time.time() + ttl)
+        if vector:
+            self._vectors[(feature, scope)].append((key, vector))
+        self._db_set(key, feature, scope, model, content, ttl, vector)
+
+    # ---------------------------------------------------------------- API
+
+    def _record_hit(self, feature: str, model: str, canonical: str, content: str, semantic: bool):
+        stats = self.stats[feature]
+        stats['semantic_hits' if semantic else 'hits'] += 1
+        prompt_tokens, completion_tokens = _estimate_tokens(canonical), _estimate_tokens(content)
+        price_in, price_out = MODEL_PRICES.get(model, MODEL_PRICES['gpt-4-turbo'])
+        stats['tokens_saved'] += prompt_tokens + completion_tokens
+        stats['cost_saved_usd'] += prompt_tokens / 1000 * price_in + completion_tokens / 1000 * price_out
+        latencies = self._miss_latency[feature]
+        if latencies:
+            stats['latency_saved_s'] += sum(latencies) / len(latencies)
+
+    def chat_completion(self, client, feature: str, model: str, messages: List[Dict],
+                        scope: Optional[Dict] = None, **kwargs) -> str:
+        """
+        Drop-in for client.chat.completions.create(...).choices[0].message.content
+
+        Args:
+            client: OpenAI client used on a miss
+            feature: Cache namespace, selects the TTL (see FEATURE_TTLS)
+            scope: Discriminators the answer is only valid for (e.g. city,
+                user_id); semantic matches never cross scopes
+            model, messages, **kwargs: passed through to the OpenAI call;
+                timeout/user are not part of the cache key
+
+        Returns:
+            Message content of the (possibly cached) completion
+        """
+        key_params = {k: v for k, v in kwargs.items() if k not in ('timeout', 'user')}
+        canonical = canonicalize_prompt(
+            messages, model, time_bands=feature in TIME_BANDED_FEATURES, **key_params)
+        scope_key = self.make_scope(scope)
+
+        cached = self.get(feature, canonical, scope_key)
+        if cached is not None:
+            self._record_hit(feature, model, canonical, cached, semantic=False)
+            logger.debug(f"🎯 LLM cache hit ({feature})")
+            return cached
+
+        vector = None
+        if self.similarity_threshold and self.embed_fn and feature in SEMANTIC_FEATURES:
+            try:
+                vector = self.embed_fn(canonical)
+                similar = self.get_similar(feature, vector, scope_key)
+                if similar is not None:
+                    self._record_hit(feature, model, canonical, similar, semantic=True)
+                    logger.debug(f"🎯 LLM semantic cache hit ({feature})")
+                    return similar
+            except Exception as e:
+                logger.warning(f"⚠️ LLM cache embedding failed: {e}")
+
+        self.stats[feature]['misses'] += 1
+        start = time.time()
+        response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+        self._miss_latency[feature].append(time.time() - start)
+        content = response.choices[0].message.content
+
+        if content and self._cacheable(content, kwargs):
+            self.set(feature, canonical, content, model=model, vector=vector, scope=scope_key)
+        return content
+
+    @staticmethod
+    def _cacheable(content: str, kwargs: Dict) -> bool:
+        """Never persist a malformed JSON-mode answer: it would be replayed on every hit"""
+        response_format = kwargs.get('response_format') or {}
+        if response_format.get('type') != 'json_object':
+            return True
+        try:
+            json.loads(content)
+            return True
+        except (json.JSONDecodeError, TypeError):
+            return False
+
+    def get_stats(self) -> Dict:
+        """Hit rates and savings per feature plus totals"""
+        features = {}
+        totals = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'cost_saved_usd': 0.0, 'tokens_saved': 0}
+        for feature, stats in self.stats.items():
+            lookups = stats['hits'] + stats['semantic_hits'] + stats['misses']
+            features[feature] = {
+                **stats,
+                'cost_saved_usd': round(stats['cost_saved_usd'], 4),
+                'latency_saved_s': round(stats['latency_saved_s'], 2),
+                'hit_rate': round((stats['hits'] + stats['semantic_hits']) / lookups * 100, 1) if lookups else 0,
+                'ttl_seconds': FEATURE_TTLS.get(feature, FEATURE_TTLS['default'])
+            }
+            for field in totals:
+                totals[field] += stats[field]
+        lookups = totals['hits'] + totals['semantic_hits'] + totals['misses']
+        totals['hit_rate'] = round((totals['hits'] + totals['semantic_hits']) / lookups * 100, 1) if lookups else 0
+        totals['cost_saved_usd'] = round(totals['cost_saved_usd'], 4)
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'memory_entries': len(self._memory),
+            'persistent': not self._db_disabled,
+            'similarity_threshold': self.similarity_threshold,
+            'totals': totals,
+            'features': features
+        }
+
+
+def _openai_embedder() -> Optional[Callable[[str], List[float]]]:
+    """Embedding function for semantic matching (text-embedding-3-small)"""
+    if not os.getenv('OPENAI_API_KEY'):
+        return None
+    from openai import OpenAI
+    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+    def embed(text: str) -> List[float]:
+        response = client.embeddings.create(
+            model="text-embedding-3-small", input=text[:8000], timeout=5)
+        return response.data[0].embedding
+
+    return embed
+
+
+# Global instance; semantic matching is opt-in via LLM_CACHE_SIMILARITY (e.g. 0.97)
+_similarity = os.getenv('LLM_CACHE_SIMILARITY')
+llm_cache = LLMResponseCache(
+    similarity_threshold=float(_similarity) if _similarity else None,
+    embed_fn=_openai_embedder() if _similarity else None
+)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Load test: /plan p99 latency against PLAN_P99_SLO_MS
+
+Fires concurrent planning requests and exits non-zero when the p99 latency
+exceeds the SLO. Two targets:
+
+  --url     a running server (pass the session cookie of a logged-in user)
+  default   an in-process /plan pipeline (geocoder + LLM stages behind the
+            request deadline) against deliberately slow local stub upstreams,
+            showing the deadline keeps the tail inside the SLO
+
+Usage:
+    python load_test_plan.py [--requests 60] [--concurrency 8] [--slo-ms 10000]
+    python load_test_plan.py --url http://localhost:5000 --cookie "session=..."
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import request_deadline
+from request_deadline import deadline_metrics, _percentile
+
+PAYLOAD = {'start': 'Piazza Castello', 'end': 'Mole Antonelliana', 'city': 'torino', 'duration': 'half_day'}
+
+
+class SlowGeocoder(BaseHTTPRequestHandler):
+    """Nominatim stand-in answering after ?delay= seconds"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        delay = float(parse_qs(urlsplit(self.path).query).get('delay', ['0'])[0])
+        time.sleep(delay)
+        body = b'[{"lat": "45.0703", "lon": "7.6869"}]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def simulated_app(geo_latency: float, llm_latency: float):
+    """Minimal Flask app whose /plan runs the deadline-aware stages against stub upstreams"""
+    from flask import Flask, jsonify
+    from openai import OpenAI
+
+    from http_client import http, Timeout
+    from llm_gateway import llm_gateway
+    from stub_llm_server import start_stub_server
+
+    geo = ThreadingHTTPServer(('127.0.0.1', 0), SlowGeocoder)
+    geo.daemon_threads = True
+    threading.Thread(target=geo.serve_forever, daemon=True).start()
+    geo_url = f"http://127.0.0.1:{geo.server_address[1]}/search"
+    stub = start_stub_server(latency=llm_latency)
+    stub.handle_error = lambda request, address: None  # timed-out clients hang up mid-reply
+    llm = llm_gateway.wrap(OpenAI(base_url=stub.base_url, api_key='load-test', max_retries=0))
+
+    app = Flask(__name__)
+
+    @app.route('/plan', methods=['POST'])
+    @request_deadline.with_deadline('plan')
+    def plan():
+        try:
+            timeout = request_deadline.require_stage('geocoder', 10)
+            coords = http.get(geo_url, params={'delay': geo_latency}, timeout=timeout).json()[0]
+        except (Timeout, TimeoutError):
+            coords = {'lat': 45.0703, 'lon': 7.6869}  # city centre fallback
+        try:
+            llm.chat.completions.create(model='gpt-4o-mini', timeout=30,
+                                        messages=[{'role': 'user', 'content': 'Itinerario Torino'}])
+            source = 'ai'
+        except Exception:
+            source = 'template'
+        return jsonify({'success': True, 'coords': coords, 'source': source})
+
+    return app
+
+
+def run_load(send, total: int, concurrency: int):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        start = time.perf_counter()
+        ok = send()
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            errors += not ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Base URL of a running server (default: in-process simulation)')
+    parser.add_argument('--cookie', default='', help='Session cookie for --url')
+    parser.add_argument('--requests', type=int, default=60)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--slo-ms', type=float, default=request_deadline.PLAN_P99_SLO_MS)
+    parser.add_argument('--budget', type=float, default=None, help='Override PLAN_DEADLINE_SECONDS (simulation)')
+    parser.add_argument('--geo-latency', type=float, default=3.0)
+    parser.add_argument('--llm-latency', type=float, default=12.0)
+    args = parser.parse_args()
+
+    if args.url:
+        from http_client import http
+        headers = {'Cookie': args.cookie} if args.cookie else {}
+
+        def send():
+            response = http.post(f"{args.url.rstrip('/')}/plan", json=PAYLOAD, headers=headers,
+                                 timeout=args.slo_ms / 1000 * 3, retries=0)
+            return response.is_success
+    else:
+        if args.budget:
+            request_deadline.ENDPOINT_DEADLINES['plan'] = args.budget
+        client = simulated_app(args.geo_latency, args.llm_latency).test_client()
+
+        def send():
+            return client.post('/plan', json=PAYLOAD).status_code == 200
+
+    print(f"🚦 {args.requests} requests, concurrency {args.concurrency}, p99 SLO {args.slo_ms:.0f} ms")
+    latencies, errors = run_load(send, args.requests, args.concurrency)
+
+    p50, p95, p99 = (_percentile(latencies, pct) for pct in (0.5, 0.95, 0.99))
+    print(f"   p50 {p50:.0f} ms | p95 {p95:.0f} ms | p99 {p99:.0f} ms | errors {errors}")
+    if not args.url:
+        skipped = deadline_metrics.get_stats().get('plan', {}).get('skipped_stages', {})
+        print(f"   stages skipped for budget: {skipped or 'none'}")
+
+    if p99 > args.slo_ms or errors:
+        print(f"❌ /plan p99 {p99:.0f} ms exceeds SLO {args.slo_ms:.0f} ms" if p99 > args.slo_ms
+              else f"❌ {errors} failed requests")
+        sys.exit(1)
+    print("✅ /plan p99 within SLO")
+
+
+if __name__ == "__main__":
+    main()
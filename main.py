@@ -1,5 +1,5 @@
 import os
-import httpx
+from http_client import http
 import json
 from fastapi import FastAPI, Request
 from fastapi.responses import FileResponse, JSONResponse, Response
@@ -27,6 +27,11 @@ class UserPreferences(BaseModel):
 
 app = FastAPI()
 
+
+@app.on_event("shutdown")
+async def close_http_pool():
+    await http.aclose()
+
 # --- DATABASE SIMULATO ---
 user_profile_db = {
     "user_1": {
@@ -74,7 +79,7 @@ async def validate_coordinates_with_nominatim(lat, lon, location_name, city):
     """
     try:
         # Reverse geocoding per verificare se le coordinate sono valide
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http.async_session(timeout=10.0) as client:
             url = f"https://nominatim.openstreetmap.org/reverse"
             params = {
                 "lat": lat,
@@ -123,7 +128,7 @@ async def search_correct_coordinates(location_name, city):
     Cerca coordinate corrette usando Nominatim search
     """
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http.async_session(timeout=10.0) as client:
             url = "https://nominatim.openstreetmap.org/search"
             
             # Prova diverse query per trovare il luogo
@@ -415,7 +420,7 @@ async def get_ai_itinerary(start_location: str, end_location: str, interests: Li
     }
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with http.async_session(timeout=60.0) as client:
             response = await client.post(api_url, json=payload, headers=headers)
             response.raise_for_status()
             result = response.json()
@@ -466,7 +471,7 @@ async def get_contextual_details(context: str):
     }
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with http.async_session(timeout=60.0) as client:
             response = await client.post(api_url, json=payload, headers=headers)
             response.raise_for_status()
             result = response.json()
@@ -503,7 +508,7 @@ async def search_wikimedia_image(location: str, city: str):
         # Wikipedia API per trovare l'articolo
         wiki_url = "https://en.wikipedia.org/api/rest_v1/page/summary/" + search_query.replace(" ", "_")
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http.async_session(timeout=10.0) as client:
             response = await client.get(wiki_url)
             if response.status_code == 200:
                 data = response.json()
@@ -586,7 +591,7 @@ async def generate_ai_image(location: str, city: str):
             "quality": "standard"
         }
         
-        async with httpx.AsyncClient(timeout=120.0) as client:
+        async with http.async_session(timeout=120.0) as client:
             response = await client.post("https://api.openai.com/v1/images/generations", 
                                        json=payload, headers=headers)
             response.raise_for_status()
@@ -666,7 +671,7 @@ async def image_proxy(url: str):
     Scarica l'immagine dalla fonte esterna e la serve con header CORS corretti.
     """
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with http.async_session(timeout=30.0) as client:
             response = await client.get(url)
             response.raise_for_status()
             
@@ -11,6 +11,7 @@ import os
 import sys
 from datetime import datetime
 from dotenv import load_dotenv
+from streaming_import import CopyUpsertSink
 
 # Load environment variables from .env file
 load_dotenv()
@@ -108,24 +109,41 @@ def create_comprehensive_table(conn):
         id SERIAL PRIMARY KEY,
         city VARCHAR(100) NOT NULL,
         name VARCHAR(1000) NOT NULL,
+        raw_name VARCHAR(500),
         description TEXT,
         category VARCHAR(100),
         attraction_type VARCHAR(100),
         latitude DECIMAL(10, 8),
         longitude DECIMAL(11, 8),
         osm_id BIGINT,
+        osm_type VARCHAR(20),
+        osm_tags JSONB,
         wikidata_id VARCHAR(50),
         wikipedia_url TEXT,
         has_image BOOLEAN DEFAULT FALSE,
+        image_url TEXT,
         thumb_url TEXT,
+        original_url TEXT,
         image_license VARCHAR(200),
         image_creator TEXT,
+        image_attribution TEXT,
         source_osm BOOLEAN DEFAULT FALSE,
         source_wikidata BOOLEAN DEFAULT FALSE,
         source_commons BOOLEAN DEFAULT FALSE,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
+
+    -- Tables created by older versions of this script lack the migrated
+    -- columns; the unique (osm_id, osm_type) key is what the upsert conflicts on
+    ALTER TABLE comprehensive_attractions
+        ADD COLUMN IF NOT EXISTS raw_name VARCHAR(500),
+        ADD COLUMN IF NOT EXISTS osm_type VARCHAR(20),
+        ADD COLUMN IF NOT EXISTS osm_tags JSONB,
+        ADD COLUMN IF NOT EXISTS image_url TEXT,
+        ADD COLUMN IF NOT EXISTS original_url TEXT,
+        ADD COLUMN IF NOT EXISTS image_attribution TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_comprehensive_osm ON comprehensive_attractions(osm_id, osm_type);
     
     -- Create indexes for performance
     CREATE INDEX IF NOT EXISTS idx_comprehensive_city ON comprehensive_attractions(city);
@@ -140,36 +158,34 @@ def create_comprehensive_table(conn):
     print("✅ Created/verified comprehensive_attractions table with indexes")
 
 
-def migrate_italian_data(conn):
-    """Migrate data from comprehensive_attractions_italy to comprehensive_attractions"""
-    cursor = conn.cursor()
+MIGRATED_COLUMNS = (
+    'city', 'name', 'raw_name', 'description', 'category', 'attraction_type',
+    'latitude', 'longitude', 'osm_id', 'osm_type', 'osm_tags', 'wikidata_id', 'wikipedia_url',
+    'has_image', 'image_url', 'thumb_url', 'original_url', 'image_license', 'image_creator', 'image_attribution',
+    'source_osm', 'source_wikidata', 'source_commons', 'created_at'
+)
 
-    # Clear any existing Italian data to avoid duplicates
-    cursor.execute("""
-        DELETE FROM comprehensive_attractions 
-        WHERE city IN (
-            SELECT DISTINCT city FROM comprehensive_attractions_italy
-        )
-    """)
 
-    deleted_count = cursor.rowcount
-    print(
-        f"🧹 Deleted {deleted_count} existing Italian records from comprehensive_attractions")
+def migrate_italian_data(conn):
+    """Merge comprehensive_attractions_italy into comprehensive_attractions by (osm_id, osm_type)"""
+    cursor = conn.cursor()
 
     # Extend image_creator to TEXT if it's still VARCHAR(500)
     cursor.execute(
         "ALTER TABLE comprehensive_attractions ALTER COLUMN image_creator TYPE TEXT")
     print("✅ Extended image_creator column to TEXT")
+    conn.commit()
 
-    # Migrate data with deduplication and conflict handling
-    migrate_sql = """
-    INSERT INTO comprehensive_attractions (
-        city, name, raw_name, description, category, attraction_type,
-        latitude, longitude, osm_id, osm_type, osm_tags, wikidata_id, wikipedia_url,
-        has_image, image_url, thumb_url, original_url, image_license, image_creator, image_attribution,
-        source_osm, source_wikidata, source_commons, created_at
-    )
-    WITH deduplicated AS (
+    # Upsert instead of delete + insert: existing rows keep their ids (and
+    # the images/mappings that reference them), unchanged rows are not
+    # rewritten. created_at is only set on insert.
+    sink = CopyUpsertSink(
+        conn, 'comprehensive_attractions', MIGRATED_COLUMNS, key=('osm_id', 'osm_type'),
+        update=[c for c in MIGRATED_COLUMNS if c not in ('osm_id', 'osm_type', 'created_at')],
+        update_values={'updated_at': 'CURRENT_TIMESTAMP'})
+
+    # Deduplicated on the server: the rows never travel over the link
+    sink.merge_query("""
         SELECT DISTINCT ON (osm_id, osm_type)
             LEFT(city, 100) as city,
             LEFT(name, 1000) as name,
@@ -199,22 +215,12 @@ def migrate_italian_data(conn):
             source_commons,
             created_at
         FROM comprehensive_attractions_italy
+        WHERE osm_id IS NOT NULL AND osm_type IS NOT NULL  -- no key to merge on
         ORDER BY osm_id, osm_type, id
-    )
-    SELECT * FROM deduplicated
-    WHERE NOT EXISTS (
-        SELECT 1 FROM comprehensive_attractions ca 
-        WHERE ca.osm_id = deduplicated.osm_id 
-        AND ca.osm_type = deduplicated.osm_type
-    )
-    """
-
-    cursor.execute(migrate_sql)
-    migrated_count = cursor.rowcount
-    conn.commit()
+    """)
 
-    print(
-        f"✅ Migrated {migrated_count:,} Italian attractions to comprehensive_attractions")
+    migrated_count = sink.stats['inserted'] + sink.stats['updated']
+    print(f"✅ Migrated Italian attractions to comprehensive_attractions: {sink.summary()}")
 
     return migrated_count
 
@@ -2,7 +2,7 @@
 Mock Enhanced Image Service for testing UI fixes
 """
 
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 import random
 
 
@@ -127,7 +127,8 @@ class MockEnhancedImageService:
 mock_service = MockEnhancedImageService()
 
 
-def get_enhanced_attraction_image(city: str, attraction_name: str, fallback_url: str = None) -> Dict:
+def get_enhanced_attraction_image(city: str, attraction_name: str, fallback_url: str = None,
+                                  width: int = None) -> Dict:
     """Mock function for testing"""
     return mock_service.get_best_image_for_attraction(city, attraction_name)
 
@@ -135,3 +136,19 @@ def get_enhanced_attraction_image(city: str, attraction_name: str, fallback_url:
 def classify_attraction_enhanced(title: str, context: str) -> Tuple[str, str, float]:
     """Mock classification for testing"""
     return mock_service.classify_attraction_from_context(title, context)
+
+
+def resolve_batch_images(items: List[Dict], width: int = None) -> List[Dict]:
+    """Mock batch resolution for testing"""
+    results = []
+    for item in items:
+        title = item.get('title', '')
+        city, attraction, confidence = classify_attraction_enhanced(title, item.get('context', ''))
+        results.append({
+            'original_title': title,
+            'classified_attraction': attraction,
+            'city': city,
+            'confidence': confidence,
+            'image': get_enhanced_attraction_image(city, attraction, width=width)
+        })
+    return results
@@ -5,21 +5,175 @@ Enables the app to serve international travelers in their preferred language
 
 import os
 import json
-from typing import Dict, Optional, List
+import time
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, List, Iterable
 import logging
-from openai import OpenAI
-from api_error_handler import resilient_api_call, with_cache, APICache
+import psycopg2
+from psycopg2.extras import execute_values
+from api_error_handler import resilient_api_call
+from llm_gateway import get_llm_client
 
 logger = logging.getLogger(__name__)
 
-# Cache for translations (24 hours TTL)
-translation_cache = APICache(ttl_seconds=86400)
+# Itinerary fields translated at top level and inside item['details']
+ITINERARY_TEXT_FIELDS = ['title', 'description', 'address', 'tips', 'note']
+
+# Upper bounds for a single batched translation request
+BATCH_MAX_STRINGS = 60
+BATCH_MAX_CHARS = 8000
+
+# Frequent function words, for local language detection when the LLM may not be used
+LANGUAGE_HINTS = {
+    'it': {'il', 'lo', 'la', 'gli', 'le', 'di', 'che', 'per', 'con', 'una', 'sono', 'del', 'della', 'non'},
+    'en': {'the', 'and', 'of', 'to', 'is', 'in', 'with', 'for', 'you', 'this', 'are', 'your'},
+    'es': {'el', 'los', 'las', 'de', 'que', 'y', 'en', 'por', 'con', 'una', 'para', 'es', 'del'},
+    'fr': {'le', 'les', 'des', 'et', 'est', 'une', 'du', 'pour', 'avec', 'dans', 'vous', 'au'},
+    'de': {'der', 'die', 'das', 'und', 'ist', 'mit', 'ein', 'eine', 'nicht', 'zu', 'den', 'von'},
+    'pt': {'o', 'os', 'as', 'de', 'que', 'e', 'em', 'um', 'uma', 'para', 'com', 'não', 'do', 'da'},
+    'nl': {'de', 'het', 'een', 'en', 'van', 'is', 'met', 'voor', 'niet', 'op', 'je'},
+    'pl': {'i', 'w', 'na', 'z', 'jest', 'do', 'nie', 'się', 'że', 'to', 'od'},
+}
+
+
+class TranslationMemory:
+    """
+    Persistent translation memory keyed by (source hash, target language)
+
+    An in-process LRU sits in front of a PostgreSQL table shared by all
+    workers, so a string translated once for any user is never sent to the
+    LLM again. Entries do not expire: place names and descriptions are stable.
+    """
+
+    def __init__(self, database_url: Optional[str] = None, max_memory_entries: int = 20000):
+        self.database_url = database_url if database_url is not None else os.getenv('DATABASE_URL')
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()  # (source_hash, lang) -> translated text
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self._db_retry_at = 0.0
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stored': 0}
+
+    @staticmethod
+    def source_hash(text: str) -> str:
+        return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+    @property
+    def _db_disabled(self) -> bool:
+        return not self.database_url or time.time() < self._db_retry_at
+
+    def _db_failed(self, action: str, error: Exception):
+        logger.warning(f"⚠️ Translation memory DB {action} failed, memory only for 60s: {error}")
+        self._db_retry_at = time.time() + 60
+
+    def _connect(self):
+        return psycopg2.connect(self.database_url, connect_timeout=3)
+
+    def _ensure_table(self, cur):
+        if self._table_ready:
+            return
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                source_hash VARCHAR(64) NOT NULL,
+                target_language VARCHAR(8) NOT NULL,
+                source_text TEXT NOT NULL,
+                translated_text TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source_hash, target_language)
+            )
+        """)
+        self._table_ready = True
+
+    def _remember(self, key, translated: str):
+        with self._lock:
+            self._memory[key] = translated
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, texts: Iterable[str], target_language: str) -> Dict[str, str]:
+        """Known translations for texts: memory first, then one DB round-trip for the rest"""
+        found = {}
+        pending = {}
+        with self._lock:
+            for text in texts:
+                key = (self.source_hash(text), target_language)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[text] = self._memory[key]
+                else:
+                    pending[key[0]] = text
+        self.stats['memory_hits'] += len(found)
+
+        if pending and not self._db_disabled:
+            try:
+                conn = self._connect()
+                with conn.cursor() as cur:
+                    self._ensure_table(cur)
+                    cur.execute("""
+                        SELECT source_hash, translated_text FROM translation_memory
+                        WHERE target_language = %s AND source_hash = ANY(%s)
+                    """, (target_language, list(pending)))
+                    rows = cur.fetchall()
+                conn.commit()
+                conn.close()
+                for source_hash, translated in rows:
+                    found[pending.pop(source_hash)] = translated
+                    self._remember((source_hash, target_language), translated)
+                self.stats['db_hits'] += len(rows)
+            except Exception as e:
+                self._db_failed('read', e)
+
+        self.stats['misses'] += len(pending)
+        return found
+
+    def set_many(self, translations: Dict[str, str], target_language: str):
+        """Store new translations in memory and, in one statement, in the shared table"""
+        if not translations:
+            return
+        rows = []
+        for source, translated in translations.items():
+            source_hash = self.source_hash(source)
+            self._remember((source_hash, target_language), translated)
+            rows.append((source_hash, target_language, source, translated))
+        self.stats['stored'] += len(rows)
+
+        if self._db_disabled:
+            return
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                self._ensure_table(cur)
+                execute_values(cur, """
+                    INSERT INTO translation_memory (source_hash, target_language, source_text, translated_text)
+                    VALUES %s
+                    ON CONFLICT (source_hash, target_language) DO NOTHING
+                """, rows)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            self._db_failed('write', e)
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats['memory_hits'] + self.stats['db_hits'] + self.stats['misses']
+        hits = lookups - self.stats['misses']
+        return {
+            **self.stats,
+            'memory_entries': len(self._memory),
+            'hit_rate': round(hits / lookups * 100, 1) if lookups else 0.0,
+        }
+
 
 class MultiLanguageSupport:
     """Handles multi-language translations and localization"""
     
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    def __init__(self, openai_client=None, memory: Optional[TranslationMemory] = None):
+        self.openai_client = openai_client or get_llm_client()
+        self.memory = memory or TranslationMemory()
+        self.llm_calls = 0
         
         # Supported languages
         self.supported_languages = {
@@ -114,8 +268,10 @@ class MultiLanguageSupport:
             }
         }
     
-    def detect_language(self, text: str) -> str:
-        """Detect the language of the input text"""
+    def detect_language(self, text: str, use_llm: bool = True) -> str:
+        """Detect the language of the input text (use_llm=False: local heuristics only)"""
+        
+        text = text if isinstance(text, str) else json.dumps(text, ensure_ascii=False)
         
         # Quick detection based on common patterns
         if any(char in text for char in '你好中文'):
@@ -126,6 +282,8 @@ class MultiLanguageSupport:
             return 'ar'
         if any(char in text for char in 'Привет'):
             return 'ru'
+        if not use_llm:
+            return self._guess_language(text)
         
         # Use AI for more accurate detection
         try:
@@ -153,9 +311,17 @@ class MultiLanguageSupport:
             logger.error(f"Language detection error: {e}")
             return 'en'
     
+    @staticmethod
+    def _guess_language(text: str) -> str:
+        """Language whose function words occur most often in text ('en' when none do)"""
+        words = [word.strip('.,;:!?"\'()«»') for word in text.lower().split()]
+        scores = {language: sum(word in hints for word in words) for language, hints in LANGUAGE_HINTS.items()}
+        best = max(scores, key=scores.get)
+        return best if scores[best] else 'en'
+    
     @resilient_api_call('translation', fallback_data=None)
-    @with_cache(translation_cache, lambda *args, **kwargs: f"trans_{args[1][:50]}_{args[2]}_{args[3]}")
-    def translate(self, text: str, target_language: str, source_language: Optional[str] = None) -> str:
+    def translate(self, text: str, target_language: str, source_language: Optional[str] = None,
+                  cached_only: bool = False) -> str:
         """
         Translate text to target language
         
@@ -163,143 +329,245 @@ class MultiLanguageSupport:
             text: Text to translate
             target_language: Target language code (e.g., 'en', 'it')
             source_language: Source language code (auto-detect if None)
+            cached_only: Only use common phrases and translation memory (no LLM call)
         """
         
         # Check if translation is needed
         if source_language == target_language:
             return text
         
-        # Check common phrases cache first
-        for phrase_key, translations in self.common_phrases.items():
+        return self.translate_batch([text], target_language, source_language,
+                                    cached_only=cached_only).get(text, text)
+    
+    def _common_phrase(self, text: str, target_language: str) -> Optional[str]:
+        for translations in self.common_phrases.values():
             if text in translations.values():
-                return translations.get(target_language, text)
+                return translations.get(target_language)
+        return None
+    
+    def translate_batch(self, texts: Iterable[str], target_language: str,
+                        source_language: Optional[str] = None, cached_only: bool = False) -> Dict[str, str]:
+        """
+        Translate many strings with at most one LLM request per chunk of misses
+        
+        Strings are deduplicated, resolved from the common phrases and the
+        translation memory, and only the remaining ones are sent to the model
+        as a single JSON object. New translations are written back to memory.
+        With cached_only (load shedding) misses are returned untranslated.
+        
+        Returns:
+            Mapping source text -> translated text (original text on failure)
+        """
+        unique = []
+        seen = set()
+        for text in texts:
+            if isinstance(text, str) and text.strip() and text not in seen:
+                seen.add(text)
+                unique.append(text)
+        
+        if source_language == target_language or target_language not in self.supported_languages:
+            return {text: text for text in unique}
+        
+        result = {}
+        lookup = []
+        for text in unique:
+            phrase = self._common_phrase(text, target_language)
+            if phrase:
+                result[text] = phrase
+            else:
+                lookup.append(text)
+        
+        result.update(self.memory.get_many(lookup, target_language))
+        misses = [text for text in lookup if text not in result]
+        
+        for chunk in ([] if cached_only else self._chunks(misses)):
+            translated = self._translate_chunk(chunk, target_language)
+            self.memory.set_many(translated, target_language)
+            result.update(translated)
+        
+        for text in misses:
+            result.setdefault(text, text)  # Return original text if translation fails
+        return result
+    
+    @staticmethod
+    def _chunks(texts: List[str]):
+        chunk, size = [], 0
+        for text in texts:
+            if chunk and (len(chunk) >= BATCH_MAX_STRINGS or size + len(text) > BATCH_MAX_CHARS):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(text)
+            size += len(text)
+        if chunk:
+            yield chunk
+    
+    def _translate_chunk(self, texts: List[str], target_language: str) -> Dict[str, str]:
+        """One structured request for a list of strings; only complete answers are returned"""
+        lang_name = self.supported_languages[target_language]['name']
+        numbered = {str(i): text for i, text in enumerate(texts)}
+        
+        prompt = f"""
+        Translate every value of the following JSON object to {lang_name}.
+        Maintain the tone and context for a travel app. Keep proper names of
+        places unchanged when they have no common {lang_name} form.
+        
+        {json.dumps(numbered, ensure_ascii=False)}
+        
+        Respond with a JSON object {{"translations": {{"<same key>": "<translated text>"}}}}
+        containing every key.
+        """
         
-        # Use AI for translation
         try:
-            lang_name = self.supported_languages[target_language]['name']
-            
-            prompt = f"""
-            Translate the following text to {lang_name}.
-            Maintain the tone and context for a travel app.
-            
-            Text: {text}
-            
-            Respond with ONLY the translated text, no explanations.
-            """
-            
+            self.llm_calls += 1
             response = self.openai_client.chat.completions.create(
                 model="gpt-4-turbo",
                 messages=[
                     {"role": "system", "content": f"You are a professional translator specializing in travel and tourism. Translate accurately to {lang_name}."},
                     {"role": "user", "content": prompt}
                 ],
-                timeout=10
+                response_format={"type": "json_object"},
+                timeout=30
             )
-            
-            return response.choices[0].message.content.strip()
-            
+            payload = json.loads(response.choices[0].message.content)
+            translations = payload.get('translations', payload)
         except Exception as e:
-            logger.error(f"Translation error: {e}")
-            return text  # Return original text if translation fails
+            logger.error(f"Batch translation error ({len(texts)} strings): {e}")
+            return {}
+        
+        translated = {}
+        for key, text in numbered.items():
+            value = translations.get(key) if isinstance(translations, dict) else None
+            if isinstance(value, str) and value.strip():
+                translated[text] = value.strip()
+        if len(translated) < len(texts):
+            logger.warning(f"Batch translation returned {len(translated)}/{len(texts)} strings")
+        return translated
+    
+    @staticmethod
+    def _itinerary_strings(itinerary: List[Dict]):
+        """Every translatable string of an itinerary, including list-valued fields"""
+        for item in itinerary:
+            for container in (item, item.get('details')):
+                if not isinstance(container, dict):
+                    continue
+                for field in ITINERARY_TEXT_FIELDS:
+                    value = container.get(field)
+                    if isinstance(value, str):
+                        yield value
+                    elif isinstance(value, list):
+                        yield from (v for v in value if isinstance(v, str))
     
-    def translate_itinerary(self, itinerary: List[Dict], target_language: str) -> List[Dict]:
-        """Translate an entire itinerary to the target language"""
+    def translate_itinerary(self, itinerary: List[Dict], target_language: str,
+                            cached_only: bool = False) -> List[Dict]:
+        """
+        Translate an entire itinerary to the target language
+        
+        All unique strings are collected first and translated in one batch,
+        so a city already translated for another user costs no LLM call.
+        """
         
         if target_language == 'it':
             return itinerary  # No translation needed for Italian
         
+        translations = self.translate_batch(self._itinerary_strings(itinerary), target_language,
+                                            cached_only=cached_only)
+        
         translated = []
         
         for item in itinerary:
-            translated_item = item.copy()
-            
-            # Translate text fields
-            fields_to_translate = ['title', 'description', 'address', 'tips', 'note']
+            translated_item = copy.deepcopy(item)
             
-            for field in fields_to_translate:
-                if field in translated_item and translated_item[field]:
-                    translated_item[field] = self.translate(
-                        translated_item[field],
-                        target_language
-                    )
-            
-            # Translate nested fields
-            if 'details' in translated_item:
-                for detail_field in fields_to_translate:
-                    if detail_field in translated_item['details']:
-                        translated_item['details'][detail_field] = self.translate(
-                            translated_item['details'][detail_field],
-                            target_language
-                        )
+            for container in (translated_item, translated_item.get('details')):
+                if not isinstance(container, dict):
+                    continue
+                for field in ITINERARY_TEXT_FIELDS:
+                    value = container.get(field)
+                    if isinstance(value, str):
+                        container[field] = translations.get(value, value)
+                    elif isinstance(value, list):
+                        container[field] = [translations.get(v, v) if isinstance(v, str) else v
+                                            for v in value]
             
             translated.append(translated_item)
         
         return translated
     
-    def localize_ui(self, language: str) -> Dict:
-        """Get localized UI strings for the specified language"""
+    def localize_ui(self, language: str, cached_only: bool = False) -> Dict:
+        """
+        Get localized UI strings for the specified language (one batched translation)
+        
+        With cached_only (load shedding) strings missing from the translation
+        memory stay in English instead of reaching the LLM.
+        """
         
         ui_strings = {
             'navigation': {
-                'home': self.translate('Home', language, 'en'),
-                'plan': self.translate('Plan Trip', language, 'en'),
-                'profile': self.translate('Profile', language, 'en'),
-                'settings': self.translate('Settings', language, 'en'),
-                'logout': self.translate('Logout', language, 'en')
+                'home': 'Home',
+                'plan': 'Plan Trip',
+                'profile': 'Profile',
+                'settings': 'Settings',
+                'logout': 'Logout'
             },
             'buttons': {
-                'search': self.translate('Search', language, 'en'),
-                'save': self.translate('Save', language, 'en'),
-                'cancel': self.translate('Cancel', language, 'en'),
-                'continue': self.translate('Continue', language, 'en'),
-                'back': self.translate('Back', language, 'en'),
-                'next': self.translate('Next', language, 'en'),
-                'finish': self.translate('Finish', language, 'en'),
-                'add': self.translate('Add', language, 'en'),
-                'remove': self.translate('Remove', language, 'en'),
-                'edit': self.translate('Edit', language, 'en')
+                'search': 'Search',
+                'save': 'Save',
+                'cancel': 'Cancel',
+                'continue': 'Continue',
+                'back': 'Back',
+                'next': 'Next',
+                'finish': 'Finish',
+                'add': 'Add',
+                'remove': 'Remove',
+                'edit': 'Edit'
             },
             'messages': {
-                'loading': self.translate('Loading...', language, 'en'),
-                'error': self.translate('An error occurred', language, 'en'),
-                'success': self.translate('Success!', language, 'en'),
-                'no_results': self.translate('No results found', language, 'en'),
-                'try_again': self.translate('Please try again', language, 'en')
+                'loading': 'Loading...',
+                'error': 'An error occurred',
+                'success': 'Success!',
+                'no_results': 'No results found',
+                'try_again': 'Please try again'
             },
             'features': {
-                'weather_aware': self.translate('Weather-Aware Planning', language, 'en'),
-                'crowd_prediction': self.translate('Crowd Prediction', language, 'en'),
-                'plan_b': self.translate('Smart Plan B', language, 'en'),
-                'discoveries': self.translate('Intelligent Discoveries', language, 'en'),
-                'travel_diary': self.translate('AI Travel Diary', language, 'en')
+                'weather_aware': 'Weather-Aware Planning',
+                'crowd_prediction': 'Crowd Prediction',
+                'plan_b': 'Smart Plan B',
+                'discoveries': 'Intelligent Discoveries',
+                'travel_diary': 'AI Travel Diary'
             },
             'time': {
-                'morning': self.translate('Morning', language, 'en'),
-                'afternoon': self.translate('Afternoon', language, 'en'),
-                'evening': self.translate('Evening', language, 'en'),
-                'night': self.translate('Night', language, 'en'),
-                'today': self.translate('Today', language, 'en'),
-                'tomorrow': self.translate('Tomorrow', language, 'en'),
-                'yesterday': self.translate('Yesterday', language, 'en')
+                'morning': 'Morning',
+                'afternoon': 'Afternoon',
+                'evening': 'Evening',
+                'night': 'Night',
+                'today': 'Today',
+                'tomorrow': 'Tomorrow',
+                'yesterday': 'Yesterday'
             },
             'weather': {
-                'sunny': self.translate('Sunny', language, 'en'),
-                'cloudy': self.translate('Cloudy', language, 'en'),
-                'rainy': self.translate('Rainy', language, 'en'),
-                'snowy': self.translate('Snowy', language, 'en'),
-                'windy': self.translate('Windy', language, 'en'),
-                'stormy': self.translate('Stormy', language, 'en')
+                'sunny': 'Sunny',
+                'cloudy': 'Cloudy',
+                'rainy': 'Rainy',
+                'snowy': 'Snowy',
+                'windy': 'Windy',
+                'stormy': 'Stormy'
             },
             'crowd_levels': {
-                'very_quiet': self.translate('Very Quiet', language, 'en'),
-                'quiet': self.translate('Quiet', language, 'en'),
-                'moderate': self.translate('Moderate', language, 'en'),
-                'crowded': self.translate('Crowded', language, 'en'),
-                'very_crowded': self.translate('Very Crowded', language, 'en')
+                'very_quiet': 'Very Quiet',
+                'quiet': 'Quiet',
+                'moderate': 'Moderate',
+                'crowded': 'Crowded',
+                'very_crowded': 'Very Crowded'
             }
         }
         
-        return ui_strings
+        translations = self.translate_batch(
+            (text for group in ui_strings.values() for text in group.values()),
+            language, 'en', cached_only=cached_only)
+        
+        return {
+            group: {key: translations.get(text, text) for key, text in strings.items()}
+            for group, strings in ui_strings.items()
+        }
     
     def format_currency(self, amount: float, currency: str = 'EUR', language: str = 'en') -> str:
         """Format currency according to locale"""
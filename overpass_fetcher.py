@@ -0,0 +1,391 @@
+"""
+Overpass Fetcher - Shared, polite OpenStreetMap Overpass client
+All POI classes of an area (bbox or named area) go out as one union query,
+several areas run concurrently under one slot limiter that follows the
+server's /status (rate limit, free slots, when the next slot frees up), and
+raw responses are cached on disk by query hash so reprocessing a city does
+not refetch it until the entry is older than OVERPASS_CACHE_TTL. Elements
+are split back into their classes client-side
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from dotenv import load_dotenv
+
+from http_client import http, HTTPError, Timeout
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+OVERPASS_URL = os.getenv('OVERPASS_URL', 'https://overpass-api.de/api/interpreter')
+OVERPASS_CONCURRENCY = int(os.getenv('OVERPASS_CONCURRENCY', '2'))
+OVERPASS_CACHE_DIR = os.getenv('OVERPASS_CACHE_DIR', 'overpass_cache')
+OVERPASS_RETRIES = int(os.getenv('OVERPASS_RETRIES', '4'))
+OVERPASS_CACHE_TTL = float(os.getenv('OVERPASS_CACHE_TTL', str(7 * 86400)))  # seconds; 0 keeps entries forever
+OVERPASS_LIVE_CACHE_TTL = float(os.getenv('OVERPASS_LIVE_CACHE_TTL', '86400'))  # request path (cost_effective_scraping)
+STATUS_TTL = 1.0  # seconds a /status answer is trusted for
+STATUS_POLL = 2.0  # wait between /status checks when every slot is busy with a running query
+MAX_BACKOFF = 60.0
+
+Area = Union[Tuple[float, float, float, float], str]  # (south, west, north, east) or 'area[...]' filter
+
+SELECTOR = re.compile(r'^(node|way|relation|nwr|nw|nr|wr)?((?:\[[^\]]*\])*)$')
+FILTER = re.compile(r'\[\s*"?([^"=~\]]+?)"?\s*(?:([=~])\s*"?([^"\]]*)"?\s*)?\]')
+STATUS_RATE_LIMIT = re.compile(r'^Rate limit: (\d+)', re.M)
+STATUS_FREE = re.compile(r'^(\d+) slots? available now', re.M)
+STATUS_NEXT = re.compile(r'^Slot available after: \S+, in (-?\d+) seconds?', re.M)
+
+
+class OverpassError(Exception):
+    """Overpass query that failed for good (HTTP error, runtime error, retries exhausted)"""
+
+
+class OverpassBusy(OverpassError):
+    """No Overpass slot within max_wait"""
+
+
+# ---------------------------------------------------------------------------
+# Queries and client-side class split
+# ---------------------------------------------------------------------------
+
+def build_query(area: Area, selectors: Sequence[str], timeout: int = 60, out: str = 'center') -> str:
+    """
+    Union query of selectors ('node["tourism"="museum"]', 'way["historic"]', ...)
+    over a bbox (south, west, north, east) or a named area filter
+    ('area["name"="Padova"][admin_level=8]')
+    """
+    if isinstance(area, str):
+        header, scope = f"{area}->.searchArea;\n", '(area.searchArea)'
+    else:
+        header, scope = '', '({},{},{},{})'.format(*area)
+    statements = '\n'.join(f"  {selector}{scope};" for selector in dict.fromkeys(selectors))
+    return f"[out:json][timeout:{timeout}];\n{header}(\n{statements}\n);\nout {out};"
+
+
+def query_key(query: str) -> str:
+    """Cache key: hash of the query with whitespace collapsed"""
+    return hashlib.sha256(' '.join(query.split()).encode('utf-8')).hexdigest()
+
+
+def _parse_selector(selector: str) -> Tuple[str, List[Tuple[str, Optional[str], Optional[str]]]]:
+    match = SELECTOR.match(selector.replace(' ', ''))
+    if not match:
+        raise ValueError(f"Unsupported Overpass selector: {selector}")
+    return match.group(1) or 'nwr', FILTER.findall(match.group(2))
+
+
+def element_matches(element: Dict, selector: str) -> bool:
+    """Whether an element returned by Overpass satisfies selector (type and tag filters)"""
+    types, filters = _parse_selector(selector)
+    element_type = element.get('type', 'node')
+    if types in ('node', 'way', 'relation'):
+        if element_type != types:
+            return False
+    elif element_type[0] not in types:  # nwr, nw, nr, wr
+        return False
+    tags = element.get('tags', {})
+    for key, op, value in filters:
+        if key not in tags:
+            return False
+        if op == '=' and tags[key] != value:
+            return False
+        if op == '~' and not re.search(value, tags[key]):
+            return False
+    return True
+
+
+def split_by_class(elements: List[Dict], classes: Dict[str, Sequence[str]]) -> Dict[str, List[Dict]]:
+    """
+    Elements of a union query per class, as separate queries would have
+    returned them (an element matching several classes is in each)
+    """
+    found = {name: [] for name in classes}
+    for element in elements:
+        for name, selectors in classes.items():
+            if any(element_matches(element, selector) for selector in selectors):
+                found[name].append(element)
+    return found
+
+
+def unique_elements(found: Dict[str, List[Dict]]) -> List[Dict]:
+    """Every element of a split result once, in class order"""
+    return list({(e.get('type'), e.get('id')): e for elements in found.values() for e in elements}.values())
+
+
+# ---------------------------------------------------------------------------
+# Disk cache and slot limiter
+# ---------------------------------------------------------------------------
+
+class OverpassCache:
+    """
+    Raw response bodies on disk, one file per query hash (disabled without a
+    directory); entries older than max_age seconds are misses, and the
+    refetched body replaces them
+    """
+
+    def __init__(self, directory: Optional[str] = OVERPASS_CACHE_DIR, max_age: float = OVERPASS_CACHE_TTL):
+        self.directory = directory
+        self.max_age = max_age
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[bytes]:
+        if not self.directory:
+            return None
+        max_age = self.max_age if max_age is None else max_age
+        try:
+            if max_age and time.time() - os.path.getmtime(self.path(key)) > max_age:
+                return None
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, body: bytes):
+        if not self.directory:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path)  # readers never see a partial response
+
+
+class SlotLimiter:
+    """
+    Client side of the Overpass slot system. At most concurrency queries are
+    in flight from this process, and each one starts only when /status
+    reports a free slot for our IP; otherwise it sleeps until the next slot
+    frees up ('Slot available after ... in N seconds') or STATUS_POLL when
+    every slot is held by a running query. A 429 drops the known free slots
+    so the next start checks /status again. Without a usable /status the
+    limiter only caps concurrency
+    """
+
+    def __init__(self, status_url: str, concurrency: int = OVERPASS_CONCURRENCY, client=http,
+                 status_ttl: float = STATUS_TTL, poll_interval: float = STATUS_POLL):
+        self.status_url = status_url
+        self.client = client
+        self.status_ttl = status_ttl
+        self.poll_interval = poll_interval
+        self.rate_limit: Optional[int] = None
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._free = 0  # free slots from the last /status not taken yet
+        self._in_flight = 0  # our started queries; /status misses those still on the wire
+        self._flight_lock = threading.Lock()
+        self._released = threading.Condition(self._flight_lock)
+        self._free_until = 0.0
+        self._status_ok = True
+        self.stats = {'status_checks': 0, 'waits': 0, 'waited_s': 0.0}
+
+    def status(self) -> Tuple[Optional[int], int, Optional[float]]:
+        """(rate limit, free slots now, seconds until the next slot frees up) from /status"""
+        self.stats['status_checks'] += 1
+        response = self.client.get(self.status_url, timeout=10, retries=0)
+        response.raise_for_status()
+        text = response.text
+        rate_limit = STATUS_RATE_LIMIT.search(text)
+        if rate_limit is None:
+            raise ValueError(f"unexpected /status answer: {text[:80]!r}")
+        free = STATUS_FREE.search(text)
+        waits = [max(0, int(seconds)) for seconds in STATUS_NEXT.findall(text)]
+        return int(rate_limit.group(1)), int(free.group(1)) if free else 0, min(waits) if waits else None
+
+    def _take_slot(self, deadline: Optional[float]):
+        """Called with the lock held; returns once a server slot is ours"""
+        while True:
+            now = time.monotonic()
+            if self._free > 0 and now < self._free_until:
+                self._free -= 1
+                self._started()
+                return
+            if not self._status_ok:
+                self._started()
+                return
+            try:
+                self.rate_limit, free, next_slot = self.status()
+            except (HTTPError, Timeout, ValueError) as e:
+                logger.warning(f"Overpass /status unavailable ({e}), limiting concurrency only")
+                self._status_ok = False
+                self._started()
+                return
+            if self.rate_limit == 0:  # unlimited endpoint
+                self._started()
+                return
+            with self._flight_lock:
+                free = min(free, self.rate_limit - self._in_flight)
+            self._free, self._free_until = free, time.monotonic() + self.status_ttl
+            if free:
+                continue
+            delay = max(0.1, next_slot if next_slot is not None else self.poll_interval)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise OverpassBusy(f"no Overpass slot for {delay:.0f}s")
+            self.stats['waits'] += 1
+            started = time.monotonic()
+            with self._released:
+                if next_slot is None and self._in_flight:
+                    self._released.wait(delay)  # our own queries hold the slots: recheck when one ends
+                    delay = 0
+            time.sleep(delay)
+            self.stats['waited_s'] += time.monotonic() - started
+
+    def acquire(self, max_wait: Optional[float] = None):
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        if not self._slots.acquire(timeout=max_wait):
+            raise OverpassBusy(f"no Overpass slot within {max_wait}s")
+        try:
+            wait = -1 if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._lock.acquire(timeout=wait):  # another thread is sleeping for the next slot
+                raise OverpassBusy(f"no Overpass slot within {max_wait}s")
+            try:
+                self._take_slot(deadline)
+            finally:
+                self._lock.release()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _started(self):
+        with self._flight_lock:
+            self._in_flight += 1
+
+    def release(self):
+        with self._released:
+            self._in_flight -= 1
+            self._released.notify_all()
+        self._slots.release()
+
+    @property
+    def follows_status(self) -> bool:
+        return self._status_ok
+
+    def throttled(self):
+        """The server answered 429: forget the free slots we thought we had"""
+        with self._lock:
+            self._free = 0
+
+
+# ---------------------------------------------------------------------------
+# Fetcher
+# ---------------------------------------------------------------------------
+
+class OverpassFetcher:
+    """
+    Cached, rate-limited Overpass queries. query() runs one raw query,
+    fetch() one union query for several POI classes of an area and
+    fetch_many() fetch() for many areas concurrently, yielding each as it
+    completes so the caller can write one city while the next downloads
+    """
+
+    def __init__(self, url: str = OVERPASS_URL, concurrency: int = OVERPASS_CONCURRENCY,
+                 cache: Optional[OverpassCache] = None, limiter: Optional[SlotLimiter] = None,
+                 client=http, retries: int = OVERPASS_RETRIES):
+        self.url = url
+        self.concurrency = concurrency
+        self.cache = cache or OverpassCache()
+        self.client = client
+        self.limiter = limiter or SlotLimiter(self.status_url(url), concurrency, client)
+        self.retries = retries
+        self._stats_lock = threading.Lock()
+        self.stats = {'queries': 0, 'cache_hits': 0, 'fetched': 0, 'throttled': 0, 'failed': 0, 'bytes': 0}
+
+    @staticmethod
+    def status_url(url: str) -> str:
+        return re.sub(r'/interpreter/?$', '', url.rstrip('/')) + '/status'
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _post(self, query: str, timeout: float, max_wait: Optional[float]):
+        self.limiter.acquire(max_wait)
+        try:
+            return self.client.post(self.url, data={'data': query}, timeout=timeout, retries=0)
+        finally:
+            self.limiter.release()
+
+    def query(self, query: str, timeout: float = 75, max_wait: Optional[float] = None,
+              refresh: bool = False, max_age: Optional[float] = None) -> Dict:
+        """
+        Overpass JSON for a raw query, from the disk cache unless refresh or
+        the entry is older than max_age (default: the cache's); raises OverpassError
+        """
+        self._count('queries')
+        key = query_key(query)
+        body = None if refresh else self.cache.get(key, max_age)
+        if body is not None:
+            self._count('cache_hits')
+            return json.loads(body)
+
+        error = 'no attempt'
+        for attempt in range(self.retries + 1):
+            if attempt and not (error == 'HTTP 429' and self.limiter.follows_status):
+                time.sleep(min(2.0 ** attempt, MAX_BACKOFF))  # a 429 with /status waits in the limiter
+            try:
+                response = self._post(query, timeout, max_wait)
+            except Timeout:
+                error = 'timeout'
+                continue
+            if response.status_code == 429:
+                self._count('throttled')
+                self.limiter.throttled()  # the next attempt waits for /status to report a free slot
+                error = 'HTTP 429'
+                continue
+            if response.status_code in (502, 503, 504):
+                error = f"HTTP {response.status_code}"
+                continue
+            if response.status_code != 200:
+                self._count('failed')
+                raise OverpassError(f"HTTP {response.status_code}: {response.text[:100]}")
+            data = response.json()
+            remark = data.get('remark', '')
+            if 'runtime error' in remark:  # server-side timeout or out of memory: partial result, not cached
+                error = remark[:100]
+                continue
+            self.cache.put(key, response.content)
+            self._count('fetched')
+            self._count('bytes', len(response.content))
+            return data
+        self._count('failed')
+        raise OverpassError(f"gave up after {self.retries + 1} attempts: {error}")
+
+    def fetch(self, area: Area, classes: Dict[str, Sequence[str]], timeout: int = 60, out: str = 'center',
+              max_wait: Optional[float] = None, refresh: bool = False,
+              max_age: Optional[float] = None) -> Dict[str, List[Dict]]:
+        """Elements per class for an area, with one query for all classes"""
+        selectors = [selector for class_selectors in classes.values() for selector in class_selectors]
+        data = self.query(build_query(area, selectors, timeout, out), timeout=timeout + 15,
+                          max_wait=max_wait, refresh=refresh, max_age=max_age)
+        return split_by_class(data.get('elements', []), classes)
+
+    def fetch_many(self, areas: Dict[str, Area], classes: Dict[str, Sequence[str]], **kwargs
+                   ) -> Iterator[Tuple[str, Optional[Dict[str, List[Dict]]], Optional[Exception]]]:
+        """(name, elements per class, error) for every area, in completion order"""
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='overpass') as pool:
+            futures = {pool.submit(self.fetch, area, classes, **kwargs): name for name, area in areas.items()}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
+
+    def summary(self) -> str:
+        stats = self.stats
+        return (f"{stats['queries']} queries: {stats['cache_hits']} cached, {stats['fetched']} fetched "
+                f"({stats['bytes'] / 1e6:.1f} MB), {stats['throttled']} throttled, {stats['failed']} failed, "
+                f"{self.limiter.stats['waited_s']:.0f}s waiting for slots")
+
+
+# Shared fetcher: every loader in the process goes through the same slots and cache
+overpass = OverpassFetcher()
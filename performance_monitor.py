@@ -344,6 +344,21 @@ class ViamigoPerformanceMonitor:
             },
             "database": db_stats,
             "chromadb": chromadb_stats,
+            "rag_prompts": self.get_rag_prompt_stats(),
+            "llm_cache": self.get_llm_cache_stats(),
+            "translation_memory": self.get_translation_memory_stats(),
+            "llm_gateway": self.get_llm_gateway_stats(),
+            "plan_streaming": self.get_plan_streaming_stats(),
+            "job_runners": self.get_job_runner_stats(),
+            "task_queue": self.get_task_queue_stats(),
+            "http_upstreams": self.get_http_upstream_stats(),
+            "deadlines": self.get_deadline_stats(),
+            "admission": self.get_admission_stats(),
+            "precomputed_itineraries": self.get_precomputed_itinerary_stats(),
+            "city_bundles": self.get_city_bundle_stats(),
+            "image_blobs": self.get_image_blob_stats(),
+            "image_variants": self.get_image_variant_stats(),
+            "placeholders": self.get_placeholder_stats(),
             "endpoints": endpoint_performance,
             "cache_stats": dict(self.cache_stats),
             "recent_slow_queries": [
@@ -357,6 +372,144 @@ class ViamigoPerformanceMonitor:
             ][-10:]  # Last 10 slow queries
         }
 
+    def get_rag_prompt_stats(self) -> Dict[str, Any]:
+        """Get token-per-prompt statistics from the RAG context builder"""
+        try:
+            from simple_rag_helper import context_builder
+            return context_builder.get_metrics()
+        except Exception as e:
+            logger.warning(f"RAG prompt stats unavailable: {e}")
+            return {}
+
+    def get_llm_cache_stats(self) -> Dict[str, Any]:
+        """Get LLM response cache hit rates and estimated savings"""
+        try:
+            from llm_response_cache import llm_cache
+            return llm_cache.get_stats()
+        except Exception as e:
+            logger.warning(f"LLM cache stats unavailable: {e}")
+            return {}
+
+    def get_translation_memory_stats(self) -> Dict[str, Any]:
+        """Get translation memory hit rate and LLM batch calls"""
+        try:
+            from multi_language_support import multi_language
+            return {**multi_language.memory.get_stats(), 'llm_calls': multi_language.llm_calls}
+        except Exception as e:
+            logger.warning(f"Translation memory stats unavailable: {e}")
+            return {}
+
+    def get_llm_gateway_stats(self) -> Dict[str, Any]:
+        """Get LLM lane queue times, rejections and token budget usage"""
+        try:
+            from llm_gateway import llm_gateway
+            return llm_gateway.get_stats()
+        except Exception as e:
+            logger.warning(f"LLM gateway stats unavailable: {e}")
+            return {}
+
+    def get_plan_streaming_stats(self) -> Dict[str, Any]:
+        """Get time-to-first-stop and completion times of the streaming planners"""
+        try:
+            from itinerary_stream import stream_metrics
+            return stream_metrics.get_stats()
+        except Exception as e:
+            logger.warning(f"Plan streaming stats unavailable: {e}")
+            return {}
+
+    def get_job_runner_stats(self) -> Dict[str, Any]:
+        """Get worker, queue depth and outcome counts of the bounded job runners"""
+        try:
+            from job_runner import background_jobs, outbound_calls
+            return {
+                'background': background_jobs.get_stats(),
+                'outbound': outbound_calls.get_stats()
+            }
+        except Exception as e:
+            logger.warning(f"Job runner stats unavailable: {e}")
+            return {}
+
+    def get_task_queue_stats(self) -> Dict[str, Any]:
+        """Get durable task queue backlog, spend against budget and rate limits"""
+        try:
+            from task_queue import task_queue
+            return task_queue.get_stats()
+        except Exception as e:
+            logger.warning(f"Task queue stats unavailable: {e}")
+            return {}
+
+    def get_http_upstream_stats(self) -> Dict[str, Any]:
+        """Get latency histograms, retries and status codes per outbound API host"""
+        try:
+            from http_client import http
+            return http.get_stats()
+        except Exception as e:
+            logger.warning(f"HTTP upstream stats unavailable: {e}")
+            return {}
+
+    def get_deadline_stats(self) -> Dict[str, Any]:
+        """Get latency against the p99 SLO and stages skipped for lack of budget per endpoint"""
+        try:
+            from request_deadline import deadline_metrics
+            return deadline_metrics.get_stats()
+        except Exception as e:
+            logger.warning(f"Deadline stats unavailable: {e}")
+            return {}
+
+    def get_admission_stats(self) -> Dict[str, Any]:
+        """Get slots, queue depth and shed/degraded counts of the admission-controlled endpoints"""
+        try:
+            from admission_control import admission
+            return admission.get_stats()
+        except Exception as e:
+            logger.warning(f"Admission stats unavailable: {e}")
+            return {}
+
+    def get_precomputed_itinerary_stats(self) -> Dict[str, Any]:
+        """Get exact/nearest/miss counts and lookup time of the precomputed itineraries"""
+        try:
+            from itinerary_precompiler import precomputed_itineraries
+            return precomputed_itineraries.get_stats()
+        except Exception as e:
+            logger.warning(f"Precomputed itinerary stats unavailable: {e}")
+            return {}
+
+    def get_city_bundle_stats(self) -> Dict[str, Any]:
+        """Get offline city bundle sizes and bundle/delta download counts"""
+        try:
+            from city_bundles import city_bundles
+            return city_bundles.get_stats()
+        except Exception as e:
+            logger.warning(f"City bundle stats unavailable: {e}")
+            return {}
+
+    def get_image_blob_stats(self) -> Dict[str, Any]:
+        """Get image locator hits/misses and blob store writes"""
+        try:
+            from image_blob_store import image_locator
+            return image_locator.get_stats()
+        except Exception as e:
+            logger.warning(f"Image blob stats unavailable: {e}")
+            return {}
+
+    def get_image_variant_stats(self) -> Dict[str, Any]:
+        """Get variant renders, bytes saved and disk cache usage"""
+        try:
+            from image_variants import image_variants
+            return image_variants.get_stats()
+        except Exception as e:
+            logger.warning(f"Image variant stats unavailable: {e}")
+            return {}
+
+    def get_placeholder_stats(self) -> Dict[str, Any]:
+        """Get placeholder renders, render time and response sizes"""
+        try:
+            from placeholder_images import placeholder_images
+            return placeholder_images.get_stats()
+        except Exception as e:
+            logger.warning(f"Placeholder stats unavailable: {e}")
+            return {}
+
     def get_database_performance_stats(self) -> Dict[str, Any]:
         """Get PostgreSQL performance statistics"""
         if not self.db_conn:
@@ -0,0 +1,117 @@
+"""
+Placeholder Images - Rendered once per (city, attraction), referenced by URL
+Itinerary JSON carries a short /api/images/placeholder URL instead of a
+~20KB base64 JPEG; the first request renders the JPEG with Pillow into the
+image variant disk cache, later ones are a sendfile. If Pillow cannot
+render, the same URL answers with a shared SVG template for a short while
+(the next request retries the JPEG); the JPEG and the .svg URL never change,
+so they are cached as immutable
+"""
+
+import os
+import time
+import hashlib
+import logging
+from functools import lru_cache
+from html import escape
+from io import BytesIO
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+from image_variants import SingleFlight, VariantCache, image_variants
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_VERSION = 1  # bump when the drawing changes: new URLs, new cache entries
+WIDTH, HEIGHT = 400, 300
+FONT_PATH = os.getenv('PLACEHOLDER_FONT', '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf')
+
+SVG_TEMPLATE = '''<svg width="400" height="300" xmlns="http://www.w3.org/2000/svg">
+    <rect width="400" height="300" fill="#f0f0f0"/>
+    <text x="200" y="140" text-anchor="middle" font-family="Arial" font-size="16" fill="#666">📍 {city}</text>
+    <text x="200" y="170" text-anchor="middle" font-family="Arial" font-size="18" fill="#333">🏛️ {attraction}</text>
+</svg>'''
+
+
+def render_svg(city: str, attraction: str) -> str:
+    return SVG_TEMPLATE.format(city=escape(city or ''), attraction=escape(attraction or ''))
+
+
+@lru_cache(maxsize=1)
+def _font():
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(FONT_PATH, 20)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_placeholder(city: str, attraction: str) -> bytes:
+    """400x300 JPEG with the city and attraction names centred"""
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (WIDTH, HEIGHT), color='#f0f0f0')
+    draw = ImageDraw.Draw(img)
+    font = _font()
+
+    for text, y, fill in ((f"📍 {city}", HEIGHT // 2 - 30, '#666666'),
+                          (f"🏛️ {attraction}", HEIGHT // 2 + 10, '#333333')):
+        bbox = draw.textbbox((0, 0), text, font=font)
+        draw.text(((WIDTH - (bbox[2] - bbox[0])) // 2, y), text, fill=fill, font=font)
+
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class PlaceholderService:
+    """One render per (city, attraction), even under concurrent requests"""
+
+    def __init__(self, cache: VariantCache = None):
+        self.cache = cache or image_variants.cache
+        self._flights = SingleFlight()
+        self.stats = {'urls': 0, 'renders': 0, 'render_errors': 0, 'render_ms': 0.0,
+                      'jpeg_bytes': 0, 'served_jpeg': 0, 'served_svg': 0, 'bytes_served': 0}
+
+    @staticmethod
+    def key(city: str, attraction: str) -> str:
+        return hashlib.sha256(f'placeholder|{PLACEHOLDER_VERSION}|{city}|{attraction}'.encode('utf-8')).hexdigest()[:32]
+
+    def url(self, city: str, attraction: str) -> str:
+        """Stable URL of the placeholder (nothing is rendered until it is requested)"""
+        self.stats['urls'] += 1
+        return f"/api/images/placeholder?{urlencode({'city': city or '', 'name': attraction or '', 'v': PLACEHOLDER_VERSION})}"
+
+    def get(self, city: str, attraction: str) -> Optional[str]:
+        """Path of the rendered JPEG, rendering it on first use; None when Pillow can't (serve the SVG)"""
+        name = f'{self.key(city, attraction)}.jpeg'
+        return self._flights.run(name, lambda: self.cache.get(name),
+                                 lambda: self._render(name, city, attraction), 10)
+
+    def _render(self, name: str, city: str, attraction: str) -> Optional[str]:
+        try:
+            started = time.perf_counter()
+            data = render_placeholder(city, attraction)
+            self.stats['render_ms'] += (time.perf_counter() - started) * 1000
+            self.stats['renders'] += 1
+            self.stats['jpeg_bytes'] += len(data)
+            return self.cache.put(name, data)
+        except Exception as e:
+            self.stats['render_errors'] += 1
+            logger.warning(f"Placeholder render failed for {attraction} ({city}): {e}")
+            return None
+
+    def record_served(self, kind: str, size: int):
+        self.stats[f'served_{kind}'] += 1
+        self.stats['bytes_served'] += size
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        served = stats['served_jpeg'] + stats['served_svg']
+        stats['avg_render_ms'] = round(stats['render_ms'] / stats['renders'], 2) if stats['renders'] else 0
+        stats['avg_response_bytes'] = round(stats['bytes_served'] / served) if served else 0
+        stats['render_ms'] = round(stats['render_ms'], 1)
+        return stats
+
+
+placeholder_images = PlaceholderService()
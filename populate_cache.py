@@ -91,14 +91,13 @@ def populate_city(city, delay=5):
             time.sleep(delay)
 
 
-def populate_batch(cities, delay=5):
-    """Populate multiple cities using batch endpoint"""
+def populate_batch(cities, poll_interval=5):
+    """Queue multiple cities via the batch endpoint and follow the job's progress"""
     url = f'{BASE_URL}/admin/populate-cities-batch'
     headers = {'X-Admin-Secret': ADMIN_SECRET}
     payload = {
         'cities': cities,
-        'categories': ['tourist_attraction', 'restaurant'],
-        'delay_seconds': delay
+        'categories': ['tourist_attraction', 'restaurant']
     }
 
     print(f"\n{'='*60}")
@@ -107,30 +106,46 @@ def populate_batch(cities, delay=5):
 
     try:
         response = requests.post(
-            url, json=payload, headers=headers, timeout=3600)  # 1 hour timeout
-
-        if response.status_code == 200:
-            data = response.json()
-            print(f"\n{'='*60}")
-            print(f"✅ Batch completed!")
-            print(
-                f"   Total duration: {data.get('total_duration_seconds', 0):.1f}s")
-            print(
-                f"   ({data.get('total_duration_seconds', 0) / 60:.1f} minutes)")
-            print(f"{'='*60}\n")
-
-            for city, results in data.get('results', {}).items():
-                print(f"{city}:")
-                for category, result in results.items():
-                    status = "cached" if result.get('cached') else "new"
-                    print(
-                        f"  - {category}: {result['count']} places ({status})")
+            url, json=payload, headers=headers, timeout=30)
 
-            return True
-        else:
+        if response.status_code not in (200, 202):
             print(f"❌ Error {response.status_code}: {response.text}")
             return False
 
+        job = response.json()
+        job_url = f"{BASE_URL}/admin/jobs/{job['job_id']}"
+        print(f"📥 Job {job['job_id']}: {job['queued']} tasks queued "
+              f"({job.get('already_pending', 0)} already pending)")
+        print(f"   Safe to interrupt: the server keeps working, resume with "
+              f"GET {job_url}\n")
+
+        while True:
+            time.sleep(poll_interval)
+            progress = requests.get(job_url, headers=headers,
+                                    params={'tasks': 'false'}, timeout=30).json()
+            print(f"   ⏳ {progress['percent']:5.1f}%  done {progress['done']}  "
+                  f"failed {progress['failed']}  queued {progress['queued']}  "
+                  f"running {progress['running']}  cost ${progress['cost_usd']:.2f}"
+                  f"{'  (budget throttled)' if progress.get('budget_throttled') else ''}")
+            if progress['finished']:
+                break
+
+        progress = requests.get(job_url, headers=headers, timeout=30).json()
+        print(f"\n{'='*60}")
+        print(f"✅ Batch completed!")
+        print(f"{'='*60}\n")
+
+        for task in progress.get('tasks', []):
+            result = task.get('result') or {}
+            label = f"{task['payload']['city']} - {task['payload']['category']}"
+            if task['status'] == 'done':
+                status = "cached" if result.get('cached') else "new"
+                print(f"  - {label}: {result.get('count', 0)} places ({status})")
+            else:
+                print(f"  - {label}: {task['status']} {task.get('error') or ''}")
+
+        return progress['failed'] == 0
+
     except Exception as e:
         print(f"❌ Exception: {e}")
         return False
@@ -181,7 +196,7 @@ def main():
     parser.add_argument('--status', action='store_true',
                         help='Check current cache status')
     parser.add_argument('--delay', type=int, default=5,
-                        help='Delay between API calls (seconds)')
+                        help='Batch progress poll interval (seconds)')
     parser.add_argument(
         '--cities-file', help='File with list of cities (one per line)')
 
@@ -194,7 +209,7 @@ def main():
     elif args.cities_file:
         with open(args.cities_file) as f:
             cities = [line.strip() for line in f if line.strip()]
-        populate_batch(cities, delay=args.delay)
+        populate_batch(cities, poll_interval=args.delay)
     elif args.batch:
         print(
             f"\n🚀 Starting batch population of {len(ITALIAN_CITIES)} Italian cities")
@@ -205,7 +220,7 @@ def main():
 
         response = input("Continue? (yes/no): ")
         if response.lower() in ['yes', 'y']:
-            populate_batch(ITALIAN_CITIES, delay=args.delay)
+            populate_batch(ITALIAN_CITIES, poll_interval=args.delay)
         else:
             print("Cancelled.")
     else:
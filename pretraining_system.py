@@ -9,7 +9,6 @@ from typing import List, Dict
 from dynamic_places_api import dynamic_places
 from flask_app import app, db
 from models import PlaceCache
-import time
 
 class PretrainingSystem:
     def __init__(self):
@@ -60,62 +59,46 @@ class PretrainingSystem:
             ]
         }
     
-    def run_pretraining(self, level='italia', batch_size=5, delay=2):
-        """Esegue il pre-training per un livello specifico"""
+    def run_pretraining(self, level='italia', wait=True, max_wait=None):
+        """
+        Esegue il pre-training per un livello specifico tramite la coda task_queue
+
+        Ogni destinazione è un task: rate limit Nominatim, retry con backoff e
+        budget OpenAI sono gestiti dalla coda. Se lo script viene interrotto,
+        rilanciarlo riprende dai luoghi non ancora in cache. Con wait ritorna
+        quando non resta nulla che questo processo possa eseguire (budget
+        esaurito, task presi da un altro worker) o dopo max_wait secondi.
+        """
+        from task_queue import task_queue
+
         destinations = self.priority_destinations.get(level, [])
-        
+
         print(f"🚀 Avvio pre-training livello: {level}")
         print(f"📍 Destinazioni da processare: {len(destinations)}")
-        
-        with app.app_context():
-            processed = 0
-            for i in range(0, len(destinations), batch_size):
-                batch = destinations[i:i+batch_size]
-                
-                for place_name, city, country in batch:
-                    try:
-                        # Controlla se già in cache
-                        cache_key = f"{place_name.lower().replace(' ', '_')}_{city.lower()}"
-                        existing = PlaceCache.query.filter_by(cache_key=cache_key).first()
-                        
-                        if existing:
-                            print(f"✅ {place_name} già in cache")
-                            continue
-                        
-                        # Ottieni informazioni dinamiche
-                        print(f"🔄 Processing: {place_name}, {city}")
-                        place_info = dynamic_places.get_place_info(place_name, city, country)
-                        
-                        if place_info:
-                            # Salva in cache database
-                            cache_entry = PlaceCache(
-                                cache_key=cache_key,
-                                place_name=place_name,
-                                city=city,
-                                country=country,
-                                place_data=json.dumps(place_info),
-                                priority_level=level
-                            )
-                            db.session.add(cache_entry)
-                            db.session.commit()
-                            
-                            print(f"💾 Salvato: {place_name} in cache")
-                            processed += 1
-                        else:
-                            print(f"❌ Errore processing: {place_name}")
-                        
-                        # Delay per evitare rate limiting
-                        time.sleep(delay)
-                        
-                    except Exception as e:
-                        print(f"❌ Errore {place_name}: {e}")
-                        continue
-                
-                print(f"📊 Batch completato. Processati: {processed}/{len(destinations)}")
-        
-        print(f"🎉 Pre-training {level} completato! Processati: {processed} luoghi")
+
+        job = task_queue.enqueue_job('pretrain_place', [
+            {'place_name': place_name, 'city': city, 'country': country, 'level': level}
+            for place_name, city, country in destinations
+        ], dedup_fields=('place_name', 'city'))
+        print(f"📥 Job {job['job_id']}: {job['queued']} task in coda")
+
+        if not wait:
+            return job['job_id']
+
+        # Lo script elabora direttamente i propri task (nessun worker esterno richiesto)
+        pending = task_queue.work(job_id=job['job_id'], until_idle=True, max_wait=max_wait)
+        progress = task_queue.job_progress(job['job_id'], include_tasks=True) or {'tasks': []}
+        processed = sum(1 for task in progress['tasks']
+                        if task['status'] == 'done' and task['result'] and task['result'].get('saved'))
+
+        if pending:
+            print(f"⏸️ Job {job['job_id']} ancora in sospeso: {pending} "
+                  f"(riprende con `python task_queue.py work` o rilanciando lo script)")
+            print(f"📊 Pre-training {level} parziale: {processed} luoghi processati")
+        else:
+            print(f"🎉 Pre-training {level} completato! Processati: {processed} luoghi")
         return processed
-    
+
     def get_cache_stats(self):
         """Statistiche della cache"""
         with app.app_context():
@@ -141,4 +124,35 @@ class PretrainingSystem:
             db.session.commit()
             return deleted
 
-# Aggiorna il modello per includere il caching
\ No newline at end of file
+
+def pretrain_place(payload):
+    """
+    Task handler (task_queue kind 'pretrain_place'): geocoding + OSM + AI per un
+    luogo, salvato in PlaceCache. I luoghi già in cache non vengono rielaborati.
+    """
+    place_name, city, country = payload['place_name'], payload['city'], payload.get('country', '')
+    cache_key = f"{place_name.lower().replace(' ', '_')}_{city.lower()}"
+
+    with app.app_context():
+        if PlaceCache.query.filter_by(cache_key=cache_key).first():
+            print(f"✅ {place_name} già in cache")
+            return {'place_name': place_name, 'saved': False, 'cached': True, 'cost_usd': 0}
+
+        print(f"🔄 Processing: {place_name}, {city}")
+        place_info = dynamic_places.get_place_info(place_name, city, country)
+        if not place_info:
+            raise RuntimeError(f"Errore processing: {place_name}")
+
+        db.session.add(PlaceCache(
+            cache_key=cache_key,
+            place_name=place_name,
+            city=city,
+            country=country,
+            place_data=json.dumps(place_info),
+            priority_level=payload.get('level')
+        ))
+        db.session.commit()
+        print(f"💾 Salvato: {place_name} in cache")
+        return {'place_name': place_name, 'saved': True, 'cached': False}
+
+# Aggiorna il modello per includere il caching
@@ -135,26 +135,34 @@ class ProactiveScrapingManager:
             logger.error(f"❌ Error scraping {city}: {e}")
             return False
 
-    def run_proactive_scraping(self, max_scrapes: int = 10, prioritize_users: bool = True):
+    def run_proactive_scraping(self, max_scrapes: int = 10, prioritize_users: bool = True,
+                               wait: bool = False, max_wait: Optional[float] = None):
         """
-        Run proactive scraping session
+        Queue a proactive scraping session on the durable task queue
 
         Args:
             max_scrapes: Maximum number of city-category pairs to scrape
             prioritize_users: If True, prioritize cities users have requested
+            wait: Block until the queue workers have finished the job
+            max_wait: With wait, give up after this many seconds (status 'pending')
+
+        Apify calls are rate limited, retried and budget-checked by task_queue;
+        pairs already queued by an earlier session are not queued twice.
         """
+        from task_queue import task_queue
+
         try:
             logger.info("🚀 Starting proactive scraping session")
 
-            scraped_count = 0
-            success_count = 0
+            selected = []
+            seen = set()
 
             # Strategy 1: User-driven scraping
             if prioritize_users:
                 user_cities = self.get_user_requested_cities(days=14)
                 for city, country, access_count in user_cities[:max_scrapes // 2]:
                     for category in self.categories:
-                        if scraped_count >= max_scrapes // 2:
+                        if len(selected) >= max_scrapes // 2:
                             break
 
                         cache_key = f"{city.lower()}_{category}"
@@ -163,27 +171,35 @@ class ProactiveScrapingManager:
 
                         # Only scrape if missing or very old
                         if not cached or (datetime.now() - cached.created_at).days > 60:
-                            if self.scrape_and_cache_city(city, country, category):
-                                success_count += 1
-                            scraped_count += 1
+                            selected.append({'city': city, 'country': country, 'category': category,
+                                             'max_age_days': 60})
+                            seen.add(cache_key)
 
             # Strategy 2: Fill gaps in popular cities
             needs_refresh = self.get_cities_needing_refresh(max_age_days=90)
-            for city, country, category, reason, detail in needs_refresh[:max_scrapes - scraped_count]:
-                if scraped_count >= max_scrapes:
+            for city, country, category, reason, detail in needs_refresh:
+                if len(selected) >= max_scrapes:
                     break
+                if f"{city.lower()}_{category}" not in seen:
+                    selected.append({'city': city, 'country': country, 'category': category,
+                                     'max_age_days': 90 if reason == 'old' else None,
+                                     'force_refresh': reason == 'insufficient'})
 
-                if self.scrape_and_cache_city(city, country, category):
-                    success_count += 1
-                scraped_count += 1
-
+            job = task_queue.enqueue_job('apify_place_category', selected,
+                                         dedup_fields=('city', 'category'))
             logger.info(
-                f"✅ Proactive scraping complete: {success_count}/{scraped_count} successful")
-            return {
-                'total_attempted': scraped_count,
-                'successful': success_count,
-                'failed': scraped_count - success_count
-            }
+                f"📥 Proactive scraping queued: {job['queued']} tasks (job {job['job_id']})")
+
+            # Without wait the job has only been queued: report it, not a finished run
+            result = {'job_id': job['job_id'], 'status': 'queued' if job['queued'] else 'nothing_to_queue',
+                      'queued': job['queued'], 'already_pending': job['duplicates'],
+                      'progress_url': f"/admin/jobs/{job['job_id']}"}
+            if wait and job['queued']:
+                progress = task_queue.wait_for_job(job['job_id'], timeout=max_wait)
+                result.update(status='finished' if progress['finished'] else 'pending',
+                              total_attempted=job['queued'], successful=progress['done'],
+                              failed=progress['failed'])
+            return result
 
         except Exception as e:
             logger.error(f"❌ Proactive scraping error: {e}")
@@ -238,6 +254,42 @@ class ProactiveScrapingManager:
             return {}
 
 
+def scrape_place_category(payload: Dict) -> Dict:
+    """
+    Task handler (task_queue kind 'apify_place_category'): one city/category from
+    Apify into place_cache. Fresh cache entries are kept unless force_refresh,
+    so a resumed batch only pays for what is still missing.
+
+    Payload: {city, category, country?, force_refresh?, max_age_days?, max_results?}
+    """
+    from flask_app import app
+    from apify_integration import apify_travel
+    from task_queue import PermanentTaskError
+
+    city, category = payload['city'], payload['category']
+    with app.app_context():
+        cached = PlaceCache.query.filter_by(
+            cache_key=f"{city.lower()}_{category}").first()
+        max_age_days = payload.get('max_age_days')
+        fresh = cached and (not max_age_days or (datetime.now() - cached.created_at).days <= max_age_days)
+        if fresh and not payload.get('force_refresh'):
+            places = json.loads(cached.place_data) if cached.place_data else []
+            return {'city': city, 'category': category, 'count': len(places), 'cached': True, 'cost_usd': 0}
+
+        if not apify_travel.is_available():
+            raise PermanentTaskError('Apify is not configured')
+
+        places = apify_travel.search_google_maps_places(
+            city, category, payload.get('max_results', 15))
+        if not places:
+            # resilient_api_call also returns [] on errors: let the queue retry later
+            raise RuntimeError(f"No places returned for {city} - {category}")
+
+        apify_travel.cache_places(city, category, places)
+        logger.info(f"✅ Cached {len(places)} places for {city} - {category}")
+        return {'city': city, 'category': category, 'count': len(places), 'cached': False}
+
+
 class SmartCacheWarmer:
     """Intelligent cache warming based on patterns"""
 
@@ -319,7 +371,7 @@ def register_proactive_routes(app):
 
     @app.route('/admin/scraping/run', methods=['POST'])
     def run_scraping():
-        """Manually trigger proactive scraping"""
+        """Queue a proactive scraping job; poll progress_url for its outcome"""
         from flask import jsonify, request
 
         max_scrapes = request.json.get('max_scrapes', 5)
@@ -331,7 +383,7 @@ def register_proactive_routes(app):
             prioritize_users=prioritize_users
         )
 
-        return jsonify(result)
+        return jsonify(result), 500 if 'error' in result else 202
 
     @app.route('/admin/scraping/coverage')
     def coverage_stats():
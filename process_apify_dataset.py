@@ -4,16 +4,15 @@ Processes Apify Google Images scraper results and populates PostgreSQL database
 with classified attraction images
 """
 import psycopg2
-import requests
 import os
-import hashlib
-from io import BytesIO
-from PIL import Image
 import logging
+import heapq
+import urllib.parse
 from dotenv import load_dotenv
-import time
-import json
 from attraction_classifier import AttractionImageClassifier
+from image_harvester import (HARVEST_CONCURRENCY, Checkpoint, ImageHarvester, PerceptualIndex,
+                             PostgresImageSink, load_known_images)
+from streaming_import import DEFAULT_CHUNK_SIZE, JsonRecords, chunked
 
 # Load environment variables
 load_dotenv()
@@ -33,156 +32,62 @@ def get_db_connection():
         return None
 
 
-def download_and_process_image(url, max_size_mb=2):
-    """Download and process image with robust error handling"""
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'image/webp,image/apng,image/jpeg,image/png,image/*,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': 'https://www.google.com/',
-        }
-
-        # Handle different URL types
-        if 'google.com/imgres' in url:
-            # Extract actual image URL from Google redirect
-            import urllib.parse
-            parsed = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
-            if 'imgurl' in parsed:
-                actual_url = parsed['imgurl'][0]
-                logger.info(f"Extracted actual URL: {actual_url}")
-                url = actual_url
-            else:
-                logger.warning(f"Could not extract image URL from: {url}")
-                return None
-
-        logger.info(f"Downloading: {url[:80]}...")
-        response = requests.get(url, headers=headers, timeout=30, stream=True)
-
-        if response.status_code != 200:
-            logger.warning(f"HTTP {response.status_code} for {url}")
-            return None
-
-        # Read content in chunks
-        content = b''
-        for chunk in response.iter_content(chunk_size=8192):
-            content += chunk
-            if len(content) > max_size_mb * 1024 * 1024:
-                logger.warning(f"Image too large: {len(content)} bytes")
-                return None
-
-        # Verify it's a valid image
-        try:
-            img = Image.open(BytesIO(content))
-            width, height = img.size
-
-            # Skip very small images (likely broken thumbnails)
-            if width < 100 or height < 100:
-                logger.warning(f"Image too small: {width}x{height}")
-                return None
-
-            # Convert to RGB if needed
-            if img.mode in ('RGBA', 'LA', 'P'):
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                rgb_img.paste(img, mask=img.split()
-                              [-1] if img.mode in ('RGBA', 'LA') else None)
-                img = rgb_img
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-
-            # Resize if too large (keep reasonable size for web display)
-            if width > 1200 or height > 800:
-                img.thumbnail((1200, 800), Image.Resampling.LANCZOS)
-                width, height = img.size
-
-            # Save as optimized JPEG
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            img_bytes = output.getvalue()
-
-            return {
-                'bytes': img_bytes,
-                'width': width,
-                'height': height,
-                'mime_type': 'image/jpeg',
-                'size': len(img_bytes)
-            }
-
-        except Exception as e:
-            logger.warning(f"Invalid image data: {e}")
-            return None
-
-    except Exception as e:
-        logger.error(f"Download error: {e}")
-        return None
-
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'image/webp,image/apng,image/jpeg,image/png,image/*,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Referer': 'https://www.google.com/',
+}
 
-def add_classified_image_to_db(image_data, city, attraction, confidence, original_metadata):
-    """Add classified image to database"""
-    try:
-        conn = get_db_connection()
-        if not conn:
-            return False
 
-        # Download and process the image
-        image_content = download_and_process_image(image_data.get('imageUrl'))
+def resolve_image_url(url):
+    """Actual image URL (Google imgres redirects unwrapped), None if there is none"""
+    if url and 'google.com/imgres' in url:
+        parsed = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+        if 'imgurl' not in parsed:
+            logger.warning(f"Could not extract image URL from: {url}")
+            return None
+        return parsed['imgurl'][0]
+    return url
 
-        if not image_content:
-            logger.warning(f"Failed to download image for {attraction}")
-            return False
 
-        # Calculate SHA256 hash
-        sha256_hash = hashlib.sha256(image_content['bytes']).hexdigest()
+def confidence_source(confidence):
+    """Source label by confidence level"""
+    if confidence >= 0.8:
+        return 'apify_high_confidence'
+    elif confidence >= 0.6:
+        return 'apify_medium_confidence'
+    return 'apify_low_confidence'
 
-        with conn.cursor() as cur:
-            # Check if image already exists
-            cur.execute(
-                "SELECT id FROM attraction_images WHERE sha256_hash = %s", (sha256_hash,))
-            if cur.fetchone():
-                logger.info(f"Image already exists (duplicate hash)")
-                return True
-
-            # Determine source based on confidence
-            if confidence >= 0.8:
-                source = 'apify_high_confidence'
-            elif confidence >= 0.6:
-                source = 'apify_medium_confidence'
-            else:
-                source = 'apify_low_confidence'
-
-            # Insert new image
-            cur.execute("""
-                INSERT INTO attraction_images 
-                (source, city, attraction_name, original_url, confidence_score,
-                 img_bytes, mime_type, width, height, sha256_hash, 
-                 original_title, content_url)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (sha256_hash) DO NOTHING
-            """, (
-                source, city, attraction, image_data.get('imageUrl'),
-                confidence, image_content['bytes'], image_content['mime_type'],
-                image_content['width'], image_content['height'], sha256_hash,
-                original_metadata.get(
-                    'title'), original_metadata.get('contentUrl')
-            ))
-
-            conn.commit()
-            logger.info(
-                f"✅ Added {attraction} in {city} ({image_content['size']} bytes, confidence: {confidence:.2f})")
-            return True
 
-    except Exception as e:
-        logger.error(f"Error adding image for {attraction}: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
+def image_job(image_data, city, attraction, confidence):
+    """Harvester job for one classified dataset image"""
+    url = resolve_image_url(image_data.get('imageUrl'))
+    if not url:
+        return None
+    return {
+        'key': f"apify:{image_data.get('imageUrl')}",
+        'urls': [url],
+        'row': {
+            'source': confidence_source(confidence),
+            'city': city,
+            'attraction_name': attraction,
+            'original_url': image_data.get('imageUrl'),
+            'confidence_score': confidence,
+            'original_title': image_data.get('title'),
+            'content_url': image_data.get('contentUrl'),
+        },
+    }
 
 
-def process_apify_dataset(dataset_path, confidence_threshold=0.0, max_images_per_attraction=10):
-    """Process Apify dataset and populate database"""
+def process_apify_dataset(dataset_path, confidence_threshold=0.0, max_images_per_attraction=10,
+                          checkpoint_path='apify_images.checkpoint', concurrency=HARVEST_CONCURRENCY):
+    """
+    Process Apify dataset and populate database: images are downloaded in
+    parallel (per-host limits), re-encoded as JPEG within 1200x800 in worker
+    processes, deduplicated against every stored image by perceptual hash and
+    inserted in batches; an interrupted run resumes from checkpoint_path
+    """
 
     logger.info(f"🚀 Processing Apify dataset: {dataset_path}")
     logger.info(f"📊 Confidence threshold: {confidence_threshold}")
@@ -191,72 +96,65 @@ def process_apify_dataset(dataset_path, confidence_threshold=0.0, max_images_per
     # Initialize classifier
     classifier = AttractionImageClassifier()
 
-    # Load dataset
-    with open(dataset_path, 'r') as f:
-        data = json.load(f)
-
-    logger.info(f"📁 Loaded {len(data)} images from dataset")
-
-    # Classify all images
-    classifications = {}
-    for image in data:
-        city, attraction, confidence = classifier.classify_image(image)
-
-        if confidence >= confidence_threshold:
-            key = f"{city}_{attraction}"
-            if key not in classifications:
-                classifications[key] = []
-
-            classifications[key].append({
+    # Stream and classify, keeping only the best images of each attraction:
+    # memory follows the number of attractions, not the size of the export
+    records = JsonRecords(dataset_path)
+    classifications = {}  # category -> min-heap of (confidence, -seq, item)
+    seq = 0
+    for chunk in chunked(records, DEFAULT_CHUNK_SIZE):
+        for image in chunk:
+            city, attraction, confidence = classifier.classify_image(image)
+            if confidence < confidence_threshold:
+                continue
+            seq += 1
+            entry = (confidence, -seq, {
                 'image_data': image,
                 'city': city,
                 'attraction': attraction,
                 'confidence': confidence
             })
+            best = classifications.setdefault(f"{city}_{attraction}", [])
+            if len(best) < max_images_per_attraction:
+                heapq.heappush(best, entry)
+            elif best and entry > best[0]:  # ties keep the earlier image
+                heapq.heapreplace(best, entry)
+        logger.info(f"📁 {records.count} images classified ({records.position / records.size:.0%})")
 
     logger.info(
         f"🎯 Found {len(classifications)} attraction categories after filtering")
 
-    # Process each attraction category
-    total_processed = 0
-    total_successful = 0
-    total_failed = 0
-
-    for category, images in classifications.items():
-        city, attraction = category.split('_', 1)
+    # Highest confidence first, limited per attraction
+    jobs = []
+    for best in classifications.values():
+        for _, _, item in sorted(best, reverse=True):
+            job = image_job(item['image_data'], item['city'], item['attraction'], item['confidence'])
+            if job:
+                jobs.append(job)
 
-        # Sort by confidence (highest first) and limit
-        images_sorted = sorted(
-            images, key=lambda x: x['confidence'], reverse=True)
-        images_to_process = images_sorted[:max_images_per_attraction]
+    conn = get_db_connection()
+    if not conn:
+        return {'total_processed': 0, 'successful': 0, 'failed': 0, 'duplicates': 0,
+                'categories': len(classifications), 'images_per_min': 0.0}
 
-        logger.info(
-            f"📍 Processing {len(images_to_process)} images for {attraction} in {city}")
-
-        for item in images_to_process:
-            total_processed += 1
-
-            success = add_classified_image_to_db(
-                item['image_data'],
-                item['city'],
-                item['attraction'],
-                item['confidence'],
-                item['image_data']
-            )
-
-            if success:
-                total_successful += 1
-            else:
-                total_failed += 1
-
-            # Small delay to be respectful
-            time.sleep(0.5)
+    try:
+        index = load_known_images(conn, PerceptualIndex())
+        harvester = ImageHarvester(
+            PostgresImageSink(conn), Checkpoint(checkpoint_path), concurrency=concurrency,
+            max_size=(1200, 800), min_size=100, reencode=True, max_bytes=2 * 1024 * 1024,
+            index=index, hash_columns=('sha256_hash',), headers=BROWSER_HEADERS,
+            progress=lambda message: logger.info(f"📍 {message}"))
+        logger.info(f"🖼️ Harvesting {len(jobs)} images ({len(index.sha256)} already stored)")
+        stats = harvester.run(jobs)
+    finally:
+        conn.close()
 
     return {
-        'total_processed': total_processed,
-        'successful': total_successful,
-        'failed': total_failed,
-        'categories': len(classifications)
+        'total_processed': stats['jobs'] - stats['skipped'],
+        'successful': stats['stored'],
+        'failed': stats['failed'],
+        'duplicates': stats['duplicates'] + stats['near_duplicates'],
+        'categories': len(classifications),
+        'images_per_min': stats['images_per_min']
     }
 
 
@@ -272,8 +170,8 @@ def show_database_stats():
             cur.execute("""
                 SELECT COUNT(*) as total_images,
                        COUNT(DISTINCT city) as cities_count,
-                       SUM(LENGTH(img_bytes)) as total_size,
-                       AVG(LENGTH(img_bytes)) as avg_size,
+                       SUM(COALESCE(blob_size, LENGTH(img_bytes))) as total_size,
+                       AVG(COALESCE(blob_size, LENGTH(img_bytes))) as avg_size,
                        AVG(confidence_score) as avg_confidence
                 FROM attraction_images
                 WHERE confidence_score IS NOT NULL
@@ -360,7 +258,9 @@ if __name__ == "__main__":
     print(f"   📁 Categories processed: {results['categories']}")
     print(f"   🖼️ Images processed: {results['total_processed']}")
     print(f"   ✅ Successfully added: {results['successful']}")
+    print(f"   ♻️ Duplicates skipped: {results['duplicates']}")
     print(f"   ❌ Failed: {results['failed']}")
+    print(f"   ⚡ Throughput: {results['images_per_min']:.0f} images/min")
 
     # Show final state
     print("\nFinal database state:")
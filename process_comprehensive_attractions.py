@@ -6,14 +6,16 @@ Processes the custom Apify actor dataset with OSM + Wikidata + Commons integrati
 import json
 import os
 import psycopg2
-import requests
-from PIL import Image
-from io import BytesIO
-import hashlib
-import time
+from itertools import islice
 from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+from image_harvester import (ImageHarvester, PerceptualIndex, PostgresImageSink, ensure_harvest_columns,
+                             load_known_images)
+from streaming_import import DEFAULT_CHUNK_SIZE, JsonRecords, import_in_chunks, values_writer
+from content_hash import UNCHANGED, ChangeDetector, content_hash, ensure_hash_column
+from entity_resolution import resolve_entities
+
 # Load environment variables
 load_dotenv()
 
@@ -135,48 +137,6 @@ class ComprehensiveAttractionsProcessor:
                 conn.commit()
                 print("✅ Enhanced database tables created/updated")
 
-    def process_image(self, image_data: Dict, attraction_name: str) -> Optional[Tuple[bytes, str, int]]:
-        """Download and process image from the dataset"""
-        if not image_data or not image_data.get('thumbUrl'):
-            return None
-
-        try:
-            thumb_url = image_data['thumbUrl']
-            response = requests.get(thumb_url, timeout=10, headers={
-                'User-Agent': 'ViamigoTravelAI/1.0 (Educational Research)'
-            })
-
-            if response.status_code != 200:
-                print(f"❌ Failed to download image: {response.status_code}")
-                return None
-
-            # Process image
-            img = Image.open(BytesIO(response.content))
-
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-
-            # Resize if too large (max 1280px width)
-            if img.width > 1280:
-                ratio = 1280 / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((1280, new_height), Image.Resampling.LANCZOS)
-
-            # Save as JPEG
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            image_bytes = output.getvalue()
-
-            # Generate hash for deduplication
-            image_hash = hashlib.sha256(image_bytes).hexdigest()
-
-            return image_bytes, image_hash, len(image_bytes)
-
-        except Exception as e:
-            print(f"❌ Error processing image for {attraction_name}: {e}")
-            return None
-
     def calculate_confidence(self, record: Dict) -> float:
         """Calculate confidence score based on data completeness"""
         confidence = 0.0
@@ -229,152 +189,184 @@ class ComprehensiveAttractionsProcessor:
 
         return 'Attraction'
 
-    def process_record(self, record: Dict) -> bool:
-        """Process a single attraction record"""
-        try:
-            # Skip records without proper names (but allow wikidata entries)
-            if not record.get('name') and not record.get('wikidata'):
-                return False
-
-            # Calculate confidence
-            confidence = self.calculate_confidence(record)
-
-            # Skip very low confidence records
-            if confidence < 0.2:
-                return False
-
-            name = record.get('name', '').strip(
-            ) or f"Unnamed {record.get('category', 'Attraction')}"
-            city = record.get('city', '')
-
-            # Insert into comprehensive_attractions table
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO comprehensive_attractions (
-                            city, name, raw_name, description, category, attraction_type,
-                            latitude, longitude, osm_id, osm_type, osm_tags,
-                            wikidata_id, wikipedia_url, has_image, image_url, 
-                            thumb_url, original_url, image_creator, image_license, image_attribution,
-                            source_osm, source_wikidata, source_commons
-                        ) VALUES (
-                            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                        ) ON CONFLICT (osm_id, osm_type) DO UPDATE SET
-                            name = EXCLUDED.name,
-                            description = EXCLUDED.description,
-                            updated_at = CURRENT_TIMESTAMP
-                        RETURNING id
-                    """, (
-                        city,
-                        name,
-                        record.get('rawName', ''),
-                        record.get('description', ''),
-                        record.get('category', ''),
-                        self.map_attraction_type(record),
-                        record.get('coords', {}).get('lat'),
-                        record.get('coords', {}).get('lon'),
-                        record.get('osmId'),
-                        record.get('osmType'),
-                        json.dumps(record.get('tags', {})),
-                        record.get('wikidata'),
-                        record.get('wikipedia'),
-                        bool(record.get('image', {}).get('thumbUrl')),
-                        record.get('image', {}).get('thumbUrl'),
-                        record.get('image', {}).get('thumbUrl'),
-                        record.get('image', {}).get('originalUrl'),
-                        record.get('image', {}).get('creator'),
-                        record.get('image', {}).get('license'),
-                        record.get('image', {}).get('attribution'),
-                        record.get('source', {}).get('osm', False),
-                        record.get('source', {}).get('wikidata', False),
-                        record.get('source', {}).get('commons', False)
-                    ))
-
-                    attraction_id = cur.fetchone()[0]
-
-                    # Process and store image if available
-                    image_data = record.get('image', {})
-                    if image_data and image_data.get('thumbUrl'):
-                        image_result = self.process_image(image_data, name)
-                        if image_result:
-                            image_bytes, image_hash, image_size = image_result
-
-                            # Insert into attraction_images table
-                            cur.execute("""
-                                INSERT INTO attraction_images (
-                                    source, city, attraction_name, img_bytes, 
-                                    confidence_score, original_title, content_url,
-                                    source_actor, osm_id, wikidata_id, license, creator, attribution,
-                                    sha256_hash, fetched_at, mime_type
-                                ) VALUES (
-                                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, 'image/jpeg'
-                                ) ON CONFLICT (sha256_hash) DO NOTHING
-                            """, (
-                                'comprehensive_actor',  # source
-                                city,
-                                name,
-                                psycopg2.Binary(image_bytes),
-                                confidence,
-                                name,
-                                image_data.get('thumbUrl'),
-                                'comprehensive',
-                                record.get('osmId'),
-                                record.get('wikidata'),
-                                image_data.get('license'),
-                                image_data.get('creator'),
-                                image_data.get('attribution'),
-                                image_hash
-                            ))
+    UPSERT = """
+        INSERT INTO comprehensive_attractions (
+            city, name, raw_name, description, category, attraction_type,
+            latitude, longitude, osm_id, osm_type, osm_tags,
+            wikidata_id, wikipedia_url, has_image, image_url, 
+            thumb_url, original_url, image_creator, image_license, image_attribution,
+            source_osm, source_wikidata, source_commons, content_hash
+        ) VALUES %s
+        ON CONFLICT (osm_id, osm_type) DO UPDATE SET
+            city = EXCLUDED.city,
+            name = EXCLUDED.name,
+            raw_name = EXCLUDED.raw_name,
+            description = EXCLUDED.description,
+            category = EXCLUDED.category,
+            attraction_type = EXCLUDED.attraction_type,
+            latitude = EXCLUDED.latitude,
+            longitude = EXCLUDED.longitude,
+            osm_tags = EXCLUDED.osm_tags,
+            wikidata_id = EXCLUDED.wikidata_id,
+            wikipedia_url = EXCLUDED.wikipedia_url,
+            has_image = EXCLUDED.has_image,
+            image_url = EXCLUDED.image_url,
+            thumb_url = EXCLUDED.thumb_url,
+            original_url = EXCLUDED.original_url,
+            image_creator = EXCLUDED.image_creator,
+            image_license = EXCLUDED.image_license,
+            image_attribution = EXCLUDED.image_attribution,
+            source_osm = EXCLUDED.source_osm,
+            source_wikidata = EXCLUDED.source_wikidata,
+            source_commons = EXCLUDED.source_commons,
+            content_hash = EXCLUDED.content_hash,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING id
+    """
+
+    def attraction_row(self, record: Dict) -> Optional[Tuple]:
+        """comprehensive_attractions row of a record, None when it is skipped"""
+        # Skip records without proper names (but allow wikidata entries)
+        if not record.get('name') and not record.get('wikidata'):
+            return None
 
-                conn.commit()
-                return True
+        # Skip very low confidence records
+        if self.calculate_confidence(record) < 0.2:
+            return None
 
-        except Exception as e:
-            print(
-                f"❌ Error processing record {record.get('name', 'Unknown')}: {e}")
-            return False
+        name = record.get('name', '').strip(
+        ) or f"Unnamed {record.get('category', 'Attraction')}"
+        image = record.get('image', {}) or {}
+        return (
+            record.get('city', ''),
+            name,
+            record.get('rawName', ''),
+            record.get('description', ''),
+            record.get('category', ''),
+            self.map_attraction_type(record),
+            record.get('coords', {}).get('lat'),
+            record.get('coords', {}).get('lon'),
+            record.get('osmId'),
+            record.get('osmType'),
+            json.dumps(record.get('tags', {})),
+            record.get('wikidata'),
+            record.get('wikipedia'),
+            bool(image.get('thumbUrl')),
+            image.get('thumbUrl'),
+            image.get('thumbUrl'),
+            image.get('originalUrl'),
+            image.get('creator'),
+            image.get('license'),
+            image.get('attribution'),
+            record.get('source', {}).get('osm', False),
+            record.get('source', {}).get('wikidata', False),
+            record.get('source', {}).get('commons', False)
+        )
+
+    def image_job(self, record: Dict) -> Optional[Dict]:
+        """Harvester job for the record's Commons thumbnail"""
+        image = record.get('image', {}) or {}
+        if not image.get('thumbUrl'):
+            return None
+        name = record.get('name', '').strip(
+        ) or f"Unnamed {record.get('category', 'Attraction')}"
+        return {
+            'key': f"comprehensive:{record.get('osmType')}/{record.get('osmId')}:{image['thumbUrl']}",
+            'urls': [image['thumbUrl']],
+            'row': {
+                'source': 'comprehensive_actor',
+                'city': record.get('city', ''),
+                'attraction_name': name,
+                'confidence_score': self.calculate_confidence(record),
+                'original_title': name,
+                'content_url': image['thumbUrl'],
+                'source_actor': 'comprehensive',
+                'osm_id': record.get('osmId'),
+                'wikidata_id': record.get('wikidata'),
+                'license': image.get('license'),
+                'creator': image.get('creator'),
+                'attribution': image.get('attribution'),
+            },
+        }
 
-    def process_dataset(self, json_file_path: str, limit: int = None):
-        """Process the comprehensive attractions dataset"""
+    def process_dataset(self, json_file_path: str, limit: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        with_images: bool = True):
+        """
+        Process the comprehensive attractions dataset: records are streamed
+        from the file, the chunk's records whose content hash is new or
+        changed are upserted with one execute_values, and only their images
+        go through the parallel image harvester
+        """
         print(
             f"🚀 Processing comprehensive attractions dataset: {json_file_path}")
 
         # Setup database tables
         self.setup_enhanced_tables()
 
-        # Load and process data
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        print(f"📊 Dataset loaded: {len(data)} attractions")
+        records = JsonRecords(json_file_path)
+        print(f"📊 Streaming dataset: {records.size / 1024 / 1024:.1f} MB")
 
         # Apply limit if specified
         if limit:
-            data = data[:limit]
+            records = islice(records, limit)
             print(f"🔢 Processing limited to {limit} records")
 
-        # Process each record
-        for i, record in enumerate(data, 1):
-            if i % 50 == 0:
-                print(
-                    f"📈 Progress: {i}/{len(data)} ({(i/len(data)*100):.1f}%)")
+        conn = self.get_db_connection()
+        with conn.cursor() as cur:
+            ensure_hash_column(cur, 'comprehensive_attractions')
+        conn.commit()
+        changes = ChangeDetector(conn, 'comprehensive_attractions', key=('osm_id', 'osm_type'))
+        harvester = None
+        if with_images:
+            with conn.cursor() as cur:
+                ensure_harvest_columns(cur)
+            conn.commit()
+            harvester = ImageHarvester(
+                PostgresImageSink(conn), index=load_known_images(conn, PerceptualIndex()),
+                max_size=(1280, 4096), reencode=True, hash_columns=('sha256_hash',),
+                headers={'User-Agent': 'ViamigoTravelAI/1.0 (Educational Research)'})
+        upsert = values_writer(conn, self.UPSERT, page_size=500, fetch=True)
+
+        def write(chunk: List[Tuple[Tuple, Optional[Dict]]]) -> int:
+            # One row per (osm_id, osm_type) per statement, the last occurrence wins
+            rows = {}
+            for i, (row, _) in enumerate(chunk):
+                rows[(row[8], row[9]) if row[8] is not None else i] = row
+            keyed = [(key, row[-1]) for key, row in rows.items() if isinstance(key, tuple)]
+            unchanged = {key for (key, _), status in zip(keyed, changes.classify(keyed))
+                         if status == UNCHANGED}
+            changed = [row for key, row in rows.items() if key not in unchanged]
+            written = upsert(changed) if changed else 0
+            if harvester:
+                harvester.run(job for row, job in chunk if job and (row[8], row[9]) not in unchanged)
+            return written
 
-            success = self.process_record(record)
-            if success:
-                self.processed_count += 1
-            else:
-                self.skipped_count += 1
+        try:
+            stats = import_in_chunks(
+                records, self._transform, write, chunk_size, label='attractions')
+        finally:
+            conn.close()
 
-            # Small delay to avoid overwhelming the system
-            time.sleep(0.01)
+        self.processed_count += stats['rows']
+        self.skipped_count += stats['read'] - stats['rows']
 
         # Final report
         print(f"\n🎉 PROCESSING COMPLETE!")
         print(f"   ✅ Processed: {self.processed_count}")
         print(f"   ⏭️  Skipped: {self.skipped_count}")
         print(f"   ❌ Errors: {self.error_count}")
-        print(
-            f"   📊 Success Rate: {(self.processed_count/(self.processed_count+self.skipped_count)*100):.1f}%")
+        print(f"   🔁 Changes: {changes.summary()}")
+        if self.processed_count + self.skipped_count:
+            print(
+                f"   📊 Success Rate: {(self.processed_count/(self.processed_count+self.skipped_count)*100):.1f}%")
+        if harvester:
+            print(f"   🖼️ Images: {harvester.report()}")
+
+    def _transform(self, record: Dict) -> Optional[Tuple[Tuple, Optional[Dict]]]:
+        row = self.attraction_row(record)
+        if row is None:
+            return None
+        return row + (content_hash(row),), self.image_job(record)
 
 
 def main():
@@ -390,6 +382,13 @@ def main():
     # Process the complete dataset (remove limit for full processing)
     processor.process_dataset(json_file)  # Process all 1800 attractions
 
+    # Map the attractions onto the places already known from place_cache
+    conn = processor.get_db_connection()
+    try:
+        resolve_entities(conn, sources=['comprehensive_attractions'])
+    finally:
+        conn.close()
+
 
 if __name__ == "__main__":
     main()
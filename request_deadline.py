@@ -0,0 +1,262 @@
+"""
+Request Deadline - Request-scoped time budget for the itinerary pipeline
+The route entry opens a deadline; the geocoder, DB layer, vector search,
+Apify and LLM wrappers read it to size their own timeouts from what is
+left and skip to cached or fallback tiers when the budget is too low
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+import functools
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# /plan total budget and p99 latency objective (load_test_plan.py enforces the SLO)
+PLAN_DEADLINE_SECONDS = float(os.getenv('PLAN_DEADLINE_SECONDS', '8'))
+PLAN_P99_SLO_MS = float(os.getenv('PLAN_P99_SLO_MS', '10000'))
+
+# Total budget of each endpoint opened by with_deadline(). It caps every stage
+# timeout inside the request: /plan's Apify stage (45s standalone) gets at most
+# these seconds, then its template fallback
+ENDPOINT_DEADLINES = {
+    'plan': PLAN_DEADLINE_SECONDS,
+}
+
+# Below this many seconds a stage is not worth starting: use its fallback instead
+STAGE_MINIMUMS = {
+    'geocoder': 1.0,
+    'nominatim': 1.0,
+    'db': 0.2,
+    'vector_search': 0.5,
+    'apify': 3.0,
+    'openai': 1.5,
+    'default': 0.5,
+}
+
+_current = contextvars.ContextVar('request_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage cannot run in the remaining budget; callers take their fallback tier"""
+
+
+class Deadline:
+    """Absolute expiry plus a record of the stages skipped for lack of time"""
+
+    def __init__(self, budget: float, endpoint: str = 'request'):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.started = time.time()
+        self.expires_at = self.started + budget
+        self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.time())
+
+    @property
+    def expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def elapsed_ms(self) -> float:
+        return (time.time() - self.started) * 1000
+
+    def timeout(self, stage: str, default: float, minimum: Optional[float] = None) -> Optional[float]:
+        """
+        Timeout for a stage: its usual timeout capped by the remaining budget,
+        or None (stage recorded as skipped) when less than `minimum` is left
+        """
+        minimum = STAGE_MINIMUMS.get(stage, STAGE_MINIMUMS['default']) if minimum is None else minimum
+        remaining = self.remaining()
+        if remaining < minimum:
+            self.skipped.append(stage)
+            deadline_metrics.record_skip(self.endpoint, stage)
+            logger.info(f"⏱️ {self.endpoint}: skipping {stage}, {remaining:.2f}s left (< {minimum}s)")
+            return None
+        return min(default, remaining)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(budget: float, endpoint: str = 'request'):
+    """Open a deadline for the enclosed work (nested scopes keep the tighter one)"""
+    outer = _current.get()
+    deadline = Deadline(budget, endpoint)
+    if outer and outer.expires_at < deadline.expires_at:
+        deadline = outer
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def adopt_deadline(deadline: Optional[Deadline]):
+    """Make a deadline captured in another thread current for the enclosed work"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def stage_timeout(stage: str, default: float, minimum: Optional[float] = None) -> Optional[float]:
+    """Timeout for a stage in the current request (default when no deadline is active)"""
+    deadline = _current.get()
+    return default if deadline is None else deadline.timeout(stage, default, minimum)
+
+
+def require_stage(stage: str, default: float, minimum: Optional[float] = None) -> float:
+    """Like stage_timeout() but raises DeadlineExceeded instead of returning None"""
+    timeout = stage_timeout(stage, default, minimum)
+    if timeout is None:
+        raise DeadlineExceeded(f"No time left for {stage}")
+    return timeout
+
+
+def _set_statement_timeout(executor, value: str) -> Optional[str]:
+    """set_config('statement_timeout', value, is_local) returning the previous value"""
+    query = ("SELECT current_setting('statement_timeout'), "
+             "set_config('statement_timeout', %s, true)")
+    if hasattr(executor, 'get_bind'):
+        from sqlalchemy import text
+        return executor.execute(text(query.replace('%s', ':value')), {'value': value}).fetchone()[0]
+    executor.execute(query, (value,))
+    return executor.fetchone()[0]
+
+
+def apply_statement_timeout(executor, default_ms: int = 30000):
+    """
+    SET LOCAL statement_timeout from the remaining budget on a psycopg2 cursor
+    (no-op outside a deadline; the connection's 30s applies). Only for
+    connections opened for the stage and closed after it: on a shared session
+    use statement_timeout(), which restores the previous value
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return
+    ms = int(require_stage('db', default_ms / 1000) * 1000)
+    _set_statement_timeout(executor, f'{ms}ms')
+
+
+@contextmanager
+def statement_timeout(executor, default_ms: int = 30000):
+    """
+    Budgeted statement_timeout for the enclosed statements on a psycopg2 cursor
+    or SQLAlchemy session, reset to its previous value afterwards so the rest of
+    the transaction (e.g. Flask-SQLAlchemy's request session) is unaffected
+    """
+    deadline = _current.get()
+    if deadline is None:
+        yield
+        return
+    ms = int(require_stage('db', default_ms / 1000) * 1000)
+    previous = _set_statement_timeout(executor, f'{ms}ms')
+    try:
+        yield
+    finally:
+        try:
+            _set_statement_timeout(executor, previous)
+        except Exception as e:
+            # Aborted transaction: the rollback discards the LOCAL setting anyway
+            logger.debug(f"statement_timeout not restored: {e}")
+
+
+def call_within_deadline(stage: str, default_timeout: float, func: Callable, *args, **kwargs):
+    """
+    Run func on the bounded outbound pool with a timeout sized from the budget
+
+    Replaces signal.alarm() timeouts, which only work in the main thread.
+    Raises DeadlineExceeded when the stage is skipped, TimeoutError on expiry.
+    """
+    from api_error_handler import api_error_handler
+    timeout = require_stage(stage, default_timeout)
+    return api_error_handler._execute_with_timeout(functools.partial(func, *args, **kwargs), timeout, stage)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class DeadlineMetrics:
+    """Latency against the p99 SLO and skipped stages per endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=1000))
+        self._slo_ms: Dict[str, float] = {}
+        self._counters = defaultdict(lambda: {'requests': 0, 'slo_violations': 0, 'degraded': 0})
+        self._skips = defaultdict(lambda: defaultdict(int))
+
+    def record_request(self, endpoint: str, elapsed_ms: float, slo_ms: float, degraded: bool):
+        with self._lock:
+            self._latencies[endpoint].append(elapsed_ms)
+            self._slo_ms[endpoint] = slo_ms
+            counters = self._counters[endpoint]
+            counters['requests'] += 1
+            counters['slo_violations'] += elapsed_ms > slo_ms
+            counters['degraded'] += degraded
+
+    def record_skip(self, endpoint: str, stage: str):
+        with self._lock:
+            self._skips[endpoint][stage] += 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = {}
+            for endpoint in set(self._counters) | set(self._skips):
+                latencies = list(self._latencies[endpoint])
+                p99 = _percentile(latencies, 0.99)
+                stats[endpoint] = {
+                    **self._counters[endpoint],
+                    'latency_ms_p50': round(_percentile(latencies, 0.5), 1),
+                    'latency_ms_p95': round(_percentile(latencies, 0.95), 1),
+                    'latency_ms_p99': round(p99, 1),
+                    'p99_slo_ms': self._slo_ms.get(endpoint),
+                    'slo_met': p99 <= self._slo_ms[endpoint] if endpoint in self._slo_ms else None,
+                    'skipped_stages': dict(self._skips[endpoint]),
+                }
+            return stats
+
+
+deadline_metrics = DeadlineMetrics()
+
+
+def with_deadline(endpoint: str, budget: Optional[float] = None, slo_ms: Optional[float] = None):
+    """
+    Flask view decorator: run the view inside a deadline and record its
+    latency against the SLO; Server-Timing reports total time and skipped stages
+
+    The budget is explicit: passed in, or the endpoint's ENDPOINT_DEADLINES entry
+    """
+    if budget is None and endpoint not in ENDPOINT_DEADLINES:
+        raise ValueError(f"No deadline for endpoint '{endpoint}': pass budget= or add it to ENDPOINT_DEADLINES")
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response
+            with deadline_scope(budget or ENDPOINT_DEADLINES[endpoint], endpoint) as deadline:
+                response = make_response(view(*args, **kwargs))
+            elapsed_ms = deadline.elapsed_ms()
+            deadline_metrics.record_request(endpoint, elapsed_ms, slo_ms or PLAN_P99_SLO_MS,
+                                            degraded=bool(deadline.skipped))
+            timing = f'total;dur={elapsed_ms:.0f}'
+            if deadline.skipped:
+                timing += f', skipped;desc="{",".join(sorted(set(deadline.skipped)))}"'
+            response.headers['Server-Timing'] = timing
+            return response
+        return wrapper
+    return decorator
@@ -4,6 +4,7 @@ from models import User
 import logging
 from functools import wraps
 from datetime import datetime
+from request_deadline import with_deadline, call_within_deadline
 
 # Import app and db after initialization to avoid circular imports
 
@@ -345,6 +346,7 @@ def api_get_profile():
 
 @app.route('/plan', methods=['POST'])
 @login_required
+@with_deadline('plan')
 def api_plan_trip():
     """API endpoint per pianificazione viaggi - routing dinamico personalizzato"""
     try:
@@ -437,6 +439,8 @@ def api_plan_trip():
         print(
             f"🔍 APIFY STATUS: available={apify_travel.is_available()}, token={bool(apify_travel.api_token)}")
 
+        precomputed = None
+
         # 🌍 FORCE APIFY for foreign destinations (with fast timeout for London)
         if is_foreign:
             if apify_travel.is_available():
@@ -452,26 +456,24 @@ def api_plan_trip():
                         itinerary = generate_london_itinerary_from_cache(
                             start, end, cached_attractions)
                     else:
-                        # Try Apify with shorter timeout for London
+                        # Try Apify with shorter timeout for London (capped by the request deadline)
                         try:
-                            import signal
-
-                            def timeout_handler(signum, frame):
-                                raise TimeoutError("Apify timeout")
-                            signal.signal(signal.SIGALRM, timeout_handler)
-                            signal.alarm(15)  # 15 second timeout
-
-                            itinerary = apify_travel.generate_authentic_waypoints(
-                                start, end, city)
-                            signal.alarm(0)  # Cancel timeout
+                            itinerary = call_within_deadline(
+                                'apify', 15, apify_travel.generate_authentic_waypoints, start, end, city)
                         except (TimeoutError, Exception) as e:
                             print(
                                 f"⚠️ Apify timeout for London, using fallback: {e}")
                             itinerary = generate_london_fallback_itinerary(
                                 start, end)
                 else:
-                    itinerary = apify_travel.generate_authentic_waypoints(
-                        start, end, city)
+                    # 45s standalone, but never more than the /plan budget (ENDPOINT_DEADLINES['plan'])
+                    try:
+                        itinerary = call_within_deadline(
+                            'apify', 45, apify_travel.generate_authentic_waypoints, start, end, city)
+                    except TimeoutError as e:
+                        # Budget esaurito: si passa ai template qui sotto
+                        print(f"⚠️ Apify oltre la deadline per {city}, uso template: {e}")
+                        itinerary = None
 
                 print(
                     f"🌍 APIFY returned {len(itinerary) if itinerary else 0} waypoints")
@@ -484,12 +486,22 @@ def api_plan_trip():
                     start, end, city, duration, user_interests
                 )
         else:
-            print(f"🇮🇹 DOMESTIC destination: {city} - using dynamic routing")
-            # Fallback al routing dinamico personalizzato
-            from dynamic_routing import dynamic_router
-            itinerary = dynamic_router.generate_personalized_itinerary(
-                start, end, city, duration, user_interests
-            )
+            # Itinerario precompilato (stesso hub/durata/profilo o il più vicino): risposta in millisecondi
+            from itinerary_precompiler import precomputed_itineraries
+            precomputed = precomputed_itineraries.lookup(
+                city, start, end, duration, user_interests)
+
+            if precomputed:
+                print(
+                    f"⚡ PRECOMPUTED {precomputed['match']} match for {city}: {precomputed['start_hub']} → {precomputed['end_hub']}")
+                itinerary = precomputed['itinerary']
+            else:
+                print(f"🇮🇹 DOMESTIC destination: {city} - using dynamic routing")
+                # Fallback al routing dinamico personalizzato
+                from dynamic_routing import dynamic_router
+                itinerary = dynamic_router.generate_personalized_itinerary(
+                    start, end, city, duration, user_interests
+                )
 
         # Se il routing dinamico fallisce, usa template specifici
         if not itinerary or len(itinerary) < 3:
@@ -518,7 +530,8 @@ def api_plan_trip():
             'itinerary': itinerary,
             'routing_info': {
                 'city': city,
-                'routing_type': 'apify_authentic' if is_foreign and apify_travel.is_available() else 'dynamic_personalized',
+                'routing_type': 'apify_authentic' if is_foreign and apify_travel.is_available() else ('precomputed' if precomputed else 'dynamic_personalized'),
+                'precomputed_match': precomputed['match'] if precomputed else None,
                 'generated_for': f"{start} → {end}",
                 'realistic_routing': True,
                 'walking_routes': True,
@@ -534,6 +547,49 @@ def api_plan_trip():
         }), 500
 
 
+@app.route('/plan/stream', methods=['POST'])
+@login_required
+def api_plan_trip_stream():
+    """Variante streaming di /plan: scheletro dell'itinerario subito, poi dettagli, immagini e consigli AI per tappa"""
+    from intelligent_italian_routing import italian_router
+    from itinerary_stream import stream_itinerary, stream_response, skeleton_from_response, wants_sse
+
+    data = request.get_json() or {}
+    start = data.get('start', '').strip()
+    end = data.get('end', '').strip()
+    duration = data.get('duration', 'half_day')
+
+    if not start or not end:
+        return jsonify({
+            'success': False,
+            'error': 'Start e end sono obbligatori'
+        }), 400
+
+    detected_city = italian_router.detect_city(f"{data.get('city', '')} {start} {end}")
+
+    def build_skeleton():
+        if detected_city:
+            itinerary = italian_router.generate_intelligent_itinerary(
+                start=start, end=end, city_name=detected_city, duration=duration)
+            return {
+                'success': True,
+                'itinerary': itinerary,
+                'city': detected_city,
+                'routing_info': {
+                    'city': detected_city,
+                    'routing_type': 'intelligent_italian',
+                    'generated_for': f"{start} → {end}"
+                }
+            }
+        # Destinazioni estere o non coperte dal router: il risultato completo fa da scheletro
+        skeleton = skeleton_from_response(api_plan_trip())
+        skeleton['city'] = skeleton.get('routing_info', {}).get('city', '')
+        return skeleton
+
+    sse = wants_sse(request)
+    return stream_response(stream_itinerary('plan', build_skeleton, sse=sse), sse)
+
+
 def detect_city_from_locations(start, end):
     """Rileva la città dall'input utente usando Nominatim API per scalabilità mondiale"""
     text = f"{start} {end}".lower()
@@ -11,9 +11,9 @@ Strategy: Tier-based approach
 """
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from datetime import datetime
-import json
+from streaming_import import CopyUpsertSink
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '.env'))
 
@@ -448,58 +448,35 @@ ITALY_TIER3_DATA = {
 
 
 def seed_place_data(city, places):
-    """Seed place data for a specific city"""
-    with engine.begin() as conn:
-        for place in places:
-            cache_key = f"{city.lower()}_{place['name'].lower().replace(' ', '_')}"
+    """Seed place data for a specific city (COPY + one upsert per batch)"""
+    conn = engine.raw_connection()
+    try:
+        with CopyUpsertSink(
+                conn, 'place_cache',
+                ('cache_key', 'place_name', 'city', 'country', 'place_data', 'priority_level'),
+                key=('cache_key',), update=('city', 'country', 'place_data', 'priority_level'),
+                insert_values={'created_at': 'NOW()', 'last_accessed': 'NOW()'},
+                update_values={'last_accessed': 'NOW()'}) as sink:
+            for place in places:
+                cache_key = f"{city.lower()}_{place['name'].lower().replace(' ', '_')}"
 
-            place_data = {
-                'name': place['name'],
-                'city': city,
-                'country': 'Italia',
-                'type': place['type'],
-                'coordinates': {
-                    'lat': place['lat'],
-                    'lon': place['lon']
-                },
-                'priority': 'high',  # Tier 1 data
-                'source': 'manual_seed_tier1'
-            }
-
-            # Check if exists
-            result = conn.execute(text(
-                "SELECT id FROM place_cache WHERE cache_key = :key"
-            ), {'key': cache_key})
-
-            if result.fetchone():
-                # Update existing
-                conn.execute(text("""
-                    UPDATE place_cache 
-                    SET place_data = :data,
-                        city = :city,
-                        country = 'Italia',
-                        priority_level = 'high',
-                        last_accessed = NOW()
-                    WHERE cache_key = :key
-                """), {
-                    'key': cache_key,
-                    'data': json.dumps(place_data),
-                    'city': city
-                })
-                print(f"  ✅ Updated: {place['name']}")
-            else:
-                # Insert new
-                conn.execute(text("""
-                    INSERT INTO place_cache 
-                    (cache_key, place_name, city, country, place_data, priority_level, created_at, last_accessed)
-                    VALUES (:key, :name, :city, 'Italia', :data, 'high', NOW(), NOW())
-                """), {
-                    'key': cache_key,
+                place_data = {
                     'name': place['name'],
                     'city': city,
-                    'data': json.dumps(place_data)
-                })
-                print(f"  ✅ Inserted: {place['name']}")
+                    'country': 'Italia',
+                    'type': place['type'],
+                    'coordinates': {
+                        'lat': place['lat'],
+                        'lon': place['lon']
+                    },
+                    'priority': 'high',  # Tier 1 data
+                    'source': 'manual_seed_tier1'
+                }
+
+                sink.add((cache_key, place['name'], city, 'Italia', place_data, 'high'))
+        print(f"  ✅ {sink.summary()}")
+    finally:
+        conn.close()
 
 
 def main():
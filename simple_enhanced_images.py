@@ -7,6 +7,8 @@ from flask import Blueprint, jsonify, request
 import logging
 import re
 
+from keyword_classifier import KeywordRules
+
 logger = logging.getLogger(__name__)
 
 enhanced_images_bp = Blueprint('enhanced_images', __name__)
@@ -51,103 +53,67 @@ ATTRACTION_IMAGES = {
 }
 
 
-def classify_attraction_simple(title, context=""):
-    """Simple attraction classification"""
-    text = f"{title} {context}".lower()
-
-    # Italian cities - CHECK CONTEXT FIRST for better accuracy
-    if any(city in text for city in ['firenze', 'florence']):
-        city = 'Firenze'
-    elif any(city in text for city in ['roma', 'rome']):
-        city = 'Roma'
-    elif any(city in text for city in ['milano', 'milan']):
-        city = 'Milano'
-    elif any(city in text for city in ['napoli', 'naples']):
-        city = 'Napoli'
-    elif any(city in text for city in ['genova', 'genoa']):
-        city = 'Genova'
-    else:
-        city = 'Italia'
-
-    # Extract attraction
-    attraction = 'Generic'
-    confidence = 0.5
-
-    # Known attractions
-    if 'colosseo' in text or 'colosseum' in text:
-        attraction = 'Colosseo'
-        confidence = 0.9
-    elif 'trevi' in text or 'fontana' in text:
-        attraction = 'Fontana di Trevi'
-        confidence = 0.9
-    elif 'pantheon' in text:
-        attraction = 'Pantheon'
-        confidence = 0.9
-    elif 'navona' in text:
-        attraction = 'Piazza Navona'
-        confidence = 0.9
+# Italian cities - CHECK CONTEXT FIRST for better accuracy; the first
+# matching rule wins, as in the if/elif chain these tables replace
+CITY_RULES = [
+    ('Firenze', (('firenze',), ('florence',))),
+    ('Roma', (('roma',), ('rome',))),
+    ('Milano', (('milano',), ('milan',))),
+    ('Napoli', (('napoli',), ('naples',))),
+    ('Genova', (('genova',), ('genoa',))),
+]
+
+# (attraction, confidence) -> alternatives, each a tuple of terms that must all appear
+ATTRACTION_RULES = [
+    (('Colosseo', 0.9), (('colosseo',), ('colosseum',))),
+    (('Fontana di Trevi', 0.9), (('trevi',), ('fontana',))),
+    (('Pantheon', 0.9), (('pantheon',),)),
+    (('Piazza Navona', 0.9), (('navona',),)),
     # Florence attractions
-    elif 'signoria' in text:
-        attraction = 'Piazza della Signoria'
-        confidence = 0.9
-    elif 'uffizi' in text:
-        attraction = 'Galleria degli Uffizi'
-        confidence = 0.9
-    elif 'ponte vecchio' in text or 'pontevecchio' in text:
-        attraction = 'Ponte Vecchio'
-        confidence = 0.9
-    elif 'duomo' in text and 'firenze' in text:
-        attraction = 'Duomo di Firenze'
-        confidence = 0.9
-    elif 'palazzo pitti' in text or 'palazzopitti' in text:
-        attraction = 'Palazzo Pitti'
-        confidence = 0.9
+    (('Piazza della Signoria', 0.9), (('signoria',),)),
+    (('Galleria degli Uffizi', 0.9), (('uffizi',),)),
+    (('Ponte Vecchio', 0.9), (('ponte vecchio',), ('pontevecchio',))),
+    (('Duomo di Firenze', 0.9), (('duomo', 'firenze'),)),
+    (('Palazzo Pitti', 0.9), (('palazzo pitti',), ('palazzopitti',))),
     # Milan attractions
-    elif 'duomo' in text and 'milano' in text:
-        attraction = 'Duomo di Milano'
-        confidence = 0.9
-    elif 'castello' in text or 'sforzesco' in text:
-        attraction = 'Castello Sforzesco'
-        confidence = 0.9
-    elif 'galleria' in text:
-        attraction = 'Galleria Vittorio Emanuele II'
-        confidence = 0.9
-    elif 'navigli' in text:
-        attraction = 'Navigli'
-        confidence = 0.9
+    (('Duomo di Milano', 0.9), (('duomo', 'milano'),)),
+    (('Castello Sforzesco', 0.9), (('castello',), ('sforzesco',))),
+    (('Galleria Vittorio Emanuele II', 0.9), (('galleria',),)),
+    (('Navigli', 0.9), (('navigli',),)),
     # Naples attractions
-    elif 'spaccanapoli' in text:
-        attraction = 'Spaccanapoli'
-        confidence = 0.9
-    elif 'castel' in text and 'ovo' in text:
-        attraction = 'Castel dell\'Ovo'
-        confidence = 0.9
-    elif 'plebiscito' in text:
-        attraction = 'Piazza del Plebiscito'
-        confidence = 0.9
-    elif 'spagnoli' in text:
-        attraction = 'Quartieri Spagnoli'
-        confidence = 0.9
-    elif 'acquario' in text:
-        attraction = 'Acquario di Genova'
-        confidence = 0.9
-    elif 'palazzo rosso' in text:
-        attraction = 'Palazzo Rosso'
-        confidence = 0.9
-    elif 'palazzo bianco' in text:
-        attraction = 'Palazzo Bianco'
-        confidence = 0.9
-    elif 'lanterna' in text:
-        attraction = 'Lanterna di Genova'
-        confidence = 0.9
-    elif 'via del campo' in text:
-        attraction = 'Via del Campo'
-        confidence = 0.8
-    elif city == 'Genova':
-        attraction = 'Centro Storico di Genova'
-        confidence = 0.7
-
-    return city, attraction, confidence
+    (('Spaccanapoli', 0.9), (('spaccanapoli',),)),
+    (('Castel dell\'Ovo', 0.9), (('castel', 'ovo'),)),
+    (('Piazza del Plebiscito', 0.9), (('plebiscito',),)),
+    (('Quartieri Spagnoli', 0.9), (('spagnoli',),)),
+    # Genoa attractions
+    (('Acquario di Genova', 0.9), (('acquario',),)),
+    (('Palazzo Rosso', 0.9), (('palazzo rosso',),)),
+    (('Palazzo Bianco', 0.9), (('palazzo bianco',),)),
+    (('Lanterna di Genova', 0.9), (('lanterna',),)),
+    (('Via del Campo', 0.8), (('via del campo',),)),
+]
+
+# Cities and attractions in one multi-pattern matcher: one scan per title
+SIMPLE_RULES = KeywordRules(CITY_RULES, ATTRACTION_RULES)
+
+
+def _fallback_attraction(city):
+    if city == 'Genova':
+        return 'Centro Storico di Genova', 0.7
+    return 'Generic', 0.5
+
+
+def classify_attraction_candidates(title, context=""):
+    """Every matching (city, attraction, confidence), best first"""
+    cities, attractions = SIMPLE_RULES.matches(f"{title} {context}".lower())
+    city = cities[0] if cities else 'Italia'
+    return [(city,) + match for match in attractions] + [(city,) + _fallback_attraction(city)]
+
+
+def classify_attraction_simple(title, context=""):
+    """Simple attraction classification"""
+    city, match = SIMPLE_RULES.first(f"{title} {context}".lower(), 'Italia')
+    return (city,) + (match or _fallback_attraction(city))
 
 
 def get_image_for_attraction(attraction):
@@ -6,16 +6,33 @@ import os
 import json
 import logging
 import time
+import threading
 from typing import List, Dict, Optional, Tuple
 from dotenv import load_dotenv
+from request_deadline import current_deadline, stage_timeout, apply_statement_timeout
+from entity_resolution import lookup_place_ids, normalize_name
 import psycopg2
 from functools import lru_cache
 from datetime import datetime, timedelta
 import chromadb
 
+try:
+    import tiktoken
+    _TOKEN_ENCODER = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _TOKEN_ENCODER = None  # fall back to the ~4 chars/token estimate
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# How ChromaDB < 0.4 rejects a compound where filter; any other error is transient
+_UNSUPPORTED_WHERE_ERRORS = ('exactly one operator', 'unsupported operator', 'invalid where', 'invalid operator')
+
+
+def _where_unsupported(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, (ValueError, TypeError)) and any(m in message for m in _UNSUPPORTED_WHERE_ERRORS)
+
 
 class OptimizedRAGHelper:
     """Enhanced RAG helper with caching, performance optimization, and semantic search"""
@@ -29,12 +46,14 @@ class OptimizedRAGHelper:
             'cache_hits': 0,
             'db_queries': 0,
             'avg_response_time': 0,
-            'semantic_queries': 0
+            'semantic_queries': 0,
+            'semantic_round_trips': 0
         }
 
         # Initialize ChromaDB for semantic search
         self._chroma_client = None
         self._chroma_collection = None
+        self._compound_where_supported = True  # $and filters (ChromaDB >= 0.4)
         self._init_chromadb()
 
     def _is_cache_valid(self, cache_key: str) -> bool:
@@ -61,6 +80,68 @@ class OptimizedRAGHelper:
             self._chroma_client = None
             self._chroma_collection = None
 
+    def _build_where_filter(
+        self,
+        city: Optional[str] = None,
+        categories: Optional[List[str]] = None,
+        compound: bool = True
+    ) -> Optional[Dict]:
+        """
+        Build a ChromaDB metadata filter for city/category constraints
+
+        Args:
+            city: Filter by city (optional)
+            categories: Filter by categories (optional)
+            compound: Combine both constraints with $and (backend permitting)
+
+        Returns:
+            Where filter dict, or None when no constraint applies
+        """
+        conditions = []
+        if city:
+            conditions.append({"city": {"$eq": city.lower()}})
+        if categories and (compound or not city):
+            conditions.append({"category": {"$in": list(categories)}})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def _get_candidate_ids(self, city: str, categories: List[str]) -> List[str]:
+        """
+        Pre-filter ids for a city+category query when $and is unavailable
+
+        Fetches metadata only (no embeddings) for the city and keeps the ids
+        whose category matches, so the vector query runs on an exact subset.
+        """
+        self._performance_metrics['semantic_round_trips'] += 1
+        candidates = self._chroma_collection.get(
+            where={"city": {"$eq": city.lower()}},
+            include=["metadatas"]
+        )
+        return [
+            doc_id for doc_id, metadata in zip(candidates.get('ids') or [], candidates.get('metadatas') or [])
+            if metadata and metadata.get('category') in categories
+        ]
+
+    def _semantic_result_to_place(self, metadata: Dict, document: str, distance: float) -> Dict:
+        """Convert a single ChromaDB hit into the place dict used by callers"""
+        # Calculate relevance score (1 - distance, normalized)
+        relevance_score = max(0, 1 - distance)
+
+        return {
+            'name': metadata.get('place_name', metadata.get('name', 'Unknown')),
+            'city': metadata.get('city', 'Unknown'),
+            'category': metadata.get('category', 'Unknown'),
+            'description': document,
+            'relevance_score': round(relevance_score, 3),
+            'semantic_match': True,
+            'distance': distance,
+            **{k: v for k, v in metadata.items() if k not in ['name', 'city', 'category']}
+        }
+
     def semantic_search_places(
         self,
         query: str,
@@ -71,6 +152,12 @@ class OptimizedRAGHelper:
         """
         Semantic search for places using ChromaDB
 
+        City+category constraints are pushed down as a single $and filter.
+        If the backend rejects compound filters, the query runs on a
+        pre-filtered id subset instead, and as a last resort the fetch is
+        widened geometrically (post-filtering by category) until n_results
+        are found or the candidate set is exhausted.
+
         Args:
             query: Natural language query (e.g., "romantic restaurants with view")
             city: Filter by city (optional)
@@ -84,59 +171,88 @@ class OptimizedRAGHelper:
             logger.warning("🚫 ChromaDB not available for semantic search")
             return []
 
+        # Request deadline nearly spent: callers fall back to the PostgreSQL results
+        if stage_timeout('vector_search', 5) is None:
+            return []
+
         try:
             self._performance_metrics['semantic_queries'] += 1
             start_time = time.time()
 
-            # Prepare where filter - ChromaDB only supports one operator at a time
-            where_filter = None
-            if city and categories:
-                # Priority: filter by city first, then post-filter by categories
-                where_filter = {"city": {"$eq": city.lower()}}
-            elif city:
-                where_filter = {"city": {"$eq": city.lower()}}
-            elif categories:
-                where_filter = {"category": {"$in": categories}}
-
-            # Perform semantic search
-            results = self._chroma_collection.query(
-                query_texts=[query],
-                n_results=n_results * 2,  # Get extra to allow for category filtering
-                where=where_filter,
-                include=["documents", "metadatas", "distances"]
-            )
+            needs_compound = bool(city and categories)
+            where_filter = self._build_where_filter(
+                city, categories, compound=self._compound_where_supported)
+            query_ids = None
+            post_filter = needs_compound and not self._compound_where_supported
+
+            if post_filter:
+                try:
+                    query_ids = self._get_candidate_ids(city, categories)
+                    if not query_ids:
+                        return []
+                    post_filter = False
+                except Exception as e:
+                    logger.debug(f"Id pre-filter unavailable, post-filtering: {e}")
+
+            # With an exact filter one round-trip is enough; when post-filtering
+            # start at 2x and widen until satisfied or exhausted.
+            fetch_size = n_results * 2 if post_filter else n_results
+            if query_ids is not None:
+                fetch_size = min(fetch_size, len(query_ids))
+            collection_size = None
 
-            # Process results
             places = []
-            if results['documents'] and results['documents'][0]:
-                for i in range(len(results['documents'][0])):
+            while True:
+                self._performance_metrics['semantic_round_trips'] += 1
+                query_kwargs = {
+                    'query_texts': [query],
+                    'n_results': fetch_size,
+                    'where': where_filter,
+                    'include': ["documents", "metadatas", "distances"]
+                }
+                if query_ids is not None:
+                    query_kwargs['ids'] = query_ids
+
+                try:
+                    results = self._chroma_collection.query(**query_kwargs)
+                except Exception as e:
+                    if needs_compound and self._compound_where_supported and _where_unsupported(e):
+                        # Backend rejected $and: remember it and retry the slow path
+                        logger.warning(
+                            f"⚠️ Compound where filter unsupported, falling back: {e}")
+                        self._compound_where_supported = False
+                        return self.semantic_search_places(query, city, categories, n_results)
+                    raise
+
+                places = []
+                documents = results['documents'][0] if results['documents'] else []
+                for i in range(len(documents)):
                     metadata = results['metadatas'][0][i]
-                    distance = results['distances'][0][i]
-                    document = results['documents'][0][i]
 
                     # Post-filter by categories if needed
-                    if categories and metadata.get('category') not in categories:
+                    if post_filter and metadata.get('category') not in categories:
                         continue
 
-                    # Calculate relevance score (1 - distance, normalized)
-                    relevance_score = max(0, 1 - distance)
-
-                    place = {
-                        'name': metadata.get('place_name', metadata.get('name', 'Unknown')),
-                        'city': metadata.get('city', 'Unknown'),
-                        'category': metadata.get('category', 'Unknown'),
-                        'description': document,
-                        'relevance_score': round(relevance_score, 3),
-                        'semantic_match': True,
-                        'distance': distance,
-                        **{k: v for k, v in metadata.items() if k not in ['name', 'city', 'category']}
-                    }
-                    places.append(place)
+                    places.append(self._semantic_result_to_place(
+                        metadata, documents[i], results['distances'][0][i]))
 
                     # Stop when we have enough results
                     if len(places) >= n_results:
                         break
 
+                if not post_filter or len(places) >= n_results or len(documents) < fetch_size:
+                    break
+
+                deadline = current_deadline()
+                if deadline and deadline.expired:
+                    break
+
+                if collection_size is None:
+                    collection_size = self._chroma_collection.count()
+                if fetch_size >= collection_size:
+                    break
+                fetch_size = min(fetch_size * 2, collection_size)
+
             query_time = time.time() - start_time
             logger.info(
                 f"🔍 Semantic search '{query}' found {len(places)} results in {query_time:.3f}s")
@@ -202,7 +318,7 @@ class OptimizedRAGHelper:
             place['search_source'] = 'semantic'
 
         # 3. Combine and deduplicate results
-        combined_places = self._merge_search_results(results, semantic_places)
+        combined_places = self._merge_search_results(results, semantic_places, city)
 
         # 4. Final ranking considering both quality and semantic relevance
         final_results = self._rank_hybrid_results(
@@ -213,37 +329,66 @@ class OptimizedRAGHelper:
 
         return final_results[:n_results]
 
-    def _merge_search_results(self, traditional: List[Dict], semantic: List[Dict]) -> List[Dict]:
+    def _merge_search_results(self, traditional: List[Dict], semantic: List[Dict],
+                              city: Optional[str] = None) -> List[Dict]:
         """
         Merge traditional and semantic search results, removing duplicates
 
+        Places are identified by their canonical place_id (place_entities),
+        so the same monument under two names or from two sources is kept
+        once; places without one fall back to their normalized name
+
         Args:
             traditional: Results from category-based search
             semantic: Results from semantic search
+            city: City searched, to resolve OSM and legacy cache keys
 
         Returns:
             Merged list with duplicates removed
         """
-        # Create lookup for traditional results by name (case-insensitive)
-        traditional_names = {
-            place.get('name', '').lower(): place for place in traditional}
-        merged = traditional.copy()
-
-        # Add semantic results that don't duplicate traditional ones
-        for semantic_place in semantic:
-            name_key = semantic_place.get('name', '').lower()
-
-            if name_key not in traditional_names:
-                merged.append(semantic_place)
-            else:
+        places = traditional + semantic
+        place_ids = self._lookup_place_ids(places, city)
+        by_place, by_name = {}, {}
+        merged = []
+
+        for i, (place, place_id) in enumerate(zip(places, place_ids)):
+            name_key = normalize_name(place.get('name', ''))
+            kept = by_place.get(place_id) if place_id else None
+            if kept is None and name_key in by_name:
+                # Same name is the same place unless both resolved to different ids
+                candidate = by_name[name_key]
+                if place_id is None or candidate.get('place_id') is None:
+                    kept = candidate
+
+            if kept is None:
+                if place_id:
+                    place['place_id'] = place_id
+                    by_place[place_id] = place
+                by_name.setdefault(name_key, place)
+                merged.append(place)
+            elif i >= len(traditional) and kept.get('search_source') != 'semantic':
                 # Enhance traditional place with semantic data
-                traditional_place = traditional_names[name_key]
-                traditional_place['relevance_score'] = semantic_place.get(
-                    'relevance_score', 0)
-                traditional_place['semantic_enhanced'] = True
+                kept['relevance_score'] = place.get('relevance_score', 0)
+                kept['semantic_enhanced'] = True
 
         return merged
 
+    def _lookup_place_ids(self, places: List[Dict], city: Optional[str]) -> List[Optional[str]]:
+        """Canonical place_id of every place (None when unresolved or the database is unavailable)"""
+        if not places or not self.database_url:
+            return [None] * len(places)
+        try:
+            conn = psycopg2.connect(self.database_url)
+            try:
+                cur = conn.cursor()
+                apply_statement_timeout(cur)
+                return lookup_place_ids(cur, places, city)
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.debug(f"Place id lookup unavailable: {e}")
+            return [None] * len(places)
+
     def _rank_hybrid_results(self, places: List[Dict], semantic_weight: float) -> List[Dict]:
         """
         Rank hybrid search results considering both quality and semantic relevance
@@ -487,6 +632,7 @@ class OptimizedRAGHelper:
         try:
             conn = psycopg2.connect(self.database_url)
             cur = conn.cursor()
+            apply_statement_timeout(cur)
             self._performance_metrics['db_queries'] += 1
 
             city_lower = city.lower()
@@ -1031,36 +1177,353 @@ class OptimizedRAGHelper:
         }
 
 
+class PromptContextBuilder:
+    """
+    Token-budgeted prompt context for city RAG
+
+    Renders per-city, per-category prompt fragments once and keeps them until
+    place_cache changes for that city (detected through a cheap COUNT/xmin
+    signature, re-checked at most every `signature_check_interval` seconds).
+    Prompts are assembled under an explicit token budget, keeping the places
+    with the highest _calculate_quality_score first.
+    """
+
+    FOOTER = "⚠️ CRITICAL: Only suggest places from this list or verify they exist in this city!"
+    HOTEL_FOOTER = "⚠️ CRITICAL: Only suggest these hotels - they have verified reviews!"
+
+    def __init__(self, rag: OptimizedRAGHelper, signature_check_interval: int = 60, hotel_ttl: int = 3600):
+        self.rag = rag
+        self.signature_check_interval = signature_check_interval
+        self.hotel_ttl = hotel_ttl
+        self._fragments = {}  # (city, category) -> fragment dict
+        self._signatures = {}  # city -> {'signature': ..., 'checked_at': ...}
+        self._hotel_fragments = {}  # (city, min_score, limit) -> fragment dict
+        self._lock = threading.Lock()
+        self._metrics = {
+            'prompts_built': 0,
+            'total_prompt_tokens': 0,
+            'max_prompt_tokens': 0,
+            'trimmed_prompts': 0,
+            'fragment_hits': 0,
+            'fragment_misses': 0,
+            'invalidations': 0
+        }
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Count tokens with tiktoken when installed, else ~4 characters per token"""
+        if _TOKEN_ENCODER is not None:
+            return len(_TOKEN_ENCODER.encode(text))
+        return max(1, (len(text) + 3) // 4) if text else 0
+
+    def _place_cache_signature(self, city_lower: str) -> Optional[Tuple]:
+        """Row count and max xmin of the city's place_cache rows (changes on any write)"""
+        try:
+            conn = psycopg2.connect(self.rag.database_url)
+            cur = conn.cursor()
+            cur.execute(
+                """SELECT COUNT(*), COALESCE(MAX(xmin::text::bigint), 0)
+                   FROM place_cache WHERE cache_key LIKE %s OR cache_key LIKE %s""",
+                (f"{city_lower}\\_%", f"osm:{city_lower}:%")
+            )
+            signature = cur.fetchone()
+            cur.close()
+            conn.close()
+            return tuple(signature) if signature else None
+        except Exception as e:
+            logger.debug(f"place_cache signature unavailable for {city_lower}: {e}")
+            return None
+
+    def _refresh_if_stale(self, city_lower: str):
+        """Drop cached fragments for a city whose place_cache rows changed"""
+        now = time.time()
+        state = self._signatures.get(city_lower)
+        if state and now - state['checked_at'] < self.signature_check_interval:
+            return
+
+        signature = self._place_cache_signature(city_lower)
+        if state and signature is not None and signature != state['signature']:
+            logger.info(f"🔄 place_cache changed for {city_lower}, rebuilding prompt fragments")
+            self.invalidate(city_lower)
+        self._signatures[city_lower] = {'signature': signature, 'checked_at': now}
+
+    def invalidate(self, city: Optional[str] = None):
+        """Forget fragments (and the RAG helper's cached context) for one city or all"""
+        with self._lock:
+            self._metrics['invalidations'] += 1
+            if city is None:
+                self._fragments.clear()
+                self._hotel_fragments.clear()
+                self._signatures.clear()
+                self.rag.clear_cache()
+                return
+
+            city_lower = city.lower()
+            for key in [k for k in self._fragments if k[0] == city_lower]:
+                del self._fragments[key]
+            for key in [k for k in self._hotel_fragments if k[0] == city_lower]:
+                del self._hotel_fragments[key]
+            self._signatures.pop(city_lower, None)
+            for key in [k for k in self.rag._cache if k.startswith(f"{city_lower}_")]:
+                del self.rag._cache[key]
+
+    def _render_category(self, category: str, data: Dict, source: str) -> Dict:
+        """Render one category into a header plus scored place lines"""
+        cat_source = data.get('source', source)
+        source_tag = f" [{cat_source}]" if source == 'mixed' else ""
+
+        lines = []
+        for place in data.get('places', []):
+            name = place.get('name', place.get('title', 'Unknown'))
+
+            # Add extra context for OSM data
+            if cat_source == 'osm':
+                vicinity = place.get('vicinity', '')
+                types = place.get('types', [])
+                if vicinity:
+                    name += f" ({vicinity})"
+                elif types:
+                    name += f" [{', '.join(types[:2])}]"
+
+            lines.append({
+                'text': name,
+                'score': self.rag._calculate_quality_score(place),
+                'tokens': self.estimate_tokens(f"  10. {name}")
+            })
+
+        header = f"**{category.upper()}**{source_tag} ({data.get('count', 0)} total):"
+        return {
+            'header': header,
+            'header_tokens': self.estimate_tokens(header) + 1,  # trailing blank line
+            'lines': sorted(lines, key=lambda line: line['score'], reverse=True)
+        }
+
+    def get_fragments(self, city: str, categories: Optional[List[str]] = None) -> Tuple[Dict, Dict]:
+        """
+        Get rendered category fragments for a city, building them on first use
+
+        Returns:
+            (fragments by category, city context summary without place lists)
+        """
+        if categories is None:
+            categories = ['restaurant', 'tourist_attraction', 'hotel', 'cafe', 'museum']
+
+        city_lower = city.lower()
+        self._refresh_if_stale(city_lower)
+
+        missing = [c for c in categories if (city_lower, c) not in self._fragments]
+        if missing:
+            self._metrics['fragment_misses'] += len(missing)
+            city_context = self.rag.get_city_context(city, missing)
+            source = city_context.get('source', 'unknown')
+            built = {}
+            for category in missing:
+                data = city_context.get('categories', {}).get(category)
+                built[(city_lower, category)] = {
+                    'category': self._render_category(category, data, source) if data and data.get('count', 0) > 0 else None,
+                    'count': data.get('count', 0) if data else 0,
+                    'source': source
+                }
+            # Failed lookups are not cached so the next call retries
+            if 'error' not in city_context:
+                with self._lock:
+                    self._fragments.update(built)
+        else:
+            built = {}
+        self._metrics['fragment_hits'] += len(categories) - len(missing)
+
+        empty = {'category': None, 'count': 0, 'source': 'unknown'}
+        fragments = {
+            c: built.get((city_lower, c)) or self._fragments.get((city_lower, c), empty)
+            for c in categories
+        }
+        sources = {f['source'] for f in fragments.values() if f['count'] > 0}
+        summary = {
+            'city': city,
+            'total_places': sum(f['count'] for f in fragments.values()),
+            'source': sources.pop() if len(sources) == 1 else ('mixed' if sources else 'unknown')
+        }
+        return fragments, summary
+
+    def _record_prompt(self, prompt: str, trimmed: bool) -> int:
+        tokens = self.estimate_tokens(prompt)
+        self._metrics['prompts_built'] += 1
+        self._metrics['total_prompt_tokens'] += tokens
+        self._metrics['max_prompt_tokens'] = max(self._metrics['max_prompt_tokens'], tokens)
+        if trimmed:
+            self._metrics['trimmed_prompts'] += 1
+        return tokens
+
+    def build_city_prompt(
+        self,
+        city: str,
+        categories: Optional[List[str]] = None,
+        max_tokens: int = 600,
+        max_places_per_category: int = 5
+    ) -> str:
+        """
+        Assemble the city context prompt under a token budget
+
+        Args:
+            city: City name
+            categories: Categories to include (default: all available)
+            max_tokens: Budget for the whole fragment, header and footer included
+            max_places_per_category: Upper bound of places listed per category
+
+        Returns:
+            Formatted string for AI prompt injection
+        """
+        fragments, summary = self.get_fragments(city, categories)
+
+        if summary['total_places'] == 0:
+            prompt = f"⚠️ No cached data available for {city}."
+            self._record_prompt(prompt, False)
+            return prompt
+
+        source_indicator = {
+            'legacy': '📊 [Legacy Data]',
+            'osm': '🗺️ [OpenStreetMap Data]',
+            'mixed': '🔀 [Mixed Sources]'
+        }.get(summary['source'], '❓ [Unknown Source]')
+        title = f"📍 REAL DATA for {city} ({summary['total_places']} places in database) {source_indicator}:"
+        budget = max_tokens - self.estimate_tokens(title) - self.estimate_tokens(self.FOOTER) - 2
+
+        # Global priority queue over every category's best places
+        candidates = []
+        for category, fragment in fragments.items():
+            rendered = fragment['category']
+            if not rendered:
+                continue
+            for line in rendered['lines'][:max_places_per_category]:
+                candidates.append((line['score'], category, line))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+
+        selected = {}
+        trimmed = False
+        for _, category, line in candidates:
+            cost = line['tokens']
+            if category not in selected:
+                cost += fragments[category]['category']['header_tokens']
+            if cost > budget:
+                trimmed = True
+                continue
+            budget -= cost
+            selected.setdefault(category, []).append(line)
+
+        lines = [title, ""]
+        for category, fragment in fragments.items():
+            if category not in selected:
+                continue
+            lines.append(fragment['category']['header'])
+            for i, line in enumerate(selected[category], 1):
+                lines.append(f"  {i}. {line['text']}")
+            lines.append("")
+        lines.append(self.FOOTER)
+
+        prompt = "\n".join(lines)
+        tokens = self._record_prompt(prompt, trimmed)
+        logger.debug(f"🧾 City prompt for {city}: {tokens} tokens (budget {max_tokens})")
+        return prompt
+
+    def build_hotel_prompt(self, city: str, min_score: float = 8.0, limit: int = 5, max_tokens: int = 300) -> str:
+        """Assemble the hotel context prompt under a token budget (best-rated hotels first)"""
+        key = (city.lower(), min_score, limit)
+        fragment = self._hotel_fragments.get(key)
+        if not fragment or time.time() - fragment['built_at'] > self.hotel_ttl:
+            self._metrics['fragment_misses'] += 1
+            hotel_context = self.rag.get_hotel_context(city, min_score, limit)
+            blocks = []
+            for hotel in hotel_context.get('hotels', []):
+                block = [
+                    f"**{hotel['name']}** ({hotel['score']}/10)",
+                    f"   📍 {hotel['address']}",
+                    f"   ⭐ {hotel['review_count']} reviews"
+                ]
+                if hotel.get('highlights'):
+                    block.append(f"   💬 \"{hotel['highlights'][:150]}...\"")
+                if hotel.get('tags'):
+                    block.append(f"   🏷️ {', '.join(hotel['tags'][:5])}")
+                text = "\n".join(block)
+                blocks.append({'text': text, 'tokens': self.estimate_tokens(text) + 2})
+            fragment = {'blocks': blocks, 'built_at': time.time()}
+            # Failed lookups are not cached so the next call retries
+            if 'error' not in hotel_context:
+                self._hotel_fragments[key] = fragment
+        else:
+            self._metrics['fragment_hits'] += 1
+
+        if not fragment['blocks']:
+            prompt = f"⚠️ No hotel data available for {city}."
+            self._record_prompt(prompt, False)
+            return prompt
+
+        title = f"🏨 REAL HOTELS for {city} (with verified reviews):"
+        budget = max_tokens - self.estimate_tokens(title) - self.estimate_tokens(self.HOTEL_FOOTER) - 2
+
+        lines = [title, ""]
+        trimmed = False
+        for i, block in enumerate(fragment['blocks'], 1):
+            if block['tokens'] > budget:
+                trimmed = True
+                break
+            budget -= block['tokens']
+            lines.append(f"{i}. {block['text']}")
+            lines.append("")
+        lines.append(self.HOTEL_FOOTER)
+
+        prompt = "\n".join(lines)
+        self._record_prompt(prompt, trimmed)
+        return prompt
+
+    def get_metrics(self) -> Dict:
+        """Prompt size and fragment cache statistics"""
+        built = self._metrics['prompts_built']
+        lookups = self._metrics['fragment_hits'] + self._metrics['fragment_misses']
+        return {
+            **self._metrics,
+            'avg_prompt_tokens': round(self._metrics['total_prompt_tokens'] / built, 1) if built else 0,
+            'fragment_hit_rate': (self._metrics['fragment_hits'] / lookups * 100) if lookups else 0,
+            'cached_fragments': len(self._fragments) + len(self._hotel_fragments)
+        }
+
+
 # Create alias for backward compatibility
 SimpleRAGHelper = OptimizedRAGHelper
 
 
 # Global instance for easy import
 rag_helper = OptimizedRAGHelper()
+context_builder = PromptContextBuilder(rag_helper)
+
+# Default prompt budgets (tokens), overridable per deployment
+CITY_CONTEXT_MAX_TOKENS = int(os.getenv('RAG_CITY_CONTEXT_MAX_TOKENS', '600'))
+HOTEL_CONTEXT_MAX_TOKENS = int(os.getenv('RAG_HOTEL_CONTEXT_MAX_TOKENS', '300'))
 
 
-def get_city_context_prompt(city: str, categories: Optional[List[str]] = None) -> str:
+def get_city_context_prompt(city: str, categories: Optional[List[str]] = None, max_tokens: Optional[int] = None) -> str:
     """
     Convenience function to get formatted context for AI prompts
+    Uses cached fragments and trims to max_tokens (default CITY_CONTEXT_MAX_TOKENS)
 
     Usage:
         context = get_city_context_prompt("Bergamo", ["restaurant", "tourist_attraction"])
         prompt = f"{context}\n\nNow generate a Plan B for..."
     """
-    city_context = rag_helper.get_city_context(city, categories)
-    return rag_helper.format_context_for_prompt(city_context)
+    return context_builder.build_city_prompt(
+        city, categories, max_tokens=max_tokens or CITY_CONTEXT_MAX_TOKENS)
 
 
-def get_hotel_context_prompt(city: str, min_score: float = 8.0, limit: int = 5) -> str:
+def get_hotel_context_prompt(city: str, min_score: float = 8.0, limit: int = 5, max_tokens: Optional[int] = None) -> str:
     """
     PATH C: Get formatted hotel context with rich reviews
+    Uses cached fragments and trims to max_tokens (default HOTEL_CONTEXT_MAX_TOKENS)
 
     Usage:
         hotel_context = get_hotel_context_prompt("Milan", min_score=8.5, limit=3)
         prompt = f"{hotel_context}\n\nSuggest hotels near..."
     """
-    hotel_context = rag_helper.get_hotel_context(city, min_score, limit)
-    return rag_helper.format_hotel_context_for_prompt(hotel_context)
+    return context_builder.build_hotel_prompt(
+        city, min_score, limit, max_tokens=max_tokens or HOTEL_CONTEXT_MAX_TOKENS)
 
 
 # New semantic search convenience functions
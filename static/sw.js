@@ -4,9 +4,13 @@
  * Enables PWA features, caching, and offline functionality
  */
 
-const CACHE_NAME = 'viamigo-travel-v1.0';
-const STATIC_CACHE_NAME = 'viamigo-static-v1.0';
-const DATA_CACHE_NAME = 'viamigo-data-v1.0';
+const CACHE_NAME = 'viamigo-travel-v1.1';
+const STATIC_CACHE_NAME = 'viamigo-static-v1.1';
+const DATA_CACHE_NAME = 'viamigo-data-v1.1';
+
+// Offline city bundles (city_bundles.py): prefetched once, then synced by delta
+const BUNDLE_DB_NAME = 'ViamigoCityBundles';
+const BUNDLE_DB_VERSION = 1;
 
 // Resources to cache for offline access
 const STATIC_RESOURCES = [
@@ -99,6 +103,11 @@ self.addEventListener('fetch', (event) => {
         return;
     }
     
+    // City bundles go to IndexedDB, not to the response cache
+    if (url.pathname.startsWith('/api/offline/bundle/')) {
+        return;
+    }
+    
     // API requests - cache with network first strategy
     if (url.pathname.startsWith('/api/')) {
         event.respondWith(handleApiRequest(request));
@@ -154,6 +163,12 @@ async function handleApiRequest(request) {
             });
         }
         
+        // Serve from a prefetched city bundle when there is one
+        const bundled = await createBundleFallback(url);
+        if (bundled) {
+            return bundled;
+        }
+        
         // Return offline fallback for specific APIs
         return createOfflineFallback(url.pathname);
     }
@@ -302,6 +317,17 @@ self.addEventListener('sync', (event) => {
     if (event.tag === 'sync-preferences') {
         event.waitUntil(syncOfflinePreferences());
     }
+    
+    if (event.tag === 'sync-city-bundles') {
+        event.waitUntil(syncCityBundles());
+    }
+});
+
+// Periodic refresh of prefetched cities (where the browser supports it)
+self.addEventListener('periodicsync', (event) => {
+    if (event.tag === 'sync-city-bundles') {
+        event.waitUntil(syncCityBundles());
+    }
 });
 
 // Sync offline itineraries when back online
@@ -380,6 +406,148 @@ function saveToIndexedDB(storeName, data) {
     });
 }
 
+// City bundle helpers
+function openBundleDB() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(BUNDLE_DB_NAME, BUNDLE_DB_VERSION);
+        request.onupgradeneeded = () => {
+            const db = request.result;
+            if (!db.objectStoreNames.contains('cities')) {
+                db.createObjectStore('cities', { keyPath: 'key' });
+            }
+        };
+        request.onerror = () => reject(request.error);
+        request.onsuccess = () => resolve(request.result);
+    });
+}
+
+function cityKey(city) {
+    return (city || '').trim().toLowerCase();
+}
+
+async function bundleTransaction(mode, action) {
+    const db = await openBundleDB();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(['cities'], mode);
+        const request = action(transaction.objectStore('cities'));
+        request.onerror = () => reject(request.error);
+        request.onsuccess = () => resolve(request.result);
+    });
+}
+
+function getCityBundle(city) {
+    return bundleTransaction('readonly', store => store.get(cityKey(city)));
+}
+
+function getAllCityBundles() {
+    return bundleTransaction('readonly', store => store.getAll());
+}
+
+function putCityBundle(bundle) {
+    return bundleTransaction('readwrite', store => store.put(bundle));
+}
+
+// Download a whole city once (gzip on the wire, records keyed by id in IndexedDB)
+async function prefetchCity(city) {
+    const existing = await getCityBundle(city);
+    if (existing) {
+        return syncCity(existing);
+    }
+    
+    const response = await fetch(`/api/offline/bundle/${encodeURIComponent(city)}`);
+    if (!response.ok) {
+        throw new Error(`Bundle not available for ${city}: ${response.status}`);
+    }
+    const bundle = await response.json();
+    const records = {};
+    bundle.records.forEach(record => { records[record.id] = record; });
+    
+    await putCityBundle({
+        key: cityKey(city),
+        city: bundle.city,
+        version: bundle.version,
+        built_at: bundle.built_at,
+        synced_at: Date.now(),
+        records
+    });
+    console.log(`📦 ${bundle.city} v${bundle.version} saved offline (${bundle.records.length} records)`);
+    return { city: bundle.city, version: bundle.version, changed: bundle.records.length, removed: 0 };
+}
+
+// Apply only what changed since the stored version
+async function syncCity(stored) {
+    const response = await fetch(
+        `/api/offline/bundle/${encodeURIComponent(stored.city)}/delta?since=${stored.version}`
+    );
+    if (!response.ok) {
+        throw new Error(`Delta not available for ${stored.city}: ${response.status}`);
+    }
+    const delta = await response.json();
+    const records = delta.full ? {} : stored.records;
+    delta.changed.forEach(record => { records[record.id] = record; });
+    delta.removed.forEach(id => { delete records[id]; });
+    
+    await putCityBundle({
+        ...stored,
+        version: delta.version,
+        built_at: delta.built_at,
+        synced_at: Date.now(),
+        records
+    });
+    if (delta.version !== stored.version) {
+        console.log(`🔄 ${stored.city} v${stored.version} → v${delta.version}: ` +
+                    `${delta.changed.length} changed, ${delta.removed.length} removed`);
+    }
+    return { city: stored.city, version: delta.version, changed: delta.changed.length, removed: delta.removed.length };
+}
+
+async function syncCityBundles() {
+    const bundles = await getAllCityBundles();
+    const results = await Promise.allSettled(bundles.map(syncCity));
+    results.filter(r => r.status === 'rejected')
+           .forEach(r => console.warn('⚠️ City bundle sync failed:', r.reason));
+    return results.filter(r => r.status === 'fulfilled').map(r => r.value);
+}
+
+// Answer city API calls from a prefetched bundle while offline
+async function createBundleFallback(url) {
+    if (!url.pathname.includes('/api/get_city_attractions')) {
+        return null;
+    }
+    
+    try {
+        const bundle = await getCityBundle(url.searchParams.get('city') || 'Milano');
+        if (!bundle) {
+            return null;
+        }
+        const attractions = Object.values(bundle.records)
+            .filter(record => record.kind === 'attraction')
+            .map(record => ({
+                title: record.data.name,
+                description: record.data.description || '',
+                category: record.data.category,
+                latitude: record.data.latitude,
+                longitude: record.data.longitude,
+                image_url: record.data.image_url,
+                source: 'offline_bundle'
+            }));
+        
+        return new Response(JSON.stringify({
+            success: true,
+            city: bundle.city,
+            attractions,
+            source: 'offline_bundle',
+            bundle_version: bundle.version,
+            offline: true
+        }), {
+            headers: { 'Content-Type': 'application/json', 'X-Served-From': 'bundle' }
+        });
+    } catch (error) {
+        console.error('❌ Bundle fallback failed:', error);
+        return null;
+    }
+}
+
 // Message handling for communication with main thread
 self.addEventListener('message', (event) => {
     const { type, data } = event.data;
@@ -397,6 +565,20 @@ self.addEventListener('message', (event) => {
             clearAllCaches();
             break;
             
+        case 'PREFETCH_CITY':
+            event.waitUntil(
+                prefetchCity(data.city)
+                    .then(result => event.ports[0]?.postMessage({ type: 'CITY_PREFETCHED', ...result }))
+                    .catch(error => event.ports[0]?.postMessage({ type: 'CITY_PREFETCH_FAILED', error: error.message }))
+            );
+            break;
+            
+        case 'SYNC_CITIES':
+            event.waitUntil(
+                syncCityBundles().then(results => event.ports[0]?.postMessage({ type: 'CITIES_SYNCED', results }))
+            );
+            break;
+            
         case 'GET_CACHE_SIZE':
             getCacheSize().then(size => {
                 event.ports[0].postMessage({ type: 'CACHE_SIZE', size });
@@ -407,6 +407,7 @@ class ViamigoUXEnhancements {
             try {
                 const registration = await navigator.serviceWorker.register('/sw.js');
                 console.log('✅ Service Worker registered successfully');
+                this.registerCityBundleSync(registration);
             } catch (error) {
                 console.log('❌ Service Worker registration failed:', error);
             }
@@ -449,6 +450,57 @@ class ViamigoUXEnhancements {
         window.addEventListener('online', updateOnlineStatus);
         window.addEventListener('offline', updateOnlineStatus);
         updateOnlineStatus();
+        
+        // Back online: pull only what changed in the prefetched cities
+        window.addEventListener('online', () => this.requestCityBundleSync());
+    }
+
+    // Save a whole city for offline use (first call downloads the bundle, later calls sync deltas)
+    prefetchCityBundle(destination) {
+        // "Corso Buenos Aires, Milano" -> "Milano"
+        const city = String(destination || '').split(',').pop().trim();
+        if (!city) {
+            return Promise.resolve(null);
+        }
+        return this.postToServiceWorker('PREFETCH_CITY', { city });
+    }
+
+    // Daily refresh of prefetched cities where Periodic Background Sync is granted
+    async registerCityBundleSync(registration) {
+        if (!('periodicSync' in registration)) {
+            return;
+        }
+        try {
+            const status = await navigator.permissions.query({ name: 'periodic-background-sync' });
+            if (status.state === 'granted') {
+                await registration.periodicSync.register('sync-city-bundles', { minInterval: 24 * 60 * 60 * 1000 });
+            }
+        } catch (error) {
+            console.log('Periodic sync not available:', error);
+        }
+    }
+
+    // One-off Background Sync (retried by the browser), or a direct message where unsupported
+    async requestCityBundleSync() {
+        if (!('serviceWorker' in navigator)) {
+            return;
+        }
+        const registration = await navigator.serviceWorker.ready;
+        if ('sync' in registration) {
+            return registration.sync.register('sync-city-bundles').catch(() => this.postToServiceWorker('SYNC_CITIES'));
+        }
+        return this.postToServiceWorker('SYNC_CITIES');
+    }
+
+    postToServiceWorker(type, data = {}) {
+        if (!('serviceWorker' in navigator) || !navigator.serviceWorker.controller) {
+            return Promise.resolve(null);
+        }
+        return new Promise((resolve) => {
+            const channel = new MessageChannel();
+            channel.port1.onmessage = (event) => resolve(event.data);
+            navigator.serviceWorker.controller.postMessage({ type, data }, [channel.port2]);
+        });
     }
 
     updateOfflineIndicator() {
@@ -67,6 +67,60 @@ class ViamigoAPI {
         }
     }
 
+    async planTripStream(departure, destination, onEvent) {
+        // NDJSON stream: itinerary skeleton first, then per-stop enrichments
+        const response = await fetch('/plan_ai_powered/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'application/x-ndjson'
+            },
+            body: JSON.stringify({
+                start: departure,
+                end: destination,
+                interests: this.getUserInterests()
+            })
+        });
+
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let sawSkeleton = false;
+
+        try {
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const event = JSON.parse(line);
+                    if (event.event === 'error') {
+                        throw new Error(event.error);
+                    }
+                    if (event.event === 'skeleton') {
+                        sawSkeleton = true;
+                    }
+                    onEvent(event);
+                }
+            }
+        } catch (error) {
+            // Once the skeleton is on screen a broken stream only loses enrichments
+            if (!sawSkeleton) throw error;
+            console.warn('Stream interrotto dopo lo scheletro:', error);
+        }
+
+        return sawSkeleton;
+    }
+
     getUserInterests() {
         const selected = document.querySelectorAll('.interest-tag.selected');
         return Array.from(selected).map(tag => tag.textContent.toLowerCase());
@@ -221,33 +275,34 @@ document.addEventListener('DOMContentLoaded', function() {
             planButton.disabled = true;
 
             try {
-                const tripData = await api.planTrip(departure, destination);
+                // Progressive rendering: stops appear as soon as the skeleton arrives
+                const requestStart = performance.now();
+                let streamed = false;
+                try {
+                    streamed = await api.planTripStream(departure, destination, (event) => {
+                        if (event.event === 'skeleton') {
+                            showItineraryPage(departure, destination);
+                            renderStreamingSkeleton(event.itinerary || []);
+                            console.log(`⚡ Prima tappa in ${Math.round(performance.now() - requestStart)} ms`);
+                        } else if (event.event === 'enrichment') {
+                            applyStopEnrichment(event.index, event.kind, event.data);
+                        }
+                    });
+                } catch (streamError) {
+                    console.warn('Streaming non disponibile, uso la pianificazione classica:', streamError);
+                }
 
-                if (tripData && tripData.recommendations) {
-                    // Switch to itinerary page and populate data
-                    const itineraryPage = document.getElementById('page-itinerary');
-                    const homePage = document.getElementById('page-home');
+                if (!streamed) {
+                    const tripData = await api.planTrip(departure, destination);
 
-                    homePage.classList.remove('active');
-                    itineraryPage.classList.add('active');
+                    if (tripData && tripData.recommendations) {
+                        showItineraryPage(departure, destination);
 
-                    // Update navigation
-                    document.querySelectorAll('.nav-button').forEach(btn => {
-                        btn.classList.remove('active', 'text-white');
-                        btn.classList.add('text-gray-500');
-                    });
-                    document.querySelector('[data-page="itinerary"]').classList.add('active', 'text-white');
-
-                    // Update header with trip info
-                    const headerText = itineraryPage.querySelector('.header h2');
-                    if (headerText) {
-                        headerText.textContent = `Da ${departure} a ${destination}`;
+                        // Generate itinerary based on recommendations
+                        generateItineraryFromRecommendations(tripData.recommendations);
+                    } else {
+                        alert('Non sono riuscito a creare un itinerario. Riprova con destinazioni diverse.');
                     }
-
-                    // Generate itinerary based on recommendations
-                    generateItineraryFromRecommendations(tripData.recommendations);
-                } else {
-                    alert('Non sono riuscito a creare un itinerario. Riprova con destinazioni diverse.');
                 }
             } catch (error) {
                 alert('Errore nella pianificazione del viaggio. Riprova tra un momento.');
@@ -314,6 +369,70 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+function showItineraryPage(departure, destination) {
+    // Switch to itinerary page and populate data
+    const itineraryPage = document.getElementById('page-itinerary');
+    const homePage = document.getElementById('page-home');
+
+    homePage.classList.remove('active');
+    itineraryPage.classList.add('active');
+
+    // Update navigation
+    document.querySelectorAll('.nav-button').forEach(btn => {
+        btn.classList.remove('active', 'text-white');
+        btn.classList.add('text-gray-500');
+    });
+    document.querySelector('[data-page="itinerary"]').classList.add('active', 'text-white');
+
+    // Update header with trip info
+    const headerText = itineraryPage.querySelector('.header h2');
+    if (headerText) {
+        headerText.textContent = `Da ${departure} a ${destination}`;
+    }
+}
+
+// --- STREAMING ITINERARY ---
+
+let streamingItinerary = [];
+
+function renderStreamingSkeleton(stops) {
+    const timelineContainer = document.querySelector('#itinerary-list-view .timeline');
+    if (!timelineContainer) return;
+
+    // Router stops carry lat/lng; the map expects [lat, lng] coordinates
+    streamingItinerary = stops.map(stop => {
+        const lat = stop.lat ?? stop.latitude;
+        const lng = stop.lng ?? stop.longitude;
+        return (lat && lng) ? { ...stop, coordinates: [lat, lng] } : { ...stop };
+    });
+
+    renderCustomItinerary(streamingItinerary, timelineContainer);
+    drawRouteOnMap(streamingItinerary);
+}
+
+function applyStopEnrichment(index, kind, data) {
+    const item = streamingItinerary[index];
+    const timelineContainer = document.querySelector('#itinerary-list-view .timeline');
+    if (!item || !data || !timelineContainer) return;
+
+    const richDetails = { ...(item._rich_details || {}) };
+    if (kind === 'details') {
+        if (data.opening_hours) richDetails.opening_hours = data.opening_hours;
+        if (data.cost) richDetails.price_range = data.cost;
+        if (data.summary && !item.description) item.description = data.summary;
+    } else if (kind === 'image') {
+        item.image_url = data.url;
+    } else if (kind === 'ai_tip') {
+        Object.assign(richDetails, data);
+    }
+    item._rich_details = { ...item, ...richDetails };
+
+    const current = timelineContainer.children[index];
+    if (current) {
+        current.replaceWith(createItineraryElement(item, index));
+    }
+}
+
 function generateItineraryFromRecommendations(recommendations) {
     const timelineContainer = document.querySelector('#itinerary-list-view .timeline');
     if (!timelineContainer) return;
@@ -404,39 +523,43 @@ function renderCustomItinerary(items, container) {
     container.innerHTML = '';
 
     items.forEach((item, index) => {
-        let htmlContent;
-        if (item.type === 'tip') {
-            htmlContent = createTipCard(item.title, item.description);
-        } else if (item.type === 'emergency_plan') {
-            htmlContent = createEmergencyPlanCard(item.title, item.description, item.plan_b_data);
-        } else if (item.type === 'smart_discovery') {
-            htmlContent = createSmartDiscoveryCard(item.title, item.description, item.discoveries);
-        } else {
-            htmlContent = createTimelineItem(item, index);
-        }
+        container.appendChild(createItineraryElement(item, index));
+    });
+}
 
-        const itemDiv = document.createElement('div');
-        itemDiv.innerHTML = htmlContent.trim(); // Use trim to avoid issues with whitespace
-
-        // Add click listener for detail expansion (if it's a regular item)
-        if (!item.type) {
-            const detailButton = itemDiv.querySelector('.cursor-pointer'); // Assuming createTimelineItem returns an item with a click handler attribute
-            if (detailButton) {
-                 // Safely get context, title, description
-                const context = item.context || '';
-                const title = item.title || '';
-                const description = item.description || '';
-                detailButton.setAttribute('onclick', `openModal('${context}', '${title}', '${description}')`);
-            } else {
-                // Fallback if the button isn't found, add listener to the main item div
-                itemDiv.querySelector('.timeline-item').addEventListener('click', () => {
-                    openModal(item.context || '', item.title || '', item.description || '');
-                });
-            }
+function createItineraryElement(item, index) {
+    let htmlContent;
+    if (item.type === 'tip') {
+        htmlContent = createTipCard(item.title, item.description);
+    } else if (item.type === 'emergency_plan') {
+        htmlContent = createEmergencyPlanCard(item.title, item.description, item.plan_b_data);
+    } else if (item.type === 'smart_discovery') {
+        htmlContent = createSmartDiscoveryCard(item.title, item.description, item.discoveries);
+    } else {
+        htmlContent = createTimelineItem(item, index);
+    }
+
+    const itemDiv = document.createElement('div');
+    itemDiv.innerHTML = htmlContent.trim(); // Use trim to avoid issues with whitespace
+
+    // Add click listener for detail expansion (if it's a regular item)
+    if (!item.type) {
+        const detailButton = itemDiv.querySelector('.cursor-pointer'); // Assuming createTimelineItem returns an item with a click handler attribute
+        if (detailButton) {
+             // Safely get context, title, description
+            const context = item.context || '';
+            const title = item.title || '';
+            const description = item.description || '';
+            detailButton.setAttribute('onclick', `openModal('${context}', '${title}', '${description}')`);
+        } else {
+            // Fallback if the button isn't found, add listener to the main item div
+            itemDiv.querySelector('.timeline-item').addEventListener('click', () => {
+                openModal(item.context || '', item.title || '', item.description || '');
+            });
         }
+    }
 
-        container.appendChild(itemDiv.firstChild); // Append the actual content element
-    });
+    return itemDiv.firstChild; // The actual content element
 }
 
 
@@ -497,6 +620,7 @@ function createTimelineItem(item, index) {
                             <span class="text-xs text-gray-400 ml-auto shrink-0">${timeDisplay}</span>
                         </div>
                         <p class="text-gray-300 text-xs leading-relaxed">${item.description}</p>
+                        ${item.image_url ? `<img src="${item.image_url}" alt="${item.title}" loading="lazy" class="mt-2 w-full h-32 object-cover rounded-lg">` : ''}
                         ${richDetailsHTML}
                     </div>
                 </div>
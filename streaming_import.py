@@ -0,0 +1,326 @@
+"""
+Streaming Import - Constant-memory loading of Apify/TripAdvisor JSON exports
+Dataset exports are read record by record (ijson when installed, otherwise
+an incremental json.JSONDecoder over a fixed-size buffer) instead of
+json.load-ing the whole file; records are transformed and written in
+chunks through execute_values or COPY, with a progress line per chunk, so
+peak memory depends on the chunk size and not on the file size.
+CopyUpsertSink is the upsert counterpart of copy_writer for loaders that
+refresh existing rows (place_cache, comprehensive_attractions)
+"""
+
+import os
+import json
+import time
+import codecs
+from io import StringIO
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+try:
+    import ijson  # optional: C-backed parser, faster on multi-GB exports
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+READ_SIZE = 1 << 20  # 1 MB of text per read
+DEFAULT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))
+
+
+class JsonRecords:
+    """
+    Records of a JSON array file (an Apify dataset export) or of a JSON
+    Lines file, parsed lazily. Re-iterable: every iteration streams the file
+    again; position/size give the progress of the current pass
+    """
+
+    def __init__(self, path: str, read_size: int = READ_SIZE, use_ijson: bool = IJSON_AVAILABLE):
+        self.path = path
+        self.read_size = read_size
+        self.use_ijson = use_ijson
+        self.size = os.path.getsize(path)
+        self.position = 0
+        self.count = 0
+
+    def __iter__(self) -> Iterator[Dict]:
+        self.position = self.count = 0
+        with open(self.path, 'rb') as f:
+            first = f.read(64).lstrip(codecs.BOM_UTF8).lstrip()[:1]
+            f.seek(0)
+            if first == b'[':
+                records = self._ijson(f) if self.use_ijson else self._decode_array(f)
+            else:
+                records = self._json_lines(f)
+            for record in records:
+                self.count += 1
+                yield record
+        self.position = self.size
+
+    def _ijson(self, f) -> Iterator[Dict]:
+        for record in ijson.items(f, 'item', use_float=True):
+            self.position = f.tell()
+            yield record
+
+    def _json_lines(self, f) -> Iterator[Dict]:
+        for line in f:
+            self.position += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+    def _decode_array(self, f) -> Iterator[Dict]:
+        """raw_decode one element at a time out of a sliding text buffer"""
+        decode = json.JSONDecoder().raw_decode
+        reader = _TextReader(f, self.read_size)
+        buffer, pos, eof = reader.read(), 0, False
+
+        pos = _skip(buffer, pos)
+        if buffer[pos:pos + 1] != '[':
+            raise ValueError(f"{self.path}: expected a JSON array")
+        pos += 1
+        while True:
+            pos = _skip(buffer, pos, ',')
+            if pos == len(buffer) and not eof:
+                buffer, pos = buffer[pos:] + reader.read(), 0
+                eof = reader.eof
+                continue
+            if buffer[pos:pos + 1] == ']':
+                return
+            try:
+                record, end = decode(buffer, pos)
+                if end == len(buffer) and not eof:
+                    raise ValueError('element may continue in the next read')
+            except ValueError:
+                if eof:
+                    raise
+                buffer, pos = buffer[pos:] + reader.read(), 0  # element spans the buffer edge
+                eof = reader.eof
+                continue
+            pos = end
+            self.position = reader.position
+            yield record
+            if pos > self.read_size:
+                buffer, pos = buffer[pos:], 0  # drop what was consumed
+
+
+class _TextReader:
+    """UTF-8 text in fixed-size binary reads (multi-byte characters split across reads are kept whole)"""
+
+    def __init__(self, f, read_size: int):
+        self.f = f
+        self.read_size = read_size
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.position = 0
+        self.eof = False
+
+    def read(self) -> str:
+        data = self.f.read(self.read_size)
+        self.position += len(data)
+        self.eof = not data
+        return self.decoder.decode(data, final=self.eof)
+
+
+def _skip(buffer: str, pos: int, extra: str = '') -> int:
+    while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in extra):
+        pos += 1
+    return pos
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident set size of this process (None where unsupported)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+
+def import_in_chunks(records: Iterable[Dict], transform: Callable[[Dict], Optional[Sequence]],
+                     write: Callable[[List[Sequence]], Optional[int]], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     label: str = 'records', progress: Optional[Callable[[str], None]] = print) -> Dict:
+    """
+    transform each record to a row (None skips it), write the rows of every
+    chunk_size records, report progress per chunk. write returns the rows
+    actually written (None: all of them)
+    """
+    stats = {'read': 0, 'rows': 0, 'written': 0, 'chunks': 0}
+    started = time.time()
+    for chunk in chunked(records, chunk_size):
+        rows = [row for row in map(transform, chunk) if row is not None]
+        stats['read'] += len(chunk)
+        stats['rows'] += len(rows)
+        if rows:
+            written = write(rows)
+            stats['written'] += len(rows) if written is None else written
+        stats['chunks'] += 1
+
+        if progress:
+            done = ''
+            if isinstance(records, JsonRecords) and records.size:
+                done = f" ({records.position / records.size:.0%})"
+            elapsed = max(time.time() - started, 1e-6)
+            peak = peak_memory_mb()
+            progress(f"   📦 chunk {stats['chunks']}: {stats['read']:,} {label} read{done}, "
+                     f"{stats['written']:,} written, {stats['read'] / elapsed:,.0f}/s"
+                     + (f", peak RSS {peak:.0f} MB" if peak else ''))
+    stats['elapsed_s'] = round(time.time() - started, 2)
+    return stats
+
+
+def values_writer(conn, sql: str, page_size: int = 500, template: Optional[str] = None,
+                  fetch: bool = False) -> Callable[[List[Sequence]], int]:
+    """Chunk writer: one execute_values + commit per chunk (with fetch, counts RETURNING rows)"""
+    def write(rows: List[Sequence]) -> int:
+        with conn.cursor() as cur:
+            result = execute_values(cur, sql, rows, template=template, page_size=page_size, fetch=fetch)
+        conn.commit()
+        return len(result) if fetch else len(rows)
+    return write
+
+
+def _csv_field(value) -> str:
+    if value is None:
+        return ''  # unquoted empty: NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def copy_writer(conn, table: str, columns: Sequence[str]) -> Callable[[List[Sequence]], int]:
+    """Chunk writer: COPY ... FROM STDIN (CSV) + commit per chunk, for rows already deduplicated"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+
+    def write(rows: List[Sequence]) -> int:
+        data = StringIO(''.join(','.join(map(_csv_field, row)) + '\n' for row in rows))
+        with conn.cursor() as cur:
+            cur.copy_expert(sql, data)
+        conn.commit()
+        return len(rows)
+    return write
+
+
+class CopyUpsertSink:
+    """
+    Bulk upsert through a staging table: every batch is COPYed into a temp
+    table with the target's column types, then merged with one
+    INSERT ... SELECT ... ON CONFLICT (key) DO UPDATE. Rows whose update
+    columns already hold the same values are left untouched, and
+    RETURNING (xmax = 0) tells inserts from updates, so each batch costs
+    four round trips whatever its size: stage, COPY, merge and commit
+    (three with commit=False).
+
+    update: columns overwritten on conflict (default: all but the key;
+    empty: DO NOTHING). insert_values/update_values: extra SQL expressions
+    for the insert and for rows that changed, e.g. {'created_at': 'NOW()'}.
+    compare: expressions deciding whether a row changed, with {} standing
+    for the row (default: the update columns), e.g. to ignore a timestamp
+    inside a JSON document: ("{}.place_data::jsonb - 'fetched_at'",).
+    Rows are buffered by add() and merged every batch_size rows, or passed
+    as a batch to write() (an import_in_chunks writer); within a batch the
+    last row for a key wins (the first one with DO NOTHING).
+    """
+
+    def __init__(self, conn, table: str, columns: Sequence[str], key: Sequence[str],
+                 update: Optional[Sequence[str]] = None, insert_values: Optional[Dict[str, str]] = None,
+                 update_values: Optional[Dict[str, str]] = None, compare: Optional[Sequence[str]] = None,
+                 batch_size: int = DEFAULT_CHUNK_SIZE, commit: bool = True):
+        self.conn = conn
+        self.table = table
+        self.columns = tuple(columns)
+        self.key_index = [self.columns.index(column) for column in key]
+        self.batch_size = batch_size
+        self.commit = commit
+        self.rows: List[Sequence] = []
+        self.stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0, 'batches': 0}
+
+        update = [c for c in self.columns if c not in key] if update is None else list(update)
+        self.keep_first = not update
+        insert_values = insert_values or {}
+        self.stage = '_stage_' + table.replace('.', '_')
+        cols = ', '.join(self.columns)
+        self.create_sql = (f"CREATE TEMP TABLE IF NOT EXISTS {self.stage} ON COMMIT DELETE ROWS AS "
+                           f"SELECT {cols} FROM {table} WITH NO DATA; TRUNCATE {self.stage}")
+        self.copy_sql = f"COPY {self.stage} ({cols}) FROM STDIN WITH (FORMAT csv)"
+
+        target = ', '.join(self.columns + tuple(insert_values))
+        source = ', '.join(self.columns + tuple(insert_values.values()))
+        merge = f"INSERT INTO {table} ({target}) SELECT {source} FROM {self.stage} ON CONFLICT ({', '.join(key)}) "
+        if update:
+            sets = [f"{column} = EXCLUDED.{column}" for column in update]
+            sets += [f"{column} = {expression}" for column, expression in (update_values or {}).items()]
+            compare = compare or ['{}.' + column for column in update]
+            merge += (f"DO UPDATE SET {', '.join(sets)} "
+                      f"WHERE ({', '.join(c.format(table) for c in compare)}) IS DISTINCT FROM "
+                      f"({', '.join(c.format('EXCLUDED') for c in compare)}) RETURNING (xmax = 0)")
+        else:
+            merge += "DO NOTHING RETURNING TRUE"
+        self.merge_sql = merge
+
+    def add(self, row: Sequence):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        rows, self.rows = self.rows, []
+        return self.write(rows) if rows else 0
+
+    def write(self, rows: List[Sequence]) -> int:
+        """Merge one batch; returns the rows inserted or updated"""
+        batch = {}
+        for row in (reversed(rows) if self.keep_first else rows):
+            batch[tuple(row[i] for i in self.key_index)] = row
+        data = StringIO(''.join(','.join(map(_csv_field, row)) + '\n' for row in batch.values()))
+        with self.conn.cursor() as cur:
+            cur.execute(self.create_sql)
+            cur.copy_expert(self.copy_sql, data)
+            return self._merge(cur, len(rows), len(batch))
+
+    def merge_query(self, select_sql: str, params: Optional[Tuple] = None) -> int:
+        """Merge rows selected on the server (same columns, unique keys), without a round trip per batch"""
+        with self.conn.cursor() as cur:
+            cur.execute(self.create_sql)
+            cur.execute(f"INSERT INTO {self.stage} ({', '.join(self.columns)}) {select_sql}", params)
+            staged = cur.rowcount
+            return self._merge(cur, staged, staged)
+
+    def _merge(self, cur, received: int, staged: int) -> int:
+        cur.execute(self.merge_sql)
+        results = [row[0] for row in cur.fetchall()]
+        if self.commit:
+            self.conn.commit()
+        inserted = sum(1 for new in results if new)
+        self.stats['inserted'] += inserted
+        self.stats['updated'] += len(results) - inserted
+        self.stats['unchanged'] += staged - len(results)
+        self.stats['duplicates'] += received - staged
+        self.stats['batches'] += 1
+        return len(results)
+
+    def summary(self) -> str:
+        return (f"{self.stats['inserted']:,} inserted, {self.stats['updated']:,} updated, "
+                f"{self.stats['unchanged']:,} unchanged")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.flush()
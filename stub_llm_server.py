@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Stub OpenAI-compatible server for offline benchmarks and tests
+Answers /v1/chat/completions and /v1/embeddings with canned JSON after a configurable delay
+
+Usage:
+    python stub_llm_server.py --port 8089 --latency 1.2
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub python benchmark_llm_cache.py
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Minimal chat/embeddings endpoint; latency and counters live on the server"""
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output clean
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency)
+            if self.path.endswith('/embeddings'):
+                server.count('embeddings')
+                text = request.get('input', '')
+                text = text[0] if isinstance(text, list) else text
+                digest = hashlib.sha256(text.encode()).digest()
+                vector = [b / 255.0 for b in digest]
+                self._send_json({
+                    'object': 'list',
+                    'data': [{'object': 'embedding', 'index': 0, 'embedding': vector}],
+                    'model': request.get('model'),
+                    'usage': {'prompt_tokens': len(text) // 4, 'total_tokens': len(text) // 4}
+                })
+                return
+
+            server.count('chat')
+            prompt = ' '.join(str(m.get('content', '')) for m in request.get('messages', []))
+            if (request.get('response_format') or {}).get('type') == 'json_object':
+                content = json.dumps({'stub': True, 'echo': prompt[:80], 'ai_confidence': 'high'})
+            else:
+                content = f"[stub] {prompt[-200:]}"
+            self._send_json({
+                'id': f"chatcmpl-stub-{server.requests['chat']}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': request.get('model', 'stub'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': len(prompt) // 4,
+                    'completion_tokens': len(content) // 4,
+                    'total_tokens': (len(prompt) + len(content)) // 4
+                }
+            })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 1.0):
+        super().__init__(('127.0.0.1', port), StubLLMHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = {'chat': 0, 'embeddings': 0}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def count(self, kind: str):
+        with self.lock:
+            self.requests[kind] += 1
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+def start_stub_server(latency: float = 1.0, port: int = 0) -> StubLLMServer:
+    """Start the stub in a daemon thread; returns the server (see .base_url)"""
+    server = StubLLMServer(port=port, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible server")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = StubLLMServer(port=args.port, latency=args.latency)
+    print(f"🤖 Stub LLM listening on {server.base_url} (latency {args.latency}s)")
+    server.serve_forever()
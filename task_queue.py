@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+Task Queue - Durable table-backed queue for scraping, pretraining and cache population
+No external broker: tasks live in PostgreSQL (claimed with FOR UPDATE SKIP LOCKED)
+or, without DATABASE_URL, in a local SQLite file. Per-provider rate limits,
+retries with exponential backoff, an Apify/OpenAI budget enforced through
+enhancements.analytics.CostMonitor, and per-job progress.
+
+Usage:
+    python task_queue.py work [--workers 2]      # the worker process: run tasks until interrupted
+    python task_queue.py status <job_id>         # progress of a job
+    python task_queue.py stats
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import sqlite3
+import logging
+import importlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+PENDING_STATES = (QUEUED, RUNNING)
+
+# A running task whose worker stops renewing it is handed to another worker after this long (s);
+# live workers renew the lease every LEASE_SECONDS / 3 while the handler runs
+LEASE_SECONDS = int(os.getenv('TASK_QUEUE_LEASE', '600'))
+RETRY_BASE_SECONDS = float(os.getenv('TASK_QUEUE_RETRY_BASE', '30'))
+RETRY_MAX_SECONDS = float(os.getenv('TASK_QUEUE_RETRY_MAX', '3600'))
+POLL_SECONDS = float(os.getenv('TASK_QUEUE_POLL', '2'))
+
+# provider=calls/seconds, e.g. Nominatim's usage policy is one request per second
+DEFAULT_RATE_LIMITS = 'apify=6/60,openai=60/60,nominatim=1/1,overpass=2/60'
+
+
+class PermanentTaskError(Exception):
+    """Raised by a handler when retrying cannot help (bad payload, provider not configured)"""
+
+
+class RateLimiter:
+    """Token bucket: `calls` per `seconds`, refilled continuously"""
+
+    def __init__(self, calls: int, seconds: float):
+        self.capacity = float(calls)
+        self.refill_rate = calls / seconds
+        self._tokens = float(calls)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until a call may start (0 when a token is available)"""
+        with self._lock:
+            self._refill(time.time())
+            return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.refill_rate
+
+    def acquire(self):
+        """Take a token, sleeping if another worker took the last one first"""
+        while True:
+            with self._lock:
+                self._refill(time.time())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.refill_rate
+            time.sleep(wait)
+
+
+def parse_rate_limits(spec: str) -> Dict[str, RateLimiter]:
+    """'apify=6/60,nominatim=1/1' -> {provider: RateLimiter}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        provider, rate = item.split('=')
+        calls, seconds = rate.split('/')
+        limits[provider.strip()] = RateLimiter(int(calls), float(seconds))
+    return limits
+
+
+class TaskSpec:
+    """Registered task kind: handler plus the provider it calls and its cost per run"""
+
+    def __init__(self, handler: Union[Callable, str], provider: Optional[str], cost_usd: float,
+                 max_attempts: int):
+        self._handler = handler
+        self.provider = provider
+        self.cost_usd = cost_usd
+        self.max_attempts = max_attempts
+
+    @property
+    def handler(self) -> Callable:
+        # 'module:function' paths are resolved on first use so the queue never imports Flask eagerly
+        if isinstance(self._handler, str):
+            module, attr = self._handler.split(':')
+            self._handler = getattr(importlib.import_module(module), attr)
+        return self._handler
+
+
+class TaskQueue:
+    """
+    Durable task queue shared by every process pointing at the same table
+
+    Tasks belong to a job (one batch request); progress is reported per job.
+    Claiming marks a task running with a lease that a heartbeat renews while
+    the handler runs, so only tasks of a crashed worker are picked up again
+    once the lease expires and a batch can always resume.
+    """
+
+    def __init__(self, database_url: Optional[str] = None, sqlite_path: Optional[str] = None,
+                 rate_limits: Optional[str] = None, monthly_budget_usd: Optional[float] = None):
+        self.database_url = database_url if database_url is not None else os.getenv('DATABASE_URL')
+        self.sqlite_path = sqlite_path or os.getenv('TASK_QUEUE_SQLITE_PATH', 'task_queue.db')
+        self.rate_limits = parse_rate_limits(
+            rate_limits if rate_limits is not None else os.getenv('TASK_QUEUE_RATE_LIMITS', DEFAULT_RATE_LIMITS))
+        self.monthly_budget_usd = monthly_budget_usd or float(os.getenv('TASK_QUEUE_MONTHLY_BUDGET', '50'))
+        self.specs: Dict[str, TaskSpec] = {}
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._table_ready = False
+        self._budget_checked_at = 0.0
+        self._budget_throttled = False
+        self._workers: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.stats = {'claimed': 0, DONE: 0, FAILED: 0, 'retried': 0, 'budget_deferrals': 0}
+
+    @property
+    def backend(self) -> str:
+        return 'postgres' if self.database_url else 'sqlite'
+
+    # ---------------------------------------------------------------- registry
+
+    def register(self, kind: str, handler: Union[Callable, str], provider: Optional[str] = None,
+                 cost_usd: float = 0.0, max_attempts: int = 3):
+        """
+        Register a handler(payload) -> dict for a task kind
+
+        Args:
+            handler: Callable or 'module:function' path
+            provider: Rate-limit bucket the handler calls (apify, openai, nominatim, ...)
+            cost_usd: Estimated spend per run, counted against the monthly budget;
+                a handler returning {'cost_usd': 0} (e.g. served from cache) records no spend
+        """
+        self.specs[kind] = TaskSpec(handler, provider, cost_usd, max_attempts)
+
+    # ---------------------------------------------------------------- storage
+
+    def _connect(self):
+        if self.backend == 'postgres':
+            return psycopg2.connect(self.database_url, connect_timeout=3)
+        conn = sqlite3.connect(self.sqlite_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _sql(self, query: str) -> str:
+        return query if self.backend == 'postgres' else query.replace('%s', '?')
+
+    def _execute(self, query: str, params: Iterable = (), fetch: str = None, many: bool = False):
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            self._ensure_table(cur)
+            if many:
+                cur.executemany(self._sql(query), params)
+            else:
+                cur.execute(self._sql(query), tuple(params))
+            rows = cur.fetchall() if fetch == 'all' else cur.fetchone() if fetch == 'one' else cur.rowcount
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def _ensure_table(self, cur):
+        if self._table_ready:
+            return
+        id_column = 'BIGSERIAL PRIMARY KEY' if self.backend == 'postgres' else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+        statements = [f"""
+            CREATE TABLE IF NOT EXISTS task_queue (
+                id {id_column},
+                job_id VARCHAR(64) NOT NULL,
+                kind VARCHAR(64) NOT NULL,
+                provider VARCHAR(32),
+                payload TEXT NOT NULL,
+                dedup_key VARCHAR(255),
+                status VARCHAR(16) NOT NULL DEFAULT 'queued',
+                priority INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                run_after DOUBLE PRECISION NOT NULL,
+                locked_by VARCHAR(128),
+                locked_until DOUBLE PRECISION,
+                cost_usd DOUBLE PRECISION NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at DOUBLE PRECISION NOT NULL,
+                finished_at DOUBLE PRECISION
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_task_queue_claim ON task_queue(status, run_after)",
+            "CREATE INDEX IF NOT EXISTS idx_task_queue_job ON task_queue(job_id)",
+            # One pending task per dedup key: re-running a batch does not queue the same city twice
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_task_queue_pending_dedup
+                ON task_queue(kind, dedup_key) WHERE status IN ('queued', 'running')""",
+        ]
+        for statement in statements:
+            cur.execute(statement)
+        self._table_ready = True
+
+    # ---------------------------------------------------------------- producers
+
+    def enqueue_job(self, kind: str, payloads: List[Dict], job_id: Optional[str] = None,
+                    priority: int = 0, dedup_fields: Tuple[str, ...] = ()) -> Dict:
+        """
+        Queue one task per payload under a single job id
+
+        Args:
+            dedup_fields: Payload fields forming the dedup key; payloads whose key
+                is already pending (queued or running) are skipped
+
+        Returns: {'job_id': ..., 'queued': n, 'duplicates': m}
+        """
+        spec = self.specs[kind]
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        rows = []
+        for payload in payloads:
+            dedup_key = '|'.join(str(payload.get(f, '')).lower() for f in dedup_fields) or None
+            rows.append((job_id, kind, spec.provider, json.dumps(payload, ensure_ascii=False), dedup_key,
+                         priority, spec.max_attempts, now, now))
+        queued = self._execute("""
+            INSERT INTO task_queue (job_id, kind, provider, payload, dedup_key, priority,
+                                    max_attempts, run_after, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT DO NOTHING
+        """, rows, many=True)
+        logger.info(f"📥 Job {job_id}: {queued} {kind} tasks queued ({len(rows) - queued} already pending)")
+        return {'job_id': job_id, 'queued': queued, 'duplicates': len(rows) - queued}
+
+    def cancel_job(self, job_id: str) -> int:
+        """Cancel the job's tasks that have not started; running tasks finish normally"""
+        return self._execute("""
+            UPDATE task_queue SET status = 'cancelled', finished_at = %s
+            WHERE job_id = %s AND status = 'queued'
+        """, (time.time(), job_id))
+
+    # ---------------------------------------------------------------- budget
+
+    def get_cost_summary(self, days_lookback: int = 30) -> Dict:
+        """Spend recorded by finished tasks, in the shape CostMonitor expects from CacheAnalytics"""
+        row = self._execute("""
+            SELECT COALESCE(SUM(cost_usd), 0), COUNT(*) FROM task_queue
+            WHERE cost_usd > 0 AND finished_at >= %s
+        """, (time.time() - days_lookback * 86400,), fetch='one')
+        spent, paid_calls = float(row[0]), int(row[1])
+        daily_avg = spent / days_lookback
+        return {
+            'period_days': days_lookback,
+            'paid_calls': paid_calls,
+            'actual_cost_usd': round(spent, 4),
+            'daily_avg_usd': daily_avg,
+            'monthly_projection_usd': daily_avg * 30,
+        }
+
+    def budget_status(self) -> Dict:
+        from enhancements.analytics import CostMonitor
+        return CostMonitor(monthly_budget_usd=self.monthly_budget_usd).check_budget_status(self)
+
+    def _paid_tasks_throttled(self) -> bool:
+        """CostMonitor verdict, re-evaluated at most once a minute"""
+        if time.time() - self._budget_checked_at < 60:
+            return self._budget_throttled
+        try:
+            from enhancements.analytics import CostMonitor
+            self._budget_throttled = CostMonitor(
+                monthly_budget_usd=self.monthly_budget_usd).should_throttle_scraping(self)
+        except Exception as e:
+            logger.warning(f"⚠️ Task budget check failed, pausing paid tasks: {e}")
+            self._budget_throttled = True
+        self._budget_checked_at = time.time()
+        return self._budget_throttled
+
+    # ---------------------------------------------------------------- consumers
+
+    def _blocked_kinds(self) -> List[str]:
+        """Kinds that may not start now: provider out of tokens, or paid while over budget"""
+        over_budget = any(spec.cost_usd > 0 for spec in self.specs.values()) and self._paid_tasks_throttled()
+        blocked = []
+        for kind, spec in self.specs.items():
+            limiter = self.rate_limits.get(spec.provider)
+            if (limiter and limiter.wait_time() > 0) or (over_budget and spec.cost_usd > 0):
+                blocked.append(kind)
+        if over_budget:
+            self.stats['budget_deferrals'] += 1
+        return blocked
+
+    def claim(self, job_id: Optional[str] = None) -> Optional[Dict]:
+        """Lease the next due task this process can run (None when there is nothing to do)"""
+        blocked = set(self._blocked_kinds())
+        kinds = [kind for kind in self.specs if kind not in blocked]
+        if not kinds:
+            return None
+        now = time.time()
+        where = f"""
+            ((status = 'queued' AND run_after <= %s) OR (status = 'running' AND locked_until < %s))
+            AND kind IN ({', '.join(['%s'] * len(kinds))})
+            {'AND job_id = %s' if job_id else ''}
+        """
+        params = [now, now, *kinds] + ([job_id] if job_id else [])
+        lease = (self.worker_id, now + LEASE_SECONDS)
+        columns = 'id, job_id, kind, payload, attempts, max_attempts'
+
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            self._ensure_table(cur)
+            if self.backend == 'postgres':
+                cur.execute(f"""
+                    UPDATE task_queue SET status = 'running', attempts = attempts + 1,
+                                          locked_by = %s, locked_until = %s
+                    WHERE id = (SELECT id FROM task_queue WHERE {where}
+                                ORDER BY priority DESC, id FOR UPDATE SKIP LOCKED LIMIT 1)
+                    RETURNING {columns}
+                """, (*lease, *params))
+                row = cur.fetchone()
+            else:
+                # SQLite has a single writer; BEGIN IMMEDIATE gives the same exclusivity
+                cur.execute('BEGIN IMMEDIATE')
+                cur.execute(self._sql(f"SELECT {columns} FROM task_queue WHERE {where} "
+                                      f"ORDER BY priority DESC, id LIMIT 1"), params)
+                row = cur.fetchone()
+                if row:
+                    cur.execute(self._sql("""
+                        UPDATE task_queue SET status = 'running', attempts = attempts + 1,
+                                              locked_by = %s, locked_until = %s
+                        WHERE id = %s
+                    """), (*lease, row[0]))
+                    row = (*row[:4], row[4] + 1, row[5])
+            conn.commit()
+        finally:
+            conn.close()
+
+        if not row:
+            return None
+        self.stats['claimed'] += 1
+        return {'id': row[0], 'job_id': row[1], 'kind': row[2], 'payload': json.loads(row[3]),
+                'attempts': row[4], 'max_attempts': row[5]}
+
+    def _renew_lease(self, task: Dict) -> bool:
+        """Extend a running task's lease; False once another worker has taken it over"""
+        return self._execute("""
+            UPDATE task_queue SET locked_until = %s
+            WHERE id = %s AND status = 'running' AND locked_by = %s
+        """, (time.time() + LEASE_SECONDS, task['id'], self.worker_id)) > 0
+
+    def _heartbeat(self, task: Dict, done: threading.Event):
+        while not done.wait(max(1.0, LEASE_SECONDS / 3)):
+            try:
+                if not self._renew_lease(task):
+                    logger.warning(f"⚠️ Task {task['id']} lease lost to another worker")
+                    return
+            except Exception as e:
+                logger.warning(f"⚠️ Task {task['id']} lease renewal failed: {e}")
+
+    def run_task(self, task: Dict):
+        """Execute a claimed task and record its outcome"""
+        spec = self.specs[task['kind']]
+        limiter = self.rate_limits.get(spec.provider)
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(task, done), daemon=True,
+                         name=f"task-queue-heartbeat-{task['id']}").start()
+        try:
+            if limiter:
+                limiter.acquire()
+            result = spec.handler(task['payload']) or {}
+        except PermanentTaskError as e:
+            return self._finish(task, FAILED, error=str(e))
+        except Exception as e:
+            if task['attempts'] >= task['max_attempts']:
+                return self._finish(task, FAILED, error=str(e))
+            return self._retry(task, str(e))
+        finally:
+            done.set()
+        cost = float(result.get('cost_usd', spec.cost_usd)) if isinstance(result, dict) else spec.cost_usd
+        self._finish(task, DONE, result=result, cost_usd=cost)
+
+    def _finish(self, task: Dict, status: str, result=None, error: Optional[str] = None, cost_usd: float = 0.0):
+        self._execute("""
+            UPDATE task_queue SET status = %s, result = %s, error = %s, cost_usd = %s,
+                                  finished_at = %s, locked_by = NULL, locked_until = NULL
+            WHERE id = %s
+        """, (status, json.dumps(result, default=str) if result is not None else None, error,
+              cost_usd, time.time(), task['id']))
+        self.stats[status] += 1
+        if status == FAILED:
+            logger.warning(f"❌ Task {task['id']} ({task['kind']}) failed: {error}")
+
+    def _retry(self, task: Dict, error: str):
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (task['attempts'] - 1))
+        delay *= random.uniform(0.9, 1.1)  # spread retries of a failed batch
+        self._execute("""
+            UPDATE task_queue SET status = 'queued', error = %s, run_after = %s,
+                                  locked_by = NULL, locked_until = NULL
+            WHERE id = %s
+        """, (error, time.time() + delay, task['id']))
+        self.stats['retried'] += 1
+        logger.info(f"🔁 Task {task['id']} ({task['kind']}) retry {task['attempts']} in {delay:.0f}s: {error}")
+
+    def run_once(self, job_id: Optional[str] = None) -> bool:
+        """Claim and run one task; False when nothing was runnable"""
+        task = self.claim(job_id)
+        if not task:
+            return False
+        self.run_task(task)
+        return True
+
+    def work(self, job_id: Optional[str] = None, until_idle: bool = False,
+             stop: Optional[threading.Event] = None, max_wait: Optional[float] = None) -> Optional[Dict[str, int]]:
+        """
+        Worker loop
+
+        Args:
+            job_id: Only process this job's tasks
+            until_idle: Return once this worker has nothing left it can run for
+                the job (or queue): {} when every task is finished, else the
+                pending tasks by reason (see _stuck_tasks; 'waiting' past max_wait)
+            max_wait: With until_idle, stop waiting after this many seconds
+        """
+        stop = stop or self._stop
+        deadline = time.time() + max_wait if max_wait is not None else None
+        while not stop.is_set():
+            try:
+                if until_idle and deadline and time.time() >= deadline:
+                    return self._stuck_tasks(job_id) or {'waiting': self._pending_count(job_id)}
+                if self.run_once(job_id):
+                    continue
+                if until_idle:
+                    stuck = self._stuck_tasks(job_id)
+                    if stuck is not None:
+                        return stuck
+            except Exception as e:
+                logger.error(f"❌ Task worker error: {e}")
+            stop.wait(POLL_SECONDS)
+        return None
+
+    def start_workers(self, count: int = 1):
+        """Daemon worker threads in this process (idempotent)"""
+        with self._lock:
+            for i in range(len(self._workers), count):
+                worker = threading.Thread(target=self.work, name=f"task-queue-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop_workers(self):
+        self._stop.set()
+
+    # ---------------------------------------------------------------- progress
+
+    def _pending_count(self, job_id: Optional[str] = None) -> int:
+        row = self._execute(f"""
+            SELECT COUNT(*) FROM task_queue WHERE status IN ('queued', 'running')
+            {'AND job_id = %s' if job_id else ''}
+        """, (job_id,) if job_id else (), fetch='one')
+        return int(row[0])
+
+    def _stuck_tasks(self, job_id: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """
+        Pending tasks by reason when none can start in this process without
+        outside help: 'over_budget' (paid, CostMonitor throttling), 'leased'
+        (running under another worker's live lease) or 'unhandled' (kind not
+        registered here). None while some are due, retrying or rate limited
+        """
+        rows = self._execute(f"""
+            SELECT status, kind, locked_by, locked_until FROM task_queue
+            WHERE status IN ('queued', 'running') {'AND job_id = %s' if job_id else ''}
+        """, (job_id,) if job_id else (), fetch='all')
+        now = time.time()
+        stuck = {}
+        for status, kind, locked_by, locked_until in rows:
+            spec = self.specs.get(kind)
+            if spec is None:
+                reason = 'unhandled'
+            elif status == RUNNING and (locked_until or 0) >= now and locked_by != self.worker_id:
+                reason = 'leased'
+            elif status == QUEUED and spec.cost_usd > 0 and self._paid_tasks_throttled():
+                reason = 'over_budget'
+            else:
+                return None
+            stuck[reason] = stuck.get(reason, 0) + 1
+        return stuck
+
+    def job_progress(self, job_id: str, include_tasks: bool = True) -> Optional[Dict]:
+        """Counts per status, spend and (optionally) per-task results of a job"""
+        rows = self._execute("""
+            SELECT id, kind, status, attempts, payload, result, error, cost_usd, created_at, finished_at
+            FROM task_queue WHERE job_id = %s ORDER BY id
+        """, (job_id,), fetch='all')
+        if not rows:
+            return None
+        counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for row in rows:
+            counts[row[2]] += 1
+        finished = counts[DONE] + counts[FAILED] + counts[CANCELLED]
+        progress = {
+            'job_id': job_id,
+            'total': len(rows),
+            **counts,
+            'percent': round(finished / len(rows) * 100, 1),
+            'finished': finished == len(rows),
+            'cost_usd': round(sum(row[7] for row in rows), 4),
+            'started_at': min(row[8] for row in rows),
+            'finished_at': max((row[9] or 0) for row in rows) if finished == len(rows) else None,
+            'budget_throttled': self._budget_throttled,
+        }
+        if include_tasks:
+            progress['tasks'] = [{
+                'id': row[0], 'kind': row[1], 'status': row[2], 'attempts': row[3],
+                'payload': json.loads(row[4]),
+                'result': json.loads(row[5]) if row[5] else None,
+                'error': row[6],
+            } for row in rows]
+        return progress
+
+    def wait_for_job(self, job_id: str, timeout: Optional[float] = None, poll: float = 1.0) -> Optional[Dict]:
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            progress = self.job_progress(job_id)
+            if not progress or progress['finished'] or (deadline and time.time() > deadline):
+                return progress
+            time.sleep(poll)
+
+    def get_stats(self) -> Dict:
+        try:
+            rows = self._execute("SELECT status, COUNT(*) FROM task_queue GROUP BY status", fetch='all')
+            costs = self.get_cost_summary(30)
+        except Exception as e:
+            return {'backend': self.backend, 'error': str(e)}
+        return {
+            'backend': self.backend,
+            'workers': len(self._workers),
+            'tasks': dict(rows),
+            'processed': dict(self.stats),
+            'cost_last_30_days_usd': costs['actual_cost_usd'],
+            'monthly_budget_usd': self.monthly_budget_usd,
+            'budget_throttled': self._budget_throttled,
+            'rate_limits': {provider: round(limiter.refill_rate * 60, 2)
+                            for provider, limiter in self.rate_limits.items()},
+        }
+
+
+# Global queue instance with the built-in task kinds
+task_queue = TaskQueue()
+task_queue.register('apify_place_category', 'proactive_scraping:scrape_place_category',
+                    provider='apify', cost_usd=0.02)
+task_queue.register('pretrain_place', 'pretraining_system:pretrain_place',
+                    provider='nominatim', cost_usd=0.01)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Durable task queue worker")
+    parser.add_argument('command', choices=['work', 'status', 'stats'])
+    parser.add_argument('job_id', nargs='?')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('TASK_QUEUE_WORKERS', '1')))
+    args = parser.parse_args()
+
+    if args.command == 'work':
+        print(f"👷 {args.workers} task worker(s) on {task_queue.backend} (Ctrl+C to stop)")
+        task_queue.start_workers(args.workers)
+        try:
+            while True:
+                time.sleep(60)
+                print(json.dumps(task_queue.get_stats(), default=str))
+        except KeyboardInterrupt:
+            task_queue.stop_workers()
+    elif args.command == 'status':
+        print(json.dumps(task_queue.job_progress(args.job_id, include_tasks=True), indent=2, default=str))
+    else:
+        print(json.dumps(task_queue.get_stats(), indent=2, default=str))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test admission control: per-endpoint slots, queue-length shedding, queue
+timeouts, degraded/cached responses with Retry-After and dashboard counters
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, jsonify
+
+import admission_control
+from admission_control import AdmissionController, AdmissionRejected, admission_controlled
+
+
+def test_slots_queue_and_shedding():
+    controller = AdmissionController(limits='expensive=2/2', queue_timeout=5)
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+    outcomes = []
+
+    def call(_):
+        try:
+            with controller.admit('expensive'):
+                with lock:
+                    in_flight[0] += 1
+                    peak[0] = max(peak[0], in_flight[0])
+                time.sleep(0.2)
+                with lock:
+                    in_flight[0] -= 1
+            outcomes.append('ok')
+        except AdmissionRejected as e:
+            assert e.reason == 'queue_full' and e.retry_after >= 1
+            outcomes.append('shed')
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(call, range(8)))
+
+    # 2 running + 2 queued are served, the other 4 are shed at once
+    assert peak[0] == 2
+    assert outcomes.count('ok') == 4 and outcomes.count('shed') == 4, outcomes
+    stats = controller.get_stats()['endpoints']['expensive']
+    assert stats['admitted'] == 4 and stats['rejected'] == 4 and stats['queued'] == 2
+    assert stats['in_flight'] == 0 and stats['waiting'] == 0
+
+    # Endpoints without limits are never held back
+    with controller.admit('autocomplete'):
+        pass
+    print("✅ Concurrency capped at 2, queue of 2, excess shed immediately")
+
+
+def test_queue_timeout():
+    controller = AdmissionController(limits='slow=1/5', queue_timeout=0.2)
+    started = controller.acquire('slow')
+    start = time.time()
+    try:
+        controller.acquire('slow')
+        assert False, "should time out in the queue"
+    except AdmissionRejected as e:
+        assert e.reason == 'queue_timeout'
+    assert 0.15 < time.time() - start < 1.0
+    controller.release('slow', started)
+    assert controller.get_stats()['endpoints']['slow']['queue_timeouts'] == 1
+    print("✅ Queued requests are shed after the queue timeout")
+
+
+def test_decorator_serves_cached_then_template():
+    original = admission_control.admission
+    controller = AdmissionController(limits='plan=1/0', queue_timeout=0)
+    admission_control.admission = controller
+    try:
+        app = Flask(__name__)
+        gate = threading.Event()
+
+        def template():
+            return jsonify({'status': 'degraded'})
+
+        @app.route('/plan', methods=['POST'])
+        @admission_controlled('plan', degrade=template, cache_key=admission_control.request_cache_key)
+        def plan():
+            gate.wait(5)
+            return jsonify({'status': 'success'})
+
+        client = app.test_client()
+        gate.set()
+        assert client.post('/plan', json={'city': 'Roma'}).get_json()['status'] == 'success'
+        gate.clear()
+
+        # Hold the only slot, then send the same and a new request
+        busy = threading.Thread(target=lambda: app.test_client().post('/plan', json={'city': 'Bari'}))
+        busy.start()
+        while controller.get_stats()['endpoints']['plan']['in_flight'] == 0:
+            time.sleep(0.01)
+
+        cached = client.post('/plan', json={'city': 'Roma'})
+        assert cached.get_json()['status'] == 'success'
+        assert cached.headers['X-Admission'] == 'shed-cached' and int(cached.headers['Retry-After']) >= 1
+
+        degraded = client.post('/plan', json={'city': 'Napoli'})
+        assert degraded.status_code == 200 and degraded.get_json()['status'] == 'degraded'
+        assert degraded.headers['X-Admission'] == 'shed-degraded' and 'Retry-After' in degraded.headers
+
+        gate.set()
+        busy.join(5)
+        stats = controller.get_stats()['endpoints']['plan']
+        assert stats['rejected'] == 2 and stats['served_cached'] == 1 and stats['degraded'] == 1
+    finally:
+        admission_control.admission = original
+    print("✅ Shed requests get the last good answer, else a template, with Retry-After")
+
+
+def test_decorator_without_degrade_returns_503():
+    original = admission_control.admission
+    controller = AdmissionController(limits='ask=1/0', queue_timeout=0)
+    admission_control.admission = controller
+    try:
+        app = Flask(__name__)
+
+        @app.route('/ask', methods=['POST'])
+        @admission_controlled('ask')
+        def ask():
+            return jsonify({'answer': 'ok'})
+
+        started = controller.acquire('ask')
+        response = app.test_client().post('/ask', json={})
+        controller.release('ask', started)
+        assert response.status_code == 503 and response.headers['Retry-After']
+        assert app.test_client().post('/ask', json={}).status_code == 200
+    finally:
+        admission_control.admission = original
+    print("✅ Without a degraded variant the shed response is 503 + Retry-After")
+
+
+if __name__ == "__main__":
+    test_slots_queue_and_shedding()
+    test_queue_timeout()
+    test_decorator_serves_cached_then_template()
+    test_decorator_without_degrade_returns_503()
+    print("\n🎉 All admission control tests passed!")
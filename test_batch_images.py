@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test set-based batch image resolution: titles normalized up front, one query
+for the whole batch with duplicates collapsed, results in request order,
+keyword/fallback classification for misses (no PostgreSQL required)
+"""
+
+from flask import Flask
+
+import enhanced_images_routes
+from create_batch_image_indexes import BATCH_INDEXES, create_batch_indexes
+from enhanced_image_service import EnhancedImageService
+
+
+class RecordingConnection:
+    """Answers the batch query with canned rows keyed by lowercased title"""
+
+    def __init__(self, rows_by_title):
+        self.rows_by_title = rows_by_title
+        self.executed = []
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        self._params = params
+
+    def fetchall(self):
+        ords, _, titles, _ = self._params
+        return [(o,) + self.rows_by_title[t] for o, t in zip(ords, titles) if t in self.rows_by_title]
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class BatchService(EnhancedImageService):
+    def __init__(self, conn):
+        super().__init__(db_url='postgresql://unused')
+        self.conn = conn
+        self.connections = 0
+
+    def get_db_connection(self):
+        self.connections += 1
+        return self.conn
+
+
+COMMONS = 'https://upload.wikimedia.org/wikipedia/commons/a/a1/Colosseo.jpg'
+ROWS = {
+    # matched_name, matched_conf, found, image_url, thumb, conf, attribution, license, commons, ai...
+    'colosseo': ('Colosseo', 0.9, True, COMMONS, None, 0.95, 'Wikimedia', 'CC BY-SA', True,
+                 None, None, None, None),
+    'pantheon': ('Pantheon', None, None, None, None, None, None, None, None,
+                 'https://example.org/pantheon.jpg', 0.7, 'Someone', 'CC0'),
+}
+
+
+def test_one_query_in_request_order():
+    conn = RecordingConnection(ROWS)
+    service = BatchService(conn)
+    items = [
+        {'title': 'The Colosseum', 'context': 'Una giornata a Roma'},
+        {'title': 'Pantheon', 'context': 'roma'},
+        {'title': 'Trevi Fountain', 'context': 'Rome'},
+        {'title': 'Colosseum Rome', 'context': 'visit rome'},
+        {'title': 'Trattoria da Mario', 'context': 'Roma'},
+    ]
+    results = service.resolve_batch(items, width=320)
+
+    # one batch statement (no DDL in the request), on one connection that gets closed
+    assert service.connections == 1 and conn.closed
+    assert len(conn.executed) == 1 and 'unnest' in conn.executed[0][0]
+    ords, cities, titles, fallbacks = conn.executed[0][1]
+    assert titles == ['colosseo', 'pantheon', 'fontana di trevi', 'trattoria da mario']  # duplicates collapsed
+    assert cities == ['roma'] * 4 and ords == [0, 1, 2, 3]
+    assert fallbacks[2] == 'Fontana di Trevi' and fallbacks[3] == 'Roma_generic'
+
+    assert [r['original_title'] for r in results] == [i['title'] for i in items]
+    colosseo, pantheon, trevi, colosseo_again, trattoria = results
+    assert colosseo['classified_attraction'] == 'Colosseo' and colosseo['confidence'] == 0.95
+    assert colosseo['image']['source'] == 'comprehensive_db' and colosseo['image']['original_url'] == COMMONS
+    assert colosseo['image']['url'].startswith('/api/images/variant?url=') and '&w=320' in colosseo['image']['url']
+    assert colosseo_again == {**colosseo, 'original_title': 'Colosseum Rome'}
+
+    assert round(pantheon['confidence'], 2) == 0.8 and pantheon['image']['source'] == 'attraction_images'
+    assert trevi['classified_attraction'] == 'Fontana di Trevi' and trevi['image']['source'] == 'fallback'
+    assert trattoria['classified_attraction'] == 'Roma_generic' and trattoria['confidence'] == 0.3
+
+    service.resolve_batch(items)
+    assert len(conn.executed) == 2
+    print("✅ One query per batch, duplicates collapsed, results in request order")
+
+
+class CatalogConnection(RecordingConnection):
+    """pg_index answers: one valid index, one invalid one left by an interrupted build"""
+
+    def __init__(self, indexes):
+        super().__init__({})
+        self.indexes = indexes
+        self.autocommit = False
+
+    def execute(self, sql, params=None):
+        assert self.autocommit, "CONCURRENTLY must run outside a transaction"
+        super().execute(sql, params)
+
+    def fetchone(self):
+        valid = self.indexes.get(self._params[0]) if self._params else None
+        return None if valid is None else (valid,)
+
+
+def test_batch_indexes_built_concurrently_outside_requests():
+    first, second = BATCH_INDEXES
+    conn = CatalogConnection({first: True, second: False})
+    assert create_batch_indexes(conn) == [second]
+    ddl = [sql for sql, _ in conn.executed if 'pg_index' not in sql]
+    assert ddl == [f"DROP INDEX CONCURRENTLY IF EXISTS {second}",
+                   f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {second} ON {BATCH_INDEXES[second]}"]
+    print("✅ Batch indexes built CONCURRENTLY by a script, invalid leftovers rebuilt")
+
+
+def test_database_down_falls_back():
+    service = BatchService(None)
+    results = service.resolve_batch([{'title': 'Ponte Vecchio', 'context': 'Firenze'},
+                                     {'title': 'Unknown place', 'context': ''}])
+    assert [r['classified_attraction'] for r in results] == ['Ponte Vecchio', 'Italia_generic']
+    assert all(r['image']['source'] == 'fallback' for r in results)
+    assert service.resolve_batch([]) == [] and service.connections == 1
+    print("✅ Keyword classification and fallback images without a database")
+
+
+def test_batch_endpoint():
+    original = enhanced_images_routes.resolve_batch_images
+    enhanced_images_routes.resolve_batch_images = BatchService(RecordingConnection(ROWS)).resolve_batch
+    try:
+        app = Flask(__name__)
+        app.register_blueprint(enhanced_images_routes.enhanced_images_bp)
+        response = app.test_client().post('/api/images/batch', json={
+            'attractions': [{'title': 'Pantheon', 'context': 'Roma'}, {'title': 'Colosseo', 'context': 'Roma'}]})
+        body = response.get_json()
+        assert body['success'] and body['total_processed'] == 2
+        assert [r['classified_attraction'] for r in body['results']] == ['Pantheon', 'Colosseo']
+    finally:
+        enhanced_images_routes.resolve_batch_images = original
+    print("✅ /api/images/batch keeps its response shape")
+
+
+if __name__ == "__main__":
+    test_one_query_in_request_order()
+    test_batch_indexes_built_concurrently_outside_requests()
+    test_database_down_falls_back()
+    test_batch_endpoint()
+    print("\n🎉 All batch image tests passed!")
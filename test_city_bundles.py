@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test offline city bundles: versioned gzip files, unchanged rebuilds, deltas
+since a client's version, full resync for pruned versions and the
+/api/offline endpoints (no PostgreSQL required)
+"""
+
+import gzip
+import json
+import tempfile
+
+from flask import Flask
+
+import ux_routes
+from city_bundles import CityBundleBuilder, CityBundleStore, record_hash
+from itinerary_precompiler import PrecomputedItineraryStore
+
+
+def _records(n_attractions=40, rating=4.5):
+    records = [{'id': f'attraction:{i}', 'kind': 'attraction', 'data': {
+                    'name': f'Attrazione {i}', 'category': 'tourism:museum',
+                    'description': 'Museo storico nel centro di Torino ' * 3,
+                    'latitude': 45.07 + i / 1000, 'longitude': 7.68, 'image_url': None}}
+               for i in range(n_attractions)]
+    records.append({'id': 'restaurant:1', 'kind': 'restaurant',
+                    'data': {'name': 'Del Cambio', 'cuisine_type': 'piemontese', 'rating': rating}})
+    records.append({'id': 'hotel:grand hotel sitea', 'kind': 'hotel',
+                    'data': {'name': 'Grand Hotel Sitea', 'average_score': 8.9, 'review_count': 120}})
+    records.append({'id': 'thumbnail:7', 'kind': 'thumbnail',
+                    'data': {'attraction_name': 'Attrazione 1', 'thumb_url': 'https://img/1.jpg', 'width': 320}})
+    return records
+
+
+def test_versions_and_compression():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CityBundleStore(bundle_dir=tmp)
+        first = store.save('Torino', _records())
+        assert first['version'] == 1 and first['counts']['attraction'] == 40
+        assert first['size_bytes'] < first['raw_bytes'] / 3, (first['size_bytes'], first['raw_bytes'])
+
+        # Same content: no new version, no new file
+        assert store.save('torino', list(reversed(_records())))['version'] == 1
+        assert store.stats['bundles_unchanged'] == 1
+
+        bundle = json.loads(gzip.decompress(open(store.bundle_path('Torino', 1), 'rb').read()))
+        assert bundle['version'] == 1 and len(bundle['records']) == 43
+        assert bundle['records'][0]['hash'] == record_hash(bundle['records'][0]['data'])
+        print(f"✅ Bundle v1: {first['raw_bytes']} bytes -> {first['size_bytes']} gzipped, unchanged rebuild skipped")
+
+
+def test_delta_since_client_version():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = CityBundleStore(bundle_dir=tmp, keep_versions=2)
+        store.save('Torino', _records())
+        store.save('Torino', _records(n_attractions=39, rating=4.7))  # one gone, one changed
+
+        delta = store.delta('Torino', 1)
+        assert delta['version'] == 2 and not delta['full']
+        assert [r['id'] for r in delta['changed']] == ['restaurant:1']
+        assert delta['changed'][0]['data']['rating'] == 4.7
+        assert delta['removed'] == ['attraction:39']
+
+        assert store.delta('Torino', 2)['changed'] == []
+
+        # v1 pruned after two more builds: the client gets everything again
+        store.save('Torino', _records(n_attractions=38))
+        store.save('Torino', _records(n_attractions=37))
+        resync = store.delta('Torino', 1)
+        assert resync['full'] and resync['version'] == 4 and len(resync['changed']) == 40
+        assert store.delta('Bari', 1) is None
+        print(f"✅ Delta v1->v2: {len(delta['changed'])} changed, {len(delta['removed'])} removed; "
+              f"pruned version -> full resync")
+
+
+def test_builder_packs_itineraries():
+    itineraries = PrecomputedItineraryStore(database_url='')
+    hub = {'name': 'Piazza Castello', 'latitude': 45.071, 'longitude': 7.686}
+    other = {'name': 'Porta Nuova', 'latitude': 45.062, 'longitude': 7.678}
+    itineraries.save_city('Torino', [{'start_hub': hub, 'end_hub': other, 'duration': 'half_day',
+                                      'profile': 'default', 'itinerary': [{'title': 'Piazza Castello'}]}])
+    builder = CityBundleBuilder(store=CityBundleStore(bundle_dir=tempfile.mkdtemp()), database_url='',
+                                itineraries=itineraries)
+    records = builder.itinerary_records('Torino')
+    assert [r['id'] for r in records] == ['itinerary:Piazza Castello|Porta Nuova|half_day|default']
+    assert records[0]['data']['itinerary'] == [{'title': 'Piazza Castello'}]
+    print("✅ Precomputed itineraries packed as bundle records")
+
+
+def test_offline_endpoints():
+    with tempfile.TemporaryDirectory() as tmp:
+        original = ux_routes.city_bundles
+        store = CityBundleStore(bundle_dir=tmp)
+        ux_routes.city_bundles = store
+        try:
+            app = Flask(__name__)
+            app.register_blueprint(ux_routes.ux_bp)
+            client = app.test_client()
+
+            empty = client.get('/api/offline/status').get_json()
+            assert empty['cached_cities'] == 0 and empty['last_sync'] is None
+
+            store.save('Torino', _records())
+            status = client.get('/api/offline/status').get_json()
+            assert status['cached_cities'] == 1 and status['cached_places'] == 42
+            assert status['last_sync'] == store.manifest('Torino')['built_at']
+
+            response = client.get('/api/offline/bundle/Torino', headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip' and response.headers['X-Bundle-Version'] == '1'
+            assert len(json.loads(gzip.decompress(response.data))['records']) == 43
+            response.close()
+
+            plain = client.get('/api/offline/bundle/Torino')
+            assert 'Content-Encoding' not in plain.headers and plain.get_json()['version'] == 1
+            etag = plain.headers['ETag']
+            assert client.get('/api/offline/bundle/Torino', headers={'If-None-Match': etag}).status_code == 304
+
+            store.save('Torino', _records(rating=4.8))
+            delta = client.get('/api/offline/bundle/Torino/delta?since=1').get_json()
+            assert delta['version'] == 2 and [r['id'] for r in delta['changed']] == ['restaurant:1']
+            assert client.get('/api/offline/bundle/Bari').status_code == 404
+        finally:
+            ux_routes.city_bundles = original
+        print("✅ /api/offline/status reports real bundles; bundle, 304 and delta endpoints")
+
+
+if __name__ == "__main__":
+    test_versions_and_compression()
+    test_delta_since_client_version()
+    test_builder_packs_itineraries()
+    test_offline_endpoints()
+    print("\n🎉 All city bundle tests passed!")
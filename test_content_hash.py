@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test incremental imports by content hash: the hash ignores key order,
+whitespace and volatile fields, the change detector classifies a batch in
+one query, and re-running a loader over unchanged data writes nothing to
+Postgres, ChromaDB or the image pipeline (no PostgreSQL required)
+"""
+
+from unittest import mock
+
+import process_comprehensive_attractions
+from Complete_Missing_Cities import MissingCitiesLoader
+from content_hash import CHANGED, NEW, UNCHANGED, UNTRACKED, ChangeDetector, content_hash
+from test_streaming_import import UpsertConnection, UpsertCursor
+
+COMPREHENSIVE = 'dataset_tourism-it-attractions_2025-10-18_20-46-30-223.json'
+
+
+class HashedConnection(UpsertConnection):
+    """UpsertConnection that also answers ChangeDetector queries from its rows"""
+
+    hash_column = 'content_hash'
+
+    def cursor(self):
+        return HashedCursor(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class HashedCursor(UpsertCursor):
+    def execute(self, sql, params=None):
+        if 'WITH ORDINALITY' not in sql:
+            return super().execute(sql, params)
+        self.conn.round_trip()
+        self.conn.statements.append(sql)
+        *keys, hashes = params
+        self.result = []
+        for i, (key, h) in enumerate(zip(zip(*keys), hashes), 1):
+            row = self.conn.rows.get(tuple(key))
+            if row is not None:
+                stored = row.get(self.conn.hash_column)
+                self.result.append((i, int(stored is not None), 1, stored == h if stored else None))
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.ids = []
+
+    def upsert(self, documents, metadatas, ids):
+        self.ids += ids
+
+
+def test_content_hash_normalization():
+    record = {'name': 'Duomo  di Milano', 'tags': {'tourism': 'attraction', 'wikidata': 'Q18068'},
+              'lat': 45.4641, 'rating': 4.0, 'fetched_at': '2025-11-07T10:00:00'}
+    same = {'rating': 4, 'lat': 45.46410000001, 'tags': {'wikidata': 'Q18068', 'tourism': 'attraction'},
+            'name': ' Duomo di Milano ', 'fetched_at': '2025-11-08T03:00:00', 'website': None}
+    assert content_hash(record) == content_hash(same)
+    assert content_hash(dict(record, name='Duomo di Monza')) != content_hash(record)
+    assert content_hash(dict(record, tags={'tourism': 'museum', 'wikidata': 'Q18068'})) != content_hash(record)
+    assert len(content_hash(record)) == 32 and content_hash(('a', None, 1.5)) != content_hash(('a', 1.5))
+    print(f"✅ Content hash ignores key order, whitespace, fetched_at and float noise: {content_hash(record)}")
+
+
+def test_change_detector_statuses():
+    conn = HashedConnection(('cache_key', 'content_hash'), ('cache_key',), ('content_hash',))
+    conn.rows = {('a',): {'content_hash': 'h-a'}, ('b',): {'content_hash': 'old'}, ('c',): {'content_hash': None}}
+    detector = ChangeDetector(conn, 'place_cache', key=('cache_key',), batch_size=3)
+    statuses = detector.classify([(('a',), 'h-a'), (('b',), 'h-b'), (('c',), 'h-c'), (('d',), 'h-d')])
+
+    assert statuses == [UNCHANGED, CHANGED, UNTRACKED, NEW] and conn.round_trips == 2  # 2 batches
+    assert detector.stats == {NEW: 1, CHANGED: 1, UNCHANGED: 1, UNTRACKED: 1}
+    assert 'unnest(%s, %s::text[]) WITH ORDINALITY AS x(k0, h, i) ' \
+           'LEFT JOIN place_cache ON cache_key = x.k0 GROUP BY x.i' in conn.statements[0]
+    hotels = ChangeDetector(conn, 'hotel_reviews', key=('LOWER(hotel_name)', 'city'), where='content_hash IS NOT NULL')
+    assert 'ON LOWER(hotel_name) = x.k0 AND city = x.k1 AND content_hash IS NOT NULL' in hotels.sql
+    print(f"✅ Change detector: {detector.summary()} in one query per batch")
+
+
+def missing_cities_loader(conn):
+    loader = MissingCitiesLoader.__new__(MissingCitiesLoader)  # no database/ChromaDB connections
+    loader.pg_conn = conn
+    loader.collection = RecordingCollection()
+    return loader
+
+
+def elements(count, renamed=()):
+    return [{'type': 'node', 'id': 9000 + i, 'lat': 45.40 + i / 1e4, 'lon': 11.87,
+             'tags': {'name': f"Luogo {i}" + (' (restaurato)' if i in renamed else ''),
+                      'tourism': 'attraction' if i % 2 else 'museum'}}
+            for i in range(count)]
+
+
+def test_missing_cities_refresh_is_a_no_op():
+    columns = ('cache_key', 'place_data', 'city', 'place_name', 'country', 'priority_level', 'content_hash')
+    conn = HashedConnection(columns, ('cache_key',), ('content_hash',))
+    conn.rows[('padua_luogo_0',)] = {'content_hash': None}  # loaded before hashes existed
+
+    runs = []
+    for changed in ((), (), (3, 7)):
+        loader = missing_cities_loader(conn)
+        conn.round_trips, copies = 0, len(conn.copies)
+        with mock.patch('builtins.print'):
+            assert loader.load_city_data('Padua', elements(400, renamed=changed))
+        runs.append((sum(1 for _, data in conn.copies[copies:] for _ in data.splitlines()),
+                     len(loader.collection.ids), conn.round_trips))
+
+    assert runs[0][:2] == (400, 400)  # first load (the untracked row gets its hash)
+    assert runs[1] == (0, 0, 3)  # unchanged: column check, hash check, commit; nothing written or embedded
+    assert runs[2][:2] == (2, 2)  # renamed places are new keys; the old rows stay
+    assert conn.rows[('padua_luogo_0',)]['content_hash'] is not None
+    print(f"✅ Missing cities refresh: {runs[0][0]} rows -> {runs[1][0]} rows written "
+          f"({runs[1][2]} round trips) when unchanged, {runs[2][0]} when 2 places changed")
+
+
+def test_comprehensive_refresh_skips_images():
+    conn = HashedConnection((), ('osm_id', 'osm_type'), ())
+    upserted, jobs = [], []
+
+    def values_writer(conn, sql, **kwargs):
+        def write(rows):
+            upserted.extend(rows)
+            for row in rows:
+                conn.rows[(row[8], row[9])] = {'content_hash': row[-1]}
+            return len(rows)
+        return write
+
+    class RecordingHarvester:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def run(self, chunk_jobs):
+            jobs.extend(chunk_jobs)
+
+        def report(self):
+            return ''
+
+    processor = process_comprehensive_attractions.ComprehensiveAttractionsProcessor(db_url='postgresql://fake')
+    module = process_comprehensive_attractions
+    with mock.patch.object(processor, 'get_db_connection', return_value=conn), \
+            mock.patch.object(module, 'values_writer', values_writer), \
+            mock.patch.object(module, 'ImageHarvester', RecordingHarvester), \
+            mock.patch.object(module, 'PostgresImageSink'), \
+            mock.patch.object(module, 'ensure_harvest_columns'), \
+            mock.patch.object(module, 'load_known_images'), \
+            mock.patch('builtins.print'):
+        processor.process_dataset(COMPREHENSIVE, chunk_size=500)
+        first = (len(upserted), len(jobs))
+        del upserted[:], jobs[:]
+        processor.process_dataset(COMPREHENSIVE, chunk_size=500)
+
+    assert first[0] > 1000 and first[1] > 100
+    assert upserted == [] and jobs == []
+    print(f"✅ Comprehensive refresh: {first[0]} rows and {first[1]} image jobs on the first run, "
+          f"{len(upserted)} and {len(jobs)} on the unchanged re-run")
+
+
+if __name__ == "__main__":
+    test_content_hash_normalization()
+    test_change_detector_statuses()
+    test_missing_cities_refresh_is_a_no_op()
+    test_comprehensive_refresh_skips_images()
+    print("\n🎉 All content hash tests passed!")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Test cross-source entity resolution: names normalize and geohash blocks
+cover neighbouring cells, one monument stored by place_cache (OSM rows and
+legacy blobs), comprehensive_attractions and attraction_images gets one
+place_id while namesakes and conflicting wikidata ids stay apart, re-runs
+resolve nothing, a bridging record merges two places (but never two
+wikidata items), and the hybrid search
+merge deduplicates by place_id (no PostgreSQL required)
+"""
+
+import csv
+import json
+import time
+from io import StringIO
+from unittest import mock
+
+import simple_rag_helper
+from entity_resolution import (COLUMNS, EntityResolver, distance_m, geohash_cell_size, geohash_encode,
+                               geohash_neighbors, lookup_place_ids, make_record, name_similarity, normalize_name,
+                               same_place)
+
+FLOATS = ('latitude', 'longitude')
+
+
+class EntityConnection:
+    """
+    Source tables as lists of row tuples (key first, city second) and
+    place_entities as a dict, answering the resolver's queries: keyset pages,
+    change detection, candidate blocks, place_id renames, the COPY upsert
+    and read-path lookups. latency is slept on every round trip
+    """
+
+    autocommit = False
+
+    def __init__(self, sources=None, latency=0.0):
+        self.sources = {name: sorted(rows) for name, rows in (sources or {}).items()}
+        self.entities = {}
+        self.staged = []
+        self.latency = latency
+        self.round_trips = 0
+        self.statements = []
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def cursor(self):
+        return EntityCursor(self)
+
+    def commit(self):
+        self.round_trip()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def row(self, entity):
+        return tuple(entity[c] for c in COLUMNS)
+
+
+class EntityCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def execute(self, sql, params=None):
+        conn = self.conn
+        conn.round_trip()
+        conn.statements.append(sql)
+        self.result = []
+        entities = conn.entities
+        if 'to_regclass' in sql:
+            self.result = [(True,)]
+        elif 'ORDER BY' in sql and 'LIMIT %s' in sql:  # keyset page of a source
+            source = next(name for name in conn.sources if f"FROM {name} " in sql)
+            last, *cities, limit = params
+            rows = [row for row in conn.sources[source] if row[0] > last
+                    and (not cities or (row[1] or '').lower() in cities[0])]
+            self.result = rows[:limit]
+        elif 'WITH ORDINALITY' in sql:  # ChangeDetector
+            sources, keys, hashes = params
+            for i, key in enumerate(zip(sources, keys), 1):
+                if key in entities:
+                    stored = entities[key]['record_hash']
+                    self.result.append((i, int(stored is not None), 1, stored == hashes[i - 1]))
+        elif 'block = ANY' in sql:  # candidates
+            blocks, wikidata, osm, tokens, cities = map(set, params[:5])
+            own = set(zip(*params[5:]))
+            self.result = [conn.row(e) for key, e in entities.items()
+                           if e['block'] in blocks or e['wikidata'] in wikidata or e['osm_key'] in osm
+                           or (tokens.intersection(e['name_tokens'].split()) and e['city'] in cities)
+                           or key in own]
+        elif sql.lstrip().startswith('UPDATE'):
+            renames = dict(zip(*params))
+            for e in entities.values():
+                e['place_id'] = renames.get(e['place_id'], e['place_id'])
+        elif sql.startswith('CREATE TEMP TABLE'):
+            conn.staged = []
+        elif 'ON CONFLICT' in sql:  # the sink merge
+            for values in conn.staged:
+                row = {c: (float(v) if c in FLOATS and v else v or None) for c, v in zip(COLUMNS, values)}
+                key = (row['source'], row['source_key'])
+                if key not in entities:
+                    self.result.append((True,))
+                elif any(entities[key][c] != row[c] for c in COLUMNS):
+                    self.result.append((False,))
+                entities[key] = row
+        elif 'UNION ALL' in sql:  # lookup_place_ids
+            ki, kr, ks, kk, oi, orank, ov, wi, wr, wv = params
+            by_key = {(e['source'], e['source_key']): e['place_id'] for e in entities.values()}
+            self.result = [(i, r, by_key[(s, k)]) for i, r, s, k in zip(ki, kr, ks, kk) if (s, k) in by_key]
+            for column, ids, ranks, values in (('osm_key', oi, orank, ov), ('wikidata', wi, wr, wv)):
+                for i, r, v in zip(ids, ranks, values):
+                    self.result += [(i, r, e['place_id']) for e in entities.values() if e[column] == v]
+
+    def copy_expert(self, sql, data):
+        self.conn.round_trip()
+        self.conn.staged = list(csv.reader(StringIO(data.read())))
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def blob(*places):
+    return json.dumps(list(places))
+
+
+def bergamo_sources():
+    """Santa Maria Maggiore in four sources, Cappella Colleoni in two, look-alikes that must stay apart"""
+    place_cache = [
+        ('osm:bergamo:101', 'Bergamo', 'Basilica di Santa Maria Maggiore', json.dumps({
+            'name': 'Basilica di Santa Maria Maggiore', 'osm_id': 101, 'osm_type': 'node', 'wikidata': 'Q1',
+            'geometry': {'location': {'lat': 45.70373, 'lng': 9.66245}}})),
+        ('osm:bergamo:102', 'Bergamo', 'Cappella Colleoni', json.dumps({
+            'name': 'Cappella Colleoni', 'osm_id': 102, 'osm_type': 'node', 'wikidata': '',
+            'geometry': {'location': {'lat': 45.70358, 'lng': 9.66210}}})),
+        ('bergamo_tourist_attraction', 'Bergamo', 'Bergamo tourist_attraction', blob(
+            {'name': 'Basilica Santa Maria Maggiore', 'lat': 45.70385, 'lng': 9.66250, 'rating': 4.8},
+            {'name': 'Torre Civica', 'wikidata': 'Q2', 'lat': 45.70380, 'lng': 9.66270},
+            {'name': 'Rocca', 'lat': 45.70520, 'lng': 9.66630})),
+        ('bergamo_restaurant', 'Bergamo', 'Bergamo restaurant', blob(
+            {'name': 'Trattoria da Mario', 'lat': 45.6950, 'lng': 9.6700},
+            {'name': 'Trattoria da Mario', 'lat': 45.7100, 'lng': 9.6500})),
+    ]
+    attractions = [
+        (1, 'Bergamo', 'Santa Maria Maggiore', 45.70390, 9.66240, 'way', 555, 'Q1'),
+        (2, 'Bergamo', 'Cappella Colleoni (Bergamo)', 45.70345, 9.66225, None, None, None),
+        (3, 'Bergamo', 'Torre Civica', 45.70382, 9.66268, 'node', 777, 'Q3'),
+    ]
+    images = [
+        (10, 'Bergamo', 'Basilica di Santa Maria Maggiore', 'Q1'),
+        (11, 'Bergamo', 'Rocca Veneziana', 'Q9'),
+    ]
+    return {'place_cache': place_cache, 'comprehensive_attractions': attractions, 'attraction_images': images}
+
+
+def place_ids(conn):
+    return {key: e['place_id'] for key, e in conn.entities.items()}
+
+
+def test_normalization_and_blocks():
+    assert normalize_name("Caffè dell'Arte") == 'caffe arte'
+    assert normalize_name('Basilica di Santa Maria Maggiore') == normalize_name('BASILICA  Santa Maria-Maggiore')
+    assert name_similarity('cappella colleoni', 'cappella colleoni bergamo') > 0.8
+    assert name_similarity('trattoria mario', 'pizzeria napoli') < 0.5
+    assert geohash_encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+    cells = geohash_neighbors(45.70373, 9.66245)
+    assert len(cells) == 15 and geohash_encode(45.70373, 9.66245, 7) in cells  # 3 rows x 5 columns at 45°N
+    dlat, dlon = geohash_cell_size(7)
+    assert 150 < dlat * 111320 < 155 and geohash_encode(45.70373 + dlat, 9.66245 - 2 * dlon, 7) in cells
+    assert 30 < distance_m(45.70373, 9.66245, 45.70358, 9.66210) < 32
+
+    duomo = make_record('x', '1', 'Milano', 'Duomo di Milano', 45.4642, 9.1900, 'Q18068')
+    other = make_record('y', '2', 'Milano', 'Duomo di Milano', 45.4642, 9.1900, 'Q999')
+    assert not same_place(duomo, other)  # conflicting wikidata ids
+    print(f"✅ Names normalize, geohash blocks cover 150 m around a place ({len(cells)} cells: {cells[0]}, ...)")
+
+
+def test_resolution_across_sources():
+    conn = EntityConnection(bergamo_sources())
+    resolver = EntityResolver(conn, batch_size=3)
+    with mock.patch('builtins.print'):
+        stats = dict(resolver.run())
+    ids = place_ids(conn)
+
+    maria = {ids[('place_cache', 'osm:bergamo:101')], ids[('comprehensive_attractions', '1')],
+             ids[('attraction_images', '10')],
+             ids[('place_cache', 'bergamo_tourist_attraction#basilica santa maria maggiore')]}
+    assert maria == {'wd:Q1'}
+    assert ids[('place_cache', 'osm:bergamo:102')] == ids[('comprehensive_attractions', '2')] == 'osm:node/102'
+    assert ids[('place_cache', 'bergamo_tourist_attraction#torre civica')] == 'wd:Q2'
+    assert ids[('comprehensive_attractions', '3')] == 'wd:Q3'  # same name and spot, another wikidata item
+    assert ids[('place_cache', 'bergamo_tourist_attraction#rocca')] != ids[('attraction_images', '11')]
+    assert len(set(ids.values())) == 7 and stats['resolved'] == len(ids) == 11
+    assert len(conn.entities) == 11 and ('place_cache', 'bergamo_restaurant#trattoria mario') in conn.entities
+
+    conn.round_trips, conn.statements = 0, []
+    again = EntityResolver(conn, batch_size=3)
+    again.run()
+    assert again.stats['resolved'] == 0 and again.stats['unchanged'] == 11
+    assert not any('ON CONFLICT' in sql or 'block = ANY' in sql for sql in conn.statements)
+    print(f"✅ 11 records from 3 sources -> 7 places; unchanged re-run: {again.summary()} "
+          f"({conn.round_trips} round trips)")
+
+
+def test_bridging_record_merges_places():
+    conn = EntityConnection(bergamo_sources())
+    with mock.patch('builtins.print'):
+        EntityResolver(conn).run()
+    rocca_blob = conn.entities[('place_cache', 'bergamo_tourist_attraction#rocca')]['place_id']
+    assert rocca_blob.startswith('pl:')
+
+    # The OSM import adds the Rocca with its wikidata id, next to the blob entry
+    conn.sources['place_cache'].append(('osm:bergamo:300', 'Bergamo', 'Rocca di Bergamo', json.dumps({
+        'name': 'Rocca di Bergamo', 'osm_id': 300, 'osm_type': 'way', 'wikidata': 'Q9',
+        'center': {'lat': 45.70525, 'lon': 9.66625}})))
+    conn.sources['place_cache'].sort()
+    resolver = EntityResolver(conn)
+    resolver.run(sources=['place_cache'], cities=['Bergamo'])
+    ids = place_ids(conn)
+
+    assert resolver.stats['resolved'] == 1 and resolver.stats['merged'] == 1
+    assert ids[('place_cache', 'bergamo_tourist_attraction#rocca')] == ids[('attraction_images', '11')] == \
+        ids[('place_cache', 'osm:bergamo:300')] == 'wd:Q9'
+    assert rocca_blob not in ids.values()
+    print(f"✅ New record bridging two places merged them under wd:Q9: {resolver.summary()}")
+
+
+def test_record_near_two_wikidata_items_merges_neither():
+    conn = EntityConnection(bergamo_sources())
+    with mock.patch('builtins.print'):
+        EntityResolver(conn).run()
+
+    # An OSM Torre Civica without a wikidata id matches both stored towers (wd:Q2 and wd:Q3)
+    conn.sources['place_cache'].append(('osm:bergamo:400', 'Bergamo', 'Torre Civica', json.dumps({
+        'name': 'Torre Civica', 'osm_id': 400, 'osm_type': 'node',
+        'geometry': {'location': {'lat': 45.70381, 'lng': 9.66269}}})))
+    conn.sources['place_cache'].sort()
+    conn.statements = []
+    resolver = EntityResolver(conn)
+    resolver.run(sources=['place_cache'], cities=['Bergamo'])
+    ids = place_ids(conn)
+
+    assert ids[('place_cache', 'bergamo_tourist_attraction#torre civica')] == 'wd:Q2'
+    assert ids[('comprehensive_attractions', '3')] == 'wd:Q3'
+    assert ids[('place_cache', 'osm:bergamo:400')] in ('wd:Q2', 'wd:Q3') and resolver.stats['merged'] == 0
+    assert not any(sql.lstrip().startswith('UPDATE') for sql in conn.statements)  # no wd: id renamed
+    print(f"✅ Record between two wikidata items linked to one of them, items kept apart: {resolver.summary()}")
+
+
+def test_hybrid_merge_deduplicates_by_place_id():
+    conn = EntityConnection(bergamo_sources())
+    with mock.patch('builtins.print'):
+        EntityResolver(conn).run()
+
+    traditional = [
+        {'name': 'Basilica di Santa Maria Maggiore', 'osm_id': 101, 'osm_type': 'node', 'search_source': 'traditional',
+         'category_match': 'tourist_attraction'},
+        {'name': 'Basilica Santa Maria Maggiore', 'search_source': 'traditional', 'category_match': 'tourist_attraction'},
+        {'name': 'Torre Civica', 'wikidata': 'Q2', 'search_source': 'traditional'},
+        {'name': 'Torre Civica', 'wikidata_id': 'Q3', 'search_source': 'traditional'},
+    ]
+    semantic = [
+        {'name': 'Santa Maria Maggiore', 'osm_id': '101', 'relevance_score': 0.91, 'search_source': 'semantic'},
+        {'name': 'Cappella Colleoni (Bergamo)', 'relevance_score': 0.8, 'search_source': 'semantic'},
+        {'name': 'Museo Ignoto', 'relevance_score': 0.5, 'search_source': 'semantic'},
+        {'name': 'Museo  ignoto', 'relevance_score': 0.4, 'search_source': 'semantic'},
+    ]
+    assert lookup_place_ids(conn.cursor(), traditional[:2] + semantic[:1], 'Bergamo') == ['wd:Q1'] * 3
+
+    helper = simple_rag_helper.OptimizedRAGHelper.__new__(simple_rag_helper.OptimizedRAGHelper)
+    helper.database_url = 'postgresql://fake'
+    with mock.patch.object(simple_rag_helper.psycopg2, 'connect', return_value=conn):
+        merged = helper._merge_search_results(traditional, semantic, 'Bergamo')
+
+    names = [p['name'] for p in merged]
+    assert names == ['Basilica di Santa Maria Maggiore', 'Torre Civica', 'Torre Civica',
+                     'Cappella Colleoni (Bergamo)', 'Museo Ignoto'], names
+    assert merged[0]['place_id'] == 'wd:Q1' and merged[0]['semantic_enhanced'] and merged[0]['relevance_score'] == 0.91
+    assert {merged[1]['place_id'], merged[2]['place_id']} == {'wd:Q2', 'wd:Q3'}
+
+    helper.database_url = None  # no database: name fallback only
+    plain = helper._merge_search_results([dict(p) for p in traditional], [dict(p) for p in semantic])
+    assert [p['name'] for p in plain].count('Torre Civica') == 1 and len(plain) == 5
+    print(f"✅ Hybrid merge: {len(traditional) + len(semantic)} results -> {len(merged)} places by place_id "
+          f"(by name alone: {len(plain)}, one Torre Civica lost and Santa Maria Maggiore twice)")
+
+
+if __name__ == "__main__":
+    test_normalization_and_blocks()
+    test_resolution_across_sources()
+    test_bridging_record_merges_places()
+    test_record_near_two_wikidata_items_merges_neither()
+    test_hybrid_merge_deduplicates_by_place_id()
+    print("\n🎉 All entity resolution tests passed!")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test the shared outbound HTTP client against a local stub server: connection
+reuse, per-host concurrency limits, retry policy, async façade and histograms
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import HTTPClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b'{"ok": true}', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        server = self.server
+        with server.lock:
+            server.ports.add(self.client_address[1])
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            hits = server.hits[self.path]
+        try:
+            if self.path.startswith('/slow'):
+                time.sleep(0.1)
+            if self.path.startswith('/flaky') and hits < 3:
+                return self._reply(503, b'{}', {'Retry-After': '0'})
+            self._reply(200)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._handle()
+
+
+def start_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.ports, server.hits = set(), {}
+    server.in_flight = server.max_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_keep_alive_reuses_connections():
+    server, base = start_stub()
+    client = HTTPClient(host_limits='')
+    for _ in range(20):
+        assert client.get(f"{base}/ping").status_code == 200
+    assert len(server.ports) == 1, server.ports
+    client.close()
+    server.shutdown()
+    print("✅ 20 sequential calls reused one keep-alive connection")
+
+
+def test_per_host_concurrency_limit():
+    server, base = start_stub()
+    client = HTTPClient(host_limits='127.0.0.1=2')
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(lambda i: client.get(f"{base}/slow/{i}").status_code, range(8)))
+    assert statuses == [200] * 8
+    assert server.max_in_flight == 2, server.max_in_flight
+    client.close()
+    server.shutdown()
+    print("✅ Per-host limit caps concurrent requests at 2")
+
+
+def test_retry_policy():
+    server, base = start_stub()
+    client = HTTPClient(host_limits='', retries=3)
+
+    assert client.get(f"{base}/flaky-get").status_code == 200
+    assert server.hits['/flaky-get'] == 3
+
+    # POST is not retried unless asked for explicitly
+    assert client.post(f"{base}/flaky-post", data='[out:json];').status_code == 503
+    assert client.post(f"{base}/flaky-post", data='[out:json];', retries=2).status_code == 200
+
+    stats = client.get_stats()['upstreams']['127.0.0.1']
+    assert stats['retries'] == 3 and stats['statuses'][503] == 4
+    client.close()
+    server.shutdown()
+    print("✅ GET retried on 503, POST only when requested")
+
+
+def test_async_facade_and_histogram():
+    server, base = start_stub()
+    client = HTTPClient(host_limits='127.0.0.1=3')
+
+    async def run():
+        async with client.async_session(timeout=5.0) as session:
+            responses = await asyncio.gather(*(session.get(f"{base}/slow/a{i}") for i in range(9)))
+        await client.aclose()
+        return [r.json()['ok'] for r in responses]
+
+    assert asyncio.run(run()) == [True] * 9
+    assert server.max_in_flight == 3
+
+    stats = client.get_stats()['upstreams']['127.0.0.1']
+    assert stats['requests'] == 9 and sum(stats['histogram'].values()) == 9
+    assert stats['latency_ms_p50'] >= 100
+    server.shutdown()
+    print(f"✅ Async façade shares limits; p50 {stats['latency_ms_p50']} ms recorded")
+
+
+if __name__ == "__main__":
+    test_keep_alive_reuses_connections()
+    test_per_host_concurrency_limit()
+    test_retry_policy()
+    test_async_facade_and_histogram()
+    print("\n🎉 All HTTP client tests passed!")
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Test the image harvester against a local fixture HTTP server: bounded
+concurrency with per-host limits, URL fallback, Retry-After, exact and
+perceptual dedup across sources, batched writes and resume from the
+checkpoint file (no PostgreSQL or network required)
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+
+from image_blob_store import ImageBlobStore
+from image_harvester import Checkpoint, ImageHarvester, PerceptualIndex, from_signed64
+
+
+def make_image(seed: int, size=(320, 240), quality=90) -> bytes:
+    """Distinct blocky picture per seed (random 12x9 grid scaled up)"""
+    rng = random.Random(seed)
+    grid = Image.frombytes('RGB', (12, 9), bytes(rng.randrange(256) for _ in range(12 * 9 * 3)))
+    buffer = BytesIO()
+    grid.resize(size, Image.Resampling.BICUBIC).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+class FixtureServer:
+    """
+    Threaded HTTP server for {path: bytes}; unknown paths are 404, paths in
+    throttle answer 429 with Retry-After once. Tracks requests and the peak
+    number of concurrent requests per Host header
+    """
+
+    def __init__(self, files, latency: float = 0.02, throttle=()):
+        self.files = files
+        self.latency = latency
+        self.throttle = set(throttle)
+        self.requests = {}
+        self.active = {}
+        self.peak = {}
+        self.lock = threading.Lock()
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                host = self.headers.get('Host')
+                with fixture.lock:
+                    fixture.requests[self.path] = fixture.requests.get(self.path, 0) + 1
+                    fixture.active[host] = fixture.active.get(host, 0) + 1
+                    fixture.peak[host] = max(fixture.peak.get(host, 0), fixture.active[host])
+                    throttled = self.path in fixture.throttle
+                    fixture.throttle.discard(self.path)
+                try:
+                    time.sleep(fixture.latency)
+                    body = fixture.files.get(self.path)
+                    if throttled:
+                        self.send_response(429)
+                        self.send_header('Retry-After', '0')
+                        body = b''
+                    elif body is None:
+                        self.send_response(404)
+                        body = b''
+                    else:
+                        self.send_response(200)
+                        self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with fixture.lock:
+                        fixture.active[host] -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def url(self, path: str, host: str = '127.0.0.1') -> str:
+        return f"http://{host}:{self.port}{path}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ListSink:
+    """Keeps written batches; fail_after makes the n-th write raise (a crash mid-run)"""
+
+    def __init__(self, fail_after=None):
+        self.batches = []
+        self.fail_after = fail_after
+
+    def write(self, rows):
+        if self.fail_after is not None and len(self.batches) >= self.fail_after:
+            raise RuntimeError('connection lost')
+        self.batches.append(list(rows))
+        return len(rows)
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+def job(key, *urls, **row):
+    return {'key': key, 'urls': list(urls), 'row': dict(row, source_id=key)}
+
+
+def test_concurrent_harvest_with_dedup():
+    files = {f'/img/{i}.jpg': make_image(i) for i in range(24)}
+    files['/broken.jpg'] = b'<html>not an image</html>'
+    near = Image.open(BytesIO(files['/img/3.jpg'])).resize((300, 225))
+    buffer = BytesIO()
+    near.save(buffer, format='JPEG', quality=60)
+    files['/near/3.jpg'] = buffer.getvalue()
+
+    with FixtureServer(files, latency=0.05) as server, tempfile.TemporaryDirectory() as tmp:
+        jobs = [job(f'wikimedia:{i}', server.url(f'/img/{i}.jpg', '127.0.0.1' if i % 2 else 'localhost'))
+                for i in range(24)]
+        jobs += [
+            job('openverse:same-bytes', server.url('/img/5.jpg', 'localhost')),  # exact duplicate, other source
+            job('openverse:recompressed', server.url('/near/3.jpg')),  # perceptual duplicate
+            job('openverse:fallback', server.url('/missing.jpg'), server.url('/img/23.jpg')),
+            job('openverse:broken', server.url('/broken.jpg')),
+        ]
+        sink = ListSink()
+        harvester = ImageHarvester(sink, Checkpoint(os.path.join(tmp, 'run.checkpoint')),
+                                   concurrency=8, per_host=2, host_interval=0, decode_workers=2,
+                                   batch_size=10, store=ImageBlobStore(os.path.join(tmp, 'blobs')),
+                                   hash_columns=('sha256',))
+        stats = harvester.run(jobs)
+
+        assert stats['stored'] == 24 and len(sink.rows) == 24
+        assert stats['duplicates'] == 2  # same bytes from another source, /img/23.jpg via the fallback
+        assert stats['near_duplicates'] == 1 and stats['failed'] == 1
+        assert max(server.peak.values()) <= 2 and len(server.peak) == 2  # per-host cap on both hosts
+        assert all(len(batch) <= 10 for batch in sink.batches) and len(sink.batches) == 3
+        row = sink.rows[0]
+        assert row['sha256'] == row['blob_sha256'] and harvester.store.exists(row['blob_sha256'])
+        assert row['width'] == 320 and row['mime_type'] == 'image/jpeg' and isinstance(row['phash'], int)
+        assert stats['images_per_min'] > 0
+        print(f"✅ 28 jobs over 2 hosts (peak {max(server.peak.values())} per host): "
+              f"{stats['stored']} stored, {stats['duplicates']} exact + {stats['near_duplicates']} perceptual "
+              f"duplicates, {stats['failed']} broken — {stats['images_per_min']:.0f} images/min")
+
+
+def test_resume_from_checkpoint():
+    files = {f'/img/{i}.jpg': make_image(100 + i) for i in range(30)}
+    with FixtureServer(files, latency=0.01, throttle=['/img/7.jpg']) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        jobs = [job(f'apify:{i}', server.url(f'/img/{i}.jpg')) for i in range(30)]
+        path = os.path.join(tmp, 'apify.checkpoint')
+        store = ImageBlobStore(os.path.join(tmp, 'blobs'))
+        options = dict(concurrency=4, per_host=4, host_interval=0, decode_workers=0, batch_size=8, store=store,
+                       reencode=True, max_size=(160, 160), min_size=100, hash_columns=('sha256_hash',))
+
+        first = ListSink(fail_after=2)  # crash on the third batch
+        try:
+            ImageHarvester(first, Checkpoint(path), **options).run(jobs)
+            raise AssertionError('the sink failure should propagate')
+        except RuntimeError:
+            pass
+        checkpoint = Checkpoint(path)
+        assert len(checkpoint.done) == 16 and len(first.rows) == 16
+
+        # A new run knows the stored images (from the DB in production) and skips finished jobs
+        index = PerceptualIndex()
+        for row in first.rows:
+            index.add(from_signed64(row['phash']), row['blob_sha256'])
+        requested = dict(server.requests)
+        second = ListSink()
+        stats = ImageHarvester(second, checkpoint, index=index, **options).run(jobs)
+
+        assert stats['skipped'] == 16 and stats['stored'] == 14
+        assert {row['source_id'] for row in first.rows + second.rows} == {f'apify:{i}' for i in range(30)}
+        refetched = [p for p in files if server.requests.get(p, 0) > requested.get(p, 0)]
+        assert len(refetched) == 14  # finished jobs were not downloaded again
+        assert server.requests['/img/7.jpg'] >= 2  # 429 + Retry-After, then served
+        assert max(row['width'] for row in second.rows) <= 160 and second.rows[0]['mime_type'] == 'image/jpeg'
+        assert len(Checkpoint(path).done) == 30
+        print(f"✅ Crash after 2 batches: resumed with {stats['skipped']} jobs skipped, "
+              f"{stats['stored']} downloaded, 429 retried after Retry-After")
+
+
+def test_perceptual_index():
+    index = PerceptualIndex(distance=6)
+    base = 0xF0F0_1234_ABCD_5678
+    index.add(base, 'a' * 64)
+    assert index.near(base ^ 0b1011) == base  # 3 bits apart
+    assert index.near(base ^ 0x0101_0101_0101_0000) == base  # 6 bits spread over 6 bytes
+    assert index.near(base ^ 0x0101_0101_0101_0100) is None  # 7 bits
+    assert index.near(base ^ 0xFF) is None  # 8 bits in one byte
+    assert index.near(~base & (2 ** 64 - 1)) is None
+    try:
+        PerceptualIndex(distance=8)
+        raise AssertionError('distance 8 cannot be guaranteed by 8 bands')
+    except ValueError:
+        pass
+    print("✅ Perceptual index: near matches within the distance, banded lookup")
+
+
+if __name__ == "__main__":
+    test_concurrent_harvest_with_dedup()
+    test_resume_from_checkpoint()
+    test_perceptual_index()
+    print("\n🎉 All image harvester tests passed!")
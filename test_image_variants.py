@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test image variants: width ladder and format negotiation, process-pool
+rendering, single render under concurrent requests, byte-bounded LRU disk
+cache, immutable serving and variant URLs for callers (no PostgreSQL required)
+"""
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import httpx
+from flask import Flask
+from PIL import Image
+
+import http_client
+import image_storage_routes
+import image_variants
+from image_blob_store import ImageBlobStore
+from image_variants import (ImageVariantService, VariantCache, fetch_remote_source, negotiate_format,
+                            snap_width, variant_url)
+
+
+def _jpeg(width=1600, height=1000):
+    buffer = BytesIO()
+    Image.frombytes('RGB', (width, height), os.urandom(width * height * 3)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def test_ladder_and_formats():
+    assert snap_width(80) == 80 and snap_width(81) == 160 and snap_width(5000) == 1600
+    assert snap_width(None) == 320
+    assert negotiate_format('auto', 'image/webp,image/*') == 'webp'
+    assert negotiate_format('auto', 'text/html') == 'jpeg'
+    assert negotiate_format('jpg') == 'jpeg'
+
+    assert variant_url('/api/images/attraction/12', 75) == '/api/images/attraction/12?w=80&fmt=auto'
+    assert variant_url('/api/images/attraction/12', 300, blob_sha256='ab' * 32) == \
+        f"/api/images/variant/{'ab' * 32}?w=320&fmt=auto"
+    assert variant_url('https://upload.wikimedia.org/a/b.jpg', 640).startswith(
+        '/api/images/variant?url=https%3A%2F%2Fupload.wikimedia.org%2Fa%2Fb.jpg&w=640')
+    assert variant_url('https://evil.example/x.jpg', 640) == 'https://evil.example/x.jpg'
+    assert variant_url('data:image/svg+xml;base64,AA', 80).startswith('data:')
+    assert variant_url('https://upload.wikimedia.org/a/b.jpg', None) == 'https://upload.wikimedia.org/a/b.jpg'
+    print("✅ Width ladder, format negotiation and variant URLs")
+
+
+def test_render_once_and_cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        service = ImageVariantService(cache=VariantCache(root=tmp), workers=2)
+        source = _jpeg()
+        loads = []
+
+        def load():
+            loads.append(1)
+            return source
+
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(lambda _: service.get_variant('sha256:x', load, 150, 'webp'), range(8)))
+        finally:
+            service.shutdown()
+
+        assert len({r[0] for r in results}) == 1 and len(loads) == 1
+        assert service.stats['renders'] == 1
+        with Image.open(results[0][0]) as img:
+            assert img.format == 'WEBP' and img.size == (160, 100)
+        saved = 1 - service.stats['variant_bytes'] / service.stats['source_bytes']
+        print(f"✅ 8 concurrent requests, one render in the process pool ({saved:.0%} smaller than the source)")
+
+
+def test_lru_eviction_by_bytes():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = VariantCache(root=tmp, max_bytes=2500)
+        cache.put('a.webp', b'a' * 1000)
+        cache.put('b.webp', b'b' * 1000)
+        assert cache.get('a.webp')  # a is now the most recently used
+        cache.put('c.webp', b'c' * 1000)
+        assert cache.get('b.webp') is None and cache.get('a.webp') and cache.get('c.webp')
+        assert sorted(os.listdir(tmp)) == ['a.webp', 'c.webp']
+        assert cache.get_stats()['bytes'] == 2000 and cache.stats['evictions'] == 1
+
+        # A restart picks up what is on disk
+        assert VariantCache(root=tmp, max_bytes=2500).get_stats()['files'] == 2
+        print("✅ LRU eviction by total bytes, cache survives restarts")
+
+
+def test_variant_endpoint_is_immutable():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ImageBlobStore(root=os.path.join(tmp, 'blobs'))
+        sha = store.put(_jpeg())
+        service = ImageVariantService(cache=VariantCache(root=os.path.join(tmp, 'variants')), workers=1)
+
+        originals = image_storage_routes.blob_store, image_storage_routes.image_variants
+        image_storage_routes.blob_store, image_storage_routes.image_variants = store, service
+        try:
+            app = Flask(__name__)
+            app.register_blueprint(image_storage_routes.image_routes_bp)
+            client = app.test_client()
+
+            response = client.get(f'/api/images/variant/{sha}?w=80', headers={'Accept': 'image/webp'})
+            assert response.status_code == 200 and response.mimetype == 'image/webp'
+            assert 'immutable' in response.headers['Cache-Control'] and response.headers['Vary'] == 'Accept'
+            etag = response.headers['ETag']
+            response.close()
+
+            again = client.get(f'/api/images/variant/{sha}?w=80', headers={'Accept': 'image/webp',
+                                                                          'If-None-Match': etag})
+            assert again.status_code == 304
+
+            jpeg = client.get(f'/api/images/variant/{sha}?w=640&fmt=jpeg')
+            with Image.open(BytesIO(jpeg.data)) as img:
+                assert img.format == 'JPEG' and img.width == 640
+            assert 'Vary' not in jpeg.headers
+            jpeg.close()
+
+            assert client.get('/api/images/variant/not-a-hash?w=80').status_code == 400
+            assert client.get(f"/api/images/variant/{'0' * 64}?w=80").status_code == 404
+            assert client.get('/api/images/variant?url=http://127.0.0.1/x.jpg&w=80').status_code == 400
+            assert service.stats['renders'] == 2
+        finally:
+            image_storage_routes.blob_store, image_storage_routes.image_variants = originals
+            service.shutdown()
+        print("✅ Variant endpoint: immutable caching, 304, explicit formats, host allowlist")
+
+
+class CountingStream(httpx.SyncByteStream):
+    """Response body of `chunks` x 1 KB that records how many chunks were read"""
+
+    def __init__(self, chunks):
+        self.chunks, self.read = chunks, 0
+
+    def __iter__(self):
+        for _ in range(self.chunks):
+            self.read += 1
+            yield b'x' * 1024
+
+
+def test_remote_source_redirects_and_size_cap():
+    requested, bodies = [], {'chunked': CountingStream(40), 'declared': CountingStream(40)}
+
+    def handler(request):
+        requested.append(str(request.url))
+        path = request.url.path
+        if path == '/ok.jpg':
+            return httpx.Response(200, content=b'jpeg bytes')
+        if path == '/hop':
+            return httpx.Response(302, headers={'Location': 'https://images.unsplash.com/ok.jpg'})
+        if path == '/escape':
+            return httpx.Response(302, headers={'Location': 'http://169.254.169.254/latest/meta-data'})
+        if path == '/loop':
+            return httpx.Response(301, headers={'Location': '/loop'})
+        if path == '/declared':
+            return httpx.Response(200, headers={'Content-Length': str(40 * 1024)}, stream=bodies['declared'])
+        return httpx.Response(200, stream=bodies['chunked'])
+
+    client = http_client.HTTPClient(retries=0)
+    client._sync_client = httpx.Client(transport=httpx.MockTransport(handler))
+    original, image_variants.MAX_SOURCE_BYTES = image_variants.MAX_SOURCE_BYTES, 16 * 1024
+    http_client.http, shared = client, http_client.http
+    try:
+        assert fetch_remote_source('https://upload.wikimedia.org/ok.jpg') == b'jpeg bytes'
+        assert fetch_remote_source('https://upload.wikimedia.org/hop') == b'jpeg bytes'
+        assert fetch_remote_source('https://upload.wikimedia.org/escape') is None
+        assert not any('169.254' in url for url in requested), "redirect target must be checked first"
+        assert fetch_remote_source('https://upload.wikimedia.org/loop') is None
+        assert requested.count('https://upload.wikimedia.org/loop') == image_variants.MAX_REDIRECTS + 1
+
+        assert fetch_remote_source('https://upload.wikimedia.org/declared') is None
+        assert bodies['declared'].read == 0, "oversized Content-Length rejected before reading"
+        assert fetch_remote_source('https://upload.wikimedia.org/chunked') is None
+        assert bodies['chunked'].read == 17, "streaming stops at the byte cap"
+    finally:
+        http_client.http, image_variants.MAX_SOURCE_BYTES = shared, original
+    print("✅ Remote sources: allowlist checked on every redirect hop, streamed byte cap")
+
+
+if __name__ == "__main__":
+    test_ladder_and_formats()
+    test_render_once_and_cache()
+    test_lru_eviction_by_bytes()
+    test_variant_endpoint_is_immutable()
+    test_remote_source_redirects_and_size_cap()
+    print("\n🎉 All image variant tests passed!")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test the itinerary precompiler on a synthetic city: hub selection, route
+optimization, exact/nearest lookups and fallback for novel inputs
+(no PostgreSQL required)
+"""
+
+import time
+
+from itinerary_precompiler import (ItineraryPrecompiler, PrecomputedItineraryStore, choose_stops,
+                                   haversine_km, normalize_place, profile_for, select_hubs)
+
+CENTER = (45.0703, 7.6869)
+
+
+def _attraction(name, category, dlat, dlon, image=True):
+    return {'name': name, 'category': category, 'description': f'{name} a Torino',
+            'latitude': CENTER[0] + dlat, 'longitude': CENTER[1] + dlon,
+            'image_url': f'https://img/{name}.jpg' if image else None, 'source': 'comprehensive_attractions'}
+
+
+ATTRACTIONS = [
+    _attraction('Stazione di Porta Nuova', 'railway:station', -0.008, -0.007),
+    _attraction('Piazza Castello', 'tourism:square', 0.001, 0.0),
+    _attraction('Piazza San Carlo', 'tourism:square', -0.003, -0.003),
+    _attraction('Museo Egizio', 'tourism:museum', -0.002, -0.002),
+    _attraction('Palazzo Reale', 'historic:palace', 0.002, 0.0005),
+    _attraction('Mole Antonelliana', 'tourism:attraction', 0.0, 0.006),
+    _attraction('Parco del Valentino', 'leisure:park', -0.012, 0.004),
+    _attraction('Duomo di Torino', 'building:church', 0.003, -0.001),
+    _attraction('Galleria Sabauda', 'tourism:gallery', 0.002, -0.0005, image=False),
+    _attraction('Bicerin', 'amenity:cafe', 0.004, -0.002),
+    _attraction('Superga', 'tourism:attraction', 0.01, 0.09),  # far: never a detour candidate
+]
+
+
+def build_store():
+    store = PrecomputedItineraryStore(database_url='')
+    compiler = ItineraryPrecompiler(store=store, database_url='', hubs_per_city=4)
+    entries = compiler.compile_city('Torino', ATTRACTIONS)
+    store.save_city('Torino', entries)
+    return store, entries
+
+
+def test_hubs_and_routes():
+    hubs = select_hubs('Torino', ATTRACTIONS, CENTER, limit=4)
+    assert [h['name'] for h in hubs] == ['Stazione di Porta Nuova', 'Piazza Castello',
+                                         'Piazza San Carlo', 'Centro Torino']
+
+    start, end = (hubs[0]['latitude'], hubs[0]['longitude']), (hubs[1]['latitude'], hubs[1]['longitude'])
+    stops = choose_stops(start, end, ATTRACTIONS, 'half_day', exclude=('Stazione di Porta Nuova', 'Piazza Castello'))
+    names = [s['name'] for s in stops]
+    assert len(names) == 4 and 'Superga' not in names
+
+    # Ordered stops are never longer than the order they were picked in
+    def length(order):
+        points = [start] + [(s['latitude'], s['longitude']) for s in order] + [end]
+        return sum(haversine_km(points[i], points[i + 1]) for i in range(len(points) - 1))
+    assert length(stops) <= length(sorted(stops, key=lambda s: s['name'])) + 1e-9
+    print(f"✅ Hubs selected and route optimized ({length(stops):.2f} km): {names}")
+
+
+def test_exact_and_nearest_lookup():
+    store, entries = build_store()
+    # 4 hubs x 4 hubs x 2 durations for default and culture (one park, one cafe: too few)
+    assert len(entries) == 64 and {e['profile'] for e in entries} == {'default', 'culture'}
+
+    exact = store.lookup('torino', 'Stazione di Porta Nuova', 'Piazza Castello', 'half_day', ['arte', 'storia'])
+    assert exact['match'] == 'exact' and exact['profile'] == 'culture'
+    assert exact['itinerary'][0]['type'] == 'start' and exact['itinerary'][-1]['title'] == 'Piazza Castello'
+    assert all(stop.get('category') != 'amenity:cafe' for stop in exact['itinerary'])
+
+    # City suffix, missing article and a typo still match the hubs
+    nearest = store.lookup('Torino', 'Porta Nuova, Torino', 'Piaza Castello', 'full_day', ['arte'])
+    assert nearest['match'] == 'nearest' and nearest['start_hub'] == 'Stazione di Porta Nuova'
+    assert nearest['end_hub'] == 'Piazza Castello' and nearest['duration'] == 'full_day'
+    assert nearest['itinerary'][0]['title'] == 'Porta Nuova, Torino'  # user's own label
+
+    # No food routes for this city: the default profile is served instead
+    food = store.lookup('Torino', 'centro', 'Piazza San Carlo', 'half_day', ['cibo'])
+    assert food['start_hub'] == 'Centro Torino' and food['profile'] == 'default'
+
+    assert store.lookup('Torino', 'Via Garibaldi 1', 'Piazza Castello') is None
+    assert store.lookup('Bari', 'Stazione Centrale', 'Piazza Ferrarese') is None
+
+    stats = store.get_stats()
+    assert stats['exact'] == 1 and stats['nearest'] == 2 and stats['misses'] == 2
+    print(f"✅ Exact and nearest matches served, novel inputs fall through ({stats['lookup_ms_avg']} ms avg)")
+
+
+def test_similar_names_are_not_nearest():
+    store, _ = build_store()
+    # Another station (or piazza) with a close name is a different place: live planning instead
+    assert store.lookup('Torino', 'Stazione di Porta Susa', 'Piazza Castello') is None
+    assert store.lookup('Torino', 'Porta', 'Piazza Castello') is None
+
+    # With coordinates the hub must also be close by
+    castello = (CENTER[0] + 0.001, CENTER[1])
+    near = store.lookup('Torino', 'Piazza San Carlo', 'Piaza Castello', end_coords=castello)
+    assert near['match'] == 'nearest' and near['end_hub'] == 'Piazza Castello'
+    far = (CENTER[0] + 0.05, CENTER[1])
+    assert store.lookup('Torino', 'Piazza San Carlo', 'Piaza Castello', end_coords=far) is None
+    assert store.get_stats()['misses'] == 3
+    print("✅ Similar names of other places and far-away hubs fall through to live planning")
+
+
+def test_lookup_is_fast():
+    store, _ = build_store()
+    start = time.perf_counter()
+    for _ in range(1000):
+        assert store.lookup('Torino', 'Piazza San Carlo', 'Piazza Castello', 'half_day')
+    per_lookup_ms = (time.perf_counter() - start) * 1000 / 1000
+    assert per_lookup_ms < 5, per_lookup_ms
+    print(f"✅ {per_lookup_ms:.3f} ms per lookup")
+
+
+def test_helpers():
+    assert normalize_place("Piazza del Duomo, Milano", 'Milano') == 'piazza duomo'
+    assert normalize_place("Città Alta") == 'citta alta'
+    assert profile_for(['storia', 'arte', 'cibo', 'natura']) == 'culture'
+    assert profile_for(['natura']) == 'parks'
+    assert profile_for([]) == 'default'
+    print("✅ Place normalization and interest profiles")
+
+
+if __name__ == "__main__":
+    test_hubs_and_routes()
+    test_exact_and_nearest_lookup()
+    test_similar_names_are_not_nearest()
+    test_lookup_is_fast()
+    test_helpers()
+    print("\n🎉 All itinerary precompiler tests passed!")
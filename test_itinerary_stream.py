@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test progressive itinerary streaming: skeleton first, enrichments as they
+complete, deadline handling, SSE framing and admission control on
+/plan_ai_powered/stream (no database or OpenAI required)
+"""
+
+import json
+import os
+import time
+from unittest import mock
+
+from flask import Flask, request
+
+from itinerary_stream import StreamMetrics, stream_itinerary, stream_response, wants_sse
+import itinerary_stream
+
+SKELETON = {
+    'itinerary': [
+        {'title': 'Piazza Castello', 'type': 'start', 'lat': 45.07, 'lng': 7.68},
+        {'title': 'Verso Mole Antonelliana', 'type': 'transport'},
+        {'title': 'Mole Antonelliana', 'type': 'activity', 'context': 'mole_antonelliana_torino'},
+        {'title': 'Parco del Valentino', 'type': 'destination', 'context': 'parco_del_valentino_torino'},
+    ],
+    'city': 'Torino',
+}
+
+
+def slow_details(stop, city):
+    time.sleep(0.2 if stop['title'].startswith('Mole') else 0.05)
+    return {'summary': f"{stop['title']} a {city}"}
+
+
+def broken_image(stop, city):
+    raise RuntimeError('image service down')
+
+
+def stuck_tip(stop, city):
+    time.sleep(1.0)
+    return {'insider_tip': 'too late'}
+
+
+def _app(enrichers, deadline=5.0):
+    app = Flask(__name__)
+
+    @app.route('/stream', methods=['POST'])
+    def stream():
+        sse = wants_sse(request)
+        return stream_response(stream_itinerary('test', lambda: dict(SKELETON), enrichers=enrichers,
+                                                deadline=deadline, sse=sse), sse)
+
+    return app
+
+
+def _events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_skeleton_first_then_enrichments_in_completion_order():
+    itinerary_stream.stream_metrics = StreamMetrics()
+    client = _app([('details', slow_details)]).test_client()
+    response = client.post('/stream', json={})
+    events = _events(response)
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [e['event'] for e in events] == ['start', 'skeleton', 'enrichment', 'enrichment', 'done']
+    assert events[1]['itinerary'][0]['title'] == 'Piazza Castello'
+    # Only place stops are enriched; the faster one (index 3) arrives first
+    assert [e['index'] for e in events[2:4]] == [3, 2]
+    assert events[-1]['enrichments'] == 2
+    print("✅ Skeleton streamed before per-stop enrichments")
+
+
+def test_failures_and_deadline_do_not_break_the_stream():
+    itinerary_stream.stream_metrics = StreamMetrics()
+    client = _app([('details', slow_details), ('image', broken_image), ('ai_tip', stuck_tip)],
+                  deadline=0.5).test_client()
+    start = time.time()
+    events = _events(client.post('/stream', json={}))
+
+    assert time.time() - start < 0.9
+    done = events[-1]
+    assert done['event'] == 'done'
+    assert (done['enrichments'], done['failed'], done['timed_out']) == (2, 2, 2)
+    print("✅ Failed and late enrichments are reported, not fatal")
+
+
+def test_sse_framing_and_time_to_first_stop_metric():
+    itinerary_stream.stream_metrics = StreamMetrics()
+    client = _app([('details', slow_details)]).test_client()
+    response = client.post('/stream', json={}, headers={'Accept': 'text/event-stream'})
+    body = response.get_data(as_text=True)
+
+    assert response.mimetype == 'text/event-stream'
+    assert body.startswith('event: start\ndata: ')
+    assert 'event: skeleton\n' in body
+
+    stats = itinerary_stream.stream_metrics.get_stats()['test']
+    assert stats['streams'] == 1 and stats['enrichments'] == 2
+    assert stats['time_to_first_stop_ms_p50'] < stats['complete_ms_p50']
+    print("✅ SSE framing and time-to-first-stop tracked")
+
+
+def test_skeleton_error_is_reported():
+    app = Flask(__name__)
+
+    def fail():
+        raise RuntimeError('router unavailable')
+
+    @app.route('/stream', methods=['POST'])
+    def stream():
+        return stream_response(stream_itinerary('failing', fail))
+
+    events = _events(app.test_client().post('/stream'))
+    assert [e['event'] for e in events] == ['start', 'error']
+    print("✅ Skeleton failures end the stream with an error event")
+
+
+def test_plan_stream_takes_a_slot_and_sheds_to_piano_b():
+    os.environ.setdefault('OPENAI_API_KEY', 'test')  # module-level instances build a client
+    import admission_control
+    import ai_companion_routes
+    from admission_control import AdmissionController
+
+    app = Flask(__name__)
+    app.register_blueprint(ai_companion_routes.ai_companion_bp)
+    controller = AdmissionController(limits='plan_ai_powered=1/0', queue_timeout=0)
+    body = {'start': 'Piazza Duomo, Milano', 'end': 'Castello Sforzesco, Milano'}
+    original = admission_control.admission
+    admission_control.admission = controller
+    try:
+        with mock.patch.object(ai_companion_routes.italian_router, 'generate_intelligent_itinerary',
+                               return_value=list(SKELETON['itinerary'])) as router, \
+                mock.patch.object(itinerary_stream, 'DEFAULT_ENRICHERS', []):
+            # Admitted: the slot is held while the stream is sent, and freed once it is closed
+            response = app.test_client().post('/plan_ai_powered/stream', json=body, buffered=False)
+            assert controller.get_stats()['endpoints']['plan_ai_powered']['in_flight'] == 1
+            events = _events(response)
+            response.close()
+            assert [e['event'] for e in events] == ['start', 'skeleton', 'done'] and router.call_count == 1
+            assert controller.get_stats()['endpoints']['plan_ai_powered']['in_flight'] == 0
+
+            # Every slot taken: Piano B skeleton with Retry-After, the router and enrichers never run
+            started = controller.acquire('plan_ai_powered')
+            shed = app.test_client().post('/plan_ai_powered/stream', json=body)
+            controller.release('plan_ai_powered', started)
+    finally:
+        admission_control.admission = original
+
+    events = _events(shed)
+    assert shed.status_code == 200 and shed.mimetype == 'application/x-ndjson'
+    assert shed.headers['X-Admission'] == 'shed-degraded' and int(shed.headers['Retry-After']) >= 1
+    assert [e['event'] for e in events] == ['start', 'skeleton', 'done']
+    assert events[1]['status'] == 'degraded' and events[1]['itinerary'] and router.call_count == 1
+    stats = controller.get_stats()['endpoints']['plan_ai_powered']
+    assert stats['admitted'] == 2 and stats['rejected'] == 1 and stats['degraded'] == 1
+    print("✅ /plan_ai_powered/stream holds a slot while streaming; shed requests stream the Piano B template")
+
+
+if __name__ == "__main__":
+    test_skeleton_first_then_enrichments_in_completion_order()
+    test_failures_and_deadline_do_not_break_the_stream()
+    test_sse_framing_and_time_to_first_stop_metric()
+    test_skeleton_error_is_reported()
+    test_plan_stream_takes_a_slot_and_sheds_to_piano_b()
+    print("\n🎉 All itinerary streaming tests passed!")
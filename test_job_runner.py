@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Test the bounded job runner: constant thread count, backpressure, result TTL,
+cancellation and deadlines (no external services required)
+"""
+
+import threading
+import time
+
+from api_error_handler import APIErrorHandler
+from job_runner import JobRunner, JobQueueFull, current_job, DONE, CANCELLED, EXPIRED
+import job_runner
+from request_deadline import current_deadline
+
+
+def test_thread_count_constant_under_load():
+    runner = JobRunner('load', max_workers=4, max_queue=500)
+    runner.submit(lambda: None).wait(1)
+    baseline = threading.active_count()
+
+    jobs = [runner.submit(time.sleep, 0.001) for _ in range(400)]
+    peak = baseline
+    while not all(job.wait(0) for job in jobs):
+        peak = max(peak, threading.active_count())
+        time.sleep(0.005)
+
+    assert peak == baseline
+    assert runner.get_stats()[DONE] == 401
+    print("✅ 400 jobs ran on 4 fixed workers")
+
+
+def test_full_queue_rejects_immediately():
+    runner = JobRunner('small', max_workers=1, max_queue=2)
+    gate = threading.Event()
+    runner.submit(gate.wait, 2)
+    time.sleep(0.05)  # first job is now running
+    runner.submit(gate.wait, 2)
+    runner.submit(gate.wait, 2)
+
+    try:
+        runner.submit(gate.wait, 2)
+        raise AssertionError("expected JobQueueFull")
+    except JobQueueFull:
+        pass
+    gate.set()
+    assert runner.get_stats()['rejected'] == 1
+    print("✅ Bounded queue applies backpressure")
+
+
+def test_partial_results_cancellation_and_ttl():
+    runner = JobRunner('poll', max_workers=1, max_queue=10, result_ttl=0.2)
+
+    def enhance(count):
+        job = current_job()
+        for i in range(count):
+            job.check()
+            job.publish(f"stop_{i}", i)
+            time.sleep(0.05)
+        return 'complete'
+
+    job = runner.submit(enhance, 100, job_id='itinerary-1')
+    time.sleep(0.12)
+    assert runner.get('itinerary-1').partial  # pollable while running
+    assert runner.cancel('itinerary-1')
+    job.wait(1)
+    assert job.status == CANCELLED and 0 < len(job.partial) < 100
+
+    time.sleep(0.3)
+    runner.submit(lambda: None).wait(1)
+    assert runner.get('itinerary-1') is None  # dropped after the result TTL
+    print("✅ Partial results, cancellation and result TTL")
+
+
+def test_deadline_expires_queued_and_running_jobs():
+    runner = JobRunner('deadline', max_workers=1, max_queue=10)
+    blocker = runner.submit(time.sleep, 0.2)
+    queued = runner.submit(lambda: 'late', timeout=0.05)
+
+    def long_job():
+        while True:
+            current_job().check()
+            time.sleep(0.01)
+
+    running = runner.submit(long_job, timeout=0.4)
+    for job in (blocker, queued, running):
+        job.wait(2)
+
+    assert queued.status == EXPIRED
+    assert running.status == EXPIRED
+    print("✅ Deadlines expire queued and running jobs")
+
+
+def test_execute_with_timeout_does_not_leak_threads():
+    original = job_runner.outbound_calls
+    job_runner.outbound_calls = JobRunner('outbound-test', max_workers=3, max_queue=5)
+    try:
+        handler = APIErrorHandler()
+        assert handler._execute_with_timeout(lambda: 42, 1) == 42
+        baseline = threading.active_count()
+
+        timeouts = 0
+        for _ in range(20):
+            try:
+                handler._execute_with_timeout(lambda: time.sleep(0.3), 0.01)
+            except TimeoutError:
+                timeouts += 1
+
+        assert timeouts == 20
+        assert threading.active_count() == baseline
+
+        time.sleep(0.4)  # let the pool drain; exceptions from the call are re-raised
+        try:
+            handler._execute_with_timeout(lambda: 1 / 0, 1)
+            raise AssertionError("expected ZeroDivisionError")
+        except ZeroDivisionError:
+            pass
+    finally:
+        job_runner.outbound_calls = original
+    print("✅ Timed-out outbound calls stay on the fixed pool")
+
+
+def test_timed_out_calls_hold_their_upstream_slot():
+    original = job_runner.outbound_calls
+    job_runner.outbound_calls = JobRunner('outbound-slots', max_workers=4, max_queue=10)
+    try:
+        handler = APIErrorHandler()
+        handler.max_in_flight = 1
+        handler.retry_config.update(initial_delay=0.05, max_retries=3)
+        calls, budgets = [], []
+
+        def slow():
+            calls.append(time.time())
+            budgets.append(current_deadline().remaining())
+            time.sleep(0.4)
+            return 'late'
+
+        result = handler.with_retry_and_timeout(slow, 'geoapify', fallback_data={'tier': 'fallback'},
+                                                custom_timeout=0.1)
+        assert result['status'] == 'fallback'
+        assert len(calls) == 1, "a retry must not run next to the attempt still holding the slot"
+        assert budgets[0] <= 0.1, "the call's own timeout is handed down to the worker"
+
+        try:
+            handler._execute_with_timeout(lambda: 'other', 1, 'geoapify')
+            raise AssertionError("expected the upstream to be at its in-flight limit")
+        except TimeoutError:
+            pass
+        assert handler._execute_with_timeout(lambda: 'other', 1, 'nominatim') == 'other'
+
+        time.sleep(0.4)  # the slow call finishes and releases its slot
+        assert handler._execute_with_timeout(lambda: 'free', 1, 'geoapify') == 'free'
+        assert handler.get_system_health()['services']['geoapify']['in_flight'] == 0
+    finally:
+        job_runner.outbound_calls = original
+    print("✅ Timed-out calls keep their upstream slot and are not resubmitted alongside")
+
+
+if __name__ == "__main__":
+    test_thread_count_constant_under_load()
+    test_full_queue_rejects_immediately()
+    test_partial_results_cancellation_and_ttl()
+    test_deadline_expires_queued_and_running_jobs()
+    test_execute_with_timeout_does_not_leak_threads()
+    test_timed_out_calls_hold_their_upstream_slot()
+    print("\n🎉 All job runner tests passed!")
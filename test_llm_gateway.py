@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test the LLM gateway: concurrency cap, lane priority, token budget, deadlines
+(no OpenAI required)
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from llm_gateway import LLMGateway, LLMQueueTimeout, BACKGROUND, INTERACTIVE
+
+
+class SlowClient:
+    """Sleeps per call and records peak concurrency and call order"""
+
+    def __init__(self, latency=0.1, tokens=100):
+        self.latency = latency
+        self.tokens = tokens
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.order = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+            self.order.append(kwargs['messages'][0]['content'])
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=self.tokens))
+
+
+def _call(client, label):
+    try:
+        client.chat.completions.create(model='gpt-4-turbo', messages=[{'role': 'user', 'content': label}])
+    except LLMQueueTimeout:
+        pass
+
+
+def _run(threads):
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_concurrency_is_capped():
+    gateway = LLMGateway(max_concurrency=3, background_slots=1, tokens_per_minute=10**6)
+    raw = SlowClient(latency=0.05)
+    client = gateway.wrap(raw)
+    _run([threading.Thread(target=_call, args=(client, f'q{i}')) for i in range(12)])
+
+    assert raw.peak == 3
+    assert gateway.get_stats()['lanes'][INTERACTIVE]['calls'] == 12
+    print("✅ Never more than max_concurrency calls in flight")
+
+
+def test_background_lane_is_capped_and_yields():
+    gateway = LLMGateway(max_concurrency=2, background_slots=1, tokens_per_minute=10**6)
+    raw = SlowClient(latency=0.1)
+    client = gateway.wrap(raw)
+
+    def background(label):
+        with gateway.lane(BACKGROUND):
+            _call(client, label)
+
+    threads = [threading.Thread(target=background, args=(f'bg{i}',)) for i in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.02)
+    interactive = [threading.Thread(target=_call, args=(client, f'ui{i}')) for i in range(2)]
+    _run(interactive)
+    for t in threads:
+        t.join()
+
+    # Background never held both slots, and interactive calls finished before most background work
+    assert gateway.get_stats()['lanes'][BACKGROUND]['calls'] == 4
+    assert max(raw.order.index('ui0'), raw.order.index('ui1')) < raw.order.index('bg3')
+    print("✅ Background lane capped and yields to interactive calls")
+
+
+def test_queue_deadline_fails_fast():
+    gateway = LLMGateway(max_concurrency=1, background_slots=1, tokens_per_minute=10**6)
+    raw = SlowClient(latency=0.3)
+    client = gateway.wrap(raw)
+    first = threading.Thread(target=_call, args=(client, 'first'))
+    first.start()
+    time.sleep(0.05)
+
+    start = time.time()
+    try:
+        with gateway.lane(INTERACTIVE, deadline=0.1):
+            client.chat.completions.create(model='gpt-4-turbo', messages=[{'role': 'user', 'content': 'late'}])
+        raise AssertionError("expected LLMQueueTimeout")
+    except LLMQueueTimeout:
+        waited = time.time() - start
+    first.join()
+
+    assert waited < 0.25
+    assert gateway.get_stats()['lanes'][INTERACTIVE]['timeouts'] + \
+        gateway.get_stats()['lanes'][INTERACTIVE]['rejected'] == 1
+    print("✅ Calls that cannot start before their deadline fail fast")
+
+
+def test_token_budget_blocks_until_window_frees():
+    gateway = LLMGateway(max_concurrency=4, background_slots=2, tokens_per_minute=1000)
+    raw = SlowClient(latency=0.0, tokens=900)
+    client = gateway.wrap(raw)
+    client.chat.completions.create(model='gpt-4-turbo', messages=[{'role': 'user', 'content': 'a'}])
+
+    try:
+        with gateway.lane(INTERACTIVE, deadline=0.2):
+            client.chat.completions.create(model='gpt-4-turbo', messages=[{'role': 'user', 'content': 'b'}])
+        raise AssertionError("expected LLMQueueTimeout")
+    except LLMQueueTimeout:
+        pass
+    assert gateway.get_stats()['tokens_last_minute'] == 900
+    print("✅ Tokens-per-minute budget holds calls back")
+
+
+if __name__ == "__main__":
+    test_concurrency_is_capped()
+    test_background_lane_is_capped_and_yields()
+    test_queue_deadline_fails_fast()
+    test_token_budget_blocks_until_window_frees()
+    print("\n🎉 All LLM gateway tests passed!")
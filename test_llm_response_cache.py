@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test the LLM response cache: canonical keys, time bands, semantic matches
+(no OpenAI or PostgreSQL required)
+"""
+
+from types import SimpleNamespace
+
+from llm_response_cache import LLMResponseCache, canonicalize_prompt
+
+
+class FakeClient:
+    """Counts chat.completions.create calls and returns a fixed JSON body"""
+
+    def __init__(self, content='{"ok": true}'):
+        self.calls = 0
+        self.content = content
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _ask(cache, client, feature, text):
+    return cache.chat_completion(client, feature, model="gpt-4-turbo",
+                                 messages=[{"role": "user", "content": text}],
+                                 response_format={"type": "json_object"}, timeout=30)
+
+
+def test_canonical_prompt_ignores_whitespace_and_minutes():
+    a = canonicalize_prompt([{"role": "user", "content": "Roma  pioggia ore 15:05"}], "gpt-4-turbo", time_bands=True)
+    b = canonicalize_prompt([{"role": "user", "content": "roma pioggia\nore 16:40"}], "gpt-4-turbo", time_bands=True)
+    c = canonicalize_prompt([{"role": "user", "content": "roma pioggia ore 19:00"}], "gpt-4-turbo", time_bands=True)
+    assert a == b
+    assert a != c
+
+    def canonical(text):
+        return canonicalize_prompt([{"role": "user", "content": text}], "gpt-4-turbo", time_bands=True)
+
+    assert canonical("Roma alle 15.05, museo 15h30") == canonical("roma alle 16.40, museo 14h10")
+    assert canonical("Biglietto 4.50 €, 1.20 km") != canonical("Biglietto 5.90 €, 1.45 km")  # prices, distances
+    assert canonical("ore 15:05 biglietto 12.30 €") != canonical("ore 15:05 biglietto 12.45 €")
+    print("✅ Canonical prompt collapses whitespace and time bands, keeps prices and distances")
+
+
+def test_exact_hit_skips_upstream_call():
+    cache, client = LLMResponseCache(database_url=''), FakeClient()
+    _ask(cache, client, 'piano_b', 'Città: Roma, meteo pioggia, ore 10:15')
+    _ask(cache, client, 'piano_b', 'Città: Roma, meteo pioggia, ore 10:45')
+
+    assert client.calls == 1
+    assert cache.get_stats()['features']['piano_b']['hit_rate'] == 50.0
+    print("✅ Same city/weather/time band served from cache")
+
+
+def test_features_are_namespaced_and_invalid_json_not_cached():
+    cache, client = LLMResponseCache(database_url=''), FakeClient(content='not json')
+    _ask(cache, client, 'scoperte', 'Milano')
+    _ask(cache, client, 'scoperte', 'Milano')
+    assert client.calls == 2
+
+    client.content = '{"ok": true}'
+    _ask(cache, client, 'scoperte', 'Milano')
+    _ask(cache, client, 'piano_b', 'Milano')
+    assert client.calls == 4
+    print("✅ Per-feature namespaces, malformed JSON never cached")
+
+
+def test_semantic_match_above_threshold():
+    vectors = {'roma museo': [1.0, 0.0], 'roma musei': [0.99, 0.05], 'venezia gondola': [0.0, 1.0]}
+    cache = LLMResponseCache(database_url='', similarity_threshold=0.95,
+                             embed_fn=lambda text: vectors[text.split(': ')[-1]])
+    client = FakeClient()
+    _ask(cache, client, 'place_details', 'roma museo')
+    _ask(cache, client, 'place_details', 'roma musei')
+    _ask(cache, client, 'place_details', 'venezia gondola')
+
+    assert client.calls == 2
+    assert cache.get_stats()['features']['place_details']['semantic_hits'] == 1
+    print("✅ Embedding-similarity match reuses a near-identical answer")
+
+
+def test_semantic_match_is_scoped_and_limited_to_user_free_features():
+    cache = LLMResponseCache(database_url='', similarity_threshold=0.95, embed_fn=lambda text: [1.0, 0.0])
+    client = FakeClient()
+
+    def ask(feature, text, city):
+        return cache.chat_completion(client, feature, model="gpt-4-turbo", scope={'city': city},
+                                     messages=[{"role": "user", "content": text}])
+
+    ask('place_details', 'Duomo', 'Milano')
+    ask('place_details', 'Duomo', 'Firenze')  # same embedding, other city
+    ask('place_details', 'Il Duomo', 'milano ')  # same city, normalized
+    assert client.calls == 2
+
+    ask('diario', 'utente 1: musei al mattino', 'Roma')
+    ask('diario', 'utente 2: musei al mattino', 'Roma')  # user data: exact matches only
+    assert client.calls == 4
+    assert cache.get_stats()['features']['place_details']['semantic_hits'] == 1
+    print("✅ Semantic matches never cross cities and skip features with user data")
+
+
+if __name__ == "__main__":
+    test_canonical_prompt_ignores_whitespace_and_minutes()
+    test_exact_hit_skips_upstream_call()
+    test_features_are_namespaced_and_invalid_json_not_cached()
+    test_semantic_match_above_threshold()
+    test_semantic_match_is_scoped_and_limited_to_user_free_features()
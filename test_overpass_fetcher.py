@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Test the shared Overpass fetcher against a local stub of the Overpass API:
+one union query per area split back into classes, cities fetched in
+parallel without exceeding the server's slots (/status is honoured, so no
+429s), 429 recovery, and the disk cache answering reprocessing runs
+(no network required)
+"""
+
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+import cost_effective_scraping
+from http_client import HTTPClient
+from overpass_fetcher import (OverpassCache, OverpassFetcher, SlotLimiter, build_query, element_matches,
+                              query_key, split_by_class, unique_elements)
+
+STATEMENT = re.compile(r'^\s*((?:node|way|relation|nwr)\S*?)\((?:area\.searchArea|[-\d.,]+)\);$', re.M)
+SCOPE = re.compile(r'^(area\[.*\])->\.searchArea;$|\(([-\d.]+,[-\d.]+,[-\d.]+,[-\d.]+)\);$', re.M)
+
+CLASSES = {
+    'attraction': ['node["tourism"~"attraction|museum"]', 'way["tourism"~"attraction|museum"]', 'node["historic"]'],
+    'restaurant': ['node["amenity"~"restaurant|cafe"]', 'way["amenity"="restaurant"]'],
+}
+
+
+def city_elements(seed: int):
+    """A museum, a historic restaurant (in both classes), a cafe, a way restaurant and a shop"""
+    base = seed * 100
+    return [
+        {'type': 'node', 'id': base + 1, 'lat': 45.0, 'lon': 9.0, 'tags': {'name': f"Museo {seed}", 'tourism': 'museum'}},
+        {'type': 'node', 'id': base + 2, 'lat': 45.0, 'lon': 9.0,
+         'tags': {'name': f"Antica Osteria {seed}", 'amenity': 'restaurant', 'historic': 'building'}},
+        {'type': 'node', 'id': base + 3, 'lat': 45.0, 'lon': 9.0, 'tags': {'name': f"Caffè {seed}", 'amenity': 'cafe'}},
+        {'type': 'way', 'id': base + 4, 'center': {'lat': 45.0, 'lon': 9.0},
+         'tags': {'name': f"Trattoria {seed}", 'amenity': 'restaurant'}},
+        {'type': 'node', 'id': base + 5, 'lat': 45.0, 'lon': 9.0, 'tags': {'name': f"Negozio {seed}", 'shop': 'books'}},
+    ]
+
+
+class OverpassStub:
+    """
+    Overpass API stand-in: /api/interpreter answers the elements of the
+    queried area (bbox 'S,W,N,E' or area filter) that match a statement of
+    the union, /api/status reports the slots of a rate limit like the real
+    server. A query arriving without a free slot gets 429; so do the first
+    steal_slots queries (another client of the same IP took the slot)
+    """
+
+    def __init__(self, areas, slots: int = 2, latency: float = 0.15, cooldown: float = 0.0,
+                 steal_slots: int = 0):
+        self.areas = areas
+        self.slots = slots
+        self.latency = latency
+        self.cooldown = cooldown
+        self.steal_slots = steal_slots
+        self.running = 0
+        self.cooling = []  # monotonic times at which cooling slots free up
+        self.queries = []
+        self.status_calls = 0
+        self.rejected = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, body: bytes, content_type='application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path != '/api/status':
+                    return self._reply(404, b'')
+                self._reply(200, stub.status_text().encode(), 'text/plain')
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode())
+                query = form['data'][0]
+                if not stub.take_slot():
+                    return self._reply(429, b'rate_limited', 'text/plain')
+                try:
+                    time.sleep(stub.latency)
+                    self._reply(200, stub.answer(query))
+                finally:
+                    stub.free_slot()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        base = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+        self.url, self.status_url = f"{base}/interpreter", f"{base}/status"
+
+    def _busy(self):
+        now = time.monotonic()
+        self.cooling = [until for until in self.cooling if until > now]
+        return self.running + len(self.cooling)
+
+    def status_text(self) -> str:
+        with self.lock:
+            self.status_calls += 1
+            free = self.slots - self._busy()
+            now = time.monotonic()
+            lines = ['Connected as: 2130706433', 'Current time: 2025-11-07T10:00:00Z', f"Rate limit: {self.slots}"]
+            if free > 0:
+                lines.append(f"{free} slots available now.")
+            for until in sorted(self.cooling):
+                at = datetime.now(timezone.utc) + timedelta(seconds=until - now)
+                lines.append(f"Slot available after: {at:%Y-%m-%dT%H:%M:%SZ}, in {math.ceil(until - now)} seconds.")
+            lines.append('Currently running queries (pid, space limit, time limit, start time):')
+            return '\n'.join(lines) + '\n'
+
+    def take_slot(self) -> bool:
+        with self.lock:
+            if self.steal_slots or self._busy() >= self.slots:
+                self.steal_slots = max(0, self.steal_slots - 1)
+                self.rejected += 1
+                return False
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            return True
+
+    def free_slot(self):
+        with self.lock:
+            self.running -= 1
+            if self.cooldown:
+                self.cooling.append(time.monotonic() + self.cooldown)
+
+    def answer(self, query: str) -> bytes:
+        import json
+        scope = SCOPE.search(query)
+        selectors = STATEMENT.findall(query)
+        with self.lock:
+            self.queries.append(query)
+        elements = self.areas.get(scope.group(1) or scope.group(2), [])
+        matched = [e for e in elements if any(element_matches(e, selector) for selector in selectors)]
+        return json.dumps({'version': 0.6, 'elements': matched}).encode()
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def selectors_of(classes):
+    return [selector for selectors in classes.values() for selector in selectors]
+
+
+def fetcher_for(stub, cache_dir, concurrency=4, retries=4):
+    client = HTTPClient(host_limits='')
+    limiter = SlotLimiter(stub.status_url, concurrency, client, poll_interval=0.05)
+    return OverpassFetcher(stub.url, concurrency, OverpassCache(cache_dir), limiter, client, retries)
+
+
+def test_union_query_and_class_split():
+    query = build_query((45.67, 9.64, 45.72, 9.70), CLASSES['attraction'] + CLASSES['restaurant'] + ['node["historic"]'])
+    assert query.count('node["historic"](45.67,9.64,45.72,9.7);') == 1 and query.count('(45.67,') == 5
+    assert query.startswith('[out:json][timeout:60];') and query.endswith('out center;')
+    named = build_query('area["name"="Padova"][admin_level=8]', ['way[shop]'], 30, 'center meta')
+    assert 'area["name"="Padova"][admin_level=8]->.searchArea;' in named and 'way[shop](area.searchArea);' in named
+
+    museum, osteria, cafe, trattoria, shop = city_elements(1)
+    assert element_matches(museum, 'node["tourism"~"attraction|museum"]')
+    assert not element_matches(trattoria, 'node["amenity"~"restaurant|cafe"]')
+    assert element_matches(trattoria, 'nwr[amenity="restaurant"]') and element_matches(shop, 'node[shop]')
+    assert element_matches(osteria, 'node["historic"]["name"]') and not element_matches(cafe, 'node["historic"]')
+
+    found = split_by_class(city_elements(1), CLASSES)
+    assert [e['id'] for e in found['attraction']] == [101, 102]
+    assert [e['id'] for e in found['restaurant']] == [102, 103, 104]
+    assert [e['id'] for e in unique_elements(found)] == [101, 102, 103, 104]
+    print("✅ One union query per area; elements split back into classes as separate queries would return them")
+
+
+def test_parallel_cities_respect_slots_and_cache():
+    cities = {f"City {i}": (45 + i, 9.0, 45 + i + 0.1, 9.1) for i in range(8)}
+    areas = {f"{s},{w},{n},{e}": city_elements(i) for i, (s, w, n, e) in enumerate(cities.values())}
+    cache_dir = tempfile.mkdtemp(prefix='overpass_cache_')
+
+    with OverpassStub(areas, slots=2, latency=0.15) as stub:
+        fetcher = fetcher_for(stub, cache_dir, concurrency=4)
+        started = time.time()
+        results = {city: found for city, found, error in fetcher.fetch_many(cities, CLASSES) if not error}
+        elapsed = time.time() - started
+
+        assert len(results) == 8 and len(stub.queries) == 8  # one query per city for both classes
+        assert stub.rejected == 0 and stub.peak == 2  # never more than the server's slots, no 429
+        assert elapsed < 8 * 0.15 * 0.9, elapsed  # sequential would take 8 x latency
+        assert [e['id'] for e in results['City 3']['restaurant']] == [302, 303, 304]
+
+        again = fetcher_for(stub, cache_dir)
+        cached = {city: found for city, found, _ in again.fetch_many(cities, CLASSES)}
+        assert cached == results and len(stub.queries) == 8 and again.stats['cache_hits'] == 8
+        again.fetch(cities['City 0'], CLASSES, refresh=True)
+        assert len(stub.queries) == 9
+
+        # Entries past the cache's max age (or the caller's) are refetched and replaced
+        path = again.cache.path(query_key(build_query(cities['City 1'], selectors_of(CLASSES))))
+        os.utime(path, (time.time() - 3600, time.time() - 3600))
+        again.cache.max_age = 7200
+        again.fetch(cities['City 1'], CLASSES)
+        assert len(stub.queries) == 9
+        again.fetch(cities['City 1'], CLASSES, max_age=60)
+        assert len(stub.queries) == 10 and time.time() - os.path.getmtime(path) < 60
+        again.cache.max_age = 60
+        again.fetch(cities['City 1'], CLASSES)
+        assert len(stub.queries) == 10
+    print(f"✅ 8 cities in {elapsed:.2f}s on 2 server slots (peak {stub.peak}, {stub.rejected} x 429, "
+          f"{fetcher.limiter.stats['status_checks']} /status checks); reprocessing: {again.summary()}, "
+          f"stale entries refetched")
+
+
+def test_throttled_query_waits_for_status():
+    areas = {'45.0,9.0,45.1,9.1': city_elements(7)}
+    with OverpassStub(areas, slots=1, latency=0.05, cooldown=0.3, steal_slots=1) as stub:
+        fetcher = fetcher_for(stub, None)
+        found = fetcher.fetch((45.0, 9.0, 45.1, 9.1), CLASSES)
+        first = len(stub.queries)
+        started = time.time()
+        fetcher.fetch((45.0, 9.0, 45.1, 9.1), {'restaurant': CLASSES['restaurant']})
+        waited = time.time() - started
+
+    assert len(found['attraction']) == 2 and fetcher.stats['throttled'] == 1 and first == 1
+    assert stub.rejected == 1 and waited >= 0.2  # the second query waited for the cooling slot
+    print(f"✅ 429 recovered through /status; next query waited {waited:.2f}s for the slot to cool down")
+
+
+def test_cost_effective_provider_uses_fetcher():
+    areas = {'area[name="Bergamo"][admin_level~"^(4|5|6|7|8)$"]': city_elements(2)}
+    with OverpassStub(areas) as stub:
+        fetcher = fetcher_for(stub, tempfile.mkdtemp(prefix='overpass_cache_'))
+        provider = cost_effective_scraping.CostEffectiveDataProvider()
+        with mock.patch.object(cost_effective_scraping, 'overpass', fetcher), mock.patch('builtins.print'):
+            places = provider._get_osm_places('Bergamo', 'restaurant')
+            again = provider._get_osm_places('Bergamo', 'restaurant')
+    assert [p['name'] for p in places] == ['Antica Osteria 2', 'Trattoria 2'] and again == places
+    assert len(stub.queries) == 1 and 'node[amenity="restaurant"](area.searchArea);' in stub.queries[0]
+    print(f"✅ CostEffectiveDataProvider._get_osm_places: {len(places)} places, second lookup from the cache")
+
+
+if __name__ == "__main__":
+    test_union_query_and_class_split()
+    test_parallel_cities_respect_slots_and_cache()
+    test_throttled_query_waits_for_status()
+    test_cost_effective_provider_uses_fetcher()
+    print("\n🎉 All Overpass fetcher tests passed!")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test placeholder images: short URLs in responses instead of inline base64,
+one render per (city, attraction) into the disk cache, immutable serving,
+escaped SVG fallback and size/time tracking (no PostgreSQL required)
+"""
+
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest import mock
+
+from flask import Flask
+from PIL import Image
+
+import image_storage_routes
+import image_utils
+import placeholder_images as placeholders
+from image_variants import VariantCache
+from placeholder_images import PlaceholderService
+
+
+def _client(service):
+    image_storage_routes.placeholder_images = service
+    app = Flask(__name__)
+    app.register_blueprint(image_storage_routes.image_routes_bp)
+    return app.test_client()
+
+
+def test_url_instead_of_inline_image():
+    with tempfile.TemporaryDirectory() as tmp:
+        service = PlaceholderService(cache=VariantCache(root=tmp))
+        with mock.patch.object(image_utils, 'placeholder_images', service), \
+                mock.patch.object(image_utils, 'get_local_image_url', return_value=None):
+            image = image_utils.get_image_for_attraction('Roma', 'Osteria & Co')
+        inline = image_utils.create_placeholder_image_data_url('Roma', 'Osteria & Co')
+
+        assert image['type'] == 'placeholder' and image['url'].startswith('/api/images/placeholder?')
+        assert 'name=Osteria+%26+Co' in image['url'] and len(image['url']) < 100
+        assert service.stats['renders'] == 0  # nothing rendered until the URL is fetched
+        assert image_utils.create_placeholder_image_data_url('Roma', 'Osteria & Co') is inline  # memoized
+        print(f"✅ Placeholder by URL: {len(image['url'])} bytes in the JSON instead of {len(inline):,}")
+
+
+def test_render_once_and_serve_immutable():
+    original = image_storage_routes.placeholder_images
+    with tempfile.TemporaryDirectory() as tmp:
+        service = PlaceholderService(cache=VariantCache(root=tmp))
+        try:
+            client = _client(service)
+            url = service.url('Firenze', 'Bottega del Gelato')
+
+            def fetch(_):
+                response = client.get(url)
+                data, status = response.data, response.status_code
+                response.close()
+                return status, data
+
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                results = list(pool.map(fetch, range(6)))
+            assert {status for status, _ in results} == {200} and len({data for _, data in results}) == 1
+            assert service.stats['renders'] == 1
+            with Image.open(BytesIO(results[0][1])) as img:
+                assert img.format == 'JPEG' and img.size == (400, 300)
+
+            response = client.get(url)
+            assert 'immutable' in response.headers['Cache-Control']
+            etag = response.headers['ETag']
+            response.close()
+            assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+            stats = service.get_stats()
+            assert stats['served_jpeg'] == 8 and stats['avg_render_ms'] > 0 and stats['jpeg_bytes'] > 0
+        finally:
+            image_storage_routes.placeholder_images = original
+        print(f"✅ One render for 6 concurrent requests ({stats['avg_render_ms']} ms, "
+              f"{stats['jpeg_bytes']:,} bytes), then immutable + 304")
+
+
+def test_svg_fallback():
+    original = image_storage_routes.placeholder_images
+    with tempfile.TemporaryDirectory() as tmp:
+        service = PlaceholderService(cache=VariantCache(root=tmp))
+        try:
+            client = _client(service)
+            with mock.patch.object(placeholders, 'render_placeholder', side_effect=OSError('no Pillow')):
+                response = client.get('/api/images/placeholder?city=Roma&name=<script>')
+            assert response.status_code == 200 and response.mimetype == 'image/svg+xml'
+            assert b'&lt;script&gt;' in response.data and b'<script>' not in response.data
+            assert response.headers['Cache-Control'] == 'public, max-age=60'  # a failed render is retried soon
+
+            svg = client.get('/api/images/placeholder.svg?city=Roma&name=Pantheon')
+            assert b'Pantheon' in svg.data and 'immutable' in svg.headers['Cache-Control'] and service.stats['render_errors'] == 1
+            assert service.get_stats()['served_svg'] == 2
+        finally:
+            image_storage_routes.placeholder_images = original
+        print("✅ Shared SVG template when Pillow can't render, names escaped, short-lived on the JPEG URL")
+
+
+if __name__ == "__main__":
+    test_url_instead_of_inline_image()
+    test_render_once_and_serve_immutable()
+    test_svg_fallback()
+    print("\n🎉 All placeholder image tests passed!")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test the token-budgeted RAG prompt context builder (no database required)
+"""
+
+from simple_rag_helper import OptimizedRAGHelper, PromptContextBuilder
+
+
+def _place(name, rating=0, reviews=0, description=''):
+    return {'name': name, 'rating': rating, 'user_ratings_total': reviews, 'description': description}
+
+
+class FakeRAG(OptimizedRAGHelper):
+    """RAG helper serving a fixed big-city context and counting lookups"""
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    def get_city_context(self, city, categories=None):
+        self.lookups += 1
+        places = {
+            'restaurant': [_place(f'Trattoria {i}', rating=3, reviews=i) for i in range(40)],
+            'museum': [_place('Pinacoteca di Brera', rating=5, reviews=900, description='x' * 80),
+                       _place('Museo del Novecento', rating=4.5, reviews=400)],
+        }
+        return {
+            'city': city,
+            'source': 'legacy',
+            'total_places': 42,
+            'categories': {
+                c: {'count': len(places[c]), 'places': places[c], 'source': 'legacy'}
+                for c in (categories or places) if c in places
+            }
+        }
+
+
+def _builder():
+    rag = FakeRAG()
+    builder = PromptContextBuilder(rag)
+    builder._place_cache_signature = lambda city_lower: (42, 1)
+    return rag, builder
+
+
+def test_fragments_are_cached():
+    rag, builder = _builder()
+    first = builder.build_city_prompt('Milano', ['restaurant', 'museum'])
+    second = builder.build_city_prompt('Milano', ['restaurant', 'museum'])
+
+    assert first == second
+    assert rag.lookups == 1
+    assert builder.get_metrics()['fragment_hits'] == 2
+    print("✅ Fragments built once and reused")
+
+
+def test_budget_keeps_highest_quality_places():
+    _, builder = _builder()
+    prompt = builder.build_city_prompt('Milano', ['restaurant', 'museum'], max_tokens=90)
+
+    assert builder.estimate_tokens(prompt) <= 90
+    assert 'Pinacoteca di Brera' in prompt
+    assert 'Museo del Novecento' in prompt
+    assert builder.get_metrics()['trimmed_prompts'] == 1
+    print(f"✅ Trimmed prompt: {builder.estimate_tokens(prompt)} tokens")
+
+
+def test_place_cache_change_invalidates_city():
+    rag, builder = _builder()
+    builder.signature_check_interval = 0
+    builder.build_city_prompt('Milano', ['museum'])
+
+    builder._place_cache_signature = lambda city_lower: (43, 2)
+    builder.build_city_prompt('Milano', ['museum'])
+
+    assert rag.lookups == 2
+    assert builder.get_metrics()['invalidations'] == 1
+    print("✅ place_cache change rebuilds fragments")
+
+
+if __name__ == "__main__":
+    test_fragments_are_cached()
+    test_budget_keeps_highest_quality_places()
+    test_place_cache_change_invalidates_city()
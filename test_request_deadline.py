@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test the request deadline: stage timeouts shrink with the budget, stages are
+skipped to their fallback tier, the deadline follows calls onto the outbound
+pool and into the LLM gateway, and the /plan SLO percentiles are tracked
+"""
+
+import time
+
+from flask import Flask, has_app_context
+
+import request_deadline
+from api_error_handler import APIErrorHandler
+from llm_gateway import LLMGateway, LLMQueueTimeout
+from request_deadline import (DeadlineExceeded, DeadlineMetrics, call_within_deadline,
+                              current_deadline, deadline_scope, require_stage, stage_timeout,
+                              statement_timeout)
+
+
+def test_stage_timeouts_follow_remaining_budget():
+    assert stage_timeout('geocoder', 10) == 10  # no deadline: stage default
+
+    with deadline_scope(3.0, 'unit') as deadline:
+        assert 2.5 < stage_timeout('geocoder', 10) <= 3.0
+        assert stage_timeout('geocoder', 2) == 2
+
+        # A nested, looser scope keeps the outer (tighter) deadline
+        with deadline_scope(60, 'inner'):
+            assert current_deadline() is deadline
+
+        deadline.expires_at = time.time() + 0.5
+        assert stage_timeout('geocoder', 10) is None
+        try:
+            require_stage('apify', 45)
+            assert False, "apify needs 3s"
+        except DeadlineExceeded:
+            pass
+        assert deadline.skipped == ['geocoder', 'apify']
+    assert current_deadline() is None
+    print("✅ Stage timeouts shrink with the budget and skip below their minimum")
+
+
+def test_resilient_call_uses_fallback_without_waiting():
+    handler = APIErrorHandler()
+    calls = []
+
+    def slow():
+        calls.append(current_deadline())
+        time.sleep(5)
+
+    with deadline_scope(2.5, 'unit'):
+        start = time.time()
+        result = handler.with_retry_and_timeout(slow, 'openai', fallback_data={'tier': 'fallback'})
+        elapsed = time.time() - start
+
+    # One attempt capped at the remaining budget, no retries past the deadline
+    assert result['status'] == 'fallback' and result['tier'] == 'fallback'
+    assert len(calls) == 1 and calls[0] is not None, "deadline must follow the call onto the pool"
+    assert elapsed < 3.0, elapsed
+    print(f"✅ Resilient call fell back after {elapsed:.2f}s (default timeout 60s)")
+
+
+def test_call_within_deadline_replaces_alarm():
+    with deadline_scope(0.6, 'unit'):
+        start = time.time()
+        try:
+            call_within_deadline('default', 15, time.sleep, 3)
+            assert False, "should time out"
+        except TimeoutError:
+            pass
+        assert time.time() - start < 1.0
+
+    with deadline_scope(0.2, 'unit'):
+        try:
+            call_within_deadline('apify', 15, lambda: 'never')
+            assert False, "apify needs more budget"
+        except DeadlineExceeded:
+            pass
+    print("✅ call_within_deadline times out on the pool and skips unaffordable stages")
+
+
+def test_only_the_deadline_follows_the_call():
+    app = Flask(__name__)
+    with app.app_context(), deadline_scope(2, 'unit') as deadline:
+        seen = call_within_deadline('default', 10, lambda: (current_deadline(), has_app_context()))
+    inner, app_context = seen
+    assert not app_context, "the Flask app context must stay on the request thread"
+    assert inner.expires_at == deadline.expires_at
+    print("✅ Outbound calls get the request deadline, not the Flask context")
+
+
+class RecordingCursor:
+    """psycopg2 cursor stand-in that tracks statement_timeout via set_config"""
+
+    def __init__(self):
+        self.setting, self.history, self._row = '30s', [], None
+
+    def execute(self, query, params=()):
+        self._row = (self.setting, params[0])
+        self.setting = params[0]
+        self.history.append(params[0])
+
+    def fetchone(self):
+        return self._row
+
+
+def test_statement_timeout_is_reset_after_the_stage():
+    cur = RecordingCursor()
+    with statement_timeout(cur):
+        assert cur.setting == '30s'  # no deadline: untouched
+    with deadline_scope(2, 'unit'):
+        with statement_timeout(cur):
+            assert cur.setting.endswith('ms') and int(cur.setting[:-2]) <= 2000
+    assert cur.setting == '30s' and len(cur.history) == 2
+
+    try:
+        request_deadline.with_deadline('unknown_endpoint')
+        assert False, "endpoint budgets must be explicit"
+    except ValueError:
+        pass
+    assert request_deadline.ENDPOINT_DEADLINES['plan'] == request_deadline.PLAN_DEADLINE_SECONDS
+    print("✅ statement_timeout restored after the stage, endpoint budgets explicit")
+
+
+def test_llm_gateway_respects_deadline():
+    gateway = LLMGateway(max_concurrency=1)
+    seen = {}
+
+    class Completions:
+        def create(self, **kwargs):
+            seen.update(kwargs)
+            return None
+
+    class Client:
+        chat = type('Chat', (), {'completions': Completions()})()
+
+    with deadline_scope(4.0, 'unit'):
+        gateway.chat_completion(Client(), model='gpt-4o-mini', messages=[], timeout=30)
+    assert 3.0 < seen['timeout'] <= 4.0
+
+    with deadline_scope(0.5, 'unit'):
+        try:
+            gateway.chat_completion(Client(), model='gpt-4o-mini', messages=[])
+            assert False, "LLM needs 1.5s"
+        except LLMQueueTimeout:
+            pass
+    assert gateway.get_stats()['lanes']['interactive']['rejected'] == 1
+    print("✅ LLM gateway caps the call timeout and rejects when the budget is spent")
+
+
+def test_view_decorator_tracks_slo():
+    metrics = DeadlineMetrics()
+    for ms in range(1, 101):
+        metrics.record_request('plan', ms * 10.0, slo_ms=950, degraded=ms > 95)
+    stats = metrics.get_stats()['plan']
+    assert stats['latency_ms_p50'] == 510.0 and stats['latency_ms_p99'] == 1000.0
+    assert stats['slo_violations'] == 5 and stats['degraded'] == 5 and stats['slo_met'] is False
+
+    app = Flask(__name__)
+
+    @app.route('/plan', methods=['POST'])
+    @request_deadline.with_deadline('plan_unit', budget=0.3, slo_ms=1000)
+    def plan():
+        return {'geocoder': stage_timeout('geocoder', 10)}
+
+    response = app.test_client().post('/plan')
+    assert response.get_json() == {'geocoder': None}
+    assert 'skipped;desc="geocoder"' in response.headers['Server-Timing']
+    stats = request_deadline.deadline_metrics.get_stats()['plan_unit']
+    assert stats['requests'] == 1 and stats['skipped_stages'] == {'geocoder': 1} and stats['slo_met']
+    print("✅ /plan decorator records SLO percentiles and skipped stages")
+
+
+if __name__ == "__main__":
+    test_stage_timeouts_follow_remaining_budget()
+    test_resilient_call_uses_fallback_without_waiting()
+    test_call_within_deadline_replaces_alarm()
+    test_only_the_deadline_follows_the_call()
+    test_statement_timeout_is_reset_after_the_stage()
+    test_llm_gateway_respects_deadline()
+    test_view_decorator_tracks_slo()
+    print("\n🎉 All request deadline tests passed!")
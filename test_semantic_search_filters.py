@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test compound city+category filtering and adaptive over-fetch
+in OptimizedRAGHelper.semantic_search_places (no ChromaDB server required)
+"""
+
+from simple_rag_helper import OptimizedRAGHelper
+
+
+def _matches(metadata, where):
+    """Tiny evaluator for the subset of the Chroma where-grammar we emit"""
+    if not where:
+        return True
+    if '$and' in where:
+        return all(_matches(metadata, clause) for clause in where['$and'])
+    (field, condition), = where.items()
+    (op, value), = condition.items()
+    if op == '$eq':
+        return metadata.get(field) == value
+    if op == '$in':
+        return metadata.get(field) in value
+    raise ValueError(f"unsupported operator {op}")
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection; ranks by insertion order"""
+
+    def __init__(self, rows, supports_and=True):
+        self.rows = rows
+        self.supports_and = supports_and
+        self.calls = 0
+
+    def count(self):
+        return len(self.rows)
+
+    def get(self, where=None, include=None):
+        self.calls += 1
+        hits = [r for r in self.rows if _matches(r['metadata'], where)]
+        return {'ids': [r['id'] for r in hits], 'metadatas': [r['metadata'] for r in hits]}
+
+    def query(self, query_texts, n_results, where=None, include=None, ids=None):
+        self.calls += 1
+        if where and '$and' in where and not self.supports_and:
+            raise ValueError("Expected where to have exactly one operator")
+        hits = [r for r in self.rows if _matches(r['metadata'], where)
+                and (ids is None or r['id'] in ids)][:n_results]
+        return {
+            'documents': [[r['document'] for r in hits]],
+            'metadatas': [[r['metadata'] for r in hits]],
+            'distances': [[0.1 for _ in hits]],
+        }
+
+
+def _sparse_city_rows():
+    """Milano with 40 restaurants and only 3 museums ranked last"""
+    rows = []
+    for i in range(40):
+        rows.append({'id': f'r{i}', 'document': f'Ristorante {i}',
+                     'metadata': {'city': 'milano', 'category': 'restaurant', 'name': f'Ristorante {i}'}})
+    for i in range(3):
+        rows.append({'id': f'm{i}', 'document': f'Museo {i}',
+                     'metadata': {'city': 'milano', 'category': 'museum', 'name': f'Museo {i}'}})
+    return rows
+
+
+def _helper_with(collection):
+    helper = OptimizedRAGHelper.__new__(OptimizedRAGHelper)
+    OptimizedRAGHelper.__init__(helper)
+    helper._chroma_collection = collection
+    return helper
+
+
+def test_compound_filter_single_round_trip():
+    """$and pushdown returns the complete sparse category in one query"""
+    collection = FakeCollection(_sparse_city_rows())
+    helper = _helper_with(collection)
+
+    places = helper.semantic_search_places('arte', city='Milano', categories=['museum'], n_results=5)
+
+    assert [p['name'] for p in places] == ['Museo 0', 'Museo 1', 'Museo 2']
+    assert collection.calls == 1
+    print(f"✅ Compound filter: {len(places)} museums in {collection.calls} round-trip")
+
+
+def test_fallback_to_id_subset_when_and_unsupported():
+    """Backends rejecting $and query an exact pre-filtered id subset"""
+    collection = FakeCollection(_sparse_city_rows(), supports_and=False)
+    helper = _helper_with(collection)
+
+    places = helper.semantic_search_places('arte', city='Milano', categories=['museum'], n_results=5)
+
+    assert [p['category'] for p in places] == ['museum'] * 3
+    assert helper._compound_where_supported is False
+    print(f"✅ Id-subset fallback: {len(places)} museums in {collection.calls} round-trips")
+
+
+def test_transient_error_keeps_compound_filter():
+    """A failed query that is not an operator rejection must not disable $and for the process"""
+    collection = FakeCollection(_sparse_city_rows())
+    query = collection.query
+    failures = [ConnectionError("Could not connect to tenant default_tenant")]
+
+    def flaky_query(**kwargs):
+        if failures:
+            collection.calls += 1
+            raise failures.pop()
+        return query(**kwargs)
+
+    collection.query = flaky_query
+    helper = _helper_with(collection)
+
+    assert helper.semantic_search_places('arte', city='Milano', categories=['museum'], n_results=5) == []
+    assert helper._compound_where_supported is True
+    places = helper.semantic_search_places('arte', city='Milano', categories=['museum'], n_results=5)
+    assert len(places) == 3 and collection.calls == 2
+    print("✅ Transient Chroma error: compound filter still used on the next query")
+
+
+def test_widening_post_filter_fills_sparse_category():
+    """Without $and or id pre-filtering the fetch widens until satisfied"""
+    collection = FakeCollection(_sparse_city_rows(), supports_and=False)
+    collection.get = None  # metadata-only get unavailable
+    helper = _helper_with(collection)
+
+    places = helper.semantic_search_places('arte', city='Milano', categories=['museum'], n_results=3)
+
+    assert len(places) == 3
+    print(f"✅ Widening post-filter: {len(places)} museums in {collection.calls} round-trips")
+
+
+def test_build_where_filter():
+    helper = _helper_with(None)
+    assert helper._build_where_filter() is None
+    assert helper._build_where_filter(city='Roma') == {'city': {'$eq': 'roma'}}
+    assert helper._build_where_filter(categories=['museum']) == {'category': {'$in': ['museum']}}
+    assert helper._build_where_filter('Roma', ['museum']) == {
+        '$and': [{'city': {'$eq': 'roma'}}, {'category': {'$in': ['museum']}}]}
+    assert helper._build_where_filter('Roma', ['museum'], compound=False) == {'city': {'$eq': 'roma'}}
+    print("✅ Where filter construction")
+
+
+if __name__ == "__main__":
+    test_build_where_filter()
+    test_compound_filter_single_round_trip()
+    test_fallback_to_id_subset_when_and_unsupported()
+    test_transient_error_keeps_compound_filter()
+    test_widening_post_filter_fills_sparse_category()
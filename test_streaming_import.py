@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Test streaming dataset imports: the incremental reader yields exactly what
+json.load does (arrays, JSON Lines, characters split across reads), rows
+are written per chunk through COPY/execute_values with progress, the
+converted import scripts select the same records as before, and the COPY
+upsert sink counts inserted/updated/unchanged rows per batch (no PostgreSQL
+required)
+"""
+
+import csv
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+import import_north_italy_dataset
+import process_apify_dataset
+from streaming_import import CopyUpsertSink, JsonRecords, copy_writer, import_in_chunks
+
+NORTH_ITALY = 'dataset_touristic-attractions_2025-11-06_20-38-13-921.json'
+GOOGLE_IMAGES = 'dataset_google-images-scraper_2025-10-18_16-14-07-199.json'
+
+
+class RecordingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        self.result = [(0,)] if sql.startswith('SELECT COUNT(*) FROM') else []
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+    def copy_expert(self, sql, data):
+        self.conn.copies.append((sql, data.read()))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class RecordingConnection:
+    """Empty tables; keeps every statement and COPY payload"""
+
+    autocommit = False
+
+    def __init__(self):
+        self.statements = []
+        self.copies = []
+        self.commits = 0
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+class UpsertConnection(RecordingConnection):
+    """
+    One table held in a dict, merged the way the sink's INSERT ... ON CONFLICT
+    does: new keys inserted, rows whose compared columns differ updated
+    (RETURNING xmax = 0 -> True/False), identical rows skipped. latency is
+    slept on every round trip
+    """
+
+    def __init__(self, columns, key, compared, latency=0.0):
+        super().__init__()
+        self.columns, self.key, self.compared, self.latency = columns, key, compared, latency
+        self.rows = {}
+        self.staged = []
+        self.round_trips = 0
+
+    def cursor(self):
+        return UpsertCursor(self)
+
+    def commit(self):
+        self.round_trip()
+        super().commit()
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class UpsertCursor(RecordingCursor):
+    def execute(self, sql, params=None):
+        self.conn.round_trip()
+        self.conn.statements.append(sql)
+        self.result = []
+        if sql.startswith('CREATE TEMP TABLE'):
+            self.conn.staged = []
+        elif sql.startswith('INSERT INTO _stage_'):
+            raise NotImplementedError('server-side staging')
+        elif 'ON CONFLICT' in sql and params is None:  # the merge
+            for row in self.conn.staged:
+                self.result += self.merge(dict(zip(self.conn.columns, row)), 'DO NOTHING' not in sql)
+        elif 'ON CONFLICT' in sql:  # one row per statement (the old loaders)
+            self.merge(dict(zip(self.conn.columns, params)), True)
+
+    def merge(self, row, update):
+        key = tuple(row[c] for c in self.conn.key)
+        current = self.conn.rows.get(key)
+        if current is None:
+            self.conn.rows[key] = row
+            return [(True,)]
+        if update and any(current[c] != row[c] for c in self.conn.compared):
+            current.update(row)
+            return [(False,)]
+        return []
+
+    def copy_expert(self, sql, data):
+        self.conn.round_trip()
+        super().copy_expert(sql, data)
+        self.conn.staged = [[value if value != '' else None for value in row]
+                            for row in csv.reader(StringIO(self.conn.copies[-1][1]))]
+
+
+def test_reader_matches_json_load():
+    records = [{'city': 'Città di Castello', 'name': 'Rocca «Albornoz» 🏰', 'tags': {'n': [1, 2.5, None]},
+                'ok': True, 'desc': 'x' * (i * 7 % 300)} for i in range(500)]
+    with tempfile.TemporaryDirectory() as tmp:
+        array = os.path.join(tmp, 'dataset.json')
+        with open(array, 'w', encoding='utf-8-sig') as f:  # BOM, like some exports
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        lines = os.path.join(tmp, 'dataset.jsonl')
+        with open(lines, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+
+        for read_size in (7, 64, 4096):  # tiny reads split records and multi-byte characters
+            reader = JsonRecords(array, read_size=read_size, use_ijson=False)
+            assert list(reader) == records and reader.position == reader.size
+        assert list(JsonRecords(lines)) == records
+        assert list(JsonRecords(NORTH_ITALY, read_size=512, use_ijson=False)) == \
+            json.load(open(NORTH_ITALY, encoding='utf-8'))
+
+        truncated = os.path.join(tmp, 'truncated.json')
+        with open(array, 'rb') as src, open(truncated, 'wb') as dst:
+            dst.write(src.read()[:-500])
+        try:
+            list(JsonRecords(truncated, read_size=256, use_ijson=False))
+            raise AssertionError('a truncated export must not pass silently')
+        except ValueError:
+            pass
+    print(f"✅ Streaming reader == json.load ({len(records)} records, reads of 7 bytes to 4 KB, JSON Lines)")
+
+
+def test_chunks_copy_and_progress():
+    conn = RecordingConnection()
+    messages = []
+    rows = [(i, f'name "{i}"', '' if i % 3 else None, i % 2 == 0, {'k': i}) for i in range(25)]
+    stats = import_in_chunks(iter(rows), lambda row: row if row[0] != 7 else None,
+                             copy_writer(conn, 'places', ('id', 'name', 'note', 'flag', 'tags')),
+                             chunk_size=10, progress=messages.append)
+
+    assert stats['read'] == 25 and stats['written'] == 24 and stats['chunks'] == 3
+    assert len(conn.copies) == 3 and conn.commits == 3 and len(messages) == 3
+    assert conn.copies[0][0] == 'COPY places (id, name, note, flag, tags) FROM STDIN WITH (FORMAT csv)'
+    parsed = [line for _, data in conn.copies for line in data.splitlines()]
+    assert parsed[0] == '0,"name ""0""",,t,"{""k"": 0}"'  # None -> unquoted empty (NULL)
+    assert parsed[1] == '1,"name ""1""","",f,"{""k"": 1}"'  # '' -> quoted empty (empty string)
+    assert next(csv.reader(StringIO(parsed[2])))[1] == 'name "2"'
+    assert '24 written' in messages[-1]
+    print(f"✅ 25 records in 3 chunks -> 3 COPY statements, NULL vs '' preserved: {messages[-1].strip()}")
+
+
+def legacy_north_italy_rows(data):
+    """The selection import_to_comprehensive_attractions made from the json.load-ed list"""
+    records, seen_osm = {}, set()
+    for item in data:
+        coords = item.get('coords', {})
+        if not all([item.get('city'), item.get('name'), coords.get('lat'), coords.get('lon')]):
+            continue
+        key = (item['city'].lower(), item['name'].lower())
+        osm = (item.get('osmId'), item.get('osmType'))
+        if key in records or (osm[0] and osm[1] and osm in seen_osm):
+            continue
+        seen_osm.add(osm)
+        records[key] = item['name']
+    return list(records.values())
+
+
+def test_north_italy_import_streams():
+    conn = RecordingConnection()
+    with mock.patch.object(import_north_italy_dataset.psycopg2, 'connect', return_value=conn), \
+            mock.patch('builtins.print'):
+        data = import_north_italy_dataset.load_dataset(NORTH_ITALY)
+        import_north_italy_dataset.import_to_comprehensive_attractions(data, chunk_size=500)
+        import_north_italy_dataset.import_to_attraction_images(data, chunk_size=500)
+
+    attractions = [copy for copy in conn.copies if 'comprehensive_attractions' in copy[0]]
+    images = [copy for copy in conn.copies if 'attraction_images' in copy[0]]
+    names = [row[1] for _, payload in attractions for row in csv.reader(StringIO(payload))]
+    expected = legacy_north_italy_rows(json.load(open(NORTH_ITALY, encoding='utf-8')))
+    assert names == expected and len(attractions) == 5  # 2,321 records, chunks of 500
+    assert images and all(payload.startswith('"wikimedia_commons"') for _, payload in images)
+    print(f"✅ North Italy import streamed twice: {len(names)} attractions in {len(attractions)} COPY chunks, "
+          f"{sum(1 for _, p in images for _ in csv.reader(StringIO(p)))} images")
+
+
+def test_apify_top_images_per_attraction():
+    harvested = []
+
+    class RecordingHarvester:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def run(self, jobs):
+            harvested.extend(jobs)
+            return {'jobs': len(harvested), 'skipped': 0, 'stored': 0, 'failed': 0, 'duplicates': 0,
+                    'near_duplicates': 0, 'images_per_min': 0.0}
+
+    with mock.patch.object(process_apify_dataset, 'get_db_connection', return_value=RecordingConnection()), \
+            mock.patch.object(process_apify_dataset, 'load_known_images', side_effect=lambda conn, index: index), \
+            mock.patch.object(process_apify_dataset, 'ImageHarvester', RecordingHarvester):
+        result = process_apify_dataset.process_apify_dataset(GOOGLE_IMAGES, confidence_threshold=0.2,
+                                                             max_images_per_attraction=3)
+
+    # What the json.load + sort version picked
+    classifier = process_apify_dataset.AttractionImageClassifier()
+    groups = {}
+    for image in json.load(open(GOOGLE_IMAGES)):
+        city, attraction, confidence = classifier.classify_image(image)
+        if confidence >= 0.2:
+            groups.setdefault(f"{city}_{attraction}", []).append((confidence, image['imageUrl']))
+    expected = {url for items in groups.values()
+                for _, url in sorted(items, key=lambda x: x[0], reverse=True)[:3]}
+
+    assert {job['row']['original_url'] for job in harvested} == expected
+    assert result['categories'] == len(groups)
+    print(f"✅ Apify dataset streamed: {len(harvested)} best images over {len(groups)} attractions, "
+          f"same selection as the full load")
+
+
+def test_copy_upsert_sink():
+    columns = ('cache_key', 'place_name', 'city', 'place_data')
+    conn = UpsertConnection(columns, ('cache_key',), ('place_data',))
+    conn.rows[('osm:bergamo:1',)] = dict(zip(columns, ('osm:bergamo:1', 'Rocca', 'Bergamo', '{"v": 1}')))
+    conn.rows[('osm:bergamo:2',)] = dict(zip(columns, ('osm:bergamo:2', 'Duomo', 'Bergamo', '{"v": 1}')))
+
+    with CopyUpsertSink(conn, 'place_cache', columns, key=('cache_key',), update=('place_data',),
+                        insert_values={'created_at': 'NOW()'}, update_values={'updated_at': 'NOW()'},
+                        compare=("{}.place_data::jsonb - 'fetched_at'",), batch_size=4) as sink:
+        sink.add(('osm:bergamo:1', 'Rocca', 'Bergamo', {'v': 1}))  # unchanged
+        sink.add(('osm:bergamo:2', 'Duomo', 'Bergamo', {'v': 2}))  # updated
+        sink.add(('osm:bergamo:3', 'Accademia Carrara', 'Bergamo', {'v': 1}))
+        sink.add(('osm:bergamo:3', 'Accademia Carrara', 'Bergamo', {'v': 3}))  # same batch: last wins
+        for i in range(4, 9):
+            sink.add((f'osm:bergamo:{i}', f'Place {i}', 'Bergamo', {'v': i}))
+
+    assert sink.stats == {'inserted': 6, 'updated': 1, 'unchanged': 1, 'duplicates': 1, 'batches': 3}
+    assert conn.rows[('osm:bergamo:3',)]['place_data'] == '{"v": 3}' and conn.commits == 3
+    assert conn.round_trips == 3 * 4  # stage, COPY, merge, commit per batch
+    merge = conn.statements[1]
+    assert merge.startswith('INSERT INTO place_cache (cache_key, place_name, city, place_data, created_at) '
+                            'SELECT cache_key, place_name, city, place_data, NOW() FROM _stage_place_cache')
+    assert "DO UPDATE SET place_data = EXCLUDED.place_data, updated_at = NOW() " \
+           "WHERE (place_cache.place_data::jsonb - 'fetched_at') IS DISTINCT FROM " \
+           "(EXCLUDED.place_data::jsonb - 'fetched_at') RETURNING (xmax = 0)" in merge
+
+    # DO NOTHING keeps existing rows and the first row of a key within a batch
+    conn = UpsertConnection(columns, ('cache_key',), ())
+    conn.rows[('padua_orto',)] = dict(zip(columns, ('padua_orto', 'Orto', 'Padua', '{}')))
+    sink = CopyUpsertSink(conn, 'place_cache', columns, key=('cache_key',), update=())
+    written = sink.write([('padua_orto', 'Orto botanico', 'Padua', {'new': 1}),
+                          ('padua_palazzo', 'Palazzo', 'Padua', {'first': 1}),
+                          ('padua_palazzo', 'Palazzo', 'Padua', {'second': 1})])
+    assert written == 1 and sink.stats['inserted'] == 1 and sink.stats['unchanged'] == 1
+    assert conn.rows[('padua_orto',)]['place_name'] == 'Orto'
+    assert conn.rows[('padua_palazzo',)]['place_data'] == '{"first": 1}'
+    assert 'DO NOTHING RETURNING TRUE' in conn.statements[-1]
+    print(f"✅ COPY upsert sink: 3 batches of 4 round trips, {sink.summary()} on the DO NOTHING pass")
+
+
+if __name__ == "__main__":
+    test_reader_matches_json_load()
+    test_chunks_copy_and_progress()
+    test_north_italy_import_streams()
+    test_apify_top_images_per_attraction()
+    test_copy_upsert_sink()
+    print("\n🎉 All streaming import tests passed!")
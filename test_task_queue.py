@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Test the durable task queue on its SQLite backend: progress, dedup, retries,
+rate limits, the CostMonitor budget gate and resuming after a crashed worker
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import task_queue as task_queue_module
+from task_queue import TaskQueue, PermanentTaskError
+
+
+def make_queue(**kwargs) -> TaskQueue:
+    path = os.path.join(tempfile.mkdtemp(), 'tasks.db')
+    kwargs.setdefault('rate_limits', '')
+    return TaskQueue(database_url='', sqlite_path=path, **kwargs)
+
+
+def test_job_progress_and_dedup():
+    queue = make_queue()
+    queue.register('echo', lambda payload: {'city': payload['city']})
+
+    job = queue.enqueue_job('echo', [{'city': c} for c in ('Roma', 'Bari', 'roma')],
+                            dedup_fields=('city',))
+    assert job['queued'] == 2 and job['duplicates'] == 1
+
+    # Queuing the same cities again while pending adds nothing
+    assert queue.enqueue_job('echo', [{'city': 'Bari'}], dedup_fields=('city',))['queued'] == 0
+
+    progress = queue.job_progress(job['job_id'])
+    assert progress['queued'] == 2 and not progress['finished']
+
+    queue.work(job_id=job['job_id'], until_idle=True)
+    progress = queue.job_progress(job['job_id'])
+    assert progress['done'] == 2 and progress['finished'] and progress['percent'] == 100.0
+    assert [t['result']['city'] for t in progress['tasks']] == ['Roma', 'Bari']
+    print("✅ Job progress and pending-task dedup")
+
+
+def test_retry_with_backoff_and_permanent_failure():
+    queue = make_queue()
+    calls = {'flaky': 0}
+
+    def flaky(payload):
+        calls['flaky'] += 1
+        if calls['flaky'] < 3:
+            raise RuntimeError('provider hiccup')
+        return {'ok': True}
+
+    def broken(payload):
+        raise PermanentTaskError('bad payload')
+
+    queue.register('flaky', flaky, max_attempts=3)
+    queue.register('broken', broken, max_attempts=5)
+
+    original = task_queue_module.RETRY_BASE_SECONDS
+    task_queue_module.RETRY_BASE_SECONDS = 0.05
+    try:
+        flaky_job = queue.enqueue_job('flaky', [{}])['job_id']
+        assert queue.run_once()
+        # The retry is scheduled in the future, not immediately runnable
+        assert not queue.run_once(flaky_job)
+        queue.work(job_id=flaky_job, until_idle=True)
+    finally:
+        task_queue_module.RETRY_BASE_SECONDS = original
+
+    task = queue.job_progress(flaky_job)['tasks'][0]
+    assert task['status'] == 'done' and task['attempts'] == 3
+
+    broken_job = queue.enqueue_job('broken', [{}])['job_id']
+    queue.work(job_id=broken_job, until_idle=True)
+    task = queue.job_progress(broken_job)['tasks'][0]
+    assert task['status'] == 'failed' and task['attempts'] == 1 and 'bad payload' in task['error']
+    print("✅ Retries back off; permanent errors fail at once")
+
+
+def test_provider_rate_limit():
+    queue = make_queue(rate_limits='slowapi=2/1')
+    queue.register('limited', lambda payload: {}, provider='slowapi')
+    job = queue.enqueue_job('limited', [{'n': i} for i in range(4)])['job_id']
+
+    original = task_queue_module.POLL_SECONDS
+    task_queue_module.POLL_SECONDS = 0.05
+    try:
+        start = time.time()
+        queue.work(job_id=job, until_idle=True)
+        elapsed = time.time() - start
+    finally:
+        task_queue_module.POLL_SECONDS = original
+
+    # Bucket of 2 then one call every 0.5s: the last two need ~1s
+    assert elapsed >= 0.9, elapsed
+    assert queue.job_progress(job)['done'] == 4
+    print(f"✅ Provider rate limit respected (4 calls in {elapsed:.2f}s)")
+
+
+def test_budget_defers_paid_tasks_only():
+    queue = make_queue(monthly_budget_usd=0.05)
+    queue.register('apify', lambda payload: {}, cost_usd=0.02)
+    queue.register('free', lambda payload: {'cost_usd': 0})
+
+    first = queue.enqueue_job('apify', [{'n': i} for i in range(3)])['job_id']
+    queue.work(job_id=first, until_idle=True)
+    assert queue.get_cost_summary(30)['actual_cost_usd'] == 0.06
+
+    queue._budget_checked_at = 0  # force a fresh CostMonitor verdict
+    second = queue.enqueue_job('apify', [{'n': 9}])['job_id']
+    free = queue.enqueue_job('free', [{}])['job_id']
+    assert not queue.run_once(second)
+    assert queue.run_once(free)
+
+    assert queue.job_progress(second)['queued'] == 1
+    assert queue.job_progress(second)['budget_throttled']
+    assert queue.budget_status()['alert_level'] == 'critical'
+    print("✅ CostMonitor budget holds back paid tasks, free tasks still run")
+
+
+def test_expired_lease_resumes_on_another_worker():
+    queue = make_queue()
+    queue.register('scrape', lambda payload: {'resumed': True})
+    job = queue.enqueue_job('scrape', [{}])['job_id']
+
+    original = task_queue_module.LEASE_SECONDS
+    task_queue_module.LEASE_SECONDS = 0
+    try:
+        crashed = queue.claim()  # worker dies without finishing
+        assert crashed and queue.job_progress(job)['running'] == 1
+        time.sleep(0.01)
+        other = make_queue()
+        other.sqlite_path = queue.sqlite_path
+        other.register('scrape', lambda payload: {'resumed': True})
+        assert other.run_once()
+    finally:
+        task_queue_module.LEASE_SECONDS = original
+
+    task = queue.job_progress(job)['tasks'][0]
+    assert task['status'] == 'done' and task['attempts'] == 2
+    print("✅ Tasks of a crashed worker are resumed after the lease")
+
+
+def test_heartbeat_keeps_a_long_task_leased():
+    queue = make_queue()
+    started, release = threading.Event(), threading.Event()
+
+    def slow(payload):
+        started.set()
+        release.wait(10)
+        return {}
+
+    queue.register('slow', slow)
+    job = queue.enqueue_job('slow', [{}])['job_id']
+
+    original = task_queue_module.LEASE_SECONDS
+    task_queue_module.LEASE_SECONDS = 3  # renewed every second
+    try:
+        worker = threading.Thread(target=queue.run_once)
+        worker.start()
+        started.wait(5)
+        time.sleep(4)  # longer than the original lease
+        other = make_queue()
+        other.sqlite_path = queue.sqlite_path
+        other.worker_id = 'other-host-1'
+        other.register('slow', slow)
+        assert other.claim() is None, "a live worker's task must not be handed over"
+        release.set()
+        worker.join(5)
+    finally:
+        task_queue_module.LEASE_SECONDS = original
+
+    task = queue.job_progress(job)['tasks'][0]
+    assert task['status'] == 'done' and task['attempts'] == 1
+    print("✅ Heartbeat renews the lease of a task that outlives it")
+
+
+def test_budget_deferral_counted_once_per_claim():
+    queue = make_queue(monthly_budget_usd=0.01)
+    for kind in ('a', 'b', 'c'):
+        queue.register(kind, lambda payload: {}, cost_usd=0.02)
+    queue._budget_checked_at, queue._budget_throttled = time.time(), True
+
+    assert queue.claim() is None
+    assert queue.stats['budget_deferrals'] == 1
+    print("✅ One budget deferral per claim, not per task kind")
+
+
+def test_until_idle_returns_when_only_blocked_tasks_remain():
+    queue = make_queue(monthly_budget_usd=0.01)
+    queue.register('apify', lambda payload: {}, cost_usd=0.02)
+    queue.register('free', lambda payload: {'cost_usd': 0})
+    queue._budget_checked_at, queue._budget_throttled = time.time(), True
+    job = queue.enqueue_job('apify', [{'n': 1}])['job_id']
+    leased = queue.enqueue_job('free', [{'n': 2}])['job_id']
+
+    other = make_queue()
+    other.sqlite_path = queue.sqlite_path
+    other.worker_id = 'dead-host-1'
+    other.register('free', lambda payload: {})
+    assert other.claim(leased)  # the worker dies holding the lease
+
+    started = time.time()
+    assert queue.work(job_id=job, until_idle=True) == {'over_budget': 1}
+    assert queue.work(until_idle=True) == {'over_budget': 1, 'leased': 1}
+    assert time.time() - started < 1
+
+    queue._budget_throttled = False
+    assert queue.work(job_id=job, until_idle=True) == {}
+    assert queue.job_progress(job)['done'] == 1
+
+    retrying = queue.enqueue_job('free', [{'n': 3}])['job_id']
+    queue._execute("UPDATE task_queue SET run_after = %s WHERE job_id = %s", (time.time() + 60, retrying))
+    assert queue.work(job_id=retrying, until_idle=True, max_wait=0.1) == {'waiting': 1}
+    print("✅ until_idle reports over-budget, leased and still-waiting tasks instead of spinning")
+
+
+def test_concurrent_workers_claim_each_task_once():
+    queue = make_queue()
+    seen = []
+    lock = threading.Lock()
+
+    def record(payload):
+        with lock:
+            seen.append(payload['n'])
+        return {}
+
+    queue.register('record', record)
+    job = queue.enqueue_job('record', [{'n': i} for i in range(40)])['job_id']
+    workers = [threading.Thread(target=queue.work, kwargs={'job_id': job, 'until_idle': True})
+               for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert sorted(seen) == list(range(40))
+    assert queue.job_progress(job)['done'] == 40
+    print("✅ 4 concurrent workers processed 40 tasks exactly once")
+
+
+if __name__ == "__main__":
+    test_job_progress_and_dedup()
+    test_retry_with_backoff_and_permanent_failure()
+    test_provider_rate_limit()
+    test_budget_defers_paid_tasks_only()
+    test_expired_lease_resumes_on_another_worker()
+    test_heartbeat_keeps_a_long_task_leased()
+    test_budget_deferral_counted_once_per_claim()
+    test_until_idle_returns_when_only_blocked_tasks_remain()
+    test_concurrent_workers_claim_each_task_once()
+    print("\n🎉 All task queue tests passed!")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test batched itinerary translation and the translation memory
+(no OpenAI or PostgreSQL required)
+"""
+
+import json
+import os
+import re
+from types import SimpleNamespace
+
+os.environ.setdefault('OPENAI_API_KEY', 'test')  # module-level instance builds a client
+
+from multi_language_support import MultiLanguageSupport, TranslationMemory
+
+
+class FakeTranslator:
+    """Answers batch prompts by prefixing every value; counts upstream calls"""
+
+    def __init__(self, drop_keys=()):
+        self.calls = 0
+        self.drop_keys = set(drop_keys)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        prompt = kwargs['messages'][-1]['content']
+        numbered = json.loads(re.search(r'\{.*\}', prompt.split('Respond with')[0], re.S).group(0))
+        translations = {k: f"[en] {v}" for k, v in numbered.items() if k not in self.drop_keys}
+        message = SimpleNamespace(content=json.dumps({'translations': translations}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _itinerary(city):
+    return [
+        {'title': f'Duomo di {city}', 'description': 'Cattedrale gotica', 'time': '09:00',
+         'details': {'tips': ['Arriva presto', 'Copri le spalle'], 'note': 'Cattedrale gotica'}},
+        {'title': 'Pranzo in trattoria', 'address': 'Via Roma 1', 'tips': 'Arriva presto'},
+    ]
+
+
+def test_itinerary_is_translated_in_one_call():
+    client = FakeTranslator()
+    service = MultiLanguageSupport(openai_client=client, memory=TranslationMemory(database_url=''))
+    original = _itinerary('Milano')
+
+    translated = service.translate_itinerary(original, 'en')
+
+    assert client.calls == 1
+    assert translated[0]['title'] == '[en] Duomo di Milano'
+    assert translated[0]['details']['tips'] == ['[en] Arriva presto', '[en] Copri le spalle']
+    assert translated[1]['tips'] == '[en] Arriva presto'
+    assert translated[0]['time'] == '09:00'
+    assert original[0]['details']['note'] == 'Cattedrale gotica'  # input left untouched
+    print("✅ Unique itinerary strings sent in a single batch request")
+
+
+def test_second_user_same_city_costs_no_llm_call():
+    memory = TranslationMemory(database_url='')
+    first = MultiLanguageSupport(openai_client=FakeTranslator(), memory=memory)
+    first.translate_itinerary(_itinerary('Firenze'), 'en')
+
+    second_client = FakeTranslator()
+    second = MultiLanguageSupport(openai_client=second_client, memory=memory)
+    translated = second.translate_itinerary(_itinerary('Firenze'), 'en')
+
+    assert second_client.calls == 0
+    assert translated[1]['address'] == '[en] Via Roma 1'
+    assert memory.get_stats()['hit_rate'] > 0
+    print("✅ Translation memory serves repeated itineraries without the LLM")
+
+
+def test_incomplete_batch_keeps_original_and_is_not_remembered():
+    client = FakeTranslator(drop_keys={'0'})
+    service = MultiLanguageSupport(openai_client=client, memory=TranslationMemory(database_url=''))
+
+    result = service.translate_batch(['Piazza', 'Ponte'], 'de')
+    assert result == {'Piazza': 'Piazza', 'Ponte': '[en] Ponte'}
+
+    client.drop_keys = set()
+    service.translate_batch(['Piazza', 'Ponte'], 'de')
+    assert client.calls == 2  # only the missing string was retried
+    assert service.translate('Piazza', 'de') == '[en] Piazza'
+    print("✅ Missing batch entries fall back to the source text")
+
+
+def test_common_phrases_and_ui_need_no_model():
+    client = FakeTranslator()
+    service = MultiLanguageSupport(openai_client=client, memory=TranslationMemory(database_url=''))
+
+    assert service.translate('Piano B attivato', 'en') == 'Plan B activated'
+    assert service.localize_ui('en')['buttons']['save'] == 'Save'
+    assert client.calls == 0
+
+    service.localize_ui('fr')
+    service.localize_ui('fr')
+    assert client.calls == 1
+    print("✅ Common phrases and UI strings resolved with at most one batch")
+
+
+def test_shed_translation_never_reaches_the_llm():
+    from ai_companion_routes import multi_language, _translate_payload
+    client = FakeTranslator()
+    original = multi_language.openai_client, multi_language.memory
+    multi_language.openai_client, multi_language.memory = client, TranslationMemory(database_url='')
+    try:
+        ui = _translate_payload({'content': '', 'target_language': 'de', 'content_type': 'ui'}, cached_only=True)
+        text = _translate_payload({'content': 'Il museo è chiuso per la pausa pranzo',
+                                   'target_language': 'en'}, cached_only=True)
+    finally:
+        multi_language.openai_client, multi_language.memory = original
+
+    assert client.calls == 0
+    assert ui['ui_strings']['buttons']['save'] == 'Save'  # not in memory: stays English
+    assert text['source_language'] == 'it' and text['translated'] == 'Il museo è chiuso per la pausa pranzo'
+    print("✅ Shed /translate detects the language locally and returns cached strings only")
+
+
+if __name__ == "__main__":
+    test_itinerary_is_translated_in_one_call()
+    test_second_user_same_city_costs_no_llm_call()
+    test_incomplete_batch_keeps_original_and_is_not_remembered()
+    test_common_phrases_and_ui_need_no_model()
+    test_shed_translation_never_reaches_the_llm()
+    print("\n🎉 All translation memory tests passed!")
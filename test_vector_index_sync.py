@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test the incremental ChromaDB indexer document mapping and apply step
+(no PostgreSQL or ChromaDB server required)
+"""
+
+import json
+
+from vector_index_sync import VectorIndexSync, attraction_documents, place_cache_documents
+
+
+class FakeCollection:
+    """Dict-backed stand-in for the Chroma collection API used by the indexer"""
+
+    def __init__(self):
+        self.docs = {}
+        self.embedded = 0
+
+    def get(self, where=None, include=None):
+        wanted = set(where['source_key']['$in'])
+        return {'ids': [i for i, (_, m) in self.docs.items() if m.get('source_key') in wanted]}
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+    def upsert(self, ids, documents, metadatas):
+        self.embedded += len(ids)
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.docs[doc_id] = (document, metadata)
+
+
+def test_legacy_blob_expands_per_place():
+    blob = json.dumps([{'name': 'Da Mario'}, {'name': 'Trattoria Rossi', 'description': 'Cucina tipica'}])
+    docs = place_cache_documents('bergamo_restaurant', 'Bergamo_restaurant', 'Bergamo', blob)
+
+    assert [d[0] for d in docs] == ['pc:bergamo_restaurant:0', 'pc:bergamo_restaurant:1']
+    assert all(d[2]['category'] == 'restaurant' and d[2]['city'] == 'bergamo' for d in docs)
+    assert 'Cucina tipica' in docs[1][1]
+    print("✅ Legacy city_category blob -> one document per place")
+
+
+def test_documents_reuse_loader_ids():
+    """Backfilled rows overwrite the documents the loaders indexed instead of duplicating them"""
+    osm = place_cache_documents('osm:la spezia:4242', 'Castello San Giorgio', 'La Spezia',
+                                {'name': 'Castello San Giorgio', 'osm_id': 4242})
+    missing = place_cache_documents('padua_cappella_degli_scrovegni', 'Cappella degli Scrovegni', 'Padua',
+                                    {'name': 'Cappella degli Scrovegni'})
+    extended = place_cache_documents('bergamo_attraction', 'Bergamo attraction', 'Bergamo',
+                                     [{'name': 'Rocca', 'osm_id': 77}, {'name': 'Senza id'}])
+    otm = place_cache_documents('opentripmap:roma:fontana di trevi', 'Fontana di Trevi', 'Roma',
+                                {'name': 'Fontana di Trevi'})
+    assert osm[0][0] == 'osm_la_spezia_4242'  # Safe_Data_Loader
+    assert missing[0][0] == 'padua_cappella_degli_scrovegni'  # Complete_Missing_Cities
+    assert [d[0] for d in extended] == ['bergamo_77', 'pc:bergamo_attraction:1']  # Extended_Safe_Data_Loader
+    assert otm[0][0] == 'opentripmap_roma_fontana_di_trevi'  # Viamigo_Data_Loader_Fixed
+
+    collection = FakeCollection()
+    collection.docs['osm_la_spezia_4242'] = ('indexed by the loader', {'place_name': 'Castello San Giorgio'})
+    sync = VectorIndexSync(database_url='postgresql://unused', collection=collection)
+    rows = {key: {'cache_key': key, 'place_name': 'x', 'city': city, 'place_data': data}
+            for key, city, data in [('osm:la spezia:4242', 'La Spezia', {'name': 'Castello San Giorgio', 'osm_id': 4242}),
+                                    ('bergamo_attraction', 'Bergamo', [{'name': 'Rocca', 'osm_id': 77}]),
+                                    ('bergamo_museum', 'Bergamo', [{'name': 'Rocca', 'osm_id': 77}])]}
+    sync._apply('place_cache', list(rows), [], rows)
+    assert sorted(collection.docs) == ['bergamo_77', 'osm_la_spezia_4242']
+    assert collection.docs['osm_la_spezia_4242'][1]['source_key'] == 'place_cache:osm:la spezia:4242'
+    print("✅ Backfill reuses the loaders' document ids (no duplicate places in the index)")
+
+
+def test_attraction_row_document():
+    docs = attraction_documents({'id': 7, 'name': 'Pinacoteca di Brera', 'city': 'Milano',
+                                 'category': 'tourism:museum', 'latitude': 45.47, 'longitude': 9.18})
+    doc_id, _, metadata = docs[0]
+    assert doc_id == 'ca:7'
+    assert metadata['category'] == 'museum'
+    assert metadata['source_key'] == 'comprehensive_attractions:7'
+    print("✅ comprehensive_attractions row -> document")
+
+
+def test_apply_embeds_only_changed_rows_and_drops_tombstones():
+    collection = FakeCollection()
+    sync = VectorIndexSync(database_url='postgresql://unused', collection=collection)
+
+    rows = {
+        'milano_museum': {'cache_key': 'milano_museum', 'place_name': 'x', 'city': 'milano',
+                          'place_data': [{'name': 'Museo A'}, {'name': 'Museo B'}]},
+    }
+    sync._apply('place_cache', ['milano_museum'], [], rows)
+    assert collection.embedded == 2
+
+    # Blob shrinks to one place: the orphaned per-item document must go
+    rows['milano_museum']['place_data'] = [{'name': 'Museo A'}]
+    upserted, deleted = sync._apply('place_cache', ['milano_museum'], [], rows)
+    assert (upserted, deleted) == (1, 1)
+
+    # Row deleted upstream
+    upserted, deleted = sync._apply('place_cache', [], ['milano_museum'], {})
+    assert (upserted, deleted) == (0, 1)
+    assert collection.docs == {}
+    print("✅ Changed rows re-embedded, tombstones removed")
+
+
+if __name__ == "__main__":
+    test_legacy_blob_expands_per_place()
+    test_documents_reuse_loader_ids()
+    test_attraction_row_document()
+    test_apply_embeds_only_changed_rows_and_drops_tombstones()
@@ -4,12 +4,15 @@ ViamigoTravelAI UX Enhancement Routes
 Enhanced user experience features including search autocomplete, city data, and mobile optimizations
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, make_response, send_file
 import psycopg2
 import os
+import gzip
 from dotenv import load_dotenv
 import logging
 
+from city_bundles import city_bundles
+
 # Load environment variables
 load_dotenv()
 
@@ -415,22 +418,63 @@ def get_app_manifest():
 
 @ux_bp.route('/api/offline/status', methods=['GET'])
 def get_offline_status():
-    """Get offline capabilities status"""
+    """Get offline capabilities status from the built city bundles"""
+    status = city_bundles.status()
     return jsonify({
-        'offline_capable': True,
-        'cached_cities': 56,
-        'cached_places': 9930,
+        'offline_capable': bool(status['cities']),
+        'cached_cities': len(status['cities']),
+        'cached_places': status['cached_places'],
         'features': {
             'search': True,
             'maps': True,
-            'basic_planning': False,  # Requires AI/API
+            'basic_planning': any(c['counts'].get('itinerary') for c in status['cities']),
             'saved_itineraries': True
         },
-        'storage_used': '5.2 MB',  # Estimated
-        'last_sync': '2024-10-17T20:00:00Z'
+        'storage_used': f"{status['size_bytes'] / 1024 / 1024:.1f} MB",
+        'last_sync': status['last_built'],
+        'bundles': [{k: c[k] for k in ('city', 'version', 'built_at', 'size_bytes')}
+                    for c in status['cities']]
     })
 
 
+@ux_bp.route('/api/offline/bundle/<city>', methods=['GET'])
+def get_city_bundle(city):
+    """Whole city bundle (gzip JSON) for the service worker's first prefetch"""
+    manifest = city_bundles.manifest(city)
+    if not manifest:
+        return jsonify({'error': f'No offline bundle for {city}'}), 404
+
+    path = city_bundles.bundle_path(city, manifest['version'])
+    etag = f"{city_bundles.city_key(city)}-v{manifest['version']}"
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = send_file(path, mimetype='application/json', etag=False, max_age=300)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        with gzip.open(path, 'rb') as f:
+            response = make_response(f.read())
+        response.mimetype = 'application/json'
+    response.set_etag(etag)
+    response.headers['X-Bundle-Version'] = str(manifest['version'])
+    response.headers['Vary'] = 'Accept-Encoding'
+    city_bundles.record_served(manifest['size_bytes'])
+    return response
+
+
+@ux_bp.route('/api/offline/bundle/<city>/delta', methods=['GET'])
+def get_city_bundle_delta(city):
+    """Records changed since ?since=<version> (full record set if that version is gone)"""
+    since = request.args.get('since', type=int)
+    delta = city_bundles.delta(city, since)
+    if delta is None:
+        return jsonify({'error': f'No offline bundle for {city}'}), 404
+    return jsonify(delta)
+
+
 @ux_bp.route('/api/sync-itinerary', methods=['POST'])
 def sync_offline_itinerary():
     """Sync offline itinerary when back online"""
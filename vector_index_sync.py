@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Vector Index Sync - Change-data-capture from PostgreSQL into ChromaDB
+Keeps viamigo_travel_data in step with place_cache and comprehensive_attractions
+
+Triggers on both tables append (table, key, op) rows to vector_sync_changes.
+The indexer drains that table in batches: changed rows are re-read and
+upserted (only they get embedded), deleted rows are removed from the
+collection. Processed changes are deleted, and the highest change_id seen is
+kept in vector_sync_state as the high-water mark. Consuming the changes table
+as a queue (instead of only filtering by change_id) means transactions that
+commit out of order are never skipped.
+
+Usage:
+    python vector_index_sync.py --install          # create tables + triggers
+    python vector_index_sync.py --backfill         # enqueue every existing row once
+    python vector_index_sync.py --once             # drain pending changes
+    python vector_index_sync.py --loop             # run forever (background job)
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "viamigo_travel_data"
+SYNC_NAME = "viamigo_travel_data"
+
+# Tracked tables: key column + columns whose change should trigger re-embedding.
+# Access bookkeeping (access_count, last_accessed) is deliberately excluded.
+TRACKED_TABLES = {
+    'place_cache': {
+        'key': 'cache_key',
+        'content_columns': ['place_name', 'city', 'place_data'],
+    },
+    'comprehensive_attractions': {
+        'key': 'id',
+        'content_columns': ['name', 'city', 'description', 'category'],
+    },
+}
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS vector_sync_changes (
+    change_id BIGSERIAL PRIMARY KEY,
+    source_table VARCHAR(64) NOT NULL,
+    row_key TEXT NOT NULL,
+    op CHAR(1) NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS vector_sync_state (
+    name VARCHAR(64) PRIMARY KEY,
+    high_water_mark BIGINT NOT NULL DEFAULT 0,
+    last_run_at TIMESTAMP,
+    documents_upserted BIGINT NOT NULL DEFAULT 0,
+    documents_deleted BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION vector_sync_capture() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO vector_sync_changes (source_table, row_key, op)
+        VALUES (TG_TABLE_NAME, to_jsonb(OLD) ->> TG_ARGV[0], 'D');
+        RETURN OLD;
+    END IF;
+    INSERT INTO vector_sync_changes (source_table, row_key, op)
+    VALUES (TG_TABLE_NAME, to_jsonb(NEW) ->> TG_ARGV[0], 'U');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# OSM/Apify style types -> categories used by semantic_search_places filters
+CATEGORY_KEYWORDS = [
+    ('restaurant', ['restaurant', 'food', 'meal_takeaway', 'trattoria', 'pizzeria', 'osteria']),
+    ('cafe', ['cafe', 'bar', 'caffè', 'gelateria', 'pasticceria']),
+    ('hotel', ['hotel', 'lodging', 'guest_house', 'albergo', 'b&b']),
+    ('museum', ['museum', 'art_gallery', 'gallery', 'museo', 'pinacoteca']),
+]
+
+
+def _categorize(*hints) -> str:
+    """Map free-form type/category hints to a search category"""
+    text = ' '.join(str(h).lower() for h in hints if h)
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return category
+    return 'tourist_attraction'
+
+
+def _document_text(name: str, city: str, place: Dict) -> str:
+    """Rich text for embedding, same shape as the loaders' add_to_chromadb"""
+    parts = [f"{name} in {city}"]
+    if place.get('description'):
+        parts.append(str(place['description']))
+    types = place.get('types')
+    if types:
+        parts.append(f"Categories: {', '.join(types) if isinstance(types, list) else types}")
+    if place.get('vicinity') or place.get('address'):
+        parts.append(f"Location: {place.get('vicinity') or place.get('address')}")
+    if place.get('cuisine'):
+        parts.append(f"Cuisine: {place['cuisine']}")
+    if place.get('wikipedia'):
+        parts.append(f"More info: {place['wikipedia']}")
+    return '. '.join(parts)
+
+
+def loader_document_id(cache_key: str, city: str, place: Dict, index: Optional[int] = None) -> str:
+    """
+    Id the loader that wrote the row gave its document, so a backfill or a
+    later change overwrites that document instead of indexing a twin
+
+    osm:{city}:{id} rows (Safe_Data_Loader) -> osm_{city}_{id}; opentripmap
+    rows (Viamigo_Data_Loader_Fixed) -> opentripmap_{city}_{name}; places of
+    a legacy blob with an OSM id (Extended_Safe_Data_Loader) -> {city}_{id};
+    other single-place rows (Complete_Missing_Cities) -> the cache key.
+    Blob places without an OSM id were never indexed by a loader.
+    """
+    prefix, _, rest = cache_key.partition(':')
+    if index is None and prefix in ('osm', 'opentripmap') and ':' in rest:
+        key_city, key_name = rest.split(':', 1)
+        return f"{prefix}_{key_city}_{key_name}".replace(' ', '_').lower()
+    if index is None:
+        return cache_key
+    if place.get('osm_id'):
+        return f"{(city or '').lower()}_{place['osm_id']}"
+    return f"pc:{cache_key}:{index}"
+
+
+def place_cache_documents(cache_key: str, place_name: str, city: str, place_data) -> List[Tuple[str, str, Dict]]:
+    """
+    Build (id, document, metadata) tuples for a place_cache row
+
+    Legacy `city_category` rows hold a JSON list of places and expand to one
+    document each; `osm:city:id` and single-place rows map to one document.
+    """
+    if isinstance(place_data, str):
+        try:
+            place_data = json.loads(place_data)
+        except (json.JSONDecodeError, TypeError):
+            return []
+
+    city_lower = (city or '').lower()
+    legacy_category = None
+    if not cache_key.startswith('osm:') and '_' in cache_key and isinstance(place_data, list):
+        legacy_category = cache_key.split('_', 1)[1]
+
+    places = place_data if isinstance(place_data, list) else [place_data]
+    documents = []
+    for i, place in enumerate(places):
+        if not isinstance(place, dict):
+            continue
+        name = place.get('name') or place.get('title') or place_name
+        if not name:
+            continue
+        category = legacy_category or _categorize(
+            place.get('category'), place.get('types'), place.get('tourism_type'), name)
+        doc_id = loader_document_id(cache_key, city, place, i if isinstance(place_data, list) else None)
+        documents.append((doc_id, _document_text(name, city or '', place), {
+            'city': city_lower,
+            'place_name': name,
+            'category': category,
+            'source': 'place_cache',
+            'source_key': f"place_cache:{cache_key}",
+        }))
+    return documents
+
+
+def attraction_documents(row: Dict) -> List[Tuple[str, str, Dict]]:
+    """Build the (id, document, metadata) tuple for a comprehensive_attractions row"""
+    name = row.get('name')
+    if not name:
+        return []
+    metadata = {
+        'city': (row.get('city') or '').lower(),
+        'place_name': name,
+        'category': _categorize(row.get('category'), row.get('attraction_type'), name),
+        'source': 'comprehensive_attractions',
+        'source_key': f"comprehensive_attractions:{row['id']}",
+    }
+    if row.get('latitude') is not None and row.get('longitude') is not None:
+        metadata['latitude'] = float(row['latitude'])
+        metadata['longitude'] = float(row['longitude'])
+    return [(f"ca:{row['id']}", _document_text(name, row.get('city') or '', row), metadata)]
+
+
+class VectorIndexSync:
+    """Incremental PostgreSQL -> ChromaDB indexer driven by vector_sync_changes"""
+
+    def __init__(self, database_url: Optional[str] = None, collection=None, batch_size: int = 200):
+        self.database_url = database_url or os.getenv('DATABASE_URL')
+        self.batch_size = batch_size
+        self._collection = collection
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {
+            'runs': 0,
+            'changes_processed': 0,
+            'documents_upserted': 0,
+            'documents_deleted': 0,
+            'last_error': None,
+            'last_run_seconds': 0.0,
+        }
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            import chromadb
+            client = chromadb.PersistentClient(path="./chromadb_data")
+            self._collection = client.get_or_create_collection(COLLECTION_NAME)
+        return self._collection
+
+    def _connect(self):
+        return psycopg2.connect(self.database_url)
+
+    def install(self):
+        """Create the changes/state tables and capture triggers (idempotent)"""
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SCHEMA_SQL)
+                for table, spec in TRACKED_TABLES.items():
+                    content = spec['content_columns']
+                    changed = ' OR '.join(
+                        f"OLD.{col} IS DISTINCT FROM NEW.{col}" for col in content)
+                    cur.execute(f"DROP TRIGGER IF EXISTS vector_sync_ins_del ON {table}")
+                    cur.execute(f"DROP TRIGGER IF EXISTS vector_sync_upd ON {table}")
+                    cur.execute(f"""
+                        CREATE TRIGGER vector_sync_ins_del
+                        AFTER INSERT OR DELETE ON {table}
+                        FOR EACH ROW EXECUTE FUNCTION vector_sync_capture('{spec['key']}')
+                    """)
+                    cur.execute(f"""
+                        CREATE TRIGGER vector_sync_upd
+                        AFTER UPDATE OF {', '.join(content)} ON {table}
+                        FOR EACH ROW WHEN ({changed})
+                        EXECUTE FUNCTION vector_sync_capture('{spec['key']}')
+                    """)
+                cur.execute("""
+                    INSERT INTO vector_sync_state (name) VALUES (%s)
+                    ON CONFLICT (name) DO NOTHING
+                """, (SYNC_NAME,))
+            conn.commit()
+            logger.info("✅ Vector sync triggers installed")
+        finally:
+            conn.close()
+
+    def backfill(self) -> int:
+        """Enqueue every existing row once (initial load into an empty index)"""
+        conn = self._connect()
+        try:
+            total = 0
+            with conn.cursor() as cur:
+                for table, spec in TRACKED_TABLES.items():
+                    cur.execute(f"""
+                        INSERT INTO vector_sync_changes (source_table, row_key, op)
+                        SELECT %s, {spec['key']}::text, 'U' FROM {table}
+                    """, (table,))
+                    total += cur.rowcount
+            conn.commit()
+            logger.info(f"📥 Enqueued {total} rows for vector backfill")
+            return total
+        finally:
+            conn.close()
+
+    def _fetch_rows(self, cur, table: str, keys: List[str]) -> Dict[str, Dict]:
+        """Current content of the changed rows, one query per table"""
+        if table == 'place_cache':
+            cur.execute("""
+                SELECT cache_key, place_name, city, place_data
+                FROM place_cache WHERE cache_key = ANY(%s)
+            """, (keys,))
+            return {
+                row[0]: {'cache_key': row[0], 'place_name': row[1], 'city': row[2], 'place_data': row[3]}
+                for row in cur.fetchall()
+            }
+
+        cur.execute("""
+            SELECT id, name, city, description, category, attraction_type, latitude, longitude
+            FROM comprehensive_attractions WHERE id = ANY(%s)
+        """, ([int(k) for k in keys],))
+        columns = ['id', 'name', 'city', 'description', 'category', 'attraction_type', 'latitude', 'longitude']
+        return {str(row[0]): dict(zip(columns, row)) for row in cur.fetchall()}
+
+    def _apply(self, table: str, upsert_keys: List[str], delete_keys: List[str], rows: Dict[str, Dict]) -> Tuple[int, int]:
+        """Push one table's batch into ChromaDB; returns (upserted, deleted)"""
+        collection = self.collection
+        ids, documents, metadatas = [], [], []
+        # Rows that vanished between capture and sync are tombstones too
+        stale_keys = list(delete_keys) + [k for k in upsert_keys if k not in rows]
+
+        for key in upsert_keys:
+            row = rows.get(key)
+            if not row:
+                continue
+            built = (place_cache_documents(row['cache_key'], row['place_name'], row['city'], row['place_data'])
+                     if table == 'place_cache' else attraction_documents(row))
+            # Legacy blobs can shrink: drop old per-item documents before re-adding
+            stale_keys.append(key)
+            for doc_id, document, metadata in built:
+                ids.append(doc_id)
+                documents.append(document)
+                metadatas.append(metadata)
+
+        # The same place in two category blobs maps to one loader id: keep its last document
+        unique = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(unique) < len(ids):
+            keep = sorted(unique.values())
+            ids, documents, metadatas = ([values[i] for i in keep] for values in (ids, documents, metadatas))
+
+        deleted = 0
+        if stale_keys:
+            source_keys = [f"{table}:{k}" for k in stale_keys]
+            existing = collection.get(where={"source_key": {"$in": source_keys}}, include=[])
+            fresh_ids = set(ids)
+            stale_ids = [doc_id for doc_id in existing.get('ids', []) if doc_id not in fresh_ids]
+            if stale_ids:
+                collection.delete(ids=stale_ids)
+                deleted = len(stale_ids)
+
+        if ids:
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+        return len(ids), deleted
+
+    def sync_once(self) -> Dict:
+        """Drain pending changes in batches; returns counters for this run"""
+        start = time.time()
+        run = {'changes': 0, 'upserted': 0, 'deleted': 0}
+        conn = self._connect()
+        try:
+            while not self._stop.is_set():
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT change_id, source_table, row_key, op
+                        FROM vector_sync_changes
+                        ORDER BY change_id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    """, (self.batch_size,))
+                    changes = cur.fetchall()
+                    if not changes:
+                        conn.rollback()
+                        break
+
+                    # Collapse to the latest op per row
+                    latest = {}
+                    for change_id, table, key, op in changes:
+                        latest[(table, key)] = op
+
+                    batch_upserted = batch_deleted = 0
+                    for table in TRACKED_TABLES:
+                        upsert_keys = [k for (t, k), op in latest.items() if t == table and op == 'U']
+                        delete_keys = [k for (t, k), op in latest.items() if t == table and op == 'D']
+                        if not upsert_keys and not delete_keys:
+                            continue
+                        rows = self._fetch_rows(cur, table, upsert_keys) if upsert_keys else {}
+                        upserted, deleted = self._apply(table, upsert_keys, delete_keys, rows)
+                        batch_upserted += upserted
+                        batch_deleted += deleted
+
+                    change_ids = [c[0] for c in changes]
+                    cur.execute("DELETE FROM vector_sync_changes WHERE change_id = ANY(%s)", (change_ids,))
+                    cur.execute("""
+                        UPDATE vector_sync_state
+                        SET high_water_mark = GREATEST(high_water_mark, %s),
+                            last_run_at = NOW(),
+                            documents_upserted = documents_upserted + %s,
+                            documents_deleted = documents_deleted + %s
+                        WHERE name = %s
+                    """, (max(change_ids), batch_upserted, batch_deleted, SYNC_NAME))
+                conn.commit()
+                run['changes'] += len(changes)
+                run['upserted'] += batch_upserted
+                run['deleted'] += batch_deleted
+        except Exception as e:
+            conn.rollback()
+            self.stats['last_error'] = str(e)
+            logger.error(f"❌ Vector sync failed: {e}")
+            raise
+        finally:
+            conn.close()
+
+        self.stats['runs'] += 1
+        self.stats['changes_processed'] += run['changes']
+        self.stats['documents_upserted'] += run['upserted']
+        self.stats['documents_deleted'] += run['deleted']
+        self.stats['last_run_seconds'] = round(time.time() - start, 3)
+        if run['changes']:
+            logger.info(
+                f"🔄 Vector sync: {run['changes']} changes -> {run['upserted']} upserted, {run['deleted']} deleted")
+        return run
+
+    def get_status(self) -> Dict:
+        """Pending backlog, high-water mark and run counters"""
+        status = dict(self.stats)
+        try:
+            conn = self._connect()
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM vector_sync_changes")
+                status['pending_changes'] = cur.fetchone()[0]
+                cur.execute("SELECT high_water_mark, last_run_at FROM vector_sync_state WHERE name = %s",
+                            (SYNC_NAME,))
+                row = cur.fetchone()
+                if row:
+                    status['high_water_mark'] = row[0]
+                    status['last_run_at'] = row[1].isoformat() if row[1] else None
+            conn.close()
+        except Exception as e:
+            status['error'] = str(e)
+        status['running'] = bool(self._thread and self._thread.is_alive())
+        return status
+
+    def start_background_sync(self, interval: int = 30):
+        """Run sync_once every `interval` seconds in a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def sync_loop():
+            while not self._stop.is_set():
+                try:
+                    self.sync_once()
+                except Exception:
+                    pass  # already logged; retry on next tick
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=sync_loop, daemon=True, name="vector-index-sync")
+        self._thread.start()
+        logger.info(f"🔄 Background vector index sync started (every {interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+
+# Global instance for easy import
+vector_index_sync = VectorIndexSync()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync PostgreSQL places into ChromaDB")
+    parser.add_argument('--install', action='store_true', help='create tables and triggers')
+    parser.add_argument('--backfill', action='store_true', help='enqueue every existing row')
+    parser.add_argument('--once', action='store_true', help='drain pending changes and exit')
+    parser.add_argument('--loop', action='store_true', help='keep syncing every --interval seconds')
+    parser.add_argument('--interval', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    vector_index_sync.batch_size = args.batch_size
+
+    if args.install:
+        vector_index_sync.install()
+    if args.backfill:
+        vector_index_sync.backfill()
+    if args.once:
+        print(f"✅ {vector_index_sync.sync_once()}")
+    if args.loop:
+        while True:
+            vector_index_sync.sync_once()
+            time.sleep(args.interval)
+    if not any([args.install, args.backfill, args.once, args.loop]):
+        print(json.dumps(vector_index_sync.get_status(), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
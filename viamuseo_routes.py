@@ -15,6 +15,8 @@ import logging
 from typing import Dict, List, Optional
 import chromadb
 
+from admission_control import admission_controlled
+
 viamuseo_bp = Blueprint('viamuseo', __name__)
 log = logging.getLogger('viamigo.viamuseo')
 
@@ -303,7 +305,26 @@ def get_museum_artworks(museum_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _question_cache_key(museum_id):
+    """Same museum and question (case/spacing-insensitive) -> same answer"""
+    question = (request.get_json(silent=True) or {}).get('question') or ''
+    return f"{museum_id}:{' '.join(question.lower().split())}"
+
+
+def _ask_shed(museum_id):
+    """Template answer when the Q&A endpoint is shed under load"""
+    question = (request.get_json(silent=True) or {}).get('question')
+    return jsonify({
+        'question': question,
+        'answer': "In questo momento la guida del museo è molto richiesta. "
+                  "Riprova tra qualche secondo: nel frattempo puoi esplorare le opere della collezione.",
+        'context': 'degraded',
+        'degraded': True
+    })
+
+
 @viamuseo_bp.route('/api/viamuseo/museum/<int:museum_id>/ask', methods=['POST'])
+@admission_controlled('museum_ask', degrade=_ask_shed, cache_key=_question_cache_key)
 def ask_museum_question(museum_id):
     """
     Ask questions about the museum using ChromaDB semantic search
@@ -5,7 +5,7 @@ Automatically detects weather conditions and triggers Plan B when needed
 
 import os
 import json
-import requests
+from http_client import http
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
@@ -65,7 +65,7 @@ class WeatherIntelligence:
                 'units': 'metric'
             }
 
-            response = requests.get(url, params=params, timeout=5)
+            response = http.get(url, params=params, timeout=5)
             response.raise_for_status()
 
             data = response.json()
@@ -235,7 +235,7 @@ class WeatherIntelligence:
                 'cnt': hours // 3  # API returns 3-hour intervals
             }
 
-            response = requests.get(url, params=params, timeout=5)
+            response = http.get(url, params=params, timeout=5)
             response.raise_for_status()
 
             data = response.json()